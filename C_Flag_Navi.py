@@ -10,6 +10,7 @@ from BNO055 import BNO055
 from motor import MotorDriver
 from Flag_B import Flag_B
 import RPi.GPIO as GPIO
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 from collections import deque
 
 class FN:
@@ -34,7 +35,7 @@ class FN:
         
         # === BNO055 初期化 ===
         self.bno = bno
-        self.pi = pigpio.pi() 
+        self.pi = pigpio_manager.acquire("FN") 
         if not self.pi.connected:
             raise RuntimeError("pigpioデーモンに接続できません。`sudo pigpiod`を実行して確認してください。")
         self.RX_PIN = 15
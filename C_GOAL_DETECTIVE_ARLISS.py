@@ -1,19 +1,21 @@
 import RPi.GPIO as GPIO
 import time
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import board
 import busio
-import numpy as np
 import cv2
 from picamera2 import Picamera2
-from libcamera import Transform
 import sys
-import os
 import math
 
 # カスタムモジュールのインポート
 from motor import MotorDriver
 from BNO055 import BNO055 # GDAクラス内で使用するため必要
+import color_classifier
+from frame_analysis import FrameAnalysis
+import camera_orientation
+import debug_image_writer
+import camera_controls
 
 # --- 定数設定 (変更なし) ---
 RX_PIN = 17
@@ -26,14 +28,14 @@ def save_image_for_debug(picam2_instance, path="/home/mark1/Pictures/paravo_imag
         print("画像キャプチャ失敗：フレームがNoneです。")
         return None
     frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-    cv2.imwrite(path, frame_bgr)
-    print(f"画像保存成功: {path}")
+    debug_image_writer.save(path, frame_bgr, event=True) # エンコードと書き込みはバックグラウンドで行う
+    print(f"画像保存を予約しました: {path}")
     return frame
 
 def detect_red_percentage(picam2_instance, save_path="/home/mark1/Pictures/red_detection_overall.jpg"):
     """
     カメラ画像をキャプチャし、画像全体における赤色ピクセルの割合を返します。
-    ここではソフトウェア的に回転・反転を行います。
+    回転はISP (Transform) で行えない分だけを、画像ではなく判定結果に対して扱います。
     エラー時は-1.0を返します。
     保存される画像は、回転後の通常のカラー画像です。
     """
@@ -44,31 +46,16 @@ def detect_red_percentage(picam2_instance, save_path="/home/mark1/Pictures/red_d
             return -1.0 # エラー値として-1.0を返す
 
         frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-        rotated_frame_bgr = cv2.rotate(frame_bgr, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        # 赤色の判定は分類器の classify() 1回 (cvtColor でHSVにして閾値の範囲ごとに inRange、分類器の作成は最初の1回だけ)
+        red = color_classifier.get_classifier([([0, 100, 100], [10, 255, 255]),
+                                               ([170, 100, 100], [180, 255, 255])], channel_order="BGR")
+        orientation = camera_orientation.residual(picam2_instance, camera_orientation.ROVER)
+        analysis = FrameAnalysis(frame_bgr, red, blur_ksize=0, orientation=orientation)
+        # 保存する画像だけは回転する。回転・エンコード・書き込みはバックグラウンドで行う
+        if debug_image_writer.save(save_path, lambda: analysis.oriented):
+            print(f"通常の画像の保存を予約しました: {save_path}")
 
-        directory = os.path.dirname(save_path)
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        cv2.imwrite(save_path, rotated_frame_bgr) 
-        print(f"通常の画像を保存しました: {save_path}")
-
-        height, width, _ = rotated_frame_bgr.shape
-        total_pixels = height * width
-
-        hsv = cv2.cvtColor(rotated_frame_bgr, cv2.COLOR_BGR2HSV)
-
-        lower_red1 = np.array([0, 100, 100])
-        upper_red1 = np.array([10, 255, 255])
-
-        lower_red2 = np.array([170, 100, 100])
-        upper_red2 = np.array([180, 255, 255])
-
-        mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-        mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-        mask = cv2.add(mask1, mask2)
-
-        red_pixels = cv2.countNonZero(mask)
-        red_percentage = (red_pixels / total_pixels) * 100 if total_pixels > 0 else 0.0
+        red_percentage = analysis.percentage
 
         print(f"検出結果: 画像全体の赤色割合: {red_percentage:.2f}%")
         return red_percentage / 100.0 # 割合は0-1の範囲で返すように調整
@@ -111,7 +98,7 @@ class GDA:
             STBY=21
         )
         
-        self.pi_instance = pigpio.pi()
+        self.pi_instance = pigpio_manager.acquire("GDA")
         if not self.pi_instance.connected:
             print("pigpioデーモンに接続できません。終了します。")
             sys.exit(1) # エラーコードで終了
@@ -131,10 +118,13 @@ class GDA:
         self.picam2.configure(self.picam2.create_preview_configuration(
             main={"size": (640, 480)},
             controls={"FrameRate": 30},
-            transform=Transform(rotation=90)
+            transform=camera_orientation.hardware_transform(camera_orientation.ROVER) # 反転だけISPで行う (90度回転はISP非対応)
         ))
         self.picam2.start()
         time.sleep(2)
+        # スキャンで回転する間は露出とホワイトバランスを固定する (camera_controls)
+        self.camera_controls = camera_controls.CameraControls(self.picam2)
+        self.camera_controls.apply("auto")
         print("GDA: すべてのデバイスが初期化されました。")
 
     def get_bno_heading(self):
@@ -229,53 +219,57 @@ class GDA:
         print(f"  初回回転: {turn_angle_step}度...")
         self.turn_to_relative_angle(turn_angle_step, turn_speed=90, angle_tolerance_deg=15)
         
-        for i in range(360 // turn_angle_step): 
-            if i > 0:
-                print(f"  --> スキャン中: さらに{turn_angle_step}度回転...")
-                self.turn_to_relative_angle(turn_angle_step, turn_speed=90, angle_tolerance_deg=15)
-                self.driver.motor_stop_brake()
-                time.sleep(0.5)
+        stability = camera_controls.DetectionStability("final_scan", threshold=final_threshold)
+        with self.camera_controls.phase("goal_check", relock=True): # 1周の間は同じ露出・色で撮る
+            for i in range(360 // turn_angle_step): 
+                if i > 0:
+                    print(f"  --> スキャン中: さらに{turn_angle_step}度回転...")
+                    self.turn_to_relative_angle(turn_angle_step, turn_speed=90, angle_tolerance_deg=15)
+                    self.driver.motor_stop_brake()
+                    time.sleep(0.5)
             
-            current_scan_heading = self.get_bno_heading()
-            if current_scan_heading is None:
-                print("警告: perform_final_scan_and_terminate: 旋回中に方位が取得できませんでした。スキップします。")
-                self.driver.motor_stop_brake()
-                time.sleep(0.1)
-                continue
+                current_scan_heading = self.get_bno_heading()
+                if current_scan_heading is None:
+                    print("警告: perform_final_scan_and_terminate: 旋回中に方位が取得できませんでした。スキップします。")
+                    self.driver.motor_stop_brake()
+                    time.sleep(0.1)
+                    continue
 
-            print(f"--- 最終確認スキャン中: 現在の方向: {current_scan_heading:.2f}度 ---")
+                print(f"--- 最終確認スキャン中: 現在の方向: {current_scan_heading:.2f}度 ---")
 
-            overall_red_ratio = detect_red_percentage(
-                self.picam2, 
-                save_path=f"/home/mark1/Pictures/final_scan_{i*turn_angle_step + turn_angle_step:03d}.jpg"
-            )
+                overall_red_ratio = detect_red_percentage(
+                    self.picam2, 
+                    save_path=f"/home/mark1/Pictures/final_scan_{i*turn_angle_step + turn_angle_step:03d}.jpg"
+                )
 
-            if overall_red_ratio == -1.0:
-                print("カメラ処理エラーのため、現在のスキャンステップをスキップします。")
-                continue
+                if overall_red_ratio == -1.0:
+                    print("カメラ処理エラーのため、現在のスキャンステップをスキップします。")
+                    continue
+                stability.record(overall_red_ratio, current_scan_heading, self.camera_controls.metadata())
 
-            print(f"検出結果: 画像全体の赤色割合: {overall_red_ratio:.2%}")
+                print(f"検出結果: 画像全体の赤色割合: {overall_red_ratio:.2%}")
 
-            if overall_red_ratio >= high_red_threshold:
-                print(f"\n  --> **高い赤色割合 ({high_red_threshold:.0%}) を検出しました！即座に180度回転して3秒間前進します。**")
-                self.turn_to_relative_angle(180, turn_speed=90, angle_tolerance_deg=15)
-                self.driver.motor_stop_brake()
-                time.sleep(0.5)
+                if overall_red_ratio >= high_red_threshold:
+                    print(f"\n  --> **高い赤色割合 ({high_red_threshold:.0%}) を検出しました！即座に180度回転して3秒間前進します。**")
+                    self.turn_to_relative_angle(180, turn_speed=90, angle_tolerance_deg=15)
+                    self.driver.motor_stop_brake()
+                    time.sleep(0.5)
                 
-                self.driver.petit_petit(4) # 前進速度を調整
-                time.sleep(3) # 3秒間前進
-                self.driver.motor_stop_brake()
-                time.sleep(0.5)
-                print("  --> 180度回転して3秒前進が完了しました。最終確認スキャンを最初から再開します。")
-                return True
+                    self.driver.petit_petit(4) # 前進速度を調整
+                    time.sleep(3) # 3秒間前進
+                    self.driver.motor_stop_brake()
+                    time.sleep(0.5)
+                    print("  --> 180度回転して3秒前進が完了しました。最終確認スキャンを最初から再開します。")
+                    return True
 
-            if overall_red_ratio >= final_threshold:
-                print(f"  --> 赤色を{final_threshold:.0%}以上検出！方向を記録します。")
-                final_scan_detected_angles.append(current_scan_heading)
+                if overall_red_ratio >= final_threshold:
+                    print(f"  --> 赤色を{final_threshold:.0%}以上検出！方向を記録します。")
+                    final_scan_detected_angles.append(current_scan_heading)
             
-            self.driver.motor_stop_brake()
-            time.sleep(0.5)
+                self.driver.motor_stop_brake()
+                time.sleep(0.5)
 
+        stability.report()
         if len(final_scan_detected_angles) >= min_red_detections_to_terminate:
             print(f"\n  --> 最終確認スキャンで{min_red_detections_to_terminate}ヶ所以上の赤色を検出しました ({len(final_scan_detected_angles)}ヶ所)。")
             
@@ -730,6 +724,7 @@ class GDA:
         if self.picam2:
             self.picam2.close()
             print("Picamera2がクローズされました。")
+        debug_image_writer.flush() # 保存待ちのデバッグ画像を書き終えてから終了する
         GPIO.cleanup()
         print("GPIOがクリーンアップされました。")
         print("=== 処理を終了しました。 ===")
@@ -8,7 +8,9 @@ import following
 from BNO055 import BNO055
 import math
 from collections import deque
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
+import color_classifier
+from frame_analysis import FrameAnalysis
 
 class GDN:
     def __init__(self, bno: BNO055, counter_max: int=50):
@@ -28,43 +30,26 @@ class GDN:
         self.upper_red1 = np.array([10, 255, 255])
         self.lower_red2 = np.array([160, 100, 100])
         self.upper_red2 = np.array([180, 255, 255])
-        self.pi = pigpio.pi() 
+        # 上の閾値の分類器を作っておく (フレームごとに cvtColor でHSVにして、範囲ごとに inRange する)
+        self.red_classifier = color_classifier.get_classifier(
+            [(self.lower_red1, self.upper_red1), (self.lower_red2, self.upper_red2)], channel_order="RGB")
+        self.pi = pigpio_manager.acquire("GDN") 
         if not self.pi.connected:
             raise RuntimeError("pigpioデーモンに接続できません。`sudo pigpiod`を実行して確認してください。")
         
+    def analyze(self, frame):
+        #1フレーム分の解析オブジェクト。回転・ぼかし・赤色判定は最初に必要になったときに1回だけ行う
+        if isinstance(frame, FrameAnalysis):
+            return frame
+        return FrameAnalysis(frame, self.red_classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE, blur_ksize=5)
+
     def get_percentage(self, frame):
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        frame = cv2.GaussianBlur(frame, (5, 5), 0)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask1 = cv2.inRange(hsv, self.lower_red1, self.upper_red1)
-        mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2)
-        mask = cv2.bitwise_or(mask1, mask2)
-        red_area = np.count_nonzero(mask)
-        total_area = frame.shape[0] * frame.shape[1]
-        percentage = (red_area / total_area) * 100
+        percentage = self.analyze(frame).percentage
         print(f"検知割合は{percentage}%です")
         return percentage
 
     def get_block_number_by_density(self, frame):
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        frame = cv2.GaussianBlur(frame, (5, 5), 0)
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask1 = cv2.inRange(hsv, self.lower_red1, self.upper_red1)
-        mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2)
-        mask = cv2.bitwise_or(mask1, mask2)
-        height, width = mask.shape
-        block_width = width // 5
-        red_ratios = []
-        for i in range(5):
-            x_start = i * block_width
-            x_end = (i + 1) * block_width if i < 4 else width
-            block_mask = mask[:, x_start:x_end]
-            red_count = np.count_nonzero(block_mask)
-            total_count = block_mask.size
-            ratio = red_count / total_count
-            red_ratios.append(ratio)
+        red_ratios = self.analyze(frame).column_densities(5)
         for i, r in enumerate(red_ratios):
             print(f"[DEBUG] ブロック{i+1}の赤密度: {r:.2%}")
         max_ratio = max(red_ratios)
@@ -117,8 +102,9 @@ class GDN:
                             break    
                 frame = self.picam2.capture_array()
                 time.sleep(0.2)
-                percentage = self.get_percentage(frame)
-                number = self.get_block_number_by_density(frame)
+                analysis = self.analyze(frame) #割合と位置は同じ解析結果から求める
+                percentage = self.get_percentage(analysis)
+                number = self.get_block_number_by_density(analysis)
                 time.sleep(0.2)
                 print(f"赤割合: {percentage:2f}%-----画面場所:{number}です ")
                 if percentage >= 90:
@@ -12,6 +12,7 @@ import struct
 
 #------GPSデータ送信(ARLISSで追加)ここから------#
 import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import serial
 #------GPSデータ送信(ARLISSで追加)ここまで------#
 
@@ -34,7 +35,7 @@ class LD:
         self.h_threshold = h_threshold
         self.start_time = time.time()
         self.im920 = serial.Serial('/dev/serial0', 19200, timeout=5)
-        self.pi = pigpio.pi()
+        self.pi = pigpio_manager.acquire("LD")
         if not self.pi.connected:
             raise RuntimeError("pigpio デーモンに接続できません。sudo pigpiod を起動してください。")
 
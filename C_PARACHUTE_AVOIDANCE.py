@@ -1,7 +1,7 @@
 import math
 import time
 import serial
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import RPi.GPIO as GPIO
 from motor import MotorDriver      # ユーザーのMotorDriverクラスを使用
 from BNO055 import BNO055
@@ -12,6 +12,8 @@ import cv2
 import numpy as np
 from picamera2 import Picamera2
 import camera
+import color_classifier
+from frame_analysis import FrameAnalysis
 from collections import deque
 from C_excellent_GPS import GPS
 
@@ -50,10 +52,13 @@ class PA:
         self.upper_red1 = np.array([5, 255, 255])
         self.lower_red2 = np.array([175, 150, 120])
         self.upper_red2 = np.array([180, 255, 255])
+        # 上の閾値の分類器を作っておく (フレームごとに cvtColor でHSVにして、範囲ごとに inRange する)
+        self.red_classifier = color_classifier.get_classifier(
+            [(self.lower_red1, self.upper_red1), (self.lower_red2, self.upper_red2)], channel_order="RGB")
         
         self.RX_PIN = 17
         self.BAUD = 9600
-        self.pi = pigpio.pi()
+        self.pi = pigpio_manager.acquire("PA")
         if not self.pi.connected:
             raise RuntimeError("pigpio デーモンに接続できません。sudo pigpiod を起動してください。")
         err = self.pi.bb_serial_read_open(self.RX_PIN, self.BAUD, 8)
@@ -62,17 +67,14 @@ class PA:
             raise RuntimeError(f"ソフトUART RX 設定失敗: GPIO={self.RX_PIN}, {self.BAUD}bps")
         
     #引数:画像フレーム　返り値:画像の赤色面積の全体のピクセル数に対する割合
+    def analyze(self, frame):
+        #1フレーム分の解析オブジェクト。回転・ぼかし・赤色判定は最初に必要になったときに1回だけ行う
+        if isinstance(frame, FrameAnalysis):
+            return frame
+        return FrameAnalysis(frame, self.red_classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE, blur_ksize=5)
+
     def get_percentage(self, frame):
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        frame = cv2.GaussianBlur(frame, (5, 5), 0)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask1 = cv2.inRange(hsv, self.lower_red1, self.upper_red1)
-        mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2)
-        mask = cv2.bitwise_or(mask1, mask2)
-        red_area = np.count_nonzero(mask)
-        total_area = frame.shape[0] * frame.shape[1]
-        percentage = (red_area / total_area) * 100
+        percentage = self.analyze(frame).percentage
         print(f"検知割合は{percentage}%です")
         return percentage
         
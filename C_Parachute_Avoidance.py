@@ -1,6 +1,6 @@
 import RPi.GPIO as GPIO
 import time
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import board
 import busio
 import numpy as np
@@ -25,7 +25,7 @@ class Parakai:
 
         # GPS
         self.RX_PIN = 17
-        self.pi = pigpio.pi()
+        self.pi = pigpio_manager.acquire("C_Parachute_Avoidance")
         self.pi.bb_serial_read_close(self.RX_PIN)   #追加
         self.pi.bb_serial_read_open(self.RX_PIN, 9600, 8)
         self.bno = bno
@@ -4,6 +4,7 @@ import math
 import time
 import serial
 import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import RPi.GPIO as GPIO
 from motor import MotorDriver      # ユーザーのMotorDriverクラスを使用
 from BNO055 import BNO055
@@ -35,7 +36,7 @@ class GPS:
         self.WIRELESS_PIN = 22
         self.im920 = serial.Serial('/dev/serial0', 19200, timeout=5)
         self.turn_speed = 95
-        self.pi = pigpio.pi()
+        self.pi = pigpio_manager.acquire("GPS")
         if not self.pi.connected:
             raise RuntimeError("pigpio デーモンに接続できません。sudo pigpiod を起動してください。")
         try:
@@ -1,6 +1,6 @@
 import math
 import time
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import RPi.GPIO as GPIO
 import threading
 import sys 
@@ -25,7 +25,7 @@ TX_PIN = 17
 RX_PIN = 27
 BAUD = 9600
 
-pi = pigpio.pi()
+pi = pigpio_manager.acquire("E_to_E")
 if not pi.connected:
     print("pigpio デーモンに接続できません。")
     sys.exit(1) 
@@ -3,6 +3,7 @@ import numpy as np
 import math
 from picamera2 import Picamera2
 from time import sleep
+import camera_orientation
 
 class FlagDetector:
     """
@@ -26,17 +27,28 @@ class FlagDetector:
         self.triangle_tolerance = triangle_tolerance
 
         # --- 検出結果を保持する変数を初期化 ---
-        self.last_image = None
+        self.last_frame = None   # センサーの向きのままの画像
+        self._last_image = None
         self.detected_flags = []
 
         # --- カメラの準備 ---
+        # 反転はISP (Transform) で行い、残りの90度回転は画像を回さずに輪郭の座標だけを変換する
         self.camera = Picamera2()
-        config = self.camera.create_still_configuration(main={"size": (self.width, self.height)})
+        config = self.camera.create_still_configuration(main={"size": (self.width, self.height)},
+                                                        transform=camera_orientation.hardware_transform(camera_orientation.ROVER))
         self.camera.configure(config)
+        self.orientation = camera_orientation.residual(self.camera, camera_orientation.ROVER)
         self.camera.start()
         print("カメラを初期化しました。")
         sleep(2)
 
+    @property
+    def last_image(self):
+        """最後に撮影した画像を表示の向きにしたもの (描画・表示用。初めて参照したときに1回だけ回転する)。"""
+        if self._last_image is None and self.last_frame is not None:
+            self._last_image = self.orientation.apply(self.last_frame)
+        return self._last_image
+
     # 垂心・重心について
     def _calculate_distance(self, p1, p2):
         """2点間の距離を計算する"""
@@ -110,14 +122,16 @@ class FlagDetector:
         1. 黒いフラッグ領域と白い図形をそれぞれ検出。
         2. 白い図形が黒いフラッグの内側にあるか判定し、関連付ける。
         """
-        self.last_image = self.camera.capture_array()
-        self.last_image = cv2.rotate(self.last_image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        if self.last_image is None:
+        self.last_frame = self.camera.capture_array()
+        self._last_image = None
+        if self.last_frame is None:
             print("画像が取得できませんでした。")
             return []
 
         self.detected_flags = []
-        img = self.last_image.copy()
+        img = self.last_frame # 読むだけなのでコピー・回転しない
+        shape = img.shape
+        display_width = self.orientation.display_shape(shape)[1]
 
         # --- 1. 黒い領域（フラッグ）の輪郭を特定 ---
         hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
@@ -127,6 +141,8 @@ class FlagDetector:
         kernel = np.ones((5, 5), np.uint8)
         black_mask = cv2.morphologyEx(black_mask, cv2.MORPH_CLOSE, kernel)
         black_contours, _ = cv2.findContours(black_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # 以降は表示の向きの座標で扱う (回転するのは輪郭の点だけ)
+        black_contours = [self.orientation.points_to_display(c, shape) for c in black_contours]
 
         valid_black_contours = [c for c in black_contours if cv2.contourArea(c) > self.min_black_area]
 
@@ -135,6 +151,7 @@ class FlagDetector:
         # 白を明確に検出するため、しきい値を高めに設定 (例: 150)
         _, white_mask = cv2.threshold(gray_img, 150, 255, cv2.THRESH_BINARY)
         shape_contours, _ = cv2.findContours(white_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        shape_contours = [self.orientation.points_to_display(c, shape) for c in shape_contours]
 
         # --- 3. 各黒領域に、どの白い図形が含まれるか判定 ---
         for flag_contour in valid_black_contours:
@@ -145,9 +162,9 @@ class FlagDetector:
             flag_cx = int(M_flag["m10"] / M_flag["m00"])
 
             location = ""
-            if flag_cx < self.width / 3:
+            if flag_cx < display_width / 3:
                 location = "左"
-            elif flag_cx < self.width * 2 / 3:
+            elif flag_cx < display_width * 2 / 3:
                 location = "中央"
             else:
                 location = "右"
@@ -0,0 +1,229 @@
+import cv2
+import numpy as np
+from picamera2 import Picamera2
+from time import sleep
+import camera_orientation
+import shape_classifier
+
+class FlagDetector:
+    """
+    カメラ画像から黒い領域（フラッグ）を探し、その中に描かれた
+    特定の白い図形を検出し、フラッグの位置を判定するクラス。
+
+    Flag_Detector5 は黒い領域と白い図形を別々に findContours し、すべての (フラッグ, 図形) の組で
+    pointPolygonTest を行っていたため、白い石や紙くずの多い地面では組の数だけ遅くなっていた。
+    このクラスは黒と白を合わせたマスクを RETR_TREE で1回だけ輪郭抽出し、フラッグの中の図形を階層から直接読む。
+    図形は shape_classifier で判別する (頂点数ではなく、特徴量とテンプレートの比較。正三角形は区別しない)。
+    結果の形式は Flag_Detector5 と同じで、図形ごとにスコア ("score") が付く。
+    """
+
+    # 黒 (フラッグ) と白 (図形) の閾値は Flag_Detector5 と同じ
+    LOWER_BLACK = np.array([0, 0, 0])
+    UPPER_BLACK = np.array([180, 255, 40]) # V(明度)の値を低く保ち、暗い領域のみを抽出
+    WHITE_THRESHOLD = 150
+    # フラッグの中の前景のうち、白い画素が面積のこの割合以上なら図形とみなす (灰色の反射などを除く)
+    WHITE_FILL = 0.5
+
+    def __init__(self, width=640, height=480, min_black_area=1000, min_shape_area=100):
+        """
+        コンストラクタ（初期化処理）
+        Args:
+            min_shape_area (float): これより小さい図形の輪郭はノイズとして除外する (Flag_Detector5 と同じ100)。
+        """
+        # --- 設定をインスタンス変数として保存 ---
+        self.width = width
+        self.height = height
+        self.min_black_area = min_black_area
+        self.shape_classifier = shape_classifier.ShapeClassifier(min_area=min_shape_area)
+        self.kernel = np.ones((5, 5), np.uint8)
+
+        # --- 検出結果を保持する変数を初期化 ---
+        self.last_frame = None   # センサーの向きのままの画像
+        self._last_image = None
+        self.detected_flags = []
+
+        # --- カメラの準備 ---
+        # 反転はISP (Transform) で行い、残りの90度回転は画像を回さずに輪郭の座標だけを変換する
+        self.camera = Picamera2()
+        config = self.camera.create_still_configuration(main={"size": (self.width, self.height)},
+                                                        transform=camera_orientation.hardware_transform(camera_orientation.ROVER))
+        self.camera.configure(config)
+        self.orientation = camera_orientation.residual(self.camera, camera_orientation.ROVER)
+        self.camera.start()
+        print("カメラを初期化しました。")
+        sleep(2)
+
+    @property
+    def last_image(self):
+        """最後に撮影した画像を表示の向きにしたもの (描画・表示用。初めて参照したときに1回だけ回転する)。"""
+        if self._last_image is None and self.last_frame is not None:
+            self._last_image = self.orientation.apply(self.last_frame)
+        return self._last_image
+
+    def _classify_shape(self, contour):
+        """
+        輪郭の形を shape_classifier で判別する (特徴量を1回求めてテンプレートと比べる)。
+        Returns:
+            tuple: (図形名, 輪郭, スコア)。判別できなければ ("不明", None, スコア)。
+        """
+        match = self.shape_classifier.classify(contour)
+        if match.name == shape_classifier.UNKNOWN:
+            return "不明", None, match.score
+        return match.name, contour, match.score
+
+    def detect(self):
+        """
+        メインの検出処理。
+        1. 黒い領域と白い図形を合わせたマスクを RETR_TREE で1回だけ輪郭抽出する
+           (地面の穴 = 黒いフラッグ、フラッグの中の前景 = 図形)。
+        2. 階層 (hierarchy) から各フラッグの子をたどり、白い画素で埋まっているものを図形として分類する。
+        """
+        self.last_frame = self.camera.capture_array()
+        self._last_image = None
+        if self.last_frame is None:
+            print("画像が取得できませんでした。")
+            return []
+
+        self.detected_flags = []
+        img = self.last_frame # 読むだけなのでコピー・回転しない
+        shape = img.shape
+        display_width = self.orientation.display_shape(shape)[1]
+
+        # --- 1. 黒い領域 (フラッグ) と白い領域 (図形) のマスク ---
+        hsv = cv2.cvtColor(img, cv2.COLOR_RGB2HSV)
+        black_mask = cv2.inRange(hsv, self.LOWER_BLACK, self.UPPER_BLACK)
+        black_mask = cv2.morphologyEx(black_mask, cv2.MORPH_CLOSE, self.kernel)
+        gray_img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+        _, white_mask = cv2.threshold(gray_img, self.WHITE_THRESHOLD, 255, cv2.THRESH_BINARY)
+
+        # --- 2. 黒と白を合わせたマスクで、フラッグと図形の輪郭を1回で求める ---
+        # 「黒くない、または白い」画素を前景にする (クロージングで埋まった図形も白い画素で削り戻す)。
+        # 周りを1画素の前景で囲むので、地面と画像の外周が1つの領域になり、その穴がフラッグ (黒い領域)、
+        # 穴の中の前景が図形になる。画像の端に接したフラッグも穴になる。
+        segmentation = cv2.bitwise_or(cv2.bitwise_not(black_mask), white_mask)
+        segmentation = cv2.copyMakeBorder(segmentation, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=255)
+        # hierarchy[i] = [次, 前, 最初の子, 親]。RETR_TREE では入れ子の深さが奇数の輪郭が穴 (黒い領域)
+        contours, hierarchy = cv2.findContours(segmentation, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE, offset=(-1, -1))
+        if hierarchy is None:
+            print("0個のフラッグを検出し、0個の図形を見つけました。")
+            return self.detected_flags
+        hierarchy = hierarchy[0]
+
+        for i, contour in enumerate(contours):
+            if hierarchy[i][2] == -1 or _depth(hierarchy, i) % 2 == 0: # 図形の無い黒い領域、または前景の輪郭
+                continue
+            if cv2.contourArea(contour) <= self.min_black_area:
+                continue
+            # 以降は表示の向きの座標で扱う (回転するのは選んだ輪郭の点だけ)
+            flag_contour = self.orientation.points_to_display(contour, shape)
+            M_flag = cv2.moments(flag_contour)
+            if M_flag["m00"] == 0: continue
+            flag_cx = int(M_flag["m10"] / M_flag["m00"])
+
+            location = ""
+            if flag_cx < display_width / 3:
+                location = "左"
+            elif flag_cx < display_width * 2 / 3:
+                location = "中央"
+            else:
+                location = "右"
+
+            # このフラッグの中の前景だけを兄弟のリンクでたどる (他のフラッグや地面の白い物は見ない)
+            shapes_in_flag = []
+            child = hierarchy[i][2]
+            while child != -1:
+                shape_contour = contours[child]
+                child = hierarchy[child][0]
+                x, y, w, h = cv2.boundingRect(shape_contour)
+                area = cv2.contourArea(shape_contour)
+                # 白い画素が面積の WHITE_FILL 未満なら、図形ではない (フラッグの傷・灰色の反射など)
+                if area <= 0 or cv2.countNonZero(white_mask[y:y + h, x:x + w]) < self.WHITE_FILL * area:
+                    continue
+                shape_contour = self.orientation.points_to_display(shape_contour, shape)
+                M_shape = cv2.moments(shape_contour)
+                if M_shape["m00"] == 0: continue
+                cx_shape = int(M_shape["m10"] / M_shape["m00"])
+                cy_shape = int(M_shape["m01"] / M_shape["m00"])
+
+                shape_name, shape_contour, score = self._classify_shape(shape_contour)
+                if shape_name != "不明" and shape_contour is not None:
+                    shapes_in_flag.append({
+                        "name": shape_name,
+                        "contour": shape_contour,
+                        "center": (cx_shape, cy_shape),
+                        "score": score
+                    })
+
+            # このフラッグ内に図形が1つ以上見つかった場合、結果に追加
+            if shapes_in_flag:
+                self.detected_flags.append({
+                    "flag_contour": flag_contour,
+                    "shapes": shapes_in_flag,
+                    "location": location
+                })
+
+        print(f"{len(self.detected_flags)}個のフラッグを検出し、{sum(len(f['shapes']) for f in self.detected_flags)}個の図形を見つけました。")
+        return self.detected_flags
+
+    def draw_results(self, image_to_draw):
+        """
+        検出結果を渡された画像に描画する。
+        """
+        if not self.detected_flags:
+            return image_to_draw
+
+        img = image_to_draw.copy()
+        for flag_info in self.detected_flags:
+            cv2.drawContours(img, [flag_info["flag_contour"]], -1, (255, 0, 0), 3)
+            
+            for shape_info in flag_info["shapes"]:
+                cv2.drawContours(img, [shape_info["contour"]], -1, (0, 255, 0), 2)
+                
+                bx, by, _, _ = cv2.boundingRect(shape_info["contour"])
+                label = f"{shape_info['name']} ({flag_info['location']})"
+                cv2.putText(img, label, (bx, by - 10),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+        return img
+        
+    def close(self):
+        """
+        カメラリソースを解放する。
+        """
+        self.camera.close()
+        print("カメラを解放しました。")
+
+def _depth(hierarchy, index):
+    """輪郭の入れ子の深さ (一番外側が0)。"""
+    depth = 0
+    parent = hierarchy[index][3]
+    while parent != -1:
+        depth += 1
+        parent = hierarchy[parent][3]
+    return depth
+
+# --- クラスの使い方 ---
+if __name__ == '__main__':
+    detector = FlagDetector()
+
+    try:
+        detected_data = detector.detect()
+
+        if detected_data:
+            print("\n--- 検出結果詳細 ---")
+            for i, flag in enumerate(detected_data):
+                # 検出された図形の名前とスコアのリストを作成
+                shape_names = [f"{s['name']}({s['score']:.2f})" for s in flag["shapes"]]
+                print(f"フラッグ {i+1}: 位置={flag['location']}, 図形={', '.join(shape_names)}")
+        else:
+            print("フラッグが見つかりませんでした。")
+
+        if detector.last_image is not None:
+            result_image = detector.draw_results(detector.last_image)
+            
+            display_image = cv2.cvtColor(result_image, cv2.COLOR_RGB2BGR)
+            cv2.imshow("Detected Shapes", display_image)
+            cv2.waitKey(0)
+    
+    finally:
+        detector.close()
+        cv2.destroyAllWindows()
@@ -5,22 +5,14 @@ from time import sleep
 from motor import MotorDriver
 import RPi.GPIO as GPIO
 import time # MotorDriver内でtime.sleepが使われているため、念のためインポート
+import shape_classifier
 
-# --- 図形分類関数 (変更なし) ---
-def classify_by_vertex_count(contour):
-    epsilon = 0.02 * cv2.arcLength(contour, True)
-    approx = cv2.approxPolyDP(contour, epsilon, True)
-    vertices = len(approx)
-    shape_name = "多角形"
-    if vertices == 3:
-        shape_name = "三角形"
-    elif vertices == 4:
-        shape_name = "長方形"
-    elif vertices == 8:
-        shape_name = "T字"
-    elif vertices == 12:
-        shape_name = "十字"
-    return shape_name, approx
+# --- 図形分類関数 (shape_classifier の特徴量とテンプレートの比較) ---
+def classify_shape(contour):
+    """輪郭の図形名とスコアを返す。どの図形にも近くなければ「多角形」。"""
+    match = shape_classifier.classify(contour)
+    shape_name = "多角形" if match.name == shape_classifier.UNKNOWN else match.name
+    return shape_name, match.score
 
 # --- 図形検出関数 (面積フィルタリングを追加) ---
 def detect_shapes_by_region(show_debug=False):
@@ -82,11 +74,8 @@ def detect_shapes_by_region(show_debug=False):
             if area < 100: 
                 continue
 
-            shape_name, approx = classify_by_vertex_count(cnt)
-            # 頂点数が3未満のものは図形として扱わない
-            if len(approx) < 3:
-                continue
-            
+            shape_name, score = classify_shape(cnt)
+
             M = cv2.moments(cnt)
             if M["m00"] == 0: # 面積が0の場合はスキップ
                 continue
@@ -97,6 +86,7 @@ def detect_shapes_by_region(show_debug=False):
 
             detected_shapes_in_roi.append({
                 "name": shape_name,
+                "score": score,
                 "area": area,
                 "global_cx": global_cx
             })
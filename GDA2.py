@@ -4,11 +4,16 @@ import time
 from picamera2 import Picamera2
 from motor import MotorDriver
 import camera
+import color_calibration
+import camera_controls
+from frame_analysis import FrameAnalysis
+from camera_orientation import Orientation
+from pyramid_search import PyramidSearch, format_pyramid_stats
 import following 
 from BNO055 import BNO055 
 import math
 from collections import deque
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import RPi.GPIO as GPIO
 
 class GDA:
@@ -24,27 +29,37 @@ class GDA:
         self.picam2.configure(config)
         self.picam2.start()
         time.sleep(1)
+        # 探索で回転する間は露出とホワイトバランスを固定する (camera_controls)
+        self.camera_controls = camera_controls.CameraControls(self.picam2)
+        self.camera_controls.apply("auto")
         self.counter_max = counter_max
         self.lower_red1 = np.array([0, 150, 120])
         self.upper_red1 = np.array([5, 255, 255])
         self.lower_red2 = np.array([175, 150, 120])
         self.upper_red2 = np.array([180, 255, 255])
-        self.pi = pigpio.pi()
+        # color_calibration でキャリブレーションした閾値があればそれを使う (無ければ上の閾値の分類器を作る)
+        self.red_classifier = color_calibration.load_classifier(
+            "red", "RGB", default=[(self.lower_red1, self.upper_red1), (self.lower_red2, self.upper_red2)])
+        # 360度スキャンでは縮小画像で赤色を探し、見つかった範囲だけを元の解像度で判定する (pyramid_search)
+        self.pyramid = PyramidSearch(self.red_classifier,
+                                     orientation=Orientation.from_cv2(cv2.ROTATE_90_COUNTERCLOCKWISE))
+        self.pi = pigpio_manager.acquire("GDA")
         self.percentage = 0
         if not self.pi.connected:
             raise RuntimeError("pigpioデーモンに接続できません。`sudo pigpiod`を実行して確認してください。")
         
+    def analyze(self, frame):
+        #1フレーム分の解析オブジェクト。回転・ぼかし・赤色判定は最初に必要になったときに1回だけ行う
+        if isinstance(frame, FrameAnalysis):
+            return frame
+        return FrameAnalysis(frame, self.red_classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE, blur_ksize=5)
+
+    def scan(self, frame):
+        #360度スキャン用の解析。縮小画像で赤色の候補が無ければ元の解像度では判定しない
+        return self.pyramid.analyze(frame)
+
     def get_percentage(self, frame):
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        frame = cv2.GaussianBlur(frame, (5, 5), 0)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-        mask1 = cv2.inRange(hsv, self.lower_red1, self.upper_red1)
-        mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2)
-        mask = cv2.bitwise_or(mask1, mask2)
-        red_area = np.count_nonzero(mask)
-        total_area = frame.shape[0] * frame.shape[1]
-        percentage = (red_area / total_area) * 100
+        percentage = self.analyze(frame).percentage
         print(f"検知割合は{percentage}%です")
         return percentage
 
@@ -94,7 +109,7 @@ class GDA:
             if angle_diff >= 350:
                 break
             frame = self.picam2.capture_array()
-            current_percentage = self.get_percentage(frame)
+            current_percentage = self.get_percentage(self.scan(frame))
             if current_percentage > best_percentage:
                 best_percentage = current_percentage
                 best_heading = current_heading
@@ -113,21 +128,26 @@ class GDA:
         time.sleep(1.0)
         start_heading = self.bno.get_heading()
         # 20度ずつ回転するためのループ
-        for i in range(12): # 360度 / 30度 = 12回
-            # 目標となる相対的な回転角度を計算
-            target_heading = (start_heading + (i + 1) * 30) % 360
-            print(f"[{i+1}/12] 目標方位 {target_heading:.2f}° に向かって回転中...")
-            self.turn_to_heading(target_heading, speed=90)
-            # カメラで撮影し、赤色の割合を取得
-            frame = self.picam2.capture_array()
-            current_percentage = self.get_percentage(frame)
-            # 検出したデータをリストに追加
-            scan_data.append({
-                'percentage': current_percentage,
-                'heading': self.bno.get_heading()
-            })
+        stability = camera_controls.DetectionStability("rotate_search_red_ball")
+        with self.camera_controls.phase("scan", relock=True): # 1回転の間は同じ露出・色で撮る
+            for i in range(12): # 360度 / 30度 = 12回
+                # 目標となる相対的な回転角度を計算
+                target_heading = (start_heading + (i + 1) * 30) % 360
+                print(f"[{i+1}/12] 目標方位 {target_heading:.2f}° に向かって回転中...")
+                self.turn_to_heading(target_heading, speed=90)
+                # カメラで撮影し、赤色の割合を取得
+                frame = self.picam2.capture_array()
+                current_percentage = self.get_percentage(self.scan(frame))
+                stability.record(current_percentage, self.bno.get_heading(), self.camera_controls.metadata())
+                # 検出したデータをリストに追加
+                scan_data.append({
+                    'percentage': current_percentage,
+                    'heading': self.bno.get_heading()
+                })
             
         self.driver.motor_stop_brake()
+        stability.report()
+        print(format_pyramid_stats(self.pyramid.stats(), "GDA"))
         print("[360度スキャン終了] データ収集完了。")
 
         return scan_data
@@ -139,21 +159,26 @@ class GDA:
         time.sleep(1.0)
         start_heading = self.bno.get_heading()
         # 15度ずつ回転するためのループ
-        for i in range(24): # 360度 / 15度 = 18回
-            # 目標となる相対的な回転角度を計算
-            target_heading = (start_heading + (i + 1) * 15) % 360
-            print(f"[{i+1}/24] 目標方位 {target_heading:.2f}° に向かって回転中...")
-            self.turn_to_heading(target_heading, speed=90)
-            # カメラで撮影し、赤色の割合を取得
-            frame = self.picam2.capture_array()
-            current_percentage = self.get_percentage(frame)
-            # 検出したデータをリストに追加
-            scan_data.append({
-                'percentage': current_percentage,
-                'heading': self.bno.get_heading()
-            })
+        stability = camera_controls.DetectionStability("rotate_search_red_ball2")
+        with self.camera_controls.phase("scan", relock=True): # 1回転の間は同じ露出・色で撮る
+            for i in range(24): # 360度 / 15度 = 18回
+                # 目標となる相対的な回転角度を計算
+                target_heading = (start_heading + (i + 1) * 15) % 360
+                print(f"[{i+1}/24] 目標方位 {target_heading:.2f}° に向かって回転中...")
+                self.turn_to_heading(target_heading, speed=90)
+                # カメラで撮影し、赤色の割合を取得
+                frame = self.picam2.capture_array()
+                current_percentage = self.get_percentage(self.scan(frame))
+                stability.record(current_percentage, self.bno.get_heading(), self.camera_controls.metadata())
+                # 検出したデータをリストに追加
+                scan_data.append({
+                    'percentage': current_percentage,
+                    'heading': self.bno.get_heading()
+                })
             
         self.driver.motor_stop_brake()
+        stability.report()
+        print(format_pyramid_stats(self.pyramid.stats(), "GDA"))
         print("[360度スキャン終了] データ収集完了。")
 
         return scan_data
@@ -245,32 +270,14 @@ class GDA:
                 elif current_state == "FOLLOW":
                     print("\n[状態: 追従] 赤ボールに向かって前進します。")
                     frame = self.picam2.capture_array()
-                    frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-                    
-                    # 画像を左・中央・右の3つの領域に分割
-                    height, width, _ = frame.shape
-                    center_start = int(width / 3)
-                    center_end = int(width * 2 / 3)
-                    
-                    # 各領域のHSVマスクを生成
-                    mask1 = cv2.inRange(hsv, self.lower_red1, self.upper_red1)
-                    mask2 = cv2.inRange(hsv, self.lower_red2, self.upper_red2)
-                    full_mask = cv2.bitwise_or(mask1, mask2)
-                    
-                    left_mask = full_mask[:, :center_start]
-                    center_mask = full_mask[:, center_start:center_end]
-                    right_mask = full_mask[:, center_end:]
+                    # 追従時はぼかさずに判定する (従来どおり)
+                    analysis = FrameAnalysis(frame, self.red_classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE, blur_ksize=0)
                     
-                    # 各領域での赤色のピクセル数をカウント
-                    left_red_pixels = np.count_nonzero(left_mask)
-                    center_red_pixels = np.count_nonzero(center_mask)
-                    right_red_pixels = np.count_nonzero(right_mask)
+                    # 画像を左・中央・右の3つの領域に分割し、各領域での赤色のピクセル数をカウント
+                    left_red_pixels, center_red_pixels, right_red_pixels = analysis.column_counts(3)
                     
                     # 赤いピクセルの総数を計算して割合を判断
-                    total_red_pixels = np.count_nonzero(full_mask)
-                    current_percentage = (total_red_pixels / (width * height)) * 100
+                    current_percentage = analysis.percentage
                     
                     time.sleep(1.0)
                     
@@ -1,6 +1,7 @@
 import serial
 import time
 import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import threading
 
 class EmGpsDatalink:
@@ -13,7 +14,7 @@ class EmGpsDatalink:
         self.WIRELESS_PIN = wireless_pin
 
         # --- pigpioの初期化 ---
-        self.pi = pigpio.pi()
+        self.pi = pigpio_manager.acquire("EmGpsDatalink")
         if not self.pi.connected:
             print("ERROR: pigpio デーモンに接続できません。")
             raise ConnectionRefusedError("pigpio daemon not connected.")
@@ -3,6 +3,26 @@ import math
 import time
 from picamera2 import Picamera2
 import numpy as np
+import color_classifier
+import color_calibration
+
+# 元のコードはRGBのフレームをBGRとしてHSV変換していたので、閾値もその前提 (赤がH 95-130側に来る) のまま使う
+RED_RANGES = [([0, 30, 30], [20, 255, 255]), ([95, 30, 30], [130, 255, 255])]
+
+_red_classifier = None
+
+def red_classifier():
+    """
+    赤色の分類器 (最初の呼び出しで1回だけ選ぶ)。color_calibration でキャリブレーションした閾値があれば、
+    フレームの本当の順 (RGB) で判定する。無ければ従来どおり RED_RANGES をBGRとして判定する。
+    """
+    global _red_classifier
+    if _red_classifier is None:
+        if color_calibration.has_calibration("red"):
+            _red_classifier = color_calibration.load_classifier("red", "RGB")
+        else:
+            _red_classifier = color_classifier.get_classifier(RED_RANGES, channel_order="BGR")
+    return _red_classifier
 
 def init_camera():
     global picam2
@@ -16,14 +36,7 @@ def init_camera():
 def get_percentage():
     frame = picam2.capture_array()
     frame = cv2.GaussianBlur(frame, (5, 5), 0)
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    lower_red1 = np.array([0, 30, 30])
-    upper_red1 = np.array([20, 255, 255])
-    lower_red2 = np.array([95, 30, 30])
-    upper_red2 = np.array([130, 255, 255])
-    mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-    mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-    mask = cv2.bitwise_or(mask1, mask2)
+    mask = red_classifier().classify(frame)
     red_area = np.count_nonzero(mask)
     total_area = frame.shape[0] * frame.shape[1]
     percentage = (red_area / total_area) * 100
@@ -50,14 +63,7 @@ def get_block_number():
     number = None
     frame = picam2.capture_array()
     frame = cv2.GaussianBlur(frame, (5, 5), 0)
-    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
-    lower_red1 = np.array([0, 30, 30])
-    upper_red1 = np.array([20, 255, 255])
-    lower_red2 = np.array([95, 30, 30])
-    upper_red2 = np.array([130, 255, 255])
-    mask1 = cv2.inRange(hsv, lower_red1, upper_red1)
-    mask2 = cv2.inRange(hsv, lower_red2, upper_red2)
-    mask = cv2.bitwise_or(mask1, mask2)
+    mask = red_classifier().classify(frame)
     contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     if contours:
         largest = max(contours, key=cv2.contourArea)
@@ -0,0 +1,209 @@
+import time
+import math
+from contextlib import contextmanager
+
+# 走行の段階ごとにカメラの露出・ホワイトバランスを切り替えるモジュール
+# 自動露出 (AE) と自動ホワイトバランス (AWB) は、ローバーが太陽の方へ向くたびに露出と色のゲインを変えるので、
+# 同じコーンでも赤色の割合がフレームごとに大きく変わり、perform_final_scan_and_terminate や
+# rotate_search_red_ball2 の余計な再探索の原因になっていた。
+# CameraControls は AE/AWB が落ち着くのを待ってからその時点の露出・ゲイン・色ゲインで固定 (lock) し、
+# 段階ごとのプロファイル (フレーム時間・ゲイン・露出) を Picamera2 の set_controls() で切り替える。
+# カメラを止めずに切り替わるので、段階の変わり目で撮影が途切れない。
+#
+# 使い方:
+#   controls = CameraControls(picam2)
+#   with controls.phase("scan"):            # 回転しながら探す間は露出とホワイトバランスを固定する
+#       for ...:
+#           percentage = ...
+#           stability.record(percentage, heading, controls.metadata())
+#   stability.report()                      # 1回転の間に赤色の割合がどれだけ揺れたか
+#   controls.apply("approach")              # 近づく間は短い露出で、AWBだけ固定のまま
+
+# プロファイル: set_controls() に渡す値と、AE/AWBを固定するか (lock)
+# FrameDurationLimits は [us] (最小, 最大)。最大を短くすると暗い場所でも露出が伸びず、動きのぶれが減る。
+PROFILES = {
+    "auto": {"controls": {"AeEnable": True, "AwbEnable": True}, "lock": False},
+    # 回転しながら探す: 1回転の間は同じ露出・色で撮る
+    "scan": {"controls": {"FrameDurationLimits": (33333, 33333)}, "lock": True},
+    # 近づく: 明るさの変化には追従するが、色 (AWB) は固定のまま。露出は短め
+    "approach": {"controls": {"AeEnable": True, "AwbEnable": False, "FrameDurationLimits": (16666, 33333)},
+                 "lock": False},
+    # ゴールの確認: 探索と同じく固定
+    "goal_check": {"controls": {"FrameDurationLimits": (33333, 33333)}, "lock": True},
+}
+
+# 固定するときにメタデータから読み取る制御値
+LOCKED_KEYS = ("ExposureTime", "AnalogueGain", "ColourGains")
+
+class CameraControls:
+    """
+    Picamera2 の制御値 (set_controls) を段階ごとのプロファイルで切り替えるクラス。
+    AE/AWB の固定は、落ち着いた時点のメタデータの値を手動の値として設定して行う。
+    """
+
+    def __init__(self, picam2, profiles=None, settle_timeout_s=2.0, tolerance=0.03, stable_frames=3):
+        """
+        Args:
+            picam2 (Picamera2): start() 済みのPicamera2 (FrameSource や replay_camera.ReplayCamera も可)。
+            profiles (dict): プロファイル名 → {"controls": dict, "lock": bool}。省略時は PROFILES。
+            settle_timeout_s (float): AE/AWB が落ち着くのを待つ最大の時間 [s]。
+            tolerance (float): 落ち着いたとみなす、フレーム間の露出・ゲインの変化率。
+            stable_frames (int): 変化が tolerance 以下のフレームがこれだけ続いたら落ち着いたとみなす。
+        """
+        self.picam2 = picam2
+        self.profiles = dict(PROFILES if profiles is None else profiles)
+        self.settle_timeout_s = settle_timeout_s
+        self.tolerance = tolerance
+        self.stable_frames = stable_frames
+        self.current = None
+        self.locked = None      # 固定している値 (LOCKED_KEYS のうちメタデータにあったもの)。固定していなければNone
+        self.switches = 0
+
+    def metadata(self):
+        """最新のフレームのメタデータ (ExposureTime, AnalogueGain, ColourGains など)。"""
+        try:
+            return self.picam2.capture_metadata()
+        except Exception as e:
+            print(f"[WARN] CameraControls: メタデータを取得できませんでした ({e})。")
+            return {}
+
+    def settle(self, timeout_s=None):
+        """
+        AE/AWB が落ち着く (露出・ゲインの変化が tolerance 以下のフレームが stable_frames 続く) まで待つ。
+
+        Returns:
+            dict: 最後のフレームのメタデータ。時間切れでもその時点のものを返す。
+        """
+        deadline = time.monotonic() + (self.settle_timeout_s if timeout_s is None else timeout_s)
+        previous = self.metadata()
+        stable = 0
+        while stable < self.stable_frames and time.monotonic() < deadline:
+            metadata = self.metadata()
+            stable = stable + 1 if _change(previous, metadata) <= self.tolerance else 0
+            previous = metadata
+        if stable < self.stable_frames:
+            print("⚠️ CameraControls: AE/AWBが時間内に落ち着きませんでした。その時点の値で続けます。")
+        return previous
+
+    def lock(self, extra_controls=None):
+        """AE/AWB が落ち着くのを待ち、その時点の露出・アナログゲイン・色ゲインで固定する。"""
+        self.picam2.set_controls({"AeEnable": True, "AwbEnable": True}) # 固定中なら一度自動に戻して合わせ直す
+        metadata = self.settle()
+        self.locked = {key: metadata[key] for key in LOCKED_KEYS if key in metadata}
+        controls = {"AeEnable": False, "AwbEnable": False, **self.locked, **(extra_controls or {})}
+        self.picam2.set_controls(controls)
+        print(f"CameraControls: AE/AWBを固定しました {_describe(self.locked)}")
+        return self.locked
+
+    def unlock(self):
+        """AE/AWB を自動に戻す。"""
+        self.picam2.set_controls({"AeEnable": True, "AwbEnable": True})
+        self.locked = None
+
+    def apply(self, name, relock=False):
+        """
+        プロファイルを適用する (カメラは止めない)。
+
+        Args:
+            name (str): プロファイル名。
+            relock (bool): 固定するプロファイルで、既に固定済みでも合わせ直すか。
+                           Falseなら前の段階で固定した値をそのまま使う (切り替えで待たない)。
+        """
+        profile = self.profiles[name]
+        controls = dict(profile["controls"])
+        if profile.get("lock"):
+            if self.locked is None or relock:
+                self.lock(controls)
+            else:
+                self.picam2.set_controls({"AeEnable": False, "AwbEnable": False, **self.locked, **controls})
+        else:
+            self.picam2.set_controls(controls)
+            if controls.get("AeEnable") and controls.get("AwbEnable"):
+                self.locked = None
+        if name != self.current:
+            self.switches += 1
+        self.current = name
+        print(f"CameraControls: プロファイル '{name}' を適用しました。")
+
+    @contextmanager
+    def phase(self, name, relock=False):
+        """with の間だけプロファイル name にし、終わったら前のプロファイルに戻す。"""
+        previous = self.current
+        self.apply(name, relock=relock)
+        try:
+            yield self
+        finally:
+            if previous is not None and previous != name:
+                self.apply(previous)
+
+def _change(previous, current):
+    """2つのメタデータの間の露出・ゲイン・色ゲインの最大の変化率。"""
+    change = 0.0
+    for key in LOCKED_KEYS:
+        a, b = previous.get(key), current.get(key)
+        if a is None or b is None:
+            continue
+        for x, y in zip(_values(a), _values(b)):
+            change = max(change, abs(y - x) / max(abs(x), 1e-6))
+    return change
+
+def _values(value):
+    return tuple(value) if isinstance(value, (tuple, list)) else (value,)
+
+def _describe(values):
+    return ", ".join(f"{k}={tuple(round(x, 3) for x in _values(v))}" if isinstance(v, (tuple, list))
+                     else f"{k}={v}" for k, v in values.items())
+
+class DetectionStability:
+    """
+    1回転 (探索の1周) の間の検出値 (赤色の割合など) と露出の揺れを集計するクラス。
+    同じ物を見ているはずのフレーム間で値がどれだけ変わったかを report() で表示する。
+    """
+
+    def __init__(self, name="scan", threshold=None):
+        """
+        Args:
+            name (str): 表示用の名前。
+            threshold (float): 検出とみなす値。指定すると、隣り合うフレームで検出/非検出が入れ替わった回数も数える。
+        """
+        self.name = name
+        self.threshold = threshold
+        self.samples = []
+
+    def record(self, value, heading=None, metadata=None):
+        """1フレームの値、そのときの方位 [deg]、カメラのメタデータを記録する。"""
+        metadata = metadata or {}
+        self.samples.append((value, heading, metadata.get("ExposureTime"), metadata.get("AnalogueGain")))
+
+    def summary(self):
+        """値の平均・標準偏差・隣り合うフレームの最大の差・検出の入れ替わり回数、露出の変化率。"""
+        values = [s[0] for s in self.samples if s[0] is not None]
+        if not values:
+            return {"frames": 0}
+        mean = sum(values) / len(values)
+        std = math.sqrt(sum((v - mean) ** 2 for v in values) / len(values))
+        jumps = [abs(b - a) for a, b in zip(values, values[1:])]
+        result = {"frames": len(values), "mean": mean, "std": std, "max_jump": max(jumps, default=0.0),
+                  "min": min(values), "max": max(values)}
+        if self.threshold is not None:
+            detected = [v >= self.threshold for v in values]
+            result["flips"] = sum(a != b for a, b in zip(detected, detected[1:]))
+        exposures = [s[2] * (s[3] or 1.0) for s in self.samples if s[2] is not None]
+        if exposures:
+            result["exposure_range"] = max(exposures) / max(min(exposures), 1e-6) # 1.0なら露出は一定
+        return result
+
+    def report(self):
+        """summary() を表示して返す。"""
+        s = self.summary()
+        if not s["frames"]:
+            print(f"DetectionStability[{self.name}]: 記録がありません。")
+            return s
+        line = (f"DetectionStability[{self.name}]: {s['frames']}フレーム, 平均 {s['mean']:.2f}, "
+                f"標準偏差 {s['std']:.2f}, 隣接フレームの最大差 {s['max_jump']:.2f}")
+        if "flips" in s:
+            line += f", 検出の入れ替わり {s['flips']}回"
+        if "exposure_range" in s:
+            line += f", 露出の変化 x{s['exposure_range']:.2f}"
+        print(line)
+        return s
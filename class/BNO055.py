@@ -156,6 +156,13 @@ class BNO055:
     def get_heading(self):
         return self.getVector(self.VECTOR_EULER)[0]
 
+    # 鉛直軸まわりの角速度 [deg/s]。get_heading()が増える向き (右回り) を正とする
+    def get_yaw_rate(self):
+        buf = self.readBytes(BNO055.VECTOR_GYROSCOPE + 4, 2) # Z軸のみ読む
+        gz = struct.unpack('h', struct.pack('BB', *buf))[0]
+        # デフォルトの単位設定 (dps) では 16 LSB = 1 deg/s。ジャイロZは左回りが正なので符号を反転
+        return -gz / 16.0
+
     def readBytes(self, register, numBytes=1):
         return self._bus.read_i2c_block_data(self._address, register, numBytes)
 
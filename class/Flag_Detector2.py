@@ -2,7 +2,9 @@ import cv2
 import numpy as np
 import time
 from picamera2 import Picamera2 # Picamera2をインポート（外部から受け取るため）
-import os # デバッグ画像保存のため
+import color_classifier
+import shape_classifier
+import debug_image_writer # デバッグ画像はバックグラウンドで保存する
 
 class FlagDetector:
     """
@@ -21,69 +23,51 @@ class FlagDetector:
     UPPER_RED2 = np.array([180, 255, 255])
 
     # 形状判定用の閾値 (必要に応じて調整)
+    # 形は shape_classifier (特徴量とテンプレートの比較) で1回だけ判別し、ここでは大きさと縦横比だけを確かめる
     # 三角形
-    TRIANGLE_MIN_VERTICES = 3
-    TRIANGLE_MAX_VERTICES = 3
-    TRIANGLE_EPSILON_FACTOR = 0.04 # 形状近似の許容誤差
     TRIANGLE_MIN_AREA_RATIO = 0.005 # 最小面積比率 (画像全体に対する割合)
 
     # 長方形
-    RECTANGLE_MIN_VERTICES = 4
-    RECTANGLE_MAX_VERTICES = 4
-    RECTANGLE_EPSILON_FACTOR = 0.04 # 形状近似の許容誤差
-    RECTANGLE_ANGLE_TOLERANCE = 10 # 90度からの許容誤差 (度)
     RECTANGLE_MIN_ASPECT_RATIO = 0.5 # 縦横比の最小値
     RECTANGLE_MAX_ASPECT_RATIO = 2.0 # 縦横比の最大値
     RECTANGLE_MIN_AREA_RATIO = 0.005 # 最小面積比率
 
-    def __init__(self, picam2_instance):
+    def __init__(self, picam2_instance, size=None):
         """
         FlagDetectorのコンストラクタです。
         カメラを初期化し、検出パラメータを設定します。
 
         Args:
             picam2_instance (Picamera2): 既に初期化され、開始されているPicamera2のインスタンス。
+                                         detect_frame() だけを使う場合 (別プロセスでの検出など) はNoneでもよい。
+            size (tuple): 画像の (幅, 高さ)。省略時はPicamera2のmainストリームの解像度。
         """
         self.picam2 = picam2_instance 
         
         # Picamera2の解像度とフレームレートは外部で設定済みという前提で、その値を取得
-        main_stream_config = self.picam2.camera_config['main']
-        self.width = main_stream_config['size'][0]
-        self.height = main_stream_config['size'][1]
+        if size is None:
+            size = self.picam2.camera_config['main']['size']
+        self.width = size[0]
+        self.height = size[1]
         self.screen_area = self.width * self.height # 画面全体のピクセル数
+        # 赤色のHSV閾値の分類器を作っておく (フレームごとに cvtColor でHSVにして、範囲ごとに inRange する)
+        self.red_classifier = color_classifier.get_classifier(
+            [(self.LOWER_RED1, self.UPPER_RED1), (self.LOWER_RED2, self.UPPER_RED2)], channel_order="BGR")
 
         print(f"✅ FlagDetector: インスタンス作成完了。カメラ解像度: {self.width}x{self.height}, 画面総ピクセル数: {self.screen_area}")
 
     def _get_hsv_mask(self, frame_bgr):
-        """BGR画像から赤色HSVマスクを生成します。"""
-        hsv = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HSV)
-        mask1 = cv2.inRange(hsv, self.LOWER_RED1, self.UPPER_RED1)
-        mask2 = cv2.inRange(hsv, self.LOWER_RED2, self.UPPER_RED2)
-        mask = cv2.bitwise_or(mask1, mask2)
-        return mask
-
-    def _approximate_shape(self, contour, epsilon_factor):
-        """輪郭を近似し、頂点数と形状名を返します。"""
-        epsilon = epsilon_factor * cv2.arcLength(contour, True)
-        approx = cv2.approxPolyDP(contour, epsilon, True)
-        num_vertices = len(approx)
-        return approx, num_vertices
-
-    def _is_triangle(self, num_vertices, contour_area, min_area_ratio):
-        """三角形であるかを判定します。"""
-        return num_vertices == self.TRIANGLE_MIN_VERTICES and \
-               (contour_area / self.screen_area) >= min_area_ratio
+        """BGR画像から赤色HSVマスクを生成します (BGRから直接HSVにして inRange、RGB2BGR の変換は省く)。"""
+        return self.red_classifier.classify(frame_bgr)
 
-    def _is_rectangle(self, num_vertices, approx, contour_area, min_area_ratio, angle_tolerance):
-        """長方形であるかを判定します。"""
-        if num_vertices == self.RECTANGLE_MIN_VERTICES and \
-           (contour_area / self.screen_area) >= min_area_ratio:
-            
-            # 各辺が直交するかを角度で確認する、より厳密な長方形判定ロジック
-            # (ただし、approxPolyDPの出力と組み合わせて正確な角度判定は複雑)
-            # ここでは外接矩形の縦横比チェックと頂点数で判定する簡易版を維持
+    def _is_triangle(self, match, contour_area, min_area_ratio):
+        """三角形であるかを判定します。"""
+        return match.name == "三角形" and (contour_area / self.screen_area) >= min_area_ratio
 
-            x, y, w, h = cv2.boundingRect(approx)
+    def _is_rectangle(self, match, contour, contour_area, min_area_ratio):
+        """長方形であるかを判定します (外接矩形の縦横比も確認する)。"""
+        if match.name == "長方形" and (contour_area / self.screen_area) >= min_area_ratio:
+            x, y, w, h = cv2.boundingRect(contour)
             aspect_ratio = float(w) / h if h > 0 else 0
             if self.RECTANGLE_MIN_ASPECT_RATIO <= aspect_ratio <= self.RECTANGLE_MAX_ASPECT_RATIO:
                 return True
@@ -98,7 +82,13 @@ class FlagDetector:
         if frame_rgb is None:
             print("FlagDetector: 画像キャプチャ失敗: フレームがNoneです。")
             return []
+        return self.detect_frame(frame_rgb, save_debug_image, debug_image_path)
 
+    def detect_frame(self, frame_rgb, save_debug_image=False, debug_image_path="/home/mark1/Pictures/flag_detection_debug.jpg"):
+        """
+        取得済みのフレーム (RGB) からフラッグを検出します (カメラには触れません)。
+        戻り値は detect() と同じです。
+        """
         frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
         blurred_frame = cv2.GaussianBlur(frame_bgr, (5, 5), 0)
         red_mask = self._get_hsv_mask(blurred_frame)
@@ -131,15 +121,14 @@ class FlagDetector:
             else:
                 location = "中央"
 
-            # 形状近似と判定
-            approx_triangle, num_vertices_triangle = self._approximate_shape(contour, self.TRIANGLE_EPSILON_FACTOR)
-            approx_rectangle, num_vertices_rectangle = self._approximate_shape(contour, self.RECTANGLE_EPSILON_FACTOR)
+            # 形状の判別 (輪郭1つにつき特徴量を1回求めてテンプレートと比べる)
+            match = shape_classifier.classify(contour)
 
             current_flag_shapes = []
-            if self._is_triangle(num_vertices_triangle, contour_area, self.TRIANGLE_MIN_AREA_RATIO):
-                current_flag_shapes.append({'name': '三角形', 'approx_contour': approx_triangle})
-            if self._is_rectangle(num_vertices_rectangle, approx_rectangle, contour_area, self.RECTANGLE_MIN_AREA_RATIO, self.RECTANGLE_ANGLE_TOLERANCE):
-                current_flag_shapes.append({'name': '長方形', 'approx_contour': approx_rectangle})
+            if self._is_triangle(match, contour_area, self.TRIANGLE_MIN_AREA_RATIO):
+                current_flag_shapes.append({'name': '三角形', 'approx_contour': contour, 'score': match.score})
+            if self._is_rectangle(match, contour, contour_area, self.RECTANGLE_MIN_AREA_RATIO):
+                current_flag_shapes.append({'name': '長方形', 'approx_contour': contour, 'score': match.score})
             
             # T字、十字などの複雑な形状検出ロジックはここに追加
 
@@ -155,18 +144,10 @@ class FlagDetector:
                 # デバッグ表示用に輪郭を描画
                 cv2.drawContours(debug_frame, [contour], -1, (0, 255, 0), 2) # 緑色で検出された輪郭
 
-        if save_debug_image and detected_flags: # 何か検出された場合のみ保存
-            directory = os.path.dirname(debug_image_path)
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            cv2.imwrite(debug_image_path, debug_frame)
-            print(f"FlagDetector: デバッグ画像を保存しました: {debug_image_path}")
-        elif save_debug_image and not detected_flags: # 検出されなくても保存したい場合
-            directory = os.path.dirname(debug_image_path)
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            cv2.imwrite(debug_image_path.replace(".jpg", "_no_flags.jpg"), debug_frame)
-            print(f"FlagDetector: デバッグ画像を保存しました (フラッグなし): {debug_image_path.replace('.jpg', '_no_flags.jpg')}")
+        if save_debug_image and detected_flags: # 検出した画像は間引かずに保存
+            debug_image_writer.save(debug_image_path, debug_frame, event=True)
+        elif save_debug_image and not detected_flags: # 検出されなかった画像は共有ライターの設定 (every_n) で間引く
+            debug_image_writer.save(debug_image_path.replace(".jpg", "_no_flags.jpg"), debug_frame)
 
         return detected_flags
 
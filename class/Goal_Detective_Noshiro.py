@@ -1,10 +1,17 @@
-import cv2
 import numpy as np
 import time
 from picamera2 import Picamera2
 from motor import MotorDriver
 import following # Assuming following.py contains follow_forward
 from BNO055 import BNO055
+import color_calibration
+from frame_analysis import FrameAnalysis
+import camera_setup
+import camera_orientation
+from turn_controller import TurnController
+from bearing import BearingEstimator, DEFAULT_HFOV_DEG
+from scene_gate import SceneGate, format_gate_stats
+from pyramid_search import PyramidSearch, format_pyramid_stats
 import RPi.GPIO as GPIO # RPi.GPIO is needed for MotorDriver and BNO055
 
 class RedConeNavigator:
@@ -30,6 +37,13 @@ class RedConeNavigator:
     # 目標到達とみなす赤色面積の割合
     GOAL_PERCENTAGE_THRESHOLD = 90
 
+    # 方向推定 (bearing.BearingEstimator)
+    CAMERA_HFOV_DEG = DEFAULT_HFOV_DEG # 表示の向きでの水平画角 [deg]
+    MIN_BEARING_CONFIDENCE = 0.3       # これ未満の推定は「見失った」として扱う
+    BEARING_CENTER_TOLERANCE_DEG = 4.0 # 中央からの角度がこれ以内なら回頭せずに前進する
+    BEARING_TURN_TOLERANCE_DEG = 1.0   # コーンへの回頭の許容誤差 (TurnControllerの既定の3度では正面から3度近くずれて止まる)
+    TURN_DIRECTION = -1                # 画面の左にあれば右に回頭する (従来のブロック判定と同じ向き)
+
     # 前進・旋回モーター速度
     MOVE_FORWARD_SPEED = 70
     SHORT_MOVE_DURATION = 1 # 短い前進の時間
@@ -54,34 +68,72 @@ class RedConeNavigator:
         """
         self.driver = driver_instance # 外部から渡されたインスタンスを使用
         self.bno = bno_instance       # 外部から渡されたインスタンスを使用
-        self.picam2 = picam2_instance # 外部から渡されたインスタンスを使用
+        self.picam2 = picam2_instance # 外部から渡されたインスタンスを使用 (Picamera2 または FrameSource)
 
         # 設定値 (デフォルト値または引数で上書き)
         self.cone_lost_counter = cone_lost_max_count if cone_lost_max_count is not None else self.CONE_LOST_MAX_COUNT
         self.cone_lost_max_count = cone_lost_max_count if cone_lost_max_count is not None else self.CONE_LOST_MAX_COUNT
         self.goal_percentage_threshold = goal_percentage_threshold if goal_percentage_threshold is not None else self.GOAL_PERCENTAGE_THRESHOLD
+
+        # 赤色の閾値は color_calibration でその日の照明に合わせたもの (loresのYUVでは保存した参照テーブルを読み込むだけ)。
+        # キャリブレーションしていなければクラス定数の閾値を使う。main (RGB) は cvtColor + inRange で判定する
+        default_ranges = [(self.LOWER_RED1, self.UPPER_RED1), (self.LOWER_RED2, self.UPPER_RED2)]
+        self.red_classifier = color_calibration.load_classifier("red", "RGB", default=default_ranges)
+        # loresストリーム (YUV420) が設定されていれば、検出はloresのY/U/V平面で直接行う (mainはデバッグ用)
+        self.detection_stream = camera_setup.DETECTION_STREAM if camera_setup.has_lores(self.picam2) else "main"
+        self.red_classifier_yuv = color_calibration.load_classifier("red", "YUV", default=default_ranges)
+        # カメラの向き。ISPのTransformで処理されていない分だけを、画像ではなく検出結果の座標に適用する
+        self.orientation = camera_orientation.residual(self.picam2, camera_orientation.ROVER)
+        # 推定した角度はそのまま連続PIDの回頭制御に渡す
+        self.bearing_estimator = BearingEstimator(hfov_deg=self.CAMERA_HFOV_DEG)
+        # (キャリブレーションが無くても TurnController がデッドバンドを越えるまで指令を上げるので、小さい回頭でも止まらない)
+        self.turner = TurnController(self.driver, self.bno, tolerance_deg=self.BEARING_TURN_TOLERANCE_DEG)
+        # 停止して落ち着くのを待つ間の、ほとんど同じフレームでは検出をやり直さない (前回の解析結果を使う)
+        self.scene_gate = SceneGate(motion_fn=getattr(self.bno, "get_yaw_rate", None),
+                                    heading_fn=getattr(self.bno, "get_heading", None))
+        # 360度の探索では、縮小画像で赤色が見つかった範囲だけを元の解像度で判定する
+        self.pyramid = PyramidSearch(self.red_classifier, self.red_classifier_yuv, orientation=self.orientation)
         
         print("✅ RedConeNavigator: インスタンス作成完了。")
 
-    def _preprocess_frame(self, frame):
-        """フレームの共通前処理（回転、ぼかし、色空間変換）"""
-        frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        frame = cv2.GaussianBlur(frame, (5, 5), 0)
-        frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        return frame
+    def analyze(self, frame):
+        """
+        フレームの解析オブジェクト (FrameAnalysis) を返します。前処理（ぼかし）と赤色判定は
+        最初に必要になったときに1回だけ行われ、同じフレームへの以降の問い合わせでは再計算しません。
+        画像は回転せず、列の番号などを self.orientation で表示の向きに変換します。
+        既にFrameAnalysisが渡された場合はそのまま返します。
+        前回解析したフレームからシーンが変わっていなければ (self.scene_gate)、前回の解析結果を返します。
+        """
+        if isinstance(frame, FrameAnalysis):
+            return frame
+        if self.scene_gate is None:
+            return self._analyze_frame(frame)
+        return self.scene_gate.run(frame, self._analyze_frame)
+
+    def _analyze_frame(self, frame):
+        if frame.ndim == 2: # loresのYUV420バッファ
+            analysis = FrameAnalysis(frame, self.red_classifier_yuv, orientation=self.orientation)
+        else:
+            analysis = FrameAnalysis(frame, self.red_classifier, blur_ksize=5, orientation=self.orientation)
+        analysis.mask # 赤色判定はここで行う (間引いたフレームでは、この結果と集計値のキャッシュをそのまま使う)
+        return analysis
+
+    def scan(self, frame):
+        """
+        探索 (search_for_cone) 用の解析。縮小画像で赤色の候補が無ければ元の解像度では判定せず、
+        候補があればその範囲だけを判定した FrameAnalysis を返します (self.pyramid)。
+        """
+        if isinstance(frame, FrameAnalysis) or self.pyramid is None:
+            return self.analyze(frame)
+        return self.pyramid.analyze(frame)
+
+    def _capture(self):
+        """検出用のフレームを取得します (loresが設定されていればYUV420のバッファ)。"""
+        return self.picam2.capture_array(self.detection_stream)
 
     def get_red_percentage(self, frame):
-        """画像中の赤色ピクセル割合を計算します。"""
-        processed_frame = self._preprocess_frame(frame)
-        hsv = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2HSV)
-        
-        mask1 = cv2.inRange(hsv, self.LOWER_RED1, self.UPPER_RED1)
-        mask2 = cv2.inRange(hsv, self.LOWER_RED2, self.UPPER_RED2)
-        mask = cv2.bitwise_or(mask1, mask2)
-        
-        red_area = np.count_nonzero(mask)
-        total_area = processed_frame.shape[0] * processed_frame.shape[1]
-        percentage = (red_area / total_area) * 100
+        """画像 (またはanalyze()の結果) 中の赤色ピクセル割合を計算します。"""
+        percentage = self.analyze(frame).percentage
         print(f"RedConeNavigator: 検知割合は {percentage:.2f}% です")
         return percentage
 
@@ -90,24 +142,7 @@ class RedConeNavigator:
         画像を5分割し、最も赤色ピクセル密度の高いブロックの番号 (1〜5) を返します。
         赤色があまりにも少ない場合はNoneを返します。
         """
-        processed_frame = self._preprocess_frame(frame)
-        hsv = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2HSV)
-        
-        mask1 = cv2.inRange(hsv, self.LOWER_RED1, self.UPPER_RED1)
-        mask2 = cv2.inRange(hsv, self.LOWER_RED2, self.UPPER_RED2)
-        mask = cv2.bitwise_or(mask1, mask2)
-        
-        height, width = mask.shape
-        block_width = width // 5
-        red_ratios = []
-        for i in range(5):
-            x_start = i * block_width
-            x_end = (i + 1) * block_width if i < 4 else width
-            block_mask = mask[:, x_start:x_end]
-            red_count = np.count_nonzero(block_mask)
-            total_count = block_mask.size
-            ratio = red_count / total_count
-            red_ratios.append(ratio)
+        red_ratios = self.analyze(frame).column_densities(5)
 
         for i, r in enumerate(red_ratios):
             print(f"RedConeNavigator: [DEBUG] ブロック{i+1}の赤密度: {r:.2%}")
@@ -122,6 +157,30 @@ class RedConeNavigator:
             print(f"RedConeNavigator: 一番密度の高いブロックは {block_number} です")
             return block_number
 
+    def get_red_bearing(self, frame):
+        """
+        赤色の塊の方向を推定します (bearing.BearingEstimate、画面の右が正)。
+        見つからない、または信頼度が MIN_BEARING_CONFIDENCE 未満の場合はNoneを返します。
+        """
+        estimate = self.bearing_estimator.estimate(self.analyze(frame))
+        if estimate is None or estimate.confidence < self.MIN_BEARING_CONFIDENCE:
+            confidence = estimate.confidence if estimate else 0.0
+            print(f"RedConeNavigator: ❌ 赤色の方向を推定できません (信頼度 {confidence:.2f})")
+            return None
+        print(f"RedConeNavigator: 赤色の方向 {estimate.bearing_deg:+.1f}度 (幅 {estimate.extent_deg:.1f}度, 信頼度 {estimate.confidence:.2f})")
+        return estimate
+
+    def _turn_toward(self, estimate):
+        """
+        推定した方向へ TurnController で回頭します。FrameSourceから撮影した時点の方位が分かる場合は、
+        撮影後に車体が回った分も含めて「撮影時の方位 + 角度」の絶対方位へ回頭します。
+        """
+        offset = self.TURN_DIRECTION * estimate.bearing_deg
+        heading = getattr(getattr(self.picam2, "last", None), "heading", None)
+        if heading is not None:
+            return self.turner.turn_to_heading((heading + offset) % 360, speed=self.TURN_SPEED_MID)
+        return self.turner.turn_by(offset, speed=self.TURN_SPEED_MID)
+
     def search_for_cone(self):
         """
         赤色コーンを探索するロジックを実行します。
@@ -153,8 +212,8 @@ class RedConeNavigator:
             max_rotation_steps = int(360 / approx_angle_per_step) + 5 # 余裕を持たせる
 
             for step in range(max_rotation_steps):
-                frame = self.picam2.capture_array()
-                percentage = self.get_red_percentage(frame)
+                frame = self._capture()
+                percentage = self.get_red_percentage(self.scan(frame))
                 
                 if percentage > 15: # 探索中に十分な赤色を見つけたら終了
                     print("RedConeNavigator: ✅ 赤コーンの探索に成功しました。")
@@ -181,13 +240,16 @@ class RedConeNavigator:
         print("RedConeNavigator: 🚀 ゴール誘導を開始します。")
         try:
             while True:
-                frame = self.picam2.capture_array()
-                time.sleep(0.1) # カメラキャプチャ後の短い待機
+                # FrameSourceを渡されていれば、撮影スレッドが受け取った「呼び出し後に露光したフレーム」がすぐ返る
+                frame = self._capture()
 
-                percentage = self.get_red_percentage(frame)
-                block_number = self.get_red_block_by_density(frame) # block_number に変更
+                # 割合と位置は同じ解析結果から求める (前処理と赤色判定はこのフレームで1回だけ)
+                analysis = self.analyze(frame)
+                percentage = self.get_red_percentage(analysis)
+                estimate = self.get_red_bearing(analysis)
+                bearing_text = f"{estimate.bearing_deg:+.1f}度" if estimate else "なし"
                 
-                print(f"RedConeNavigator: 現在の状態: 赤割合: {percentage:.2f}% | 画面場所:{block_number}")
+                print(f"RedConeNavigator: 現在の状態: 赤割合: {percentage:.2f}% | 方向:{bearing_text}")
 
                 # 1. ゴール判定
                 if percentage >= self.goal_percentage_threshold:
@@ -196,7 +258,7 @@ class RedConeNavigator:
                     break # ループ終了
 
                 # 2. コーンの位置に基づく動作
-                if block_number is None:
+                if estimate is None:
                     # コーンが見つからない場合、探索モードに移行
                     self.cone_lost_counter -= 1
                     print(f"RedConeNavigator: ⚠️ 赤コーンを見失いました。残りリトライ回数: {self.cone_lost_counter}")
@@ -217,7 +279,14 @@ class RedConeNavigator:
                         time.sleep(0.5) # 停止して再検出を待つ
                         continue # 再検出のためループの最初に戻る
 
-                elif block_number == 3: # 中央にコーンがある場合
+                elif abs(estimate.bearing_deg) > self.BEARING_CENTER_TOLERANCE_DEG:
+                    # 推定した角度だけ1回で回頭し、回頭後のフレームで改めて確認する
+                    print(f"RedConeNavigator: ↔️ コーンは中央から {estimate.bearing_deg:+.1f}度。回頭します。")
+                    self._turn_toward(estimate)
+                    self.cone_lost_counter = self.CONE_LOST_MAX_COUNT # カウンターリセット
+                    continue
+
+                else: # 中央にコーンがある場合
                     self.cone_lost_counter = self.CONE_LOST_MAX_COUNT # カウンターリセット
                     if percentage > 40:
                         print("RedConeNavigator: ✅ 中央にコーン、接近中（大）。短い前進。")
@@ -237,48 +306,6 @@ class RedConeNavigator:
                         self.driver.motor_stop_brake()
                         time.sleep(0.5)
 
-                elif block_number == 1: # 左端にコーンがある場合
-                    print("RedConeNavigator: ⬅️ コーンが左端にあります。右に旋回。")
-                    self.driver.petit_right(0, self.TURN_SPEED_HIGH)
-                    self.driver.petit_right(self.TURN_SPEED_HIGH, 0)
-                    self.driver.motor_stop_brake()
-                    time.sleep(0.5)
-                    self.cone_lost_counter = self.CONE_LOST_MAX_COUNT # カウンターリセット
-
-                elif block_number == 2: # 左中央にコーンがある場合
-                    print("RedConeNavigator: ↙️ コーンが左中央にあります。右に旋回。")
-                    self.driver.petit_right(0, self.TURN_SPEED_MID)
-                    self.driver.petit_right(self.TURN_SPEED_MID, 0)
-                    self.driver.motor_stop_brake()
-                    time.sleep(0.5)
-                    self.cone_lost_counter = self.CONE_LOST_MAX_COUNT # カウンターリセット
-                    if percentage < 50: # まだ遠ければ少し前進して調整
-                        print("RedConeNavigator: 正面にとらえることができませんでしたが、検知割合が低いため、接近します")
-                        following.follow_forward(self.driver, self.bno, self.MOVE_FORWARD_SPEED, self.SHORT_MOVE_DURATION)
-                        self.driver.motor_stop_brake()
-                        time.sleep(0.5)
-
-                elif block_number == 4: # 右中央にコーンがある場合
-                    print("RedConeNavigator: ↘️ コーンが右中央にあります。左に旋回。")
-                    self.driver.petit_left(0, self.TURN_SPEED_MID)
-                    self.driver.petit_left(self.TURN_SPEED_MID, 0)
-                    self.driver.motor_stop_brake()
-                    time.sleep(0.5)
-                    self.cone_lost_counter = self.CONE_LOST_MAX_COUNT # カウンターリセット
-                    if percentage < 50: # まだ遠ければ少し前進して調整
-                        print("RedConeNavigator: 正面にとらえることができませんでしたが、検知割合が低いため、接近します")
-                        following.follow_forward(self.driver, self.bno, self.MOVE_FORWARD_SPEED, self.SHORT_MOVE_DURATION)
-                        self.driver.motor_stop_brake()
-                        time.sleep(0.5)
-
-                elif block_number == 5: # 右端にコーンがある場合
-                    print("RedConeNavigator: ➡️ コーンが右端にあります。左に旋回。")
-                    self.driver.petit_left(0, self.TURN_SPEED_HIGH)
-                    self.driver.petit_left(self.TURN_SPEED_HIGH, 0)
-                    self.driver.motor_stop_brake()
-                    time.sleep(0.5)
-                    self.cone_lost_counter = self.CONE_LOST_MAX_COUNT # カウンターリセット
-                
                 time.sleep(0.1) # 各ループの最後に短い待機
 
         except KeyboardInterrupt:
@@ -294,4 +321,8 @@ class RedConeNavigator:
         """
         if self.driver:
             self.driver.motor_stop_brake()
+        if self.scene_gate is not None:
+            print(format_gate_stats(self.scene_gate.stats(), "RedConeNavigator"))
+        if self.pyramid is not None and self.pyramid.frames:
+            print(format_pyramid_stats(self.pyramid.stats(), "RedConeNavigator"))
         print("RedConeNavigator: クリーンアップ完了。")
@@ -0,0 +1,112 @@
+import math
+from collections import namedtuple
+import numpy as np
+
+# マスクから目標 (赤コーンなど) の方向 [deg] を推定するモジュール
+# 以前は画面を縦5ブロックに分けて最も密度の高いブロックで旋回の仕方を決めていたため、
+# 方向は約12度刻みにしか分からず、撮影→小刻み旋回を何度も繰り返していた。
+# BearingEstimator は列ごとの検出画素数 (重み付きの列ヒストグラム) から目標の重心の列を求め、
+# 水平画角とレンズの歪みから画面中央に対する角度に換算する。この角度をそのまま TurnController に渡せば、
+# 1回の回頭で目標を正面にとらえられる。
+#
+# 使い方:
+#   estimator = BearingEstimator(hfov_deg=48.8)
+#   estimate = estimator.estimate(analysis)        # FrameAnalysis (または列ヒストグラム) から推定
+#   if estimate and estimate.confidence >= 0.5:
+#       turner.turn_by(-estimate.bearing_deg)
+
+# 表示の向きでの水平画角 [deg]。カメラを90度回して取り付けているので、センサーの縦方向の画角になる。
+# (Camera Module v2 の縦の画角 48.8度。カメラやモードを変えたら hfov_from_measurement() で測り直す)
+DEFAULT_HFOV_DEG = 48.8
+
+# 推定結果:
+#   bearing_deg: 画面中央からの角度 [deg] (画面の右が正)
+#   confidence: 0.0〜1.0 (検出画素が十分にあり、1つの塊にまとまっているほど高い)
+#   extent_deg: 目標の左右の幅 [deg] (近いほど大きい)
+#   column: 重心の列 [px] (小数)
+#   pixel_count: 目標とした塊の検出画素数
+BearingEstimate = namedtuple("BearingEstimate", ["bearing_deg", "confidence", "extent_deg", "column", "pixel_count"])
+
+def hfov_from_measurement(column, width, angle_deg):
+    """
+    画面中央から angle_deg [deg] の方向に置いた目標が列 column [px] に写ったときの水平画角 [deg]。
+    (レンズの歪みが小さい画面の中ほどで測ること)
+    """
+    offset = (column + 0.5) / width * 2 - 1 # -1 (左端) 〜 1 (右端)
+    return math.degrees(2 * math.atan(math.tan(math.radians(abs(angle_deg))) / abs(offset)))
+
+class BearingEstimator:
+    """
+    列ヒストグラムから目標の方向と信頼度を求めるクラス。
+    画素の位置→角度の換算はピンホールモデルに、1次の放射歪み (k1) の補正を加えたもの。
+    """
+
+    def __init__(self, hfov_deg=DEFAULT_HFOV_DEG, k1=0.0, min_column_fraction=0.02,
+                 min_pixels_fraction=0.002, full_confidence_fraction=0.02):
+        """
+        Args:
+            hfov_deg (float): 表示の向きでの水平画角 [deg]。
+            k1 (float): 放射歪みの係数 (樽型なら負)。0なら補正しない。
+            min_column_fraction (float): 列の高さに対する割合がこれ未満の列はノイズとして無視する。
+            min_pixels_fraction (float): 画像全体に対する目標の画素の割合がこれ未満なら推定しない (Noneを返す)。
+            full_confidence_fraction (float): 目標の画素の割合がこれ以上なら、画素数による信頼度を1とする。
+        """
+        self.hfov_deg = hfov_deg
+        self.k1 = k1
+        self.min_column_fraction = min_column_fraction
+        self.min_pixels_fraction = min_pixels_fraction
+        self.full_confidence_fraction = full_confidence_fraction
+
+    def column_to_bearing(self, column, width):
+        """列 column [px] (小数可) の画面中央からの角度 [deg] (右が正)。"""
+        focal = (width / 2) / math.tan(math.radians(self.hfov_deg) / 2)
+        x = (column + 0.5 - width / 2) / focal # 正規化座標 (歪みあり)
+        if self.k1:
+            x = x / (1 + self.k1 * x * x)
+        return math.degrees(math.atan(x))
+
+    def estimate(self, analysis):
+        """
+        FrameAnalysis から方向を推定する。
+
+        Args:
+            analysis (FrameAnalysis): 解析済みのフレーム (column_profile と shape を使う)。
+
+        Returns:
+            BearingEstimate: 推定結果。目標が見つからなければNone。
+        """
+        return self.estimate_from_profile(analysis.column_profile, analysis.shape[0])
+
+    def estimate_from_profile(self, profile, height):
+        """
+        列ごとの検出画素数 profile (左から) と画像の高さから方向を推定する。
+        ノイズの列を除いた上で連続した列の塊に分け、画素数が最大の塊の重心を目標の列とする。
+        """
+        profile = np.asarray(profile, dtype=np.float64)
+        width = len(profile)
+        total = profile.sum()
+        if width == 0 or total < self.min_pixels_fraction * width * height:
+            return None
+
+        active = profile >= self.min_column_fraction * height
+        if not active.any():
+            return None
+        # 連続した有効な列の塊 [start, end) を求める
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], active.astype(np.int8), [0]))))
+        runs = list(zip(edges[::2], edges[1::2]))
+        masses = [profile[s:e].sum() for s, e in runs]
+        best = int(np.argmax(masses))
+        start, end = runs[best]
+        mass = masses[best]
+        if mass < self.min_pixels_fraction * width * height:
+            return None
+
+        columns = np.arange(start, end)
+        column = float((columns * profile[start:end]).sum() / mass)
+        bearing = self.column_to_bearing(column, width)
+        extent = self.column_to_bearing(end - 1, width) - self.column_to_bearing(start, width)
+
+        # 信頼度 = (目標の塊が全体の検出画素に占める割合) x (画素数の多さ、上限1)
+        dominance = mass / total
+        amount = min(1.0, mass / (self.full_confidence_fraction * width * height))
+        return BearingEstimate(bearing, dominance * amount, extent, column, int(mass))
@@ -0,0 +1,128 @@
+import math
+import time
+import statistics
+import contextlib
+import io
+import cv2
+import numpy as np
+import rover_sim
+rover_sim.install_fake_modules()
+import color_classifier
+from camera_orientation import IDENTITY
+from frame_analysis import FrameAnalysis
+from bearing import BearingEstimator, DEFAULT_HFOV_DEG
+from turn_controller import TurnController, wrap_angle
+from bench_turn import setup_hardware, measure_calibration
+
+# 赤コーンを正面にとらえるまでの撮影回数・時間を、従来の5ブロック判定 + 小刻み旋回と、
+# 方向推定 (bearing.BearingEstimator) + TurnController で比べる (rover_simによるシミュレーション)
+# カメラは仮想の方位から赤コーンの写る列を計算して合成画像を作る。
+# 画面の左に写った目標へは右に回頭する (RedConeNavigator.TURN_DIRECTION = -1 と同じ向き)。
+# bearing_uncal はキャリブレーションを読み込まない呼び出し側 (nonstuck_EE など) と同じく、恒等テーブルのまま回頭する。
+
+WIDTH, HEIGHT = 240, 320           # loresを90度回した表示の向き
+CONE_HALF_WIDTH_DEG = 3.0          # 目標の見かけの半幅 [deg]
+CENTER_TOLERANCE_DEG = 4.0         # RedConeNavigator.BEARING_CENTER_TOLERANCE_DEG
+TURN_TOLERANCE_DEG = 1.0           # RedConeNavigator.BEARING_TURN_TOLERANCE_DEG
+MAX_FRAMES = 30
+
+CLASSIFIER = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+
+def bearing_to_column(bearing_deg, hfov_deg=DEFAULT_HFOV_DEG):
+    focal = (WIDTH / 2) / math.tan(math.radians(hfov_deg) / 2)
+    return WIDTH / 2 + focal * math.tan(math.radians(bearing_deg)) - 0.5
+
+def render(relative_deg, rng):
+    """目標が車体の正面から relative_deg [deg] (右回り正) にあるときの画像 (RGB)。"""
+    frame = np.empty((HEIGHT, WIDTH, 3), np.float32)
+    frame[:] = (70, 110, 50)
+    image_bearing = -relative_deg # 右回りの方向にある目標は画面の左に写る
+    x0 = bearing_to_column(image_bearing - CONE_HALF_WIDTH_DEG)
+    x1 = bearing_to_column(image_bearing + CONE_HALF_WIDTH_DEG)
+    if x1 >= 0 and x0 < WIDTH:
+        cv2.rectangle(frame, (int(round(x0)), HEIGHT // 3), (int(round(x1)), HEIGHT * 2 // 3), (200, 30, 25), -1)
+    frame += rng.normal(0, 8, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+def analyze(sim, rng):
+    return FrameAnalysis(render(wrap_angle(sim.target - sim.heading), rng), CLASSIFIER, orientation=IDENTITY, blur_ksize=5)
+
+def legacy_aim(sim, driver, bno, rng):
+    """従来の RedConeNavigator.navigate_to_cone の旋回部分 (5ブロックのどこにあるかで小刻み旋回)。"""
+    for frames in range(1, MAX_FRAMES + 1):
+        block = analyze(sim, rng).best_column(5, 0.05)
+        if block == 3:
+            return frames
+        speed = 100 if block in (1, 5) else 90
+        if block in (1, 2) or block is None:
+            driver.petit_right(0, speed)
+            driver.petit_right(speed, 0)
+        else:
+            driver.petit_left(0, speed)
+            driver.petit_left(speed, 0)
+        driver.motor_stop_brake()
+        time.sleep(0.5)
+        time.sleep(0.1)
+    return MAX_FRAMES
+
+def bearing_aim(sim, driver, bno, rng, estimator, turner):
+    """方向を推定して TurnController で1回で回頭する (RedConeNavigator._turn_toward と同じ)。"""
+    for frames in range(1, MAX_FRAMES + 1):
+        estimate = estimator.estimate(analyze(sim, rng))
+        if estimate is not None and abs(estimate.bearing_deg) <= CENTER_TOLERANCE_DEG:
+            return frames
+        offset = -estimate.bearing_deg if estimate is not None else 10.0
+        turner.turn_by(offset, speed=90)
+        time.sleep(0.1)
+    return MAX_FRAMES
+
+def run_case(method, angle, calibration, seed=0):
+    rng = np.random.default_rng(seed)
+    with rover_sim.RoverSim(seed=seed) as sim:
+        driver, bno = setup_hardware()
+        if calibration is not None:
+            driver.set_calibration(calibration)
+        sim.target = (sim.heading + angle) % 360
+        start = sim.now
+        if method == "legacy_blocks":
+            frames = legacy_aim(sim, driver, bno, rng)
+        else:
+            turner = TurnController(driver, bno, tolerance_deg=TURN_TOLERANCE_DEG)
+            frames = bearing_aim(sim, driver, bno, rng, BearingEstimator(), turner)
+        time.sleep(0.5)
+        return frames, sim.now - start, wrap_angle(sim.target - sim.heading)
+
+def estimation_error(angles=np.linspace(-22, 22, 45), seeds=range(3)):
+    """角度が分かっている合成画像で推定の誤差を測る。"""
+    estimator = BearingEstimator()
+    errors, confidences = [], []
+    for seed in seeds:
+        rng = np.random.default_rng(seed)
+        for angle in angles:
+            analysis = FrameAnalysis(render(angle, rng), CLASSIFIER, orientation=IDENTITY)
+            estimate = estimator.estimate(analysis)
+            errors.append(abs(estimate.bearing_deg - (-angle)))
+            confidences.append(estimate.confidence)
+    return max(errors), statistics.mean(errors), min(confidences)
+
+if __name__ == "__main__":
+    worst, mean, min_confidence = estimation_error()
+    print(f"推定誤差: 平均 {mean:.2f}度, 最大 {worst:.2f}度 (最小信頼度 {min_confidence:.2f})\n")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        calibration = measure_calibration()
+    angles = [-20, -12, -6, 6, 12, 20]
+    methods = ["legacy_blocks", "bearing", "bearing_uncal"]
+    print(f"{'method':<14} | {'angle':>6} | {'frames':>6} | {'time[s]':>8} | {'error[deg]':>10}")
+    summary = {m: [] for m in methods}
+    for method in methods:
+        for angle in angles:
+            with contextlib.redirect_stdout(io.StringIO()):
+                frames, elapsed, error = run_case(method, angle, None if method.endswith("_uncal") else calibration)
+            summary[method].append((frames, elapsed, abs(error)))
+            print(f"{method:<14} | {angle:>6} | {frames:>6} | {elapsed:>8.2f} | {error:>+10.1f}")
+    print()
+    for method in methods:
+        frames, times, errors = zip(*summary[method])
+        print(f"{method:<14}: 平均撮影回数 {statistics.mean(frames):.1f}, 平均所要時間 {statistics.mean(times):.2f}秒, "
+              f"平均残り誤差 {statistics.mean(errors):.1f}度")
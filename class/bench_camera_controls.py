@@ -0,0 +1,104 @@
+import math
+import numpy as np
+import color_classifier
+from camera_controls import CameraControls, DetectionStability
+from replay_camera import ReplayCamera
+from bench_color_classifier import make_scene
+
+# 自動露出・自動ホワイトバランスのままの場合と、CameraControls で固定した場合の、1回転の間の赤色割合の揺れ
+# rotate_search_red_ball2 と同じく15度ずつ24回向きを変えて撮影する。
+# カメラには自動露出・AWBを模した SunCamera を使う。コーンは常に画角内にあるものとし、
+# 太陽の方向 (背景の明るさと色温度) だけが方位で変わる。自動露出は画面全体の平均を目標の明るさに、
+# AWBは画面全体の平均をグレーに合わせようとして1フレームごとに半分ずつ追従する。
+# 同じコーンなので、理想的には赤色の割合はどの方位でも同じになる。
+
+STEPS = 24
+STEP_DEG = 15
+SUN_DEG = 90
+THRESHOLD = 4.0          # 検出とみなす赤色の割合 [%] (コーンは約8%)
+FRAMES_PER_STEP = 2      # 向きを変えてから撮影するまでのフレーム数 (停止と撮影の間)
+
+class SunCamera(ReplayCamera):
+    """方位によって背景の明るさと色温度が変わるシーンを、AE/AWB付きで撮影する ReplayCamera。"""
+
+    TARGET_MEAN = 110.0
+    LAG = 0.5
+
+    def __init__(self, scene, cone_mask):
+        super().__init__(main_size=scene.shape[1::-1])
+        self.scene = scene.astype(np.float32)
+        self.cone = cone_mask[..., None]
+        self.heading = 0.0
+        self.exposure = 1.0
+        self.gains = np.ones(3, np.float32)
+        self.controls = {"AeEnable": True, "AwbEnable": True}
+        self.restarts = 0
+
+    def stop(self):
+        self.restarts += 1
+        super().stop()
+
+    def radiance(self):
+        """今の方位で見える明るさ。太陽の方を向くと背景が明るく暖色に、反対を向くと暗く青くなる。"""
+        facing = math.cos(math.radians(self.heading - SUN_DEG))
+        background = (1.0 + 0.9 * max(facing, 0.0) - 0.3 * max(-facing, 0.0)) \
+            * np.array([1.0 + 0.15 * facing, 1.0, 1.0 - 0.2 * facing], np.float32)
+        return self.scene * np.where(self.cone, 1.0, background)
+
+    def _step(self):
+        """1フレーム進めて、AE/AWBを追従させた画像を返す。"""
+        radiance = self.radiance()
+        if self.controls.get("AeEnable", True):
+            target = self.TARGET_MEAN / max(float(radiance.mean()), 1.0)
+            self.exposure += self.LAG * (target - self.exposure)
+        else:
+            self.exposure = self.controls.get("ExposureTime", 10000) / 10000
+        if self.controls.get("AwbEnable", True):
+            means = radiance.reshape(-1, 3).mean(axis=0)
+            target = means.mean() / np.maximum(means, 1.0)
+            self.gains += self.LAG * (target - self.gains)
+        else:
+            red, blue = self.controls.get("ColourGains", (1.0, 1.0))
+            self.gains = np.array([red, 1.0, blue], np.float32)
+        image = np.clip(radiance * self.exposure * self.gains, 0, 255).astype(np.uint8)
+        return image
+
+    def capture_array(self, name="main"):
+        self.capture_count += 1
+        return self._step()
+
+    def capture_metadata(self):
+        self._step()
+        return {"ExposureTime": int(self.exposure * 10000), "AnalogueGain": 1.0,
+                "ColourGains": (float(self.gains[0]), float(self.gains[2]))}
+
+def cone_mask(frame):
+    red = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    return red.classify(frame) > 0
+
+def rotation(camera, controls, profile):
+    stability = DetectionStability(profile, threshold=THRESHOLD)
+    red = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    camera.heading = 0.0
+    with controls.phase(profile, relock=True):
+        for i in range(STEPS):
+            camera.heading = (i + 1) * STEP_DEG
+            for _ in range(FRAMES_PER_STEP):
+                camera.capture_metadata()
+            stability.record(red.percentage(camera.capture_array()), camera.heading, controls.metadata())
+    return stability
+
+if __name__ == "__main__":
+    scene = make_scene(320, 240, seed=3)
+    results = {}
+    for profile in ("auto", "scan"):
+        camera = SunCamera(scene, cone_mask(scene))
+        controls = CameraControls(camera, settle_timeout_s=0.5)
+        controls.apply("auto")
+        results[profile] = rotation(camera, controls, profile).report()
+        print(f"    カメラの再起動 {camera.restarts}回, プロファイルの切り替え {controls.switches}回")
+
+    auto, locked = results["auto"], results["scan"]
+    ok = locked["std"] < auto["std"] and locked["flips"] <= auto["flips"]
+    print(f"{'✅' if ok else '🔴'} 赤色割合の標準偏差 {auto['std']:.2f} → {locked['std']:.2f}%ポイント, "
+          f"検出の入れ替わり {auto['flips']} → {locked['flips']}回 (閾値 {THRESHOLD}%)")
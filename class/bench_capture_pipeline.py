@@ -0,0 +1,92 @@
+import time
+import statistics
+import tracemalloc
+import cv2
+import numpy as np
+import color_classifier
+from frame_analysis import FrameAnalysis
+from capture_pipeline import CapturePipeline
+from replay_camera import ReplayCamera
+from bench_color_classifier import SLOWDOWN_MAX, legacy_mask, make_scene
+
+# 撮影から赤色の割合を求めるまでの、1フレームあたりのメモリ確保量とスループットを比べる
+#   - 従来: capture_array() (コピー) → rotate → GaussianBlur → RGB→BGR→HSV → inRange×2 → bitwise_or
+#   - FrameAnalysis: capture_array() (コピー) → FrameAnalysis (main の RGB は cvtColor + inRange、lores の YUV は LUT) だが配列は毎回確保する
+#   - CapturePipeline: capture_request() のバッファをコピーせずに読み、配列はすべてプールに書き込む
+# カメラには ReplayCamera を使う (capture_array() は実機と同じくバッファのコピーを返す)。
+# 確保量は tracemalloc で測った1フレームの処理中の確保量の最大値 (numpyの配列も数えられる)。
+# 確保を無くしても遅くなっては意味が無いので、main の CapturePipeline が従来の処理より遅くないことも確かめる。
+
+MAIN_SIZE = (640, 480)
+LORES_SIZE = (320, 240)
+FRAMES = 200
+
+def legacy(camera):
+    frame = camera.capture_array("main")
+    frame = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    frame = cv2.GaussianBlur(frame, (5, 5), 0)
+    mask = legacy_mask(frame)
+    return np.count_nonzero(mask) / mask.size * 100
+
+def analysis(camera, classifier, stream):
+    frame = camera.capture_array(stream)
+    return FrameAnalysis(frame, classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE,
+                         blur_ksize=0 if stream == "lores" else 5).percentage
+
+def allocated_per_frame(step):
+    """1フレームの処理中に確保されたバイト数の最大値 (中央値)。最初のフレーム (プールの確保) は除く。"""
+    step()
+    tracemalloc.start()
+    samples = []
+    for _ in range(20):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        step()
+        samples.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return statistics.median(samples)
+
+def throughput(step):
+    step()
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        step()
+    return FRAMES / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    camera = ReplayCamera()
+    camera.configure(camera.create_still_configuration(main={"size": MAIN_SIZE}, lores={"size": LORES_SIZE}))
+    camera.start()
+    camera.load(make_scene(*MAIN_SIZE))
+    rgb = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    yuv = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="YUV")
+    main_pipeline = CapturePipeline(camera, rgb, stream="main")
+    lores_pipeline = CapturePipeline(camera, yuv, stream="lores")
+
+    cases = [
+        ("main 従来", lambda: legacy(camera)),
+        ("main FrameAnalysis", lambda: analysis(camera, rgb, "main")),
+        ("main CapturePipeline", lambda: main_pipeline.process().percentage),
+        ("lores FrameAnalysis", lambda: analysis(camera, yuv, "lores")),
+        ("lores CapturePipeline", lambda: lores_pipeline.process().percentage),
+    ]
+    fps = {}
+    for name, step in cases:
+        allocated = allocated_per_frame(step)
+        fps[name] = throughput(step)
+        print(f"{name:<22}: 確保 {allocated / 1024:8.1f}KB/フレーム, {fps[name]:6.1f} fps")
+
+    ratio = fps["main 従来"] / fps["main CapturePipeline"]
+    print(f"{'✅' if ratio <= SLOWDOWN_MAX else '🔴'} main: CapturePipeline の処理時間は従来の {ratio:.2f}倍 "
+          f"(上限 {SLOWDOWN_MAX})")
+
+    # プールを使っても結果は同じで、2フレーム目からは確保が増えないこと
+    for name, pipeline, stream, classifier in (("main", main_pipeline, "main", rgb),
+                                               ("lores", lores_pipeline, "lores", yuv)):
+        before = pipeline.pool.allocations
+        result = pipeline.process().percentage
+        expected = analysis(camera, classifier, stream)
+        ok = pipeline.pool.allocations == before and abs(result - expected) < 1e-9
+        s = pipeline.stats()
+        print(f"{'✅' if ok else '🔴'} {name}: 赤色 {result:.2f}% (FrameAnalysis {expected:.2f}%), "
+              f"プール {s['pool_bytes'] / 1024:.0f}KB, 確保 {s['allocations']}回 / {s['frames']}フレーム")
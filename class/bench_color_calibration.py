@@ -0,0 +1,90 @@
+import os
+import time
+import tempfile
+import cv2
+import numpy as np
+import color_classifier
+import color_calibration
+from bench_color_classifier import make_scene
+
+# 照明を変えた合成画像で、各ファイルの固定の赤の閾値と、同じ照明でキャリブレーションした閾値を比べる
+#   - 検出率: コーンの画素のうち赤と判定された割合
+#   - 誤検出率: コーン以外の画素 (茶色・ピンクの物を含む) のうち赤と判定された割合
+# キャリブレーションは種 0 の画像 (正面にコーンを置いた起動時の画像) で行い、種 1〜9 で評価する。
+# 最後に、lores (YUV) の分類器で、参照テーブルを作り直す場合と保存した .npy を読む場合の起動時間を比べる。
+
+WIDTH, HEIGHT = 320, 240
+FIXED = {
+    "camera.py": (((0, 30, 30), (20, 255, 255)), ((95, 30, 30), (130, 255, 255))), # BGRとして判定していた
+    "GDA2": (((0, 150, 120), (5, 255, 255)), ((175, 150, 120), (180, 255, 255))),
+    "Goal_Detective_Noshiro": color_classifier.RED_RANGES,
+}
+LIGHTING = {
+    "昼光": (1.0, (1.0, 1.0, 1.0)),
+    "曇り (暗い)": (0.5, (1.0, 1.0, 1.0)),
+    "逆光 (明るい)": (1.5, (1.0, 1.0, 1.0)),
+    "夕方 (暖色)": (0.8, (1.15, 0.95, 0.7)),
+    "日陰 (寒色)": (0.7, (0.8, 1.0, 1.25)),
+}
+
+def cone_mask(seed):
+    """make_scene と同じ乱数の順でコーンの位置を求めた正解マスク (縁の2画素は除く)。"""
+    rng = np.random.default_rng(seed)
+    cx, cy = int(WIDTH * rng.uniform(0.3, 0.7)), int(HEIGHT * 0.6)
+    size = int(HEIGHT * rng.uniform(0.2, 0.4))
+    cone = np.array([[cx, cy - size], [cx - size // 2, cy + size // 2], [cx + size // 2, cy + size // 2]], np.int32)
+    mask = np.zeros((HEIGHT, WIDTH), np.uint8)
+    cv2.fillPoly(mask, [cone], 255)
+    inner = cv2.erode(mask, np.ones((5, 5), np.uint8))
+    outer = cv2.dilate(mask, np.ones((5, 5), np.uint8))
+    return inner > 0, outer == 0
+
+def lit(frame, gain, tint):
+    return np.clip(frame.astype(np.float32) * gain * np.array(tint, np.float32), 0, 255).astype(np.uint8)
+
+def evaluate(classifier, gain, tint, seeds=range(1, 10)):
+    hits = cone = false = background = 0
+    for seed in seeds:
+        mask = classifier.classify(lit(make_scene(WIDTH, HEIGHT, seed), gain, tint)) > 0
+        inside, outside = cone_mask(seed)
+        hits += np.count_nonzero(mask & inside)
+        cone += np.count_nonzero(inside)
+        false += np.count_nonzero(mask & outside)
+        background += np.count_nonzero(outside)
+    return hits / cone, false / background
+
+if __name__ == "__main__":
+    names = list(FIXED) + ["キャリブレーション"]
+    print(f"{'照明':<12} | " + " | ".join(f"{n[:22]:>22}" for n in names))
+    worst_fixed, worst_calibrated = 1.0, 1.0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "color_calibration.json")
+        for light, (gain, tint) in LIGHTING.items():
+            cells = []
+            for name, ranges in FIXED.items():
+                order = "BGR" if name == "camera.py" else "RGB"
+                recall, fp = evaluate(color_classifier.get_classifier(ranges, channel_order=order), gain, tint)
+                worst_fixed = min(worst_fixed, recall)
+                cells.append(f"{recall:>9.1%} / {fp:>8.2%}")
+            color_calibration.calibrate(lit(make_scene(WIDTH, HEIGHT, 0), gain, tint), "red", path=path)
+            recall, fp = evaluate(color_calibration.load_classifier("red", "RGB", path=path), gain, tint)
+            worst_calibrated = min(worst_calibrated, recall)
+            cells.append(f"{recall:>9.1%} / {fp:>8.2%}")
+            print(f"{light:<12} | " + " | ".join(cells))
+        print("(各欄は 検出率 / 誤検出率)")
+        ok = worst_calibrated >= worst_fixed
+        print(f"{'✅' if ok else '🔴'} 最悪の照明での検出率: 固定の閾値 {worst_fixed:.1%} → キャリブレーション {worst_calibrated:.1%}")
+
+        # 起動時間: 表を作る場合と、保存した表を読む場合
+        for bits in (5, 8):
+            color_classifier._classifiers.clear()
+            color_calibration._loaded.clear()
+            start = time.perf_counter()
+            color_calibration.load_classifier("red", "YUV", path=path, bits=bits) # 初回は表を作って保存する
+            build = time.perf_counter() - start
+            color_classifier._classifiers.clear()
+            color_calibration._loaded.clear()
+            start = time.perf_counter()
+            color_calibration.load_classifier("red", "YUV", path=path, bits=bits)
+            load = time.perf_counter() - start
+            print(f"bits={bits}: 表を作る {build * 1000:7.1f}ms / 保存した表を読む {load * 1000:6.1f}ms")
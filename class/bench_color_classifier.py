@@ -0,0 +1,104 @@
+import time
+import statistics
+import cv2
+import numpy as np
+from color_classifier import ColorClassifier, RED_RANGES
+from capture_pipeline import BufferPool
+
+# 赤色検出の処理時間と結果の一致率を、従来の処理 (RGB→BGR→HSV, inRange×2, bitwise_or) と
+# color_classifier (RGBから直接HSV + inRange) で比べる
+# 参考として、RGBを5ビットに量子化した参照テーブルを np.take で引く方法 (以前の RGB の判定) も測る
+# カメラは使わず合成画像で測るので、PC上でも実機上でも実行できる
+#   - 時間   : 320x240 と 640x480 で1フレームあたりの処理時間 [ms] (GaussianBlurは両方に共通なので含めない)
+#   - 一致率 : 従来の処理のマスクと画素単位で比べた一致率と、赤色割合 [%] の差
+
+AGREEMENT_MIN = 1.0        # 画素単位の一致率の下限 (RGBはHSV変換 + inRange なので完全に一致する)
+PERCENTAGE_DIFF_MAX = 0.0  # 赤色割合の差の上限 [%ポイント]
+SLOWDOWN_MAX = 1.05        # 従来の処理に対する処理時間の比の上限 (測定のばらつきの分だけ余裕を持たせる)
+
+def legacy_mask(frame_rgb, hsv_ranges=RED_RANGES):
+    """従来の処理 (RedConeNavigator.get_red_percentage と同じ手順)。"""
+    frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
+    hsv = cv2.cvtColor(frame_bgr, cv2.COLOR_BGR2HSV)
+    (lower1, upper1), (lower2, upper2) = hsv_ranges
+    mask1 = cv2.inRange(hsv, np.array(lower1), np.array(upper1))
+    mask2 = cv2.inRange(hsv, np.array(lower2), np.array(upper2))
+    return cv2.bitwise_or(mask1, mask2)
+
+def make_scene(width, height, seed=0):
+    """
+    芝生・空・影を模した背景に、赤いコーンと赤っぽい物 (茶色・ピンク) を置いた合成画像 (RGB)。
+    照明むらとセンサーノイズも加え、閾値の境界付近の色が含まれるようにする。
+    """
+    rng = np.random.default_rng(seed)
+    frame = np.zeros((height, width, 3), np.float32)
+    frame[:height // 3] = (150, 180, 220)      # 空
+    frame[height // 3:] = (70, 110, 50)        # 芝生
+    cx, cy = int(width * rng.uniform(0.3, 0.7)), int(height * 0.6)
+    size = int(height * rng.uniform(0.2, 0.4))
+    cone = np.array([[cx, cy - size], [cx - size // 2, cy + size // 2], [cx + size // 2, cy + size // 2]], np.int32)
+    cv2.fillPoly(frame, [cone], (200, 30, 25))
+    cv2.circle(frame, (width // 6, height * 3 // 4), height // 10, (140, 70, 50), -1)   # 茶色
+    cv2.circle(frame, (width * 5 // 6, height * 3 // 4), height // 10, (220, 120, 150), -1) # ピンク
+    # 照明むら (横方向のグラデーションと低周波の明暗)
+    shade = cv2.resize(rng.uniform(0.6, 1.2, (4, 4)).astype(np.float32), (width, height))
+    frame *= shade[..., None]
+    frame += rng.normal(0, 8, frame.shape)
+    frame = np.clip(frame, 0, 255).astype(np.uint8)
+    return cv2.GaussianBlur(frame, (5, 5), 0)
+
+def time_ms(func, frame, repeat=200):
+    func(frame)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(frame)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def check_agreement(classifier, sizes=((320, 240), (640, 480)), seeds=range(10)):
+    """
+    合成画像とランダム画像で従来の処理と比べる。
+
+    Returns:
+        tuple: (最小の一致率, 赤色割合の差の最大値[%ポイント])
+    """
+    worst_agreement, worst_diff = 1.0, 0.0
+    for width, height in sizes:
+        for seed in seeds:
+            frames = [make_scene(width, height, seed),
+                      np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)]
+            for frame in frames:
+                expected = legacy_mask(frame)
+                actual = classifier.classify(frame)
+                agreement = np.count_nonzero(expected == actual) / expected.size
+                diff = abs(np.count_nonzero(expected) - np.count_nonzero(actual)) / expected.size * 100
+                worst_agreement = min(worst_agreement, agreement)
+                worst_diff = max(worst_diff, diff)
+    return worst_agreement, worst_diff
+
+def table_mask(classifier, frame):
+    """参考: 量子化RGBの参照テーブルを np.take で引く方法 (以前の RGB の判定)。"""
+    return classifier._lookup(frame[..., 0], frame[..., 1], frame[..., 2])
+
+if __name__ == "__main__":
+    classifier = ColorClassifier(RED_RANGES, "RGB")
+    pool = BufferPool()
+    classifier.table # 参考の表引きのために表を作っておく (RGBの判定そのものは表を使わない)
+    print(f"参照テーブル (参考, bits={classifier.bits}): {classifier.table.nbytes / 1024:.0f}KB, 作成 {classifier.build_time_s * 1000:.1f}ms")
+
+    print(f"\n{'size':<8} | {'legacy[ms]':>10} | {'classify[ms]':>12} | {'pool[ms]':>8} | {'LUT5 (参考)[ms]':>15}")
+    not_slower = True
+    for width, height in ((320, 240), (640, 480)):
+        frame = make_scene(width, height)
+        legacy = time_ms(legacy_mask, frame)
+        plain = time_ms(classifier.classify, frame)
+        pooled = time_ms(lambda f: classifier.classify(f, buffers=pool), frame)
+        lut = time_ms(lambda f: table_mask(classifier, f), frame)
+        not_slower &= max(plain, pooled) <= legacy * SLOWDOWN_MAX
+        print(f"{width}x{height:<4} | {legacy:>10.2f} | {plain:>12.2f} | {pooled:>8.2f} | {lut:>15.2f}")
+
+    agreement, diff = check_agreement(classifier)
+    ok = agreement >= AGREEMENT_MIN and diff <= PERCENTAGE_DIFF_MAX
+    print(f"\n{'✅' if ok else '🔴'} 一致率 {agreement:.2%}, 赤色割合の差の最大値 {diff:.2f}%ポイント")
+    print(f"{'✅' if not_slower else '🔴'} どちらのサイズでも従来の処理より遅くない (比 {SLOWDOWN_MAX} 以下)")
@@ -0,0 +1,62 @@
+import os
+import time
+import tempfile
+import cv2
+from bench_color_classifier import make_scene
+from debug_image_writer import DebugImageWriter
+
+# デバッグ画像の保存で制御ループのスレッドが止まる時間を比べる (640x480のBGR画像)
+#   - imwrite: 従来どおり毎フレーム cv2.imwrite する
+#   - writer: DebugImageWriter.save() で参照をキューに入れるだけ (every_n=1 / 10)
+# SDカードへの書き込みはこの環境のディスクより遅いので、Raspberry Piでは差がもっと大きくなる。
+# 最後にディスク使用量の上限 (古い画像からの削除) を確認する。
+
+FRAMES = 100
+INTERVAL = 0.1   # 10Hzで撮影する想定
+
+def frames():
+    return [cv2.cvtColor(make_scene(640, 480, seed=s), cv2.COLOR_RGB2BGR) for s in range(4)]
+
+def run(images, save):
+    stalls = []
+    for i in range(FRAMES):
+        start = time.perf_counter()
+        save(images[i % len(images)])
+        stalls.append(time.perf_counter() - start)
+        time.sleep(max(0.0, INTERVAL - stalls[-1]))
+    stalls.sort()
+    return stalls[len(stalls) // 2] * 1000, stalls[-1] * 1000
+
+if __name__ == "__main__":
+    images = frames()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "akairo_grid.jpg")
+        p50, worst = run(images, lambda image: cv2.imwrite(path, image))
+        print(f"{'imwrite':<18}: 止まる時間 p50 {p50:.2f}ms / 最大 {worst:.2f}ms")
+        for every_n in (1, 10):
+            writer = DebugImageWriter(every_n=every_n, jpeg_quality=80)
+            p50, worst = run(images, lambda image: writer.save(path, image))
+            writer.flush()
+            s = writer.stats()
+            print(f"{'writer every_n=' + str(every_n):<18}: 止まる時間 p50 {p50:.3f}ms / 最大 {worst:.3f}ms, "
+                  f"保存 {s['written']}, 間引き {s['skipped']}, 取りこぼし {s['dropped']}, "
+                  f"エンコード+書き込み p50 {s['encode_p50_ms']:.1f}ms")
+
+        # 画質ごとのファイルサイズ
+        for quality in (95, 80, 60):
+            ok, encoded = cv2.imencode(".jpg", images[0], [cv2.IMWRITE_JPEG_QUALITY, quality])
+            print(f"JPEG画質 {quality}: {encoded.nbytes / 1024:.0f}KB")
+
+        # ディスク使用量の上限: 連番で残し、上限を超えたら古いものから消す
+        budget_mb = 0.5
+        writer = DebugImageWriter(budget_mb=budget_mb, keep_history=True)
+        history = os.path.join(tmp, "history", "flag.jpg")
+        for i in range(40):
+            writer.save(history, images[i % len(images)], event=True)
+            writer.flush()
+        files = os.listdir(os.path.dirname(history))
+        on_disk = sum(os.path.getsize(os.path.join(os.path.dirname(history), f)) for f in files)
+        s = writer.stats()
+        ok = on_disk <= budget_mb * 1024 * 1024 and on_disk == s["bytes_on_disk"] and "flag_000040.jpg" in files
+        print(f"{'✅' if ok else '🔴'} 上限 {budget_mb}MB: 保存 {s['written']}, 削除 {s['evicted']}, "
+              f"残り {len(files)}枚 ({on_disk / 1024:.0f}KB)")
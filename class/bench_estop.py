@@ -0,0 +1,94 @@
+import os
+import time
+import random
+import statistics
+import threading
+import multiprocessing
+from motor import MotorDriver
+
+# 緊急停止 (MotorDriver.emergency_stop) の停止レイテンシ計測
+# 別スレッドで changing_right(0, 90) などのランプ処理を走らせ、CPUに負荷を掛けた状態で
+# ランダムな時刻に緊急停止し、次の3つを計測する
+#   - stop  : emergency_stop() を呼んでから、ブレーキとPWM 0の書き込みが終わるまで
+#   - abort : emergency_stop() を呼んでから、ランプ処理のスレッドが戻るまで
+#   - 検証  : 停止後にランプ処理がピンを書き換えていないか (read_bank_1 と PWMデューティで確認)
+# 車輪を浮かせた状態で、`sudo pigpiod` を起動してから実行すること
+
+MOTOR_PINS = {
+    'PWMA': 12, 'AIN1': 23, 'AIN2': 18,
+    'PWMB': 19, 'BIN1': 16, 'BIN2': 26,
+    'STBY': 21
+}
+STOP_BUDGET_MS = 5.0    # 保証したい停止レイテンシ (p99)
+ABORT_BUDGET_MS = 50.0  # ランプ処理が抜けるまでの上限 (1ステップ分の待機 + α)
+
+def burn_cpu(stop_event):
+    """負荷用: 別プロセスでCPUを回し続ける。"""
+    x = 0
+    while not stop_event.is_set():
+        x = (x * 31 + 7) % 1000003
+
+def maneuver(driver):
+    """緊急停止される側の処理 (スタック脱出と同じ、ランプ + 長い待機)。"""
+    driver.changing_right(0, 90)
+    if driver.estop_wait(3):
+        return
+    driver.changing_left(0, 90)
+
+def run_trials(driver, trials=50, load_procs=None):
+    if load_procs is None:
+        load_procs = os.cpu_count() or 1
+    stop_event = multiprocessing.Event()
+    procs = [multiprocessing.Process(target=burn_cpu, args=(stop_event,), daemon=True) for _ in range(load_procs)]
+    for p in procs:
+        p.start()
+
+    brake_mask = driver._brake_mask
+    stop_ms, abort_ms, violations = [], [], 0
+    try:
+        for i in range(trials):
+            driver.clear_emergency_stop()
+            worker = threading.Thread(target=maneuver, args=(driver,))
+            worker.start()
+            time.sleep(random.uniform(0.05, 2.0)) # ランプ中・待機中のどちらでも止める
+
+            start = time.perf_counter()
+            driver.emergency_stop(f"trial {i}")
+            stop_ms.append((time.perf_counter() - start) * 1000)
+            worker.join()
+            abort_ms.append((time.perf_counter() - start) * 1000)
+
+            # 停止後にブレーキが外れていないか、PWMが0のままかを確認
+            bank = driver.pi.read_bank_1()
+            duty_a = driver.pi.get_PWM_dutycycle(driver.PWMA_PIN)
+            duty_b = driver.pi.get_PWM_dutycycle(driver.PWMB_PIN)
+            if bank & brake_mask != brake_mask or duty_a or duty_b:
+                violations += 1
+                print(f"⚠️ trial {i}: 停止後の状態が不正です (bank={bank:#010x}, duty={duty_a},{duty_b})")
+            time.sleep(0.3)
+    finally:
+        stop_event.set()
+        for p in procs:
+            p.join(timeout=1)
+        driver.clear_emergency_stop()
+        driver.motor_stop_brake()
+    return stop_ms, abort_ms, violations
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[max(0, int(len(values) * q) - 1)]
+
+if __name__ == "__main__":
+    driver = MotorDriver(**MOTOR_PINS)
+    try:
+        stop_ms, abort_ms, violations = run_trials(driver)
+    finally:
+        driver.cleanup()
+        driver.pi.stop()
+
+    print(f"\n{'':<6} | {'p50[ms]':>8} | {'p99[ms]':>8} | {'max[ms]':>8}")
+    for name, values in (("stop", stop_ms), ("abort", abort_ms)):
+        print(f"{name:<6} | {statistics.median(values):>8.2f} | {percentile(values, 0.99):>8.2f} | {max(values):>8.2f}")
+    ok = percentile(stop_ms, 0.99) <= STOP_BUDGET_MS and max(abort_ms) <= ABORT_BUDGET_MS and violations == 0
+    print(f"\n停止後の状態不正: {violations}回")
+    print(f"{'✅' if ok else '🔴'} 停止レイテンシ p99 <= {STOP_BUDGET_MS}ms, ランプ脱出 <= {ABORT_BUDGET_MS}ms")
@@ -0,0 +1,72 @@
+import io
+import os
+import time
+import contextlib
+import cv2
+import numpy as np
+import replay_camera
+replay_camera.install_fake_modules()
+import vision_bench
+
+# 散らかった地面で、Flag_Detector5 (黒と白を別々に findContours + 全組の pointPolygonTest) と
+# Flag_Detector6 (黒と白を合わせたマスクを RETR_TREE で1回、階層から図形を読む) の速さと結果の比較
+# 芝生の上にフラッグを2枚 (図形入り) 置き、白い小石 (紙くず・反射) と、フラッグの面積の閾値を超える
+# 大きさの黒い影を散らばらせる。散らかりの量を増やしていき、1フレームあたりの時間と検出した図形を比べる。
+
+WIDTH, HEIGHT = 640, 480
+CLUTTER = ((0, 0), (100, 5), (400, 15), (1600, 40))   # (白い小石の数, 黒い影の数)
+REPEAT = 3
+FLAGS = (((180, 200), 110, "十字"), ((450, 220), 90, "三角形"))
+
+def make_scene(pebbles, shadows, seed=0):
+    """センサーの向きのRGB画像。フラッグは表示の向きで描いてから、ROVERの逆に回して戻す。"""
+    rng = np.random.default_rng(seed)
+    width, height = HEIGHT, WIDTH # 表示の向き (縦長)
+    frame = np.empty((height, width, 3), np.float32)
+    frame[:] = (85, 115, 55)
+    for _ in range(pebbles):
+        center = (int(rng.uniform(0, width)), int(rng.uniform(0, height)))
+        cv2.circle(frame, center, int(rng.uniform(2, 6)), (235, 235, 230), -1)
+    for _ in range(shadows): # 影に入った小石は見えない (影の中の白い穴は図形と区別できないため)
+        center = (int(rng.uniform(0, width)), int(rng.uniform(0, height)))
+        axes = (int(rng.uniform(20, 45)), int(rng.uniform(15, 30)))
+        cv2.ellipse(frame, center, axes, float(rng.uniform(0, 180)), 0, 360, (20, 22, 18), -1)
+    for (cx, cy), side, shape in FLAGS:
+        cv2.rectangle(frame, (cx - side // 2, cy - side // 2), (cx + side // 2, cy + side // 2), (15, 15, 18), -1)
+        cv2.fillPoly(frame, [vision_bench._shape_polygon(shape, cx, cy, side * 0.6)], (235, 235, 235))
+    frame += rng.normal(0, 4, frame.shape).astype(np.float32)
+    display = np.clip(frame, 0, 255).astype(np.uint8)
+    return cv2.rotate(display, cv2.ROTATE_90_CLOCKWISE)
+
+def load_detector(filename, camera):
+    module = vision_bench.load_module(os.path.join(vision_bench.ROOT_DIR, filename), "bench_" + filename[:-3])
+    module.Picamera2 = lambda *args, **kwargs: camera
+    module.sleep = lambda seconds: None
+    with contextlib.redirect_stdout(io.StringIO()):
+        return module.FlagDetector()
+
+def run(detector, camera, frame):
+    camera.load(frame)
+    elapsed = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            flags = detector.detect()
+        elapsed.append((time.perf_counter() - start) * 1000)
+    return min(elapsed), sorted(s["name"] for flag in flags for s in flag["shapes"])
+
+if __name__ == "__main__":
+    cameras = {name: replay_camera.ReplayCamera() for name in ("Flag_Detector5.py", "Flag_Detector6.py")}
+    detectors = {name: load_detector(name, camera) for name, camera in cameras.items()}
+    expected = sorted(shape for _, _, shape in FLAGS)
+    ok = True
+    print(f"{'白い小石':>8} {'黒い影':>6} | {'Flag_Detector5':>16} | {'Flag_Detector6':>16} | 図形")
+    for pebbles, shadows in CLUTTER:
+        frame = make_scene(pebbles, shadows)
+        results = {name: run(detectors[name], cameras[name], frame) for name in detectors}
+        (t5, shapes5), (t6, shapes6) = results.values()
+        good = shapes6 == expected
+        ok = ok and good and t6 < t5
+        print(f"{pebbles:>12} {shadows:>8} | {t5:>14.2f}ms | {t6:>14.2f}ms | "
+              f"{'✅' if good else '🔴'} 5: {shapes5}, 6: {shapes6} (x{t5 / t6:.1f})")
+    print(f"{'✅' if ok else '🔴'} 散らかった地面でも Flag_Detector6 が正しい図形を速く見つける")
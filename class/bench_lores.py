@@ -0,0 +1,100 @@
+import sys
+import time
+import statistics
+import cv2
+import numpy as np
+import color_classifier
+from frame_analysis import FrameAnalysis
+from bench_color_classifier import legacy_mask, make_scene
+
+# 赤色検出を mainストリーム (RGB 640x480) で行う場合と、loresストリーム (YUV420 320x240) で行う場合の比較
+#   - 1回の検出にかかる時間 [ms] と、それだけで回せる検出のfps
+#   - 1フレームで読むバイト数
+#   - 赤色割合 [%] の差 (従来の処理との比較)
+# 合成画像で測るのでカメラ無しでも実行できる。実機では `python3 bench_lores.py --camera` で
+# Picamera2から実際に取得しながらの検出fpsも測る。
+
+MAIN_SIZE = (640, 480)
+LORES_SIZE = (320, 240)
+PERCENTAGE_DIFF_MAX = 1.0 # 赤色割合の差の上限 [%ポイント]
+
+def rgb_to_yuv420(frame_rgb, size=LORES_SIZE):
+    """RGB画像をloresと同じ YUV420 (I420, フルレンジBT.601) のバッファにする (ISPの縮小もINTER_AREAで模擬)。"""
+    small = cv2.resize(frame_rgb, size, interpolation=cv2.INTER_AREA)
+    ycrcb = cv2.cvtColor(small, cv2.COLOR_RGB2YCrCb) # OpenCVのYCrCbはフルレンジBT.601
+    half = (size[0] // 2, size[1] // 2)
+    cb = cv2.resize(ycrcb[..., 2], half, interpolation=cv2.INTER_AREA)
+    cr = cv2.resize(ycrcb[..., 1], half, interpolation=cv2.INTER_AREA)
+    return np.concatenate([ycrcb[..., 0].reshape(-1), cb.reshape(-1), cr.reshape(-1)]).reshape(size[1] * 3 // 2, size[0])
+
+def legacy_detect(frame_rgb):
+    """従来の処理 (RedConeNavigator.get_red_percentage の旧実装: 回転・ぼかし・RGB→BGR→HSV・inRange×2)。"""
+    frame = cv2.rotate(frame_rgb, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    frame = cv2.GaussianBlur(frame, (5, 5), 0)
+    mask = legacy_mask(frame)
+    return np.count_nonzero(mask) / mask.size * 100
+
+def main_detect(frame_rgb, classifier):
+    return FrameAnalysis(frame_rgb, classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE, blur_ksize=5).percentage
+
+def lores_detect(buffer, classifier):
+    return FrameAnalysis(buffer, classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE).percentage
+
+def time_ms(func, *args, repeat=200):
+    func(*args)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def run_offline():
+    rgb_classifier = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    yuv_classifier = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="YUV")
+    frame = make_scene(*MAIN_SIZE)
+    buffer = rgb_to_yuv420(frame)
+
+    cases = [
+        ("main RGB 640x480 (従来)", frame.nbytes, time_ms(legacy_detect, frame)),
+        ("main RGB 640x480 (分類器)", frame.nbytes, time_ms(main_detect, frame, rgb_classifier)),
+        ("lores YUV420 320x240", buffer.nbytes, time_ms(lores_detect, buffer, yuv_classifier)),
+    ]
+    print(f"{'pipeline':<26} | {'bytes/frame':>11} | {'ms/frame':>8} | {'fps':>7}")
+    for name, nbytes, ms in cases:
+        print(f"{name:<26} | {nbytes:>11} | {ms:>8.2f} | {1000 / ms:>7.0f}")
+    print(f"→ loresは従来比 {cases[0][2] / cases[2][2]:.1f}倍の検出fps, 読むバイト数は {buffer.nbytes / frame.nbytes:.0%}")
+
+    worst = 0.0
+    for seed in range(20):
+        frame = make_scene(*MAIN_SIZE, seed=seed)
+        worst = max(worst, abs(legacy_detect(frame) - lores_detect(rgb_to_yuv420(frame), yuv_classifier)))
+    ok = worst <= PERCENTAGE_DIFF_MAX
+    print(f"\n{'✅' if ok else '🔴'} 赤色割合の差 (従来 vs lores, 20シーン) の最大値: {worst:.2f}%ポイント (上限 {PERCENTAGE_DIFF_MAX})")
+
+def run_camera(frames=100):
+    """実機のPicamera2で、mainを取得して従来の処理をする場合と、loresを取得して判定する場合のfpsを測る。"""
+    from picamera2 import Picamera2
+    import camera_setup
+    picam2 = Picamera2()
+    camera_setup.configure_detection_camera(picam2, main_size=MAIN_SIZE, lores_size=LORES_SIZE)
+    yuv_classifier = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="YUV")
+    try:
+        for name, capture, detect in (
+                ("main + 従来の処理", lambda: picam2.capture_array("main"), legacy_detect),
+                ("lores + YUV判定", lambda: picam2.capture_array("lores"), lambda b: lores_detect(b, yuv_classifier))):
+            start = time.perf_counter()
+            cpu_start = time.process_time()
+            for _ in range(frames):
+                detect(capture())
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu_start
+            print(f"{name:<18}: {frames / elapsed:5.1f} fps, CPU {cpu / frames * 1000:5.1f} ms/frame")
+    finally:
+        picam2.close()
+
+if __name__ == "__main__":
+    run_offline()
+    if "--camera" in sys.argv:
+        print()
+        run_camera()
@@ -0,0 +1,56 @@
+import numpy as np
+import color_classifier
+from frame_analysis import _bounds
+from mask_stats import MaskStats
+from bench_color_classifier import make_scene
+from bench_lores import time_ms
+
+# 領域ごとの検出画素数を、切り出し + np.count_nonzero (従来) と、積分画像 (mask_stats.MaskStats) で比べる
+#   - 5列 (get_red_block_by_density)、2x3 (detect_red_in_grid)、16x12 (細かい分割)、スライディングウィンドウ
+#   - 積分画像は「表の作成 + 問い合わせ」と「問い合わせのみ」(同じマスクに2回目以降の問い合わせ) を測る
+# 640x480はmainのマスク、160x120はloresのYUV420から作るマスク (縦横1/2) の大きさ。
+
+LAYOUTS = {"5列": (1, 5), "2x3": (2, 3), "16x12": (16, 12)}
+WINDOW = (0.25, 0.25, 0.05) # 窓の高さ・幅と、ずらす量 (画像の大きさに対する割合)
+
+def make_mask(width, height):
+    classifier = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    return classifier.classify(make_scene(width, height))
+
+def slice_grid(mask, rows, cols):
+    ys, xs = _bounds(mask.shape[0], rows), _bounds(mask.shape[1], cols)
+    return [[np.count_nonzero(mask[ys[r]:ys[r + 1], xs[c]:xs[c + 1]]) for c in range(cols)] for r in range(rows)]
+
+def integral_grid(mask, rows, cols, stats=None):
+    stats = stats or MaskStats(mask)
+    return stats.grid_counts(_bounds(mask.shape[0], rows), _bounds(mask.shape[1], cols))
+
+def window_params(mask):
+    height, width = mask.shape
+    return int(height * WINDOW[0]), int(width * WINDOW[1]), max(1, int(height * WINDOW[2])), max(1, int(width * WINDOW[2]))
+
+def slice_windows(mask):
+    win_h, win_w, step_y, step_x = window_params(mask)
+    return [[np.count_nonzero(mask[y:y + win_h, x:x + win_w]) for x in range(0, mask.shape[1] - win_w + 1, step_x)]
+            for y in range(0, mask.shape[0] - win_h + 1, step_y)]
+
+def integral_windows(mask, stats=None):
+    stats = stats or MaskStats(mask)
+    return stats.window_counts(*window_params(mask))
+
+if __name__ == "__main__":
+    ok = True
+    print(f"{'mask':<8} | {'layout':<8} | {'従来[ms]':>9} | {'積分(作成込み)[ms]':>18} | {'積分(問い合わせ)[ms]':>20}")
+    for width, height in ((640, 480), (160, 120)):
+        mask = make_mask(width, height)
+        stats = MaskStats(mask)
+        print(f"{width}x{height:<4} | {'表の作成':<8} | {'':>9} | {time_ms(MaskStats, mask):>18.3f} | {'':>20}")
+        for name, (rows, cols) in LAYOUTS.items():
+            ok &= np.array_equal(slice_grid(mask, rows, cols), integral_grid(mask, rows, cols))
+            print(f"{width}x{height:<4} | {name:<8} | {time_ms(slice_grid, mask, rows, cols):>9.3f} | "
+                  f"{time_ms(integral_grid, mask, rows, cols):>18.3f} | {time_ms(integral_grid, mask, rows, cols, stats):>20.3f}")
+        windows = np.array(slice_windows(mask))
+        ok &= np.array_equal(windows, integral_windows(mask))
+        print(f"{width}x{height:<4} | {'窓' + str(windows.size) + '個':<8} | {time_ms(slice_windows, mask, repeat=20):>9.3f} | "
+              f"{time_ms(integral_windows, mask):>18.3f} | {time_ms(integral_windows, mask, stats):>20.3f}")
+    print(f"\n{'✅' if ok else '🔴'} すべての分割で従来の集計と画素数が一致")
@@ -0,0 +1,94 @@
+import os
+import time
+import statistics
+from motor import MotorDriver
+
+# ソフトウェアPWM (set_PWM_dutycycle) とハードウェアPWM (hardware_PWM) のA/B比較
+# 計測項目: デューティ更新1回あたりのレイテンシ, 制御ループ中のpigpiodのCPU使用率
+# 実行前に `sudo pigpiod` でデーモンを起動しておくこと
+
+MOTOR_PINS = {
+    'PWMA': 12, 'AIN1': 23, 'AIN2': 18,
+    'PWMB': 19, 'BIN1': 16, 'BIN2': 26,
+    'STBY': 21
+}
+
+def find_pigpiod_pid():
+    """/procを走査してpigpiodのPIDを返す。見つからなければNone。"""
+    for pid in os.listdir("/proc"):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f"/proc/{pid}/comm") as f:
+                if f.read().strip() == "pigpiod":
+                    return int(pid)
+        except OSError:
+            continue
+    return None
+
+def read_cpu_ticks(pid):
+    """プロセスのutime+stime (clock tick) を返す。"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return int(fields[11]) + int(fields[12])
+
+def run_backend(backend, loop_hz=200, duration_s=10.0, hw_freq=20000):
+    """
+    指定バックエンドで正弦波状にデューティを更新し続け、レイテンシとCPU使用率を計測する。
+    モーターは実際に回るので、車輪を浮かせた状態で実行すること。
+    """
+    driver = MotorDriver(
+        PWMA=MOTOR_PINS['PWMA'], AIN1=MOTOR_PINS['AIN1'], AIN2=MOTOR_PINS['AIN2'],
+        PWMB=MOTOR_PINS['PWMB'], BIN1=MOTOR_PINS['BIN1'], BIN2=MOTOR_PINS['BIN2'],
+        STBY=MOTOR_PINS['STBY'],
+        pwm_backend=backend, hw_freq=hw_freq
+    )
+    pid = find_pigpiod_pid()
+    hz = os.sysconf("SC_CLK_TCK")
+    latencies = []
+    try:
+        period = 1.0 / loop_hz
+        cpu_start = read_cpu_ticks(pid) if pid else 0
+        wall_start = time.monotonic()
+        next_t = wall_start
+        i = 0
+        while time.monotonic() - wall_start < duration_s:
+            speed = 30 + 20 * ((i % 100) / 100)
+            t0 = time.perf_counter()
+            driver.motor_Lforward(speed)
+            driver.motor_Rforward(speed)
+            latencies.append((time.perf_counter() - t0) / 2 * 1e6)
+            i += 1
+            next_t += period
+            time.sleep(max(0, next_t - time.monotonic()))
+        wall = time.monotonic() - wall_start
+        cpu_percent = (read_cpu_ticks(pid) - cpu_start) / hz / wall * 100 if pid else float('nan')
+    finally:
+        driver.motor_stop_brake()
+        driver.cleanup()
+        driver.pi.stop()
+
+    latencies.sort()
+    return {
+        "backend": backend,
+        "updates": len(latencies),
+        "lat_p50_us": statistics.median(latencies),
+        "lat_p99_us": latencies[int(len(latencies) * 0.99) - 1],
+        "pigpiod_cpu_percent": cpu_percent,
+    }
+
+if __name__ == "__main__":
+    # 比較の前にアイドル時のpigpiod CPU使用率も確認しておく
+    pid = find_pigpiod_pid()
+    if pid is None:
+        print("⚠️ pigpiodが見つかりません。CPU使用率は計測されません。")
+    else:
+        hz = os.sysconf("SC_CLK_TCK")
+        c0 = read_cpu_ticks(pid)
+        time.sleep(3)
+        print(f"アイドル時のpigpiod CPU使用率: {(read_cpu_ticks(pid) - c0) / hz / 3 * 100:.1f}%")
+
+    results = [run_backend("software"), run_backend("hardware")]
+    print("\nbackend   | updates | p50[us] | p99[us] | pigpiod CPU[%]")
+    for r in results:
+        print(f"{r['backend']:<9} | {r['updates']:>7} | {r['lat_p50_us']:>7.1f} | {r['lat_p99_us']:>7.1f} | {r['pigpiod_cpu_percent']:>6.1f}")
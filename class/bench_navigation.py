@@ -0,0 +1,89 @@
+import math
+import statistics
+import contextlib
+import io
+import rover_sim
+rover_sim.install_fake_modules()
+import following
+from excellent_gps import RoverGPSNavigator
+from bench_turn import setup_hardware, measure_calibration
+
+# GPS誘導 (RoverGPSNavigator) と直進維持 (following.follow_forward) の回帰ベンチマーク
+# rover_simの仮想時計で動くので、数分の走行も数秒で終わる
+# 同じシードなら同じ結果になるので、制御を変更したときの前後比較に使う
+
+GOAL_CASES = [
+    # (目標までの距離[m], 目標の方位[deg], 出発時の方位[deg])
+    (30.0, 0.0, 0.0),
+    (30.0, 90.0, 0.0),
+    (30.0, 180.0, 45.0),
+    (50.0, 225.0, 300.0),
+]
+
+def run_navigation(distance_m, bearing_deg, start_heading, calibration=None, seed=0, time_limit_s=600):
+    """
+    RoverGPSNavigator.navigate_to_goal() を1回走らせる。
+
+    Returns:
+        dict: RoverSim.summary() に goal_distance_m (真の位置からゴールまでの距離) と reached を加えたもの。
+    """
+    with rover_sim.RoverSim(start_heading=start_heading, seed=seed, time_limit_s=time_limit_s) as sim:
+        driver, bno = setup_hardware()
+        if calibration is not None:
+            driver.set_calibration(calibration)
+        b = math.radians(bearing_deg)
+        goal = list(sim.local_to_latlon(distance_m * math.sin(b), distance_m * math.cos(b)))
+        navigator = RoverGPSNavigator(driver, bno, sim.pi, rover_sim.GPS_RX_PIN, 9600, goal)
+        start_time, start_energy = sim.now, sim.energy_j
+        navigator.navigate_to_goal()
+    result = sim.summary()
+    result["time_s"] -= start_time
+    result["energy_j"] -= start_energy
+    result["goal_distance_m"] = sim.distance_to(goal)
+    result["reached"] = not sim.timed_out
+    return result
+
+def run_follow(base_speed=80, duration_time=10.0, loop_hz=20, seed=0):
+    """
+    following.follow_forward() で直進させ、真の方位の目標からのずれと横ずれを測る。
+
+    Returns:
+        dict: RoverSim.summary() に heading_rms_deg, cross_track_m, jitter_p99_ms, overruns を加えたもの。
+    """
+    with rover_sim.RoverSim(seed=seed) as sim:
+        driver, bno = setup_hardware()
+        target = sim.heading
+        start_time, start_energy, start_index = sim.now, sim.energy_j, len(sim.trace)
+        stats = following.follow_forward(driver, bno, base_speed, duration_time, loop_hz=loop_hz)
+    errors = [((h - target + 180) % 360 - 180) for _, _, _, h, _ in sim.trace[start_index:]]
+    result = sim.summary()
+    result["time_s"] -= start_time
+    result["energy_j"] -= start_energy
+    result["heading_rms_deg"] = math.sqrt(statistics.mean(e * e for e in errors))
+    # 目標方位に垂直な方向の位置ずれ (右が正)
+    t = math.radians(target)
+    result["cross_track_m"] = sim.x * math.cos(t) - sim.y * math.sin(t)
+    result["jitter_p99_ms"] = stats.jitter_p99_ms
+    result["overruns"] = stats.overruns
+    return result
+
+if __name__ == "__main__":
+    with contextlib.redirect_stdout(io.StringIO()):
+        calibration = measure_calibration()
+
+    print("=== RoverGPSNavigator ===")
+    print(f"{'dist[m]':>7} | {'bearing':>7} | {'start':>5} | {'time[s]':>8} | {'energy[J]':>9} | {'path[m]':>7} | {'goal err[m]':>11} | reached")
+    for distance_m, bearing_deg, start_heading in GOAL_CASES:
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = run_navigation(distance_m, bearing_deg, start_heading, calibration)
+        print(f"{distance_m:>7.0f} | {bearing_deg:>7.0f} | {start_heading:>5.0f} | {r['time_s']:>8.1f} | {r['energy_j']:>9.1f} | "
+              f"{r['distance_m']:>7.1f} | {r['goal_distance_m']:>11.1f} | {'yes' if r['reached'] else 'NO'}")
+
+    print("\n=== following.follow_forward (10秒) ===")
+    print(f"{'speed':>5} | {'loop[Hz]':>8} | {'heading rms[deg]':>16} | {'cross track[m]':>14} | {'energy[J]':>9} | {'jitter p99[ms]':>14} | overruns")
+    for base_speed in (60, 80):
+        for loop_hz in (10, 20, 50):
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = run_follow(base_speed, loop_hz=loop_hz)
+            print(f"{base_speed:>5} | {loop_hz:>8} | {r['heading_rms_deg']:>16.2f} | {r['cross_track_m']:>+14.2f} | "
+                  f"{r['energy_j']:>9.1f} | {r['jitter_p99_ms']:>14.2f} | {r['overruns']:>8}")
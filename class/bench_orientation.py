@@ -0,0 +1,43 @@
+import cv2
+import color_classifier
+from camera_orientation import Orientation, IDENTITY
+from frame_analysis import FrameAnalysis
+from bench_color_classifier import make_scene
+from bench_lores import rgb_to_yuv420, time_ms
+
+# 画像を回転・反転してから解析する場合 (従来) と、センサーの向きのまま解析して結果の座標だけを
+# 変換する場合 (camera_orientation) の比較。1回の検出 (割合・5列の密度・2x3のセル) の時間と、結果が一致するか。
+
+ORIENTATIONS = {
+    "回転のみ (RedConeNavigator)": (cv2.ROTATE_90_COUNTERCLOCKWISE, None),
+    "回転+左右反転 (パラシュート回避)": (cv2.ROTATE_90_COUNTERCLOCKWISE, 1),
+}
+
+def rotate_then_analyze(frame, classifier, rotate, flip):
+    if frame.ndim == 2: # YUV420はそのままでは回せないので、従来どおりRGBへ変換してから回す
+        frame = cv2.cvtColor(frame, cv2.COLOR_YUV2RGB_I420)
+        classifier = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    frame = Orientation.from_cv2(rotate, flip).apply(frame)
+    return query(FrameAnalysis(frame, classifier, orientation=IDENTITY))
+
+def analyze_in_sensor_space(frame, classifier, rotate, flip):
+    return query(FrameAnalysis(frame, classifier, orientation=Orientation.from_cv2(rotate, flip)))
+
+def query(analysis):
+    return analysis.percentage, analysis.column_densities(5), analysis.grid_ratios(2, 3)
+
+if __name__ == "__main__":
+    rgb = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    yuv = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="YUV")
+    frame = make_scene(640, 480)
+    inputs = {"main RGB 640x480": (frame, rgb), "lores YUV420 320x240": (rgb_to_yuv420(frame), yuv)}
+
+    print(f"{'orientation':<32} | {'input':<20} | {'回転してから[ms]':>14} | {'座標だけ変換[ms]':>14}")
+    for name, (rotate, flip) in ORIENTATIONS.items():
+        for input_name, (image, classifier) in inputs.items():
+            before = time_ms(rotate_then_analyze, image, classifier, rotate, flip)
+            after = time_ms(analyze_in_sensor_space, image, classifier, rotate, flip)
+            print(f"{name:<32} | {input_name:<20} | {before:>14.2f} | {after:>14.2f}")
+
+    ok = all(rotate_then_analyze(frame, rgb, *o) == analyze_in_sensor_space(frame, rgb, *o) for o in ORIENTATIONS.values())
+    print(f"\n{'✅' if ok else '🔴'} main RGBで割合・列の密度・セルの割合が回転してからの解析と一致")
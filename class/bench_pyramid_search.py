@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import tempfile
+import cv2
+import numpy as np
+import color_classifier
+import vision_bench
+from frame_analysis import FrameAnalysis
+from pyramid_search import PyramidSearch, format_pyramid_stats
+
+# 360度の探索で、フレーム全体を判定する場合と PyramidSearch (80x60で候補を探してROIだけ判定) の比較
+# vision_bench のコーパス (引数で指定、省略時は合成コーパスを作る) の全フレームを探索中の撮影とみなして、
+# 1フレームあたりの時間・1回転分の合計時間・赤色の割合の差・検出 (0.2%超) の一致を求める。
+# サイズは RedConeNavigator の main (640x480)、GDA2 の main (320x480)、RedConeNavigator の既定 (320x240)。
+#
+# 使い方:
+#   python bench_pyramid_search.py [/home/mark1/vision_corpus]
+
+SIZES = ((640, 480), (320, 480), (320, 240))
+PRESENT_PERCENTAGE = 0.2
+REPEAT = 5
+
+def load_corpus(directory):
+    frames = []
+    for name, label in vision_bench.load_labels(directory):
+        frame = vision_bench.read_frame(directory, name)
+        if frame is not None:
+            frames.append((label, frame))
+    return frames
+
+def best_ms(fn, frame):
+    elapsed = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn(frame)
+        elapsed.append((time.perf_counter() - start) * 1000)
+    return min(elapsed), result
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        directory = sys.argv[1]
+    else:
+        directory = os.path.join(tempfile.gettempdir(), "bench_pyramid_corpus")
+        if not os.path.exists(os.path.join(directory, vision_bench.LABELS_FILE)):
+            vision_bench.synth(directory, count=48)
+    corpus = load_corpus(directory)
+    red = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    print(f"コーパス: {directory} ({len(corpus)}フレーム, 赤コーン {sum(l['target'] == 'red_cone' for l, _ in corpus)}枚)")
+
+    ok = True
+    for width, height in SIZES:
+        frames = [(label, cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)) for label, frame in corpus]
+        full = lambda f: FrameAnalysis(f, red, blur_ksize=5).percentage
+        full(frames[0][1])
+        PyramidSearch(red).analyze(frames[0][1]) # 緩めた分類器の表の作成を測定から外す (2回目からはキャッシュ)
+        search = PyramidSearch(red)
+        pyramid = lambda f: search.analyze(f).percentage
+        full_ms, pyramid_ms, worst, mismatches = [], [], 0.0, 0
+        for label, frame in frames:
+            t_full, p_full = best_ms(full, frame)
+            t_pyr, p_pyr = best_ms(pyramid, frame)
+            full_ms.append(t_full)
+            pyramid_ms.append(t_pyr)
+            worst = max(worst, abs(p_full - p_pyr))
+            mismatches += (p_full > PRESENT_PERCENTAGE) != (p_pyr > PRESENT_PERCENTAGE)
+        empty = [i for i, (label, _) in enumerate(frames) if label["target"] != "red_cone"]
+        reduction = 1 - sum(pyramid_ms) / sum(full_ms)
+        print(f"\n--- {width}x{height} ---")
+        print(format_pyramid_stats(search.stats()))
+        print(f"1フレーム (p50): 全体 {np.median(full_ms):.2f}ms → 2段 {np.median(pyramid_ms):.2f}ms, "
+              f"赤コーンの無いフレーム: {np.mean([full_ms[i] for i in empty]):.2f}ms → "
+              f"{np.mean([pyramid_ms[i] for i in empty]):.2f}ms")
+        print(f"コーパス全体 (1回転 {len(frames)}方向とみなす): {sum(full_ms):.1f}ms → {sum(pyramid_ms):.1f}ms "
+              f"({reduction:.0%} 短縮)")
+        good = mismatches == 0 and worst < 0.05
+        ok = ok and good and reduction > 0
+        print(f"{'✅' if good else '🔴'} 赤色割合の差の最大値 {worst:.3f}%ポイント, 検出 ({PRESENT_PERCENTAGE}%超) の不一致 {mismatches}フレーム")
+    print(f"\n{'✅' if ok else '🔴'} どのサイズでも検出結果を変えずに探索時間を短縮")
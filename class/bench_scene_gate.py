@@ -0,0 +1,59 @@
+import time
+import cv2
+import numpy as np
+import color_classifier
+from frame_analysis import FrameAnalysis
+from scene_gate import SceneGate, format_gate_stats
+from bench_color_classifier import make_scene
+
+# 停止と小刻みな移動を繰り返す検出ループで、SceneGate がどれだけ検出を間引けるかと、間引いても結果が変わらないか
+# 1パルスごとに車体が動いて (画像を横にずらして模擬) から、停止して落ち着く間に4フレーム撮影する。
+# 停止中のフレームはセンサーノイズだけが違う。1/4のパルスはデッドバンドで車体が動かなかったものとする。
+# 最後に、止まったまま小さいコーン (画面の約0.4%、芝生と明るさがほぼ同じ) が視野に入った場合に、検出をやり直すかを確かめる。
+
+WIDTH, HEIGHT = 640, 480
+PULSES = 40
+FRAMES_PER_PULSE = 4
+NOISE = 3.0
+
+def detect(frame, classifier):
+    analysis = FrameAnalysis(frame, classifier, blur_ksize=5)
+    return analysis.percentage, analysis.best_column(5, 0.05)
+
+def noisy(frame, rng):
+    return np.clip(frame + rng.normal(0, NOISE, frame.shape), 0, 255).astype(np.uint8)
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    classifier = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="RGB")
+    base = make_scene(WIDTH * 2, HEIGHT, seed=1).astype(np.float32)
+    gate = SceneGate()
+    offset, worst_diff, fresh_s = 0, 0.0, 0.0
+    for pulse in range(PULSES):
+        if pulse % 4 != 3: # デッドバンドで動かなかったパルス以外は視野がずれる
+            offset += int(rng.integers(20, 60))
+        scene = np.roll(base, -offset, axis=1)[:, :WIDTH]
+        for _ in range(FRAMES_PER_PULSE):
+            frame = noisy(scene, rng)
+            result = gate.run(frame, lambda f: detect(f, classifier))
+            start = time.perf_counter()
+            expected = detect(frame, classifier)
+            fresh_s += time.perf_counter() - start
+            worst_diff = max(worst_diff, abs(result[0] - expected[0]))
+    s = gate.stats()
+    print(format_gate_stats(s))
+    print(f"毎フレーム検出した場合の合計 {fresh_s * 1000:.0f}ms に対して、間引きで {s['saved_s'] / fresh_s:.0%} を節約")
+    print(f"{'✅' if worst_diff < 0.5 else '🔴'} 間引いたフレームの赤色割合と、検出し直した場合の差の最大値: {worst_diff:.3f}%ポイント")
+
+    # 止まったまま小さいコーンが視野に入る
+    empty = np.full((HEIGHT, WIDTH, 3), (70, 110, 50), np.float32)
+    with_cone = empty.copy()
+    cv2.fillPoly(with_cone, [np.array([[560, 300], [540, 360], [580, 360]], np.int32)], (200, 30, 25))
+    gate = SceneGate()
+    gate.run(noisy(empty, rng), lambda f: detect(f, classifier))
+    before = gate.processed
+    gate.run(noisy(empty, rng), lambda f: detect(f, classifier))
+    unchanged_skipped = gate.processed == before
+    gate.run(noisy(with_cone, rng), lambda f: detect(f, classifier))
+    ok = unchanged_skipped and gate.processed == before + 1 and gate.last_reason == "画像の変化"
+    print(f"{'✅' if ok else '🔴'} 同じ景色は間引き、小さいコーン ({1200 / (WIDTH * HEIGHT):.1%}) が入ったら検出し直す")
@@ -0,0 +1,196 @@
+import io
+import os
+import sys
+import time
+import tempfile
+import contextlib
+import cv2
+import numpy as np
+import replay_camera
+replay_camera.install_fake_modules()
+import vision_bench
+import shape_classifier
+
+# shape_classifier (特徴量1回 + テンプレートの比較) と、以前の approxPolyDP の頂点数による判別の、
+# 輪郭1つあたりの時間と正解率の比較
+#   - コーパス: vision_bench のコーパス (引数で指定、省略時は合成) のフラッグの中の図形の輪郭
+#               (Flag_Detector6 が判別に渡す輪郭をそのまま集める。正解はフレームのラベル)
+#   - 合成: 黒い板の上の白い図形を小さく (一辺16〜60画素) 回転・ぼかし・ノイズ付きで描いて取り直した輪郭と、
+#           図形ではない白い物 (楕円・丸の集まり) の輪郭。図形ではない物は「不明」と答えれば正解
+#   - 大きい図形: 近くのフラッグのように大きく (250〜900画素) 写った、角の丸まりもノイズも無い図形。
+#                 大きさがテンプレートの範囲を超えても正しく判別できることを確かめる
+# 以前の判別は Flag_Detector5 (許容誤差0.03 + 垂心)、Flag_Detector2 (0.04 で2回、三角形と長方形だけ)、
+# Flag_hyper (0.02、頂点数8をT字・12を十字) のもの。
+#
+# 使い方:
+#   python bench_shape_classifier.py [/home/mark1/vision_corpus]
+
+SYNTH_PER_SHAPE = 150
+REPEAT = 5
+LARGE_SIZES_PX = (250, 350, 450, 640, 900)
+LARGE_SCORE_MIN = 0.5
+UNKNOWN_NAMES = (shape_classifier.UNKNOWN, "多角形", None)
+
+# ---------------- 以前の判別 (比較用にそのまま残す) ----------------
+
+def legacy_flag_detector2(contour):
+    """Flag_Detector2 の判別: 三角形用と長方形用に approxPolyDP を2回。"""
+    epsilon = 0.04 * cv2.arcLength(contour, True)
+    triangle = cv2.approxPolyDP(contour, epsilon, True)
+    rectangle = cv2.approxPolyDP(contour, epsilon, True)
+    if len(triangle) == 3:
+        return "三角形"
+    if len(rectangle) == 4:
+        x, y, w, h = cv2.boundingRect(rectangle)
+        if h > 0 and 0.5 <= w / h <= 2.0:
+            return "長方形"
+    return None
+
+def legacy_vertex_count(contour):
+    """Flag_hyper の classify_by_vertex_count: 頂点数 3/4/8/12 を 三角形/長方形/T字/十字 とみなす。"""
+    approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+    return {3: "三角形", 4: "長方形", 8: "T字", 12: "十字"}.get(len(approx), "多角形")
+
+def flag_detector5_classifier():
+    """Flag_Detector5 の _classify_shape (カメラを使わないのでインスタンスは作らずに呼ぶ)。"""
+    module = vision_bench.load_module(os.path.join(vision_bench.ROOT_DIR, "Flag_Detector5.py"), "bench_Flag_Detector5")
+    detector = module.FlagDetector.__new__(module.FlagDetector)
+    detector.triangle_tolerance = 0.3
+
+    def classify(contour):
+        name, _ = detector._classify_shape(contour)
+        return "三角形" if name == "正三角形" else name
+    return classify
+
+# ---------------- 輪郭の用意 ----------------
+
+def corpus_contours(directory):
+    """Flag_Detector6 が判別に渡す輪郭と、そのフレームのラベルの図形名。"""
+    camera = replay_camera.ReplayCamera()
+    module = vision_bench.load_module(os.path.join(vision_bench.ROOT_DIR, "Flag_Detector6.py"), "bench_Flag_Detector6")
+    module.Picamera2 = lambda *args, **kwargs: camera
+    module.sleep = lambda seconds: None
+    with contextlib.redirect_stdout(io.StringIO()):
+        detector = module.FlagDetector()
+    collected, label = [], {}
+    classify = detector._classify_shape
+
+    def recording(contour):
+        collected.append((contour, label["shape"]))
+        return classify(contour)
+    detector._classify_shape = recording
+    for name, label in vision_bench.load_labels(directory):
+        if label["target"] != "flag":
+            continue
+        camera.load(vision_bench.read_frame(directory, name))
+        with contextlib.redirect_stdout(io.StringIO()):
+            detector.detect()
+    return collected
+
+def _camera_contour(polygon, rng):
+    """黒い板に白い多角形 (複数可) を描き、ぼかし・ノイズを加えてから Flag_Detector と同じ閾値で取り直した輪郭。"""
+    size = 100
+    canvas = np.full((size, size), 18, np.float32)
+    for points in polygon:
+        cv2.fillPoly(canvas, [np.round(points * 16).astype(np.int32)], 235, cv2.LINE_AA, shift=4)
+    k = int(rng.choice([1, 3, 5]))
+    canvas = cv2.GaussianBlur(canvas, (k, k), 0) if k > 1 else canvas
+    canvas = np.clip(canvas + rng.normal(0, 6, canvas.shape), 0, 255).astype(np.uint8)
+    _, binary = cv2.threshold(canvas, 150, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return max(contours, key=cv2.contourArea) if contours else None
+
+def _place(points, size_px, angle_deg, center=(50, 50)):
+    angle = np.radians(angle_deg)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    return points @ rotation.T * (size_px / 2) + center
+
+def synthetic_contours(seed=0):
+    rng = np.random.default_rng(seed)
+    collected = []
+    for name in shape_classifier.SHAPES:
+        for _ in range(SYNTH_PER_SHAPE):
+            kwargs = {"三角形": {"apex_deg": rng.uniform(50, 80)}, "長方形": {"aspect": rng.uniform(1.0, 2.0)},
+                      "T字": {"thickness": rng.uniform(0.28, 0.38)}, "十字": {"thickness": rng.uniform(0.28, 0.38)}}[name]
+            points = _place(shape_classifier.shape_polygon(name, **kwargs), rng.uniform(16, 60), rng.uniform(-30, 30))
+            contour = _camera_contour([points], rng)
+            if contour is not None:
+                collected.append((contour, name))
+    for i in range(SYNTH_PER_SHAPE): # 図形ではない白い物
+        if i % 2 == 0:
+            t = np.linspace(0, 2 * np.pi, 40, endpoint=False)
+            a, b = rng.uniform(8, 25), rng.uniform(5, 20)
+            polygons = [np.stack([50 + a * np.cos(t), 50 + b * np.sin(t)], axis=1)]
+        else:
+            t = np.linspace(0, 2 * np.pi, 20, endpoint=False)
+            polygons = [np.stack([50 + rng.uniform(-12, 12) + r * np.cos(t), 50 + rng.uniform(-12, 12) + r * np.sin(t)],
+                                 axis=1) for r in rng.uniform(5, 10, 3)]
+        contour = _camera_contour(polygons, rng)
+        if contour is not None:
+            collected.append((contour, None))
+    return collected
+
+def large_shapes():
+    """大きく描いた図形の (大きさ [px], 正解の図形名, 判別結果) のリスト。"""
+    results = []
+    for size_px in LARGE_SIZES_PX:
+        for name in shape_classifier.SHAPES:
+            for angle in (0, 20, 45):
+                contour = shape_classifier._render_contour(shape_classifier.shape_polygon(name), size_px, angle)
+                results.append((size_px, name, shape_classifier.classify(contour)))
+    return results
+
+# ---------------- 比較 ----------------
+
+def evaluate(classify, contours):
+    """(正解率, 輪郭1つあたりの時間 [us])。図形ではない物は「不明」系の答えを正解とする。"""
+    correct = 0
+    for contour, expected in contours:
+        name = classify(contour)
+        correct += (name in UNKNOWN_NAMES) if expected is None else (name == expected)
+    elapsed = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for contour, _ in contours:
+            classify(contour)
+        elapsed.append(time.perf_counter() - start)
+    return correct / len(contours), min(elapsed) / len(contours) * 1e6
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        directory = sys.argv[1]
+    else:
+        directory = os.path.join(tempfile.gettempdir(), "bench_shape_corpus")
+        if not os.path.exists(os.path.join(directory, vision_bench.LABELS_FILE)):
+            vision_bench.synth(directory, count=64)
+
+    start = time.perf_counter()
+    shape_classifier.classify(np.array([[[0, 0]], [[10, 0]], [[0, 10]]], np.int32))
+    print(f"テンプレートの作成: {(time.perf_counter() - start) * 1000:.1f}ms (最初の1回だけ)")
+
+    methods = {
+        "shape_classifier": lambda c: shape_classifier.classify(c).name,
+        "Flag_Detector5 (頂点数+垂心)": flag_detector5_classifier(),
+        "Flag_Detector2 (頂点数x2)": legacy_flag_detector2,
+        "Flag_hyper (頂点数)": legacy_vertex_count,
+    }
+    sets = {"コーパス": corpus_contours(directory), "合成 (小さい・回転・ぼかし)": synthetic_contours()}
+    scores = {}
+    for set_name, contours in sets.items():
+        shapes = sum(expected is not None for _, expected in contours)
+        print(f"\n--- {set_name}: 図形 {shapes}個, 図形ではない物 {len(contours) - shapes}個 ---")
+        for method, classify in methods.items():
+            accuracy, us = evaluate(classify, contours)
+            scores[(set_name, method)] = accuracy
+            print(f"{method:<28} 正解率 {accuracy:6.1%}  {us:6.1f}us/輪郭")
+
+    ok = all(scores[(s, "shape_classifier")] >= max(v for (s2, m), v in scores.items() if s2 == s) for s in sets)
+    print(f"\n{'✅' if ok else '🔴'} どちらの輪郭でも shape_classifier の正解率が最も高い")
+
+    large = large_shapes()
+    for size_px in LARGE_SIZES_PX:
+        matches = [(name, match) for size, name, match in large if size == size_px]
+        correct = sum(match.name == name for name, match in matches)
+        print(f"大きい図形 {size_px:>4}px: 正解 {correct}/{len(matches)}, 最小スコア {min(m.score for _, m in matches):.3f}")
+    ok = all(match.name == name and match.score >= LARGE_SCORE_MIN for _, name, match in large)
+    print(f"{'✅' if ok else '🔴'} 大きく写った図形 (最大 {LARGE_SIZES_PX[-1]}px) も正しく判別できる (スコア {LARGE_SCORE_MIN} 以上)")
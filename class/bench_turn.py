@@ -0,0 +1,111 @@
+import time
+import statistics
+import contextlib
+import io
+import rover_sim
+rover_sim.install_fake_modules()
+from motor import MotorDriver
+from BNO055 import BNO055
+from turn_controller import TurnController, wrap_angle
+from drive_calibration import calibrate_drive
+
+# 回頭制御の時間・消費電力量の比較 (rover_simによるシミュレーション)
+# 従来のパルス＆スリープ方式とTurnController (連続PID) で90度回頭などにかかる時間を比べる
+# MotorDriver/BNO055は実機と同じコードを、偽のpigpio/smbusと仮想時計の上で動かす
+# turn_controller_uncal はキャリブレーションを読み込まない呼び出し側 (nonstuck_EE など) と同じく恒等テーブルのまま回す
+
+# --- 比較対象: 従来の回頭ループ (GDA2.GDA.turn_to_heading と parashute_avoidance の旧実装) ---
+def legacy_gda_turn(driver, bno, target_heading, speed=90, tolerance=10, timeout_s=60):
+    start = time.monotonic()
+    while time.monotonic() - start < timeout_s:
+        delta = wrap_angle(target_heading - bno.get_heading())
+        if abs(delta) < tolerance:
+            driver.motor_stop_brake()
+            time.sleep(0.5)
+            break
+        if delta > 0:
+            driver.petit_right(0, speed)
+            driver.petit_right(speed, 0)
+        else:
+            driver.petit_left(0, speed)
+            driver.petit_left(speed, 0)
+        driver.motor_stop_brake()
+        time.sleep(1.0)
+        time.sleep(0.05)
+    return wrap_angle(target_heading - bno.get_heading())
+
+def legacy_relative_turn(driver, bno, target_heading, speed=90, tolerance=10, max_attempts=100):
+    for _ in range(max_attempts):
+        error = wrap_angle(target_heading - bno.get_heading())
+        if abs(error) <= tolerance:
+            driver.motor_stop_brake()
+            time.sleep(0.5)
+            break
+        duration = 0.02 + (abs(error) / 180.0) * 0.2
+        if error < 0:
+            driver.petit_left(0, speed)
+            driver.petit_left(speed, 0)
+        else:
+            driver.petit_right(0, speed)
+            driver.petit_right(speed, 0)
+        time.sleep(duration)
+        driver.motor_stop_brake()
+        time.sleep(0.05)
+    return wrap_angle(target_heading - bno.get_heading())
+
+def setup_hardware():
+    """シミュレーション中に実機と同じ手順でMotorDriverとBNO055を初期化する。"""
+    driver = MotorDriver(**rover_sim.MOTOR_PINS)
+    bno = BNO055()
+    bno.begin()
+    bno.setExternalCrystalUse(True)
+    return driver, bno
+
+def measure_calibration(seed=0):
+    """実機と同じ手順 (drive_calibration.calibrate_drive) でモデルのデッドバンドと左右差を測る。"""
+    with rover_sim.RoverSim(seed=seed):
+        driver, bno = setup_hardware()
+        return calibrate_drive(driver, bno)
+
+def run_case(method, angle, calibration, seed=0):
+    """
+    1回分の回頭をシミュレーションする。
+
+    Returns:
+        tuple: (所要時間[s], 最終誤差[deg], 消費電力量[J])
+    """
+    with rover_sim.RoverSim(seed=seed) as sim:
+        driver, bno = setup_hardware()
+        if calibration is not None:
+            driver.set_calibration(calibration)
+        target = (sim.heading + angle) % 360
+        start_time, start_energy = sim.now, sim.energy_j
+        if method.startswith("turn_controller"):
+            TurnController(driver, bno).turn_to_heading(target, speed=90)
+        elif method == "legacy_gda":
+            legacy_gda_turn(driver, bno, target)
+        else:
+            legacy_relative_turn(driver, bno, target)
+        # 停止後の惰性も含めた最終誤差
+        time.sleep(0.5)
+        return sim.now - start_time, wrap_angle(target - sim.heading), sim.energy_j - start_energy
+
+if __name__ == "__main__":
+    with contextlib.redirect_stdout(io.StringIO()):
+        calibration = measure_calibration()
+
+    angles = [10, 15, 30, 45, 90, 120, 180, -10, -30, -90]
+    methods = ["legacy_gda", "legacy_relative", "turn_controller", "turn_controller_uncal"]
+    print(f"{'method':<21} | {'angle':>6} | {'time[s]':>8} | {'error[deg]':>10} | {'energy[J]':>9}")
+    summary = {m: [] for m in methods}
+    for method in methods:
+        for angle in angles:
+            with contextlib.redirect_stdout(io.StringIO()):
+                elapsed, error, energy = run_case(method, angle, None if method.endswith("_uncal") else calibration)
+            summary[method].append((elapsed, abs(error), energy))
+            print(f"{method:<21} | {angle:>6} | {elapsed:>8.2f} | {error:>+10.1f} | {energy:>9.1f}")
+    print()
+    for method in methods:
+        times, errors, energies = zip(*summary[method])
+        print(f"{method:<21}: 平均所要時間 {statistics.mean(times):.2f}秒, "
+              f"平均誤差 {statistics.mean(errors):.1f}度, 平均消費電力量 {statistics.mean(energies):.1f}J")
@@ -0,0 +1,90 @@
+import os
+import time
+from bench_color_classifier import make_scene
+from rate_loop import FixedRateLoop, format_stats
+from vision_worker import VisionWorker, PIPELINES
+
+# 50Hzの制御ループの中で10Hzのカメラのフレームを検出するときの、制御ループの乱れを比べる
+#   - inline: 従来どおり制御ループのスレッドで検出する (赤色の割合 + 2x3グリッド)
+#   - worker: VisionWorker に submit() して、制御ループは latest() で最新の結果を読むだけ
+# 640x480 (mainのRGB) の合成画像を使う。Raspberry Pi 4 は4コアなので、ワーカーは別のコアで動く。
+# 最後に、両方の方法でフレームごとの結果が一致するかを確かめる。
+# (1コアの環境ではワーカーとOSのスケジューラでCPUを分け合うため、ジッタの改善は小さく見える)
+
+RATE_HZ = 50
+FRAME_EVERY = 5       # 5周期に1回 (10Hz) 新しいフレームが届く
+DURATION = 5.0
+PIPELINE_CONFIG = {
+    "red": ("red_percentage", {}),
+    "grid": ("grid_occupancy", {"rows": 2, "cols": 3}),
+}
+
+def control_step():
+    """モーター・IMUの制御の代わりの軽い処理。"""
+    return sum(i * i for i in range(200))
+
+def run_inline(frames):
+    runners = {name: PIPELINES[kind](**kwargs) for name, (kind, kwargs) in PIPELINE_CONFIG.items()}
+    loop = FixedRateLoop(RATE_HZ)
+    end = time.monotonic() + DURATION
+    i, busy, outputs = 0, [], {}
+    while time.monotonic() < end:
+        control_step()
+        if i % FRAME_EVERY == 0:
+            index = (i // FRAME_EVERY) % len(frames)
+            t0 = time.perf_counter()
+            outputs[index] = {name: run(frames[index]) for name, run in runners.items()}
+            busy.append(time.perf_counter() - t0)
+        i += 1
+        loop.wait()
+    return loop.stats(), busy, None, outputs
+
+def run_worker(frames):
+    with VisionWorker(frames[0].shape, pipelines=PIPELINE_CONFIG) as worker:
+        loop = FixedRateLoop(RATE_HZ)
+        end = time.monotonic() + DURATION
+        i, busy, outputs = 0, [], {}
+        while time.monotonic() < end:
+            control_step()
+            if i % FRAME_EVERY == 0:
+                index = (i // FRAME_EVERY) % len(frames)
+                t0 = time.perf_counter()
+                worker.submit(frames[index], source_seq=index)
+                busy.append(time.perf_counter() - t0)
+            result = worker.latest()
+            if result is not None and not result.error:
+                outputs[result.source_seq] = result.values
+            i += 1
+            loop.wait()
+        result = worker.wait_result(worker.submitted - 1, timeout=1.0)
+        if result is not None and not result.error:
+            outputs[result.source_seq] = result.values
+        return loop.stats(), busy, worker.stats(), outputs
+
+if __name__ == "__main__":
+    frames = [make_scene(640, 480, seed=s) for s in range(4)]
+    print(f"CPU: {os.cpu_count()}コア, 制御ループ {RATE_HZ}Hz, フレーム {RATE_HZ // FRAME_EVERY}Hz, {DURATION:.0f}秒\n")
+    outputs = {}
+    for name, run in (("inline", run_inline), ("worker", run_worker)):
+        loop_stats, busy, worker_stats, outputs[name] = run(frames)
+        busy_ms = sorted(b * 1000 for b in busy)
+        print(format_stats(loop_stats, name))
+        print(f"  制御ループのスレッドがフレームごとに止まる時間: p50 {busy_ms[len(busy_ms) // 2]:.2f}ms / 最大 {busy_ms[-1]:.2f}ms")
+        print(f"  ヒストグラム (1ms刻み): {loop_stats.histogram}")
+        if worker_stats:
+            print(f"  投入 {worker_stats['submitted']}, 処理 {worker_stats['processed']}, "
+                  f"取りこぼし {worker_stats['dropped']}, エラー {worker_stats['errors']}, "
+                  f"キューの深さ {worker_stats['queue_depth']}")
+            print(f"  遅延 p50 {worker_stats['latency_p50_ms']:.1f}ms / p99 {worker_stats['latency_p99_ms']:.1f}ms, "
+                  f"処理時間 p50 {worker_stats['processing_p50_ms']:.1f}ms")
+
+    common = sorted(set(outputs["inline"]) & set(outputs["worker"]))
+    mismatched = [index for index in common if outputs["inline"][index] != outputs["worker"][index]]
+    if not common:
+        print("\n⚠️ inline と worker で共通のフレームの結果がありません")
+    elif mismatched:
+        print(f"\n🔴 inline と worker の結果が一致しません: フレーム {mismatched}")
+        for index in mismatched:
+            print(f"  inline: {outputs['inline'][index]}\n  worker: {outputs['worker'][index]}")
+    else:
+        print(f"\n✅ inline と worker の結果が一致 ({len(common)}フレーム)")
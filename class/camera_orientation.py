@@ -0,0 +1,158 @@
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# カメラの取り付け向き (画像の回転・反転) を1か所で扱うモジュール
+# 以前は検出のたびに cv2.rotate / cv2.flip で画像全体をコピーしていた。
+# 左右・上下の反転は libcamera.Transform でISPに任せ (コピーなし)、ISPにできない90度回転 (転置) は
+# 画像を回さずに、検出結果の座標・列番号・セルの範囲だけを表示の向きに変換する。
+# Raspberry PiのISPは hflip/vflip (と180度回転) のみ対応で、転置 (90度/270度回転) はできない。
+#
+# 使い方:
+#   config = picam2.create_still_configuration(transform=camera_orientation.hardware_transform(ROVER))
+#   orientation = camera_orientation.residual(picam2, ROVER)   # ISPで処理しきれなかった残りの変換
+#   analysis = FrameAnalysis(frame, classifier, orientation=orientation)
+
+class Orientation(namedtuple("Orientation", ["transpose", "flip_x", "flip_y"])):
+    """
+    センサーの向きの画像 S から表示の向きの画像 D への変換。
+    D は S を (transposeなら) 転置してから、flip_x で左右、flip_y で上下に反転したもの。
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_cv2(cls, rotate=None, flip=None):
+        """
+        cv2.rotate の回転コードと cv2.flip の flipCode (回転の後に反転) から作る。
+
+        Args:
+            rotate (int): cv2.ROTATE_90_COUNTERCLOCKWISE などの回転コード。Noneなら回転しない。
+            flip (int): 1で左右、0で上下、-1で両方を反転。Noneなら反転しない。
+        """
+        transpose, flip_x, flip_y = {
+            None: (False, False, False),
+            cv2.ROTATE_90_CLOCKWISE: (True, True, False),
+            cv2.ROTATE_90_COUNTERCLOCKWISE: (True, False, True),
+            cv2.ROTATE_180: (False, True, True),
+        }[rotate]
+        if flip is not None:
+            flip_x ^= flip != 0
+            flip_y ^= flip <= 0
+        return cls(transpose, flip_x, flip_y)
+
+    @property
+    def is_identity(self):
+        return not any(self)
+
+    def display_shape(self, shape):
+        """センサーの向きの (高さ, 幅) から、表示の向きの (高さ, 幅) を求める。"""
+        height, width = shape[:2]
+        return (width, height) if self.transpose else (height, width)
+
+    def apply(self, image):
+        """画像そのものを表示の向きにする (画像全体をコピーするので、デバッグ画像の保存など人が見るときだけ使う)。"""
+        if self.transpose:
+            image = cv2.transpose(image)
+        if self.flip_x and self.flip_y:
+            image = cv2.flip(image, -1)
+        elif self.flip_x:
+            image = cv2.flip(image, 1)
+        elif self.flip_y:
+            image = cv2.flip(image, 0)
+        return image
+
+    def to_display(self, x, y, shape):
+        """センサーの向きの画素座標 (x, y) を表示の向きの座標にする (x, y はスカラーでも配列でもよい)。"""
+        if self.transpose:
+            x, y = y, x
+        height, width = self.display_shape(shape)
+        if self.flip_x:
+            x = width - 1 - x
+        if self.flip_y:
+            y = height - 1 - y
+        return x, y
+
+    def points_to_display(self, points, shape):
+        """輪郭などの点列 (..., 2) を表示の向きの座標にした新しい配列を返す。"""
+        x, y = self.to_display(points[..., 0], points[..., 1], shape)
+        return np.stack([x, y], axis=-1).astype(points.dtype, copy=False)
+
+    def to_sensor_rect(self, y0, y1, x0, x1, shape):
+        """表示の向きの矩形 [y0, y1) x [x0, x1) に対応する、センサーの向きの矩形 (y0, y1, x0, x1)。"""
+        height, width = self.display_shape(shape)
+        if self.flip_x:
+            x0, x1 = width - x1, width - x0
+        if self.flip_y:
+            y0, y1 = height - y1, height - y0
+        if self.transpose:
+            return x0, x1, y0, y1
+        return y0, y1, x0, x1
+
+    def sensor_bounds(self, row_bounds, col_bounds, shape):
+        """
+        表示の向きのグリッドの境界 (行, 列) を、センサーの向きのグリッドの境界 (行, 列) にする。
+        求めたグリッドで集計した結果は grid_to_display() で表示の向きに並べ替える。
+        """
+        height, width = self.display_shape(shape)
+        if self.flip_x:
+            col_bounds = [width - x for x in reversed(col_bounds)]
+        if self.flip_y:
+            row_bounds = [height - y for y in reversed(row_bounds)]
+        if self.transpose:
+            return col_bounds, row_bounds
+        return row_bounds, col_bounds
+
+    def grid_to_display(self, grid):
+        """センサーの向きのグリッドで集計した2次元配列を、表示の向きのセルの並びにする。"""
+        if self.transpose:
+            grid = grid.T
+        if self.flip_x:
+            grid = grid[:, ::-1]
+        if self.flip_y:
+            grid = grid[::-1]
+        return grid
+
+    def column_profile(self, mask):
+        """表示の向きで左から並べた、列ごとの非ゼロ画素数 (マスクを回転せずに求める)。"""
+        sums = np.count_nonzero(mask, axis=1 if self.transpose else 0)
+        return sums[::-1] if self.flip_x else sums
+
+    def hardware_flips(self):
+        """
+        ISPに任せる反転 (hflip, vflip)。これを適用した後に残る変換は転置だけになる。
+        (転置の前の左右反転は転置の後の上下反転と同じなので、転置するときはhflip/vflipを入れ替える)
+        """
+        if self.transpose:
+            return self.flip_y, self.flip_x
+        return self.flip_x, self.flip_y
+
+    def after_hardware(self, hflip=False, vflip=False):
+        """ISPで (hflip, vflip) を適用済みの画像に対して、残りに必要な変換。"""
+        if self.transpose:
+            return Orientation(True, self.flip_x ^ vflip, self.flip_y ^ hflip)
+        return Orientation(False, self.flip_x ^ hflip, self.flip_y ^ vflip)
+
+IDENTITY = Orientation(False, False, False)
+# ローバーのカメラの取り付け向き (従来の cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE) と同じ)
+ROVER = Orientation.from_cv2(cv2.ROTATE_90_COUNTERCLOCKWISE)
+
+def hardware_transform(orientation):
+    """orientationのうちISPで処理できる部分 (反転) を libcamera.Transform にする。"""
+    from libcamera import Transform
+    hflip, vflip = orientation.hardware_flips()
+    return Transform(hflip=int(hflip), vflip=int(vflip))
+
+def residual(picam2, orientation):
+    """
+    picam2 (またはFrameSource) に設定済みのTransformを差し引いた、ソフトウェア側で扱う残りの変換。
+    Transformが設定されていなければ orientation がそのまま返る。
+    """
+    try:
+        transform = picam2.camera_config.get("transform")
+    except AttributeError:
+        transform = None
+    if transform is None:
+        return orientation
+    if getattr(transform, "transpose", False):
+        print("⚠️ camera_orientation: 転置を含むTransformには対応していないため、反転のみを差し引きます。")
+    return orientation.after_hardware(bool(getattr(transform, "hflip", False)), bool(getattr(transform, "vflip", False)))
@@ -0,0 +1,77 @@
+import time
+from libcamera import ColorSpace
+import camera_orientation
+
+# 検出用のカメラ設定をまとめたモジュール
+# mainストリーム (RGB) に加えて、小さいloresストリーム (YUV420) を設定する。
+# 検出はloresのY/U/V平面を color_classifier (channel_order="YUV") で直接判定し、
+# mainはデバッグ画像の保存など、人が見るための画像にだけ使う。
+# RGBへの変換が無くなり、1フレームで読むメモリも 640x480x3 (921KB) から 320x240x1.5 (115KB) に減る。
+#
+# 使い方:
+#   picam2 = Picamera2()
+#   camera_setup.configure_detection_camera(picam2, main_size=(640, 480), lores_size=(320, 240))
+#   buffer = picam2.capture_array(camera_setup.DETECTION_STREAM)
+#
+# orientation を渡すと、その反転部分をTransformとしてISPに任せる。残りの転置は
+# camera_orientation.residual(picam2, orientation) で求めて FrameAnalysis に渡す (画像は回さない)。
+
+DETECTION_STREAM = "lores"
+
+def configure_detection_camera(picam2, main_size=(640, 480), lores_size=(320, 240), transform=None,
+                               controls=None, still=True, start=True, settle_s=1.0, orientation=None):
+    """
+    mainストリームとYUV420のloresストリームを設定してカメラを開始する。
+
+    Args:
+        picam2 (Picamera2): まだconfigureしていないPicamera2のインスタンス。
+        main_size (tuple): mainストリームの (幅, 高さ)。デバッグ画像の解像度。
+        lores_size (tuple): loresストリームの (幅, 高さ)。検出に使う解像度。mainより小さくすること。
+                            幅は64の倍数にしておくと、行の余白 (ストライド) が付かず扱いやすい。
+        transform (libcamera.Transform): 画像の回転・反転 (省略時はなし)。
+        controls (dict): 初期のカメラ制御値 (FrameRateなど)。
+        still (bool): Trueならcreate_still_configuration、Falseならcreate_preview_configurationを使う。
+        start (bool): 設定後にカメラを開始するか。
+        settle_s (float): 開始後にAE/AWBが落ち着くまで待つ時間 [s]。
+        orientation (camera_orientation.Orientation): 画像の向き。transformを省略した場合に、
+                                                      このうちISPで処理できる反転をTransformにする。
+
+    Returns:
+        dict: 適用したカメラ設定。
+    """
+    if lores_size[0] > main_size[0] or lores_size[1] > main_size[1]:
+        raise ValueError(f"loresの解像度 {lores_size} はmain {main_size} 以下にしてください。")
+    if lores_size[0] % 64:
+        print(f"⚠️ camera_setup: loresの幅 {lores_size[0]} は64の倍数ではないため、行に余白が付く場合があります。")
+    create = picam2.create_still_configuration if still else picam2.create_preview_configuration
+    kwargs = {
+        "main": {"size": tuple(main_size)},
+        "lores": {"size": tuple(lores_size), "format": "YUV420"},
+        # color_classifier.yuv_to_rgb と同じ フルレンジBT.601 を指定する
+        "colour_space": ColorSpace.Sycc(),
+    }
+    if transform is None and orientation is not None:
+        transform = camera_orientation.hardware_transform(orientation)
+    if transform is not None:
+        kwargs["transform"] = transform
+    if controls:
+        kwargs["controls"] = controls
+    config = create(**kwargs)
+    picam2.configure(config)
+    if start:
+        picam2.start()
+        time.sleep(settle_s)
+    print(f"✅ camera_setup: main {main_size[0]}x{main_size[1]} (デバッグ用), "
+          f"lores {lores_size[0]}x{lores_size[1]} YUV420 (検出用) で設定しました。")
+    return config
+
+def has_lores(picam2):
+    """picam2 (またはFrameSource) にloresストリームが設定されているか。"""
+    try:
+        return bool(picam2.camera_config.get("lores"))
+    except AttributeError:
+        return False
+
+def lores_size(picam2):
+    """loresストリームの (幅, 高さ)。"""
+    return tuple(picam2.camera_config["lores"]["size"])
@@ -0,0 +1,143 @@
+import time
+import numpy as np
+from frame_analysis import FrameAnalysis
+
+# 撮影から色判定までを、フレームごとに配列を確保せずに行うためのモジュール
+# 以前は capture_array() (バッファのコピー) → GaussianBlur → cvtColor → inRange×2 → bitwise_or と、
+# 1フレームの間に画像サイズの配列を何枚も新しく確保していた。Raspberry Pi ではこの確保と解放のたびに
+# メモリの断片化やキャッシュの追い出しが起き、処理時間がばらつく原因になる。
+# CapturePipeline は
+#   - capture_request() で受け取ったバッファをコピーせずに (MappedArray で) そのまま読み、すぐ release() する
+#   - ぼかした画像・分類の作業配列・マスク・積分画像は BufferPool から取り出した同じ配列に dst=/out= で書き込む
+# ので、2フレーム目からは画像サイズの確保が無くなる。
+#
+# 使い方:
+#   pipeline = CapturePipeline(picam2, red_classifier, stream="lores", orientation=orientation)
+#   analysis = pipeline.process()           # FrameAnalysis (マスクは計算済み、カメラのバッファは返却済み)
+#   analysis.percentage, analysis.best_column(5, 0.05)
+#   analysis = pipeline.process(keep_frame=True)   # デバッグ画像も保存するならフレームもプールにコピーして残す
+# プールの配列は次の process() で上書きされるので、前のフレームの FrameAnalysis を持ち越さないこと。
+
+class BufferPool:
+    """
+    名前ごとに、形とdtypeの決まった配列を1回だけ確保して使い回すプール。
+    同じ名前で違う形・dtypeを要求されたとき (解像度を変えたときなど) だけ確保し直す。
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.allocations = 0   # これまでに確保した回数 (2フレーム目以降に増えなければ確保は無い)
+
+    def get(self, name, shape, dtype=np.uint8):
+        """
+        名前nameの配列を返す (中身は前回の値のまま)。
+
+        Args:
+            name (str): 用途ごとの名前 ("blur", "mask" など)。
+            shape (tuple): 配列の形。
+            dtype: 配列の型。
+
+        Returns:
+            np.ndarray: 毎回同じ配列。
+        """
+        shape = tuple(shape)
+        dtype = np.dtype(dtype)
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype)
+            self._buffers[name] = buffer
+            self.allocations += 1
+        return buffer
+
+    @property
+    def nbytes(self):
+        """プールが保持している配列の合計バイト数。"""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+def _map(request, stream):
+    """リクエストのバッファをコピーせずに見る (with の中でだけ有効)。"""
+    if hasattr(request, "map_array"): # replay_camera.ReplayRequest
+        return request.map_array(stream)
+    from picamera2 import MappedArray
+    return MappedArray(request, stream)
+
+class CapturePipeline:
+    """
+    capture_request() のバッファから直接マスクを作るクラス。
+    画像サイズの配列はすべて BufferPool に持ち、フレームごとには確保しない。
+    """
+
+    def __init__(self, picam2, classifier, stream="main", orientation=None, blur_ksize=5, pool=None):
+        """
+        Args:
+            picam2 (Picamera2): 設定・start()済みのPicamera2インスタンス (replay_camera.ReplayCamera も可)。
+            classifier (color_classifier.ColorClassifier): 色分類器 (チャンネル順はストリームに合わせる)。
+            stream (str): 判定に使うストリーム名 ("main" または "lores")。
+            orientation (camera_orientation.Orientation): センサーの向きから表示の向きへの変換。
+            blur_ksize (int): mainストリームでのGaussianBlurのカーネルサイズ (loresではぼかさない)。
+            pool (BufferPool): 使うプール。Noneなら新しく作る。
+        """
+        self.picam2 = picam2
+        self.classifier = classifier
+        self.stream = stream
+        self.orientation = orientation
+        self.blur_ksize = blur_ksize
+        self.pool = pool if pool is not None else BufferPool()
+        self.frames = 0
+        self.metadata = None
+        self.last_process_ms = None
+
+    def process(self, keep_frame=False):
+        """
+        1フレーム撮影してマスクまで計算し、カメラのバッファを返してから FrameAnalysis を返す。
+
+        Args:
+            keep_frame (bool): Trueならフレームをプールの配列にコピーして残す (oriented でデバッグ画像を作るとき)。
+
+        Returns:
+            FrameAnalysis: マスク計算済みの解析結果 (次の process() までの間だけ有効)。
+        """
+        request = self.picam2.capture_request()
+        start = time.perf_counter()
+        try:
+            with _map(request, self.stream) as mapped:
+                analysis = self._analyze(mapped.array, keep_frame)
+            self.metadata = request.get_metadata()
+        finally:
+            request.release()
+        self.last_process_ms = (time.perf_counter() - start) * 1000
+        return analysis
+
+    def process_frame(self, frame, keep_frame=True):
+        """
+        取得済みのフレーム (FrameSource や capture_array() の画像) からマスクを計算する。
+
+        Args:
+            frame (np.ndarray): ストリームと同じ形式の画像。
+            keep_frame (bool): Falseならフレームを参照しない (呼び出し側が配列を使い回す場合)。
+
+        Returns:
+            FrameAnalysis: マスク計算済みの解析結果。
+        """
+        analysis = FrameAnalysis(frame, self.classifier, orientation=self.orientation,
+                                 blur_ksize=self._blur_ksize(frame), buffers=self.pool)
+        self.frames += 1
+        return analysis.detach(frame if keep_frame else None)
+
+    def _analyze(self, buffer, keep_frame):
+        analysis = FrameAnalysis(buffer, self.classifier, orientation=self.orientation,
+                                 blur_ksize=self._blur_ksize(buffer), buffers=self.pool)
+        copy = None
+        if keep_frame:
+            copy = self.pool.get("frame", buffer.shape, buffer.dtype)
+            np.copyto(copy, buffer)
+        self.frames += 1
+        return analysis.detach(copy)
+
+    def _blur_ksize(self, frame):
+        return 0 if frame.ndim == 2 else self.blur_ksize
+
+    def stats(self):
+        """処理したフレーム数、プールの確保回数・バイト数、直近の処理時間 [ms]。"""
+        return {"frames": self.frames, "allocations": self.pool.allocations, "pool_bytes": self.pool.nbytes,
+                "last_process_ms": self.last_process_ms}
@@ -0,0 +1,230 @@
+import os
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+import cv2
+
+# デバッグ画像の保存を制御ループから切り離すモジュール
+# 以前は検出のたびに (フラッグが無いときも) cv2.imwrite を呼んでいて、JPEGのエンコードとSDカードへの
+# 書き込みで1回あたり数十msも制御ループが止まっていた。
+# DebugImageWriter は画像の参照をキューに入れるだけで戻り、エンコードと書き込みはバックグラウンドの
+# スレッドで行う。保存するフレームの間引き (N枚に1枚、またはイベントのときだけ)、JPEGの画質、
+# ディスク使用量の上限 (超えたら古い画像から削除) を設定できる。
+#
+# 使い方:
+#   import debug_image_writer
+#   debug_image_writer.save("/home/mark1/Pictures/akairo_grid.jpg", debug_frame)    # BGRの画像を渡すだけ
+#   debug_image_writer.save(path, frame, event=True)    # 検出したときなど、間引かずに保存したい画像
+#   debug_image_writer.configure(every_n=10, jpeg_quality=70, budget_mb=200)      # 設定の変更 (任意)
+#
+# 渡した画像は書き込みが終わるまで参照されるので、渡した後に同じ配列を書き換えないこと
+# (capture_array() の戻り値や cv2.cvtColor の結果など、毎回新しく作られる配列ならそのまま渡してよい)。
+# 画像の代わりに、画像を返す関数を渡すと、描画 (色の変換や枠の書き込み) もバックグラウンドで行う。
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+class DebugImageWriter:
+    """
+    デバッグ画像を非同期に保存するクラス。
+    キューが一杯のときは待たずにその画像を捨てる (制御ループを止めないことを優先する)。
+    """
+
+    def __init__(self, every_n=1, jpeg_quality=80, budget_mb=500, max_queue=4, keep_history=False,
+                 history=200):
+        """
+        Args:
+            every_n (int): 同じ保存先への画像はN枚に1枚だけ保存する (event=Trueの画像は常に保存)。
+            jpeg_quality (int): JPEGの画質 (0〜100)。
+            budget_mb (float): このクラスが保存した画像の合計サイズの上限 [MB]。超えたら古い画像から削除する。
+                               Noneなら削除しない。
+            max_queue (int): 保存待ちの画像の最大数。
+            keep_history (bool): Trueなら保存先のファイル名に通し番号を付けて上書きせずに残す
+                                 (古いものはbudget_mbで削除される)。
+            history (int): エンコード時間の統計に使う直近の保存の数。
+        """
+        self.every_n = max(1, int(every_n))
+        self.jpeg_quality = int(jpeg_quality)
+        self.budget_bytes = None if budget_mb is None else int(budget_mb * 1024 * 1024)
+        self.keep_history = keep_history
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._counters = {}          # 保存先 → save() が呼ばれた回数 (間引き用)
+        self._files = OrderedDict()  # 保存したファイル → サイズ [bytes] (古い順)
+        self._bytes_on_disk = 0
+        self._encode_times = deque(maxlen=history)
+        self._seq = 0
+        self.requested = 0
+        self.queued = 0
+        self.skipped = 0     # 間引きで保存しなかった数
+        self.dropped = 0     # キューが一杯で捨てた数
+        self.written = 0
+        self.evicted = 0
+        self.errors = 0
+        self.last_error = None
+
+    # ---------------- 呼び出し側 (制御ループ) ----------------
+
+    def save(self, path, image, event=False, quality=None):
+        """
+        画像の保存を予約する (待たない)。
+
+        Args:
+            path (str): 保存先 (拡張子で形式が決まる)。
+            image: BGRの画像 (np.ndarray)、または画像を返す引数なしの関数。
+            event (bool): Trueなら間引かずに保存する (検出時など)。
+            quality (int): この画像だけJPEGの画質を変える場合に指定する。
+
+        Returns:
+            bool: キューに入れたらTrue (間引き・キューが一杯で保存しない場合はFalse)。
+        """
+        with self._lock:
+            self.requested += 1
+            count = self._counters.get(path, 0)
+            self._counters[path] = count + 1
+            if not event and count % self.every_n != 0:
+                self.skipped += 1
+                return False
+            self._seq += 1
+            seq = self._seq
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((path, image, quality, seq))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.queued += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        """キューの画像をすべて書き終えるまで待つ (ミッションの終了時など)。書き終えたらTrue。"""
+        end = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() > end:
+                return False
+            time.sleep(0.01)
+        return True
+
+    # ---------------- 書き込みスレッド ----------------
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._write_loop, name="debug-image-writer", daemon=True)
+                    self._thread.start()
+
+    def _write_loop(self):
+        while True:
+            path, image, quality, seq = self._queue.get()
+            try:
+                self._write(path, image, quality, seq)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                    self.last_error = f"{path}: {type(e).__name__}: {e}"
+                print(f"⚠️ DebugImageWriter: 画像を保存できませんでした ({self.last_error})")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path, image, quality, seq):
+        start = time.perf_counter()
+        if callable(image):
+            image = image()
+        if image is None:
+            return
+        ext = os.path.splitext(path)[1].lower() or ".jpg"
+        params = []
+        if ext in (".jpg", ".jpeg"):
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality if quality is None else int(quality)]
+        ok, encoded = cv2.imencode(ext, image, params)
+        if not ok:
+            raise RuntimeError("エンコードに失敗しました")
+        if self.keep_history:
+            root, _ = os.path.splitext(path)
+            path = f"{root}_{seq:06d}{ext}"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 書き込み途中の壊れたファイルが残らないよう、一時ファイルに書いてから置き換える
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(encoded.tobytes())
+        os.replace(tmp_path, path)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._bytes_on_disk -= self._files.pop(path, 0)
+            self._files[path] = encoded.nbytes
+            self._bytes_on_disk += encoded.nbytes
+            self._encode_times.append(elapsed)
+            self.written += 1
+            evict = self._take_evictions()
+        for old in evict:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _take_evictions(self):
+        """上限を超えた分の古いファイルを管理から外して返す (ロックを持って呼ぶ)。最新のファイルは残す。"""
+        evict = []
+        if self.budget_bytes is None:
+            return evict
+        while self._bytes_on_disk > self.budget_bytes and len(self._files) > 1:
+            old, size = self._files.popitem(last=False)
+            self._bytes_on_disk -= size
+            self.evicted += 1
+            evict.append(old)
+        return evict
+
+    # ---------------- 統計 ----------------
+
+    def stats(self):
+        """保存の統計 (dict)。encode_*_ms は描画・エンコード・書き込みを合わせた時間。"""
+        with self._lock:
+            times = sorted(self._encode_times)
+            result = {
+                "requested": self.requested,
+                "queued": self.queued,
+                "skipped": self.skipped,
+                "dropped": self.dropped,
+                "written": self.written,
+                "evicted": self.evicted,
+                "errors": self.errors,
+                "queue_depth": self._queue.qsize(),
+                "files": len(self._files),
+                "bytes_on_disk": self._bytes_on_disk,
+            }
+        result["encode_p50_ms"] = times[len(times) // 2] * 1000 if times else None
+        result["encode_max_ms"] = times[-1] * 1000 if times else None
+        return result
+
+# プロセス全体で共有するライター (各クラスはこれを使う)
+_writer = DebugImageWriter()
+
+def get_writer():
+    return _writer
+
+def configure(**kwargs):
+    """共有ライターの設定 (every_n, jpeg_quality, budget_mb, keep_history) を変更する。"""
+    for key, value in kwargs.items():
+        if key == "budget_mb":
+            _writer.budget_bytes = None if value is None else int(value * 1024 * 1024)
+        elif key == "every_n":
+            _writer.every_n = max(1, int(value))
+        elif key in ("jpeg_quality", "keep_history"):
+            setattr(_writer, key, value)
+        else:
+            raise ValueError(f"debug_image_writer: 不明な設定 '{key}' です。")
+    return _writer
+
+def save(path, image, event=False, quality=None):
+    """共有ライターで画像の保存を予約する。DebugImageWriter.save() と同じ。"""
+    return _writer.save(path, image, event, quality)
+
+def flush(timeout=5.0):
+    return _writer.flush(timeout)
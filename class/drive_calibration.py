@@ -0,0 +1,172 @@
+import json
+import time
+
+class DriveCalibration:
+    """
+    左右モーターの線形化テーブル (デューティ[%] → 車輪速度) を保持するクラス。
+    車輪速度は「その車輪だけを回したときの旋回角速度 [deg/s]」で表す。
+    (片輪ピボット旋回の角速度 = 車輪速度 / トレッド幅 なので、左右で同じ単位になる)
+    MotorDriver.set_twist() はこのテーブルを逆引きしてデッドバンドと左右差を補正する。
+    """
+
+    SIDES = ("left", "right")
+
+    def __init__(self, left_table=None, right_table=None):
+        """
+        Args:
+            left_table (list): 左モーターの [(デューティ, 車輪速度), ...]。
+            right_table (list): 右モーターの [(デューティ, 車輪速度), ...]。
+            省略時は「デューティ = 車輪速度」の恒等テーブル (未キャリブレーション) になる。
+        """
+        identity = [(0.0, 0.0), (100.0, 100.0)]
+        # 恒等テーブルではデッドバンドが分からないので、使う側で補う (TurnController の最小デューティなど)
+        self.calibrated = left_table is not None and right_table is not None
+        self.tables = {
+            "left": self._monotonic(left_table or identity),
+            "right": self._monotonic(right_table or identity),
+        }
+
+    @staticmethod
+    def _monotonic(table):
+        """逆引きできるよう、デューティ順に並べて車輪速度を単調非減少にする。"""
+        result = []
+        best = 0.0
+        for duty, rate in sorted(table):
+            best = max(best, float(abs(rate)))
+            result.append((float(duty), best))
+        return result
+
+    @classmethod
+    def from_measurements(cls, left_points, right_points, rate_threshold_dps=3.0):
+        """
+        掃引測定の結果からテーブルを作成する。
+        閾値未満の角速度しか出なかったデューティはデッドバンドとみなし、速度0として扱う。
+        """
+        def build(points):
+            table = []
+            for duty, rate in sorted(points):
+                rate = abs(rate)
+                if rate < rate_threshold_dps and all(r == 0.0 for _, r in table):
+                    table = [(duty, 0.0)] # デッドバンド上端を更新
+                else:
+                    table.append((duty, rate))
+            if not table or table[0][1] != 0.0:
+                table.insert(0, (0.0, 0.0))
+            return table
+        return cls(build(left_points), build(right_points))
+
+    def deadband(self, side):
+        """車輪が回り始めるデューティ [%] を返す。"""
+        duty = 0.0
+        for d, rate in self.tables[side]:
+            if rate > 0:
+                break
+            duty = d
+        return duty
+
+    def max_wheel_rate(self, side=None):
+        """出せる最大車輪速度。sideを省略すると左右の小さい方を返す。"""
+        if side is None:
+            return min(self.tables[s][-1][1] for s in self.SIDES)
+        return self.tables[side][-1][1]
+
+    def duty_for(self, side, wheel_rate):
+        """車輪速度 (大きさ) を得るのに必要なデューティ [%] を線形補間で求める。"""
+        wheel_rate = abs(wheel_rate)
+        if wheel_rate <= 0:
+            return 0.0
+        table = self.tables[side]
+        for (d0, r0), (d1, r1) in zip(table, table[1:]):
+            if wheel_rate <= r1:
+                if r1 == r0:
+                    return d1
+                return d0 + (d1 - d0) * (wheel_rate - r0) / (r1 - r0)
+        return table[-1][0]
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"left": self.tables["left"], "right": self.tables["right"]}, f, indent=2)
+        print(f"DriveCalibration: キャリブレーションを {path} に保存しました。")
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        print(f"DriveCalibration: キャリブレーションを {path} から読み込みました。")
+        return cls(data["left"], data["right"])
+
+def twist_to_wheel_rates(calibration, v, omega):
+    """
+    並進 v (-1.0〜1.0) と旋回角速度 omega [deg/s, 右回り正] を左右の符号付き車輪速度に変換する。
+    車輪が飽和する場合は旋回を優先し、残りの余裕で並進させる。
+    """
+    limit = calibration.max_wheel_rate()
+    half_turn = max(-limit, min(limit, omega / 2))
+    margin = limit - abs(half_turn)
+    base = max(-margin, min(margin, v * limit))
+    return base + half_turn, base - half_turn
+
+def _measure_yaw_rate(bno, sample_s, interval_s=0.02):
+    """sample_s秒間のヨーレート [deg/s] の平均を返す。"""
+    samples = []
+    end = time.monotonic() + sample_s
+    while time.monotonic() < end:
+        samples.append(bno.get_yaw_rate())
+        time.sleep(interval_s)
+    return sum(samples) / len(samples) if samples else 0.0
+
+def calibrate_drive(driver, bno, duties=range(10, 101, 10), settle_s=0.6, sample_s=0.8,
+                    rate_threshold_dps=3.0):
+    """
+    片輪ずつデューティを掃引してピボット旋回させ、BNO055のヨーレートから
+    デッドバンドと左右の車輪速度テーブルを測定する。広い場所で実行すること。
+
+    Returns:
+        DriveCalibration: 測定結果から作成したキャリブレーション。
+    """
+    points = {"left": [], "right": []}
+    try:
+        for side in DriveCalibration.SIDES:
+            print(f"DriveCalibration: {side}モーターの掃引を開始します。")
+            for duty in duties:
+                driver.motor_stop_brake() # 反対側の車輪はブレーキで固定
+                if side == "left":
+                    driver.motor_Lforward(duty)
+                else:
+                    driver.motor_Rforward(duty)
+                time.sleep(settle_s) # 加速が終わるまで待つ
+                rate = _measure_yaw_rate(bno, sample_s)
+                points[side].append((duty, rate))
+                print(f"DriveCalibration: {side} デューティ{duty:>3}% → ヨーレート {rate:+7.1f} deg/s")
+                driver.motor_stop_brake()
+                time.sleep(0.5)
+    finally:
+        driver.motor_stop_brake()
+
+    calibration = DriveCalibration.from_measurements(points["left"], points["right"], rate_threshold_dps)
+    for side in DriveCalibration.SIDES:
+        print(f"DriveCalibration: {side} デッドバンド {calibration.deadband(side):.0f}%, 最大車輪速度 {calibration.max_wheel_rate(side):.1f} deg/s")
+    return calibration
+
+# ====================== 実行部 ======================
+
+if __name__ == '__main__':
+    from motor import MotorDriver
+    from BNO055 import BNO055
+
+    driver = MotorDriver(
+        PWMA=12, AIN1=23, AIN2=18,
+        PWMB=19, BIN1=16, BIN2=26,
+        STBY=21
+    )
+    bno = BNO055()
+    try:
+        if not bno.begin():
+            raise IOError("BNO055の初期化に失敗しました。")
+        time.sleep(1)
+        bno.setExternalCrystalUse(True)
+        calibration = calibrate_drive(driver, bno)
+        calibration.save("/home/mark1/drive_calibration.json")
+    finally:
+        driver.cleanup()
+        driver.pi.stop()
@@ -6,6 +6,7 @@ import RPi.GPIO as GPIO # GPIOクリーンアップのため
 from motor import MotorDriver
 from BNO055 import BNO055
 import following # PD制御による直進維持
+from turn_controller import TurnController
 
 class RoverGPSNavigator:
     """
@@ -40,6 +41,7 @@ class RoverGPSNavigator:
         """
         self.driver = driver_instance # 外部から渡されたインスタンスを使用
         self.bno = bno_instance       # 外部から渡されたインスタンスを使用
+        self.turner = TurnController(self.driver, self.bno) # 方向調整用の連続PID回頭制御
         self.pi = pi_instance         # 外部から渡されたインスタンスを使用
         self.RX_PIN = rx_pin          # 外部から渡されたGPS RXピン
         self.GPS_BAUD = gps_baud      # 外部から渡されたGPSボーレート
@@ -206,20 +208,8 @@ class RoverGPSNavigator:
 
                 # 4. 方向調整フェーズ (角度誤差が大きい場合のみ回頭)
                 if abs(angle_error) > self.ANGLE_ADJUST_THRESHOLD_DEG:
-                    turn_duration = 0.15 + (min(abs(angle_error), 360 - abs(angle_error)) / 180.0) * 0.2
-                    
-                    if angle_error < 0: # ターゲットが現在より小さい場合（左に回る方が近い）
-                        print(f"[TURN] RoverGPSNavigator: 左に回頭します (誤差: {angle_error:.1f}°, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_left(0, self.TURN_SPEED)
-                        self.driver.petit_left(self.TURN_SPEED, 0) # 2引数バージョン
-                    else: # ターゲットが現在より大きい場合（右に回る方が近い）
-                        print(f"[TURN] RoverGPSNavigator: 右に回頭します (誤差: {angle_error:.1f}°, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_right(0, self.TURN_SPEED)
-                        self.driver.petit_right(self.TURN_SPEED, 0) # 2引数バージョン
-                    
-                    time.sleep(turn_duration)
-                    self.driver.motor_stop_brake() # 確実な停止
-                    time.sleep(0.5) # 回転後の安定待ち
+                    print(f"[TURN] RoverGPSNavigator: 目標方位へ回頭します (誤差: {angle_error:.1f}°)")
+                    self.turner.turn_to_heading(bearing_to_goal, speed=self.TURN_SPEED)
                     continue # 方向調整が終わったら、次のループで再度GPSと方位を確認
 
                 # 5. 前進フェーズ (PD制御による直進維持)
@@ -1,91 +1,139 @@
 import time
 from BNO055 import BNO055
 from motor import MotorDriver
+from rate_loop import FixedRateLoop, format_stats
 import smbus
 import struct
 import RPi.GPIO as GPIO
 
+class HeadingHoldController:
+    """
+    BNO055の方位を保ったまま前進させるPD制御クラス。
+    FixedRateLoopの締め切りで周期を固定し、D項は「実際に経過した時間」で誤差の差分を割って求める。
+    (以前は数µs差で読んだ2つの方位の差をsleep時間で割っていたため、D項が実質0だった)
+    MotorDriver が緊急停止 (emergency_stop) されたら、その周期で走行を打ち切る。
+    """
+
+    MAX_LOOP_HZ = 50 # BNO055の方位更新 (100Hz) とI2C/pigpioの通信時間から決めた上限
+
+    def __init__(self, driver, bno, kp=0.80, kd=0.05, loop_hz=20, d_filter_tau=0.05):
+        """
+        Args:
+            driver (MotorDriver): motor_Lforward/motor_Rforwardを持つモータードライバー。
+            bno (BNO055): get_heading()を持つIMU。
+            kp (float): 比例ゲイン [%/deg]。
+            kd (float): 微分ゲイン [%/(deg/s)]。
+            loop_hz (float): 制御周期 [Hz] (MAX_LOOP_HZ以下)。
+            d_filter_tau (float): 誤差微分の一次ローパスの時定数 [s] (方位の量子化ノイズ対策)。
+        """
+        if not 0 < loop_hz <= self.MAX_LOOP_HZ:
+            raise ValueError(f"loop_hzは0より大きく{self.MAX_LOOP_HZ}以下で指定してください: {loop_hz}")
+        self.driver = driver
+        self.bno = bno
+        self.kp = kp
+        self.kd = kd
+        self.loop_hz = loop_hz
+        self.d_filter_tau = d_filter_tau
+        self.ls = 0
+        self.rs = 0
+        self.stats = None # 直前のrun()のジッタ統計 (LoopStats)
+
+    def _read_heading(self):
+        heading = self.bno.get_heading()
+        while heading is None: # 読み取り失敗時は少し待って再試行
+            time.sleep(0.005)
+            heading = self.bno.get_heading()
+        return heading
+
+    def run(self, base_speed, duration_time, target_heading=None):
+        """
+        duration_time秒間、target_heading (省略時は現在方位) を保って前進する。
+        終了時のモーター出力は ls, rs に残すので、減速は呼び出し側で行う。
+
+        Returns:
+            LoopStats: この走行の制御周期ジッタ統計。
+        """
+        target = self._read_heading() if target_heading is None else target_heading
+        loop = FixedRateLoop(self.loop_hz)
+        prev_err = None
+        prev_time = None
+        derr = 0.0
+        start_time = time.monotonic()
+
+        while True:
+            if getattr(self.driver, "estopped", False):
+                print("FOLLOW: 緊急停止のため走行を打ち切りました。")
+                break
+            now = time.monotonic()
+            current = self._read_heading()
+            err = (current - target + 180) % 360 - 180
+
+            # 誤差の時間微分: 方位を読んだ時刻の差で割る
+            if prev_err is not None:
+                dt = now - prev_time
+                if dt > 0:
+                    raw = ((err - prev_err + 180) % 360 - 180) / dt
+                    alpha = dt / (self.d_filter_tau + dt)
+                    derr += alpha * (raw - derr)
+            prev_err = err
+            prev_time = now
+
+            correction = self.kp * err + self.kd * derr
+            self.ls = max(0, min(100, base_speed - correction))
+            self.rs = max(0, min(100, base_speed + correction))
+            self.driver.motor_Lforward(self.ls)
+            self.driver.motor_Rforward(self.rs)
+
+            if time.monotonic() - start_time > duration_time:
+                break
+            loop.wait()
+
+        self.stats = loop.stats()
+        print(format_stats(self.stats, label="FOLLOW"))
+        return self.stats
+
 #100付近にはしないこと。制御ができなくはならないけど、追従が遅くなる。
-def follow_forward(driver, bno, base_speed, duration_time):
+def follow_forward(driver, bno, base_speed, duration_time, loop_hz=20, kp=0.80, kd=0.05):
+    controller = HeadingHoldController(driver, bno, kp=kp, kd=kd, loop_hz=loop_hz)
     target = bno.get_heading()
-    
-    #パラメータ
-    base_speed = base_speed
-    Kp = 0.80
-    Kd = 0
-    loop_interval = 0.10
-    prev_err = 0.0
-    derr = 0
-    ls = 0
-    rs = 0
-    start_time = time.time()
     driver.changing_forward(0, base_speed)
 
     try:
-        while True:
-            current = bno.get_heading()
-            err = (current - target + 180) % 360 - 180
-            correction = Kp * err + Kd * derr
-            ls = max(0, min(100, base_speed - correction))
-            rs = max(0, min(100, base_speed + correction))
+        stats = controller.run(base_speed, duration_time, target_heading=target)
+        ls = controller.ls
+        rs = controller.rs
+        for i in range (1, 100):
+            d_ls = ls / 100
+            d_rs = rs / 100
+            ls = ls - i * d_ls
+            rs = rs - i * d_rs
             driver.motor_Lforward(ls)
             driver.motor_Rforward(rs)
-            after = bno.get_heading()
-            time.sleep(loop_interval)
-            derr = (after - current) / loop_interval
-            delta_time = time.time() - start_time
-            if delta_time > duration_time:
-                for i in range (1, 100):
-                    d_ls = ls / 100
-                    d_rs = rs / 100
-                    ls = ls - i * d_ls
-                    rs = rs - i * d_rs
-                    driver.motor_Lforward(ls)
-                    driver.motor_Rforward(rs)
-                    time.sleep(0.03)
+            if driver.estop_wait(0.03): # 緊急停止が掛かったら減速を打ち切る
                 break
     finally:
         print("誘導終了")
+    return stats
 
 #petit_forward0.1秒所要、減速0.2秒所要、
-def follow_petit_forward(driver, bno, base_speed, duration_time):
+def follow_petit_forward(driver, bno, base_speed, duration_time, loop_hz=20, kp=0.80, kd=0.05):
+    controller = HeadingHoldController(driver, bno, kp=kp, kd=kd, loop_hz=loop_hz)
     target = bno.get_heading()
-    
-    #パラメータ
-    base_speed = base_speed
-    Kp = 0.80
-    Kd = 0
-    loop_interval = 0.10
-    prev_err = 0.0
-    derr = 0
-    ls = 0
-    rs = 0
-    start_time = time.time()
     driver.petit_forward(0, base_speed)
 
     try:
-        while True:
-            current = bno.get_heading()
-            err = (current - target + 180) % 360 - 180
-            correction = Kp * err + Kd * derr
-            ls = max(0, min(100, base_speed - correction))
-            rs = max(0, min(100, base_speed + correction))
+        stats = controller.run(base_speed, duration_time, target_heading=target)
+        ls = controller.ls
+        rs = controller.rs
+        for i in range (1, 20):
+            d_ls = ls / 20
+            d_rs = rs / 20
+            ls = ls - i * d_ls
+            rs = rs - i * d_rs
             driver.motor_Lforward(ls)
             driver.motor_Rforward(rs)
-            after = bno.get_heading()
-            time.sleep(loop_interval)
-            derr = (after - current) / loop_interval
-            delta_time = time.time() - start_time
-            if delta_time > duration_time:
-                for i in range (1, 20):
-                    d_ls = ls / 20
-                    d_rs = rs / 20
-                    ls = ls - i * d_ls
-                    rs = rs - i * d_rs
-                    driver.motor_Lforward(ls)
-                    driver.motor_Rforward(rs)
-                    time.sleep(0.01)
+            if driver.estop_wait(0.01): # 緊急停止が掛かったら減速を打ち切る
                 break
     finally:
         print("誘導終了")
-    
+    return stats
@@ -0,0 +1,253 @@
+from functools import cached_property
+import cv2
+import numpy as np
+import color_classifier
+from camera_orientation import Orientation
+from mask_stats import MaskStats
+
+# 1フレーム分の画像解析を、必要になった時点で1回だけ計算して使い回すためのモジュール
+# 以前は get_red_percentage(frame) と get_red_block_by_density(frame) のように、同じフレームに対して
+# 関数ごとに回転・ぼかし・色判定をやり直していた。FrameAnalysis は前処理した画像・マスク・
+# 各種の集計値を一度計算したら保持するので、何を何回聞いても1フレームの処理は1回で済む。
+#
+# 使い方:
+#   analysis = FrameAnalysis(frame, red_classifier)
+#   analysis.percentage             # 赤色の割合 [%]
+#   analysis.best_column(5, 0.05)   # 最も赤色密度の高い列 (1〜5) またはNone
+#   analysis.grid_ratios(2, 3)      # 2x3のセルごとの赤色の割合
+#   analysis.region_ratio(y0, y1, x0, x1)   # 任意の矩形 (ROI) の赤色の割合 (積分画像から O(1))
+#
+# loresストリームのYUV420バッファを渡した場合は、RGBに変換せずに判定してから
+# 小さいマスク (縦横1/2) から求める (ぼかしはISPの縮小で足りるので行わない)。
+#
+# 回転・反転 (camera_orientation.Orientation) は画像にもマスクにも適用しない。マスクはセンサーの向きのまま作り、
+# 列・セル・重心・輪郭などの結果だけを表示の向きの座標に変換して返す (画像全体のコピーが無くなる)。
+#
+# roi を指定すると、その矩形 (センサーの向き) だけをぼかして色判定し、外側は検出なしとしたフレーム全体の
+# 大きさのマスクを作る (pyramid_search が縮小画像で候補を見つけた範囲だけを元の解像度で判定するのに使う)。
+# 割合・列・セルはフレーム全体に対する値のまま求まる。
+
+def _bounds(length, n):
+    """長さlengthをn分割した境界 (各区間は length // n、余りは最後の区間に含める)。"""
+    step = length // n
+    return [i * step for i in range(n)] + [length]
+
+class FrameAnalysis:
+    """
+    1フレームの解析結果を遅延計算してキャッシュするクラス。
+    フレームごとに新しく作り、そのフレームについての問い合わせはすべてこのインスタンスに対して行う。
+    """
+
+    def __init__(self, frame, classifier, rotate=cv2.ROTATE_90_COUNTERCLOCKWISE, flip=None, blur_ksize=5,
+                 orientation=None, buffers=None, roi=None):
+        """
+        Args:
+            frame (np.ndarray): カメラから取得したままの画像、またはloresのYUV420 (I420) バッファ。
+            classifier (color_classifier.ColorClassifier): マスクを作る色分類器 (チャンネル順はframeに合わせる)。
+            rotate (int): cv2.rotateの回転コード。Noneなら回転しない。
+            flip (int): cv2.flipのflipCode (1で左右反転)。Noneなら反転しない。
+            blur_ksize (int): 色判定の前にかけるGaussianBlurのカーネルサイズ。0またはNoneならぼかさない。
+            orientation (camera_orientation.Orientation): センサーの向きから表示の向きへの変換。
+                指定した場合は rotate/flip より優先する (camera_orientation.residual() の結果を渡す)。
+            buffers (capture_pipeline.BufferPool): 指定すると、ぼかした画像・マスク・積分画像をこのプールの
+                配列に書き込む (フレームごとの確保が無くなる)。プールの配列は次のフレームで上書きされるので、
+                同じプールを使うFrameAnalysisは同時に1つだけ使うこと。
+            roi (tuple): センサーの向きのマスクの座標での (y0, y1, x0, x1)。指定するとこの範囲だけを判定し、
+                範囲外は検出なしとする (YUV420ならマスクは縦横1/2なので、その座標で指定する)。
+        """
+        self.frame = frame
+        self.classifier = classifier
+        self.orientation = orientation if orientation is not None else Orientation.from_cv2(rotate, flip)
+        self.blur_ksize = blur_ksize
+        self.buffers = buffers
+        self.roi = None if roi is None else tuple(int(v) for v in roi)
+        self.is_yuv420 = frame.ndim == 2
+        self._column_counts = {}
+        self._grid_counts = {}
+
+    def detach(self, frame=None):
+        """
+        カメラのバッファ (capture_request() の MappedArray) を返す前に呼ぶ。
+        マスクを計算してから、元のフレームとそれを指す配列を参照しないようにする。
+
+        Args:
+            frame (np.ndarray): 代わりに持たせるフレームのコピー。Noneなら以降 oriented は使えない。
+
+        Returns:
+            FrameAnalysis: self
+        """
+        self.mask
+        if self.__dict__.get("preprocessed") is self.frame: # ぼかさない場合は元のフレームそのもの
+            del self.__dict__["preprocessed"]
+        self.frame = frame
+        return self
+
+    @cached_property
+    def oriented(self):
+        """表示の向きにした画像 (ぼかす前。YUV420ならBGRに変換する)。画像全体をコピーするのでデバッグ画像の保存や表示にだけ使う。"""
+        frame = self.frame
+        if frame is None:
+            raise RuntimeError("フレームを保持していません (CapturePipeline.process(keep_frame=True) で取得してください)。")
+        if self.is_yuv420:
+            frame = cv2.cvtColor(frame, cv2.COLOR_YUV2BGR_I420)
+        return self.orientation.apply(frame)
+
+    @cached_property
+    def preprocessed(self):
+        """色判定に使う画像 (センサーの向きのまま、ぼかし済み)。"""
+        if not self.blur_ksize:
+            return self.frame
+        dst = None if self.buffers is None else self.buffers.get("blur", self.frame.shape, self.frame.dtype)
+        return cv2.GaussianBlur(self.frame, (self.blur_ksize, self.blur_ksize), 0, dst=dst)
+
+    @cached_property
+    def mask(self):
+        """色分類器で判定したマスク (0/255、センサーの向きのまま)。"""
+        if self.roi is not None:
+            return self._roi_mask()
+        if self.is_yuv420:
+            return self.classifier.classify_yuv420(self.frame, buffers=self.buffers)
+        return self.classifier.classify(self.preprocessed, buffers=self.buffers)
+
+    def _roi_mask(self):
+        """self.roi の範囲だけを判定したフレーム全体の大きさのマスク。範囲の大きさはフレームごとに違うので作業配列はプールから取らない。"""
+        if self.is_yuv420:
+            shape = color_classifier.split_yuv420(self.frame)[1].shape
+        else:
+            shape = self.frame.shape[:2]
+        if self.buffers is None:
+            mask = np.zeros(shape, np.uint8)
+        else:
+            mask = self.buffers.get("mask", shape, np.uint8)
+            mask.fill(0)
+        y0, y1, x0, x1 = self.roi
+        y0, x0 = max(0, y0), max(0, x0)
+        y1, x1 = min(shape[0], y1), min(shape[1], x1)
+        if y1 <= y0 or x1 <= x0:
+            return mask
+        if self.is_yuv420:
+            mask[y0:y1, x0:x1] = self.classifier.classify_yuv420(self.frame, roi=(y0, y1, x0, x1))
+            return mask
+        crop = self.frame[y0:y1, x0:x1]
+        if self.blur_ksize:
+            crop = cv2.GaussianBlur(crop, (self.blur_ksize, self.blur_ksize), 0)
+        mask[y0:y1, x0:x1] = self.classifier.classify(crop)
+        return mask
+
+    @cached_property
+    def oriented_mask(self):
+        """表示の向きにしたマスク (デバッグ用)。"""
+        return self.orientation.apply(self.mask)
+
+    @property
+    def shape(self):
+        """表示の向きでの (高さ, 幅)。列・セル・座標はすべてこの向きで返す。"""
+        return self.orientation.display_shape(self.mask.shape)
+
+    @cached_property
+    def pixel_count(self):
+        """マスク中の検出画素数。"""
+        return int(np.count_nonzero(self.mask))
+
+    @property
+    def ratio(self):
+        """検出画素の割合 (0.0-1.0)。"""
+        return self.pixel_count / self.mask.size
+
+    @property
+    def percentage(self):
+        """検出画素の割合 [%]。"""
+        return self.ratio * 100
+
+    @cached_property
+    def column_profile(self):
+        """表示の向きで左から並べた列ごとの検出画素数。列方向の分割や方向の推定はすべてこれから求める。"""
+        return self.orientation.column_profile(self.mask)
+
+    def column_counts(self, n=5):
+        """画像を左からn列に分割したときの、各列の検出画素数。"""
+        if n not in self._column_counts:
+            sums = self.column_profile
+            edges = _bounds(len(sums), n)
+            self._column_counts[n] = [int(sums[edges[i]:edges[i + 1]].sum()) for i in range(n)]
+        return self._column_counts[n]
+
+    def column_densities(self, n=5):
+        """画像を左からn列に分割したときの、各列の検出画素の割合 (0.0-1.0)。"""
+        height, width = self.shape
+        edges = _bounds(width, n)
+        return [count / (height * (edges[i + 1] - edges[i])) for i, count in enumerate(self.column_counts(n))]
+
+    def best_column(self, n=5, min_density=0.05):
+        """
+        最も検出画素の密度が高い列の番号 (左から1〜n) を返す。
+        どの列も min_density 未満ならNoneを返す。
+        """
+        densities = self.column_densities(n)
+        best = max(densities)
+        if best < min_density:
+            return None
+        return densities.index(best) + 1
+
+    def grid_counts(self, rows=2, cols=3):
+        """
+        画像を rows x cols のセルに分割したときの、各セルの検出画素数 (rows個のリストのリスト)。
+        セルの数によらず、積分画像の表を (rows+1)x(cols+1) 点引くだけで求める。
+        """
+        key = (rows, cols)
+        if key not in self._grid_counts:
+            height, width = self.shape
+            row_bounds, col_bounds = self.orientation.sensor_bounds(_bounds(height, rows), _bounds(width, cols),
+                                                                    self.mask.shape)
+            counts = self.orientation.grid_to_display(self.stats.grid_counts(row_bounds, col_bounds))
+            self._grid_counts[key] = counts.tolist()
+        return self._grid_counts[key]
+
+    def grid_cells(self, rows=2, cols=3):
+        """各セルの範囲 (y_start, y_end, x_start, x_end) (rows個のリストのリスト)。"""
+        height, width = self.shape
+        ys, xs = _bounds(height, rows), _bounds(width, cols)
+        return [[(ys[r], ys[r + 1], xs[c], xs[c + 1]) for c in range(cols)] for r in range(rows)]
+
+    def grid_ratios(self, rows=2, cols=3):
+        """各セルの検出画素の割合 (0.0-1.0) (rows個のリストのリスト)。"""
+        counts = self.grid_counts(rows, cols)
+        return [[counts[r][c] / ((y1 - y0) * (x1 - x0)) for c, (y0, y1, x0, x1) in enumerate(row)]
+                for r, row in enumerate(self.grid_cells(rows, cols))]
+
+    @cached_property
+    def stats(self):
+        """マスクの積分画像 (mask_stats.MaskStats、センサーの向き)。最初の領域の問い合わせで1回だけ作る。"""
+        return MaskStats(self.mask, buffers=self.buffers)
+
+    def region_count(self, y0, y1, x0, x1):
+        """表示の向きの矩形 [y0, y1) x [x0, x1) 内の検出画素数。"""
+        return self.stats.count(*self.orientation.to_sensor_rect(y0, y1, x0, x1, self.mask.shape))
+
+    def region_ratio(self, y0, y1, x0, x1):
+        """表示の向きの矩形 [y0, y1) x [x0, x1) 内の検出画素の割合 (0.0-1.0)。"""
+        area = (y1 - y0) * (x1 - x0)
+        return self.region_count(y0, y1, x0, x1) / area if area > 0 else 0.0
+
+    @cached_property
+    def centroid(self):
+        """検出画素全体の重心 (x, y) (表示の向き)。検出画素が無ければNone。"""
+        m = cv2.moments(self.mask, binaryImage=True)
+        if m["m00"] == 0:
+            return None
+        return self.orientation.to_display(m["m10"] / m["m00"], m["m01"] / m["m00"], self.mask.shape)
+
+    @cached_property
+    def contours(self):
+        """マスクの外側の輪郭のリスト (点の座標は表示の向き)。"""
+        contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if self.orientation.is_identity:
+            return contours
+        return [self.orientation.points_to_display(c, self.mask.shape) for c in contours]
+
+    @cached_property
+    def largest_blob(self):
+        """面積最大の輪郭。輪郭が無ければNone。"""
+        if not self.contours:
+            return None
+        return max(self.contours, key=cv2.contourArea)
@@ -0,0 +1,254 @@
+import time
+import threading
+from collections import deque, namedtuple
+
+# カメラの撮影を専用スレッドで回し続け、最新のフレームを待たずに受け取れるようにするモジュール
+# 以前は制御ループが picam2.capture_array() で次のフレームを同期的に待ち、その後 sleep していたので、
+# 撮影の待ち時間がそのまま制御の遅れになっていた。また、フレームが撮影された瞬間の方位が分からなかった。
+# FrameSource は撮影スレッドが受け取ったフレームに、露光時刻 (time.monotonic()基準)・センサーのメタデータ・
+# 露光時刻での方位 (BNO055の履歴から補間) を付けて、直近 buffers 枚をリングバッファに保持する。
+#
+# 使い方:
+#   camera = FrameSource(picam2, heading_fn=bno.get_heading)
+#   frame = camera.latest()                 # 最新のフレーム (待たない。まだ無ければNone)
+#   frame = camera.wait_for(after=t)        # 露光の中央が時刻tより後のフレームを待つ (動いた後の撮影など)
+#   image = camera.capture_array()          # picam2.capture_array() の置き換え (呼んだ後に露光したフレーム)
+#   buffer = camera.capture_array("lores")  # streams=("main", "lores") なら同じフレームのloresも取れる
+#   camera.stop()
+# picam2の他の属性 (camera_configなど) はそのまま参照できるので、picam2_instanceの代わりに渡せる。
+
+Frame = namedtuple("Frame", ["image", "seq", "timestamp", "heading", "metadata", "arrays"])
+Frame.__doc__ = """
+撮影したフレーム。
+    image (np.ndarray): 最初のストリームの画像 (capture_array()と同じ形式)。
+    arrays (dict): ストリーム名 → 画像 (streamsに指定した全てのストリーム)。
+    seq (int): 撮影スレッドが受け取った順の通し番号 (1から)。
+    timestamp (float): 露光の中央の時刻 (time.monotonic()基準) [s]。
+    heading (float): timestampでの方位 [deg] (heading_fnが無い、または履歴が無ければNone)。
+    metadata (dict): Picamera2のメタデータ (ExposureTime, SensorTimestamp など)。
+"""
+
+class FrameSource:
+    """
+    Picamera2の撮影を別スレッドで行い、タイムスタンプ付きの最新フレームを受け渡すクラス。
+    最初にフレームを要求されたときに撮影スレッドを開始する (BNO055の初期化前に作ってもよい)。
+    """
+
+    def __init__(self, picam2, heading_fn=None, buffers=3, streams=("main",), heading_hz=100, heading_history_s=2.0):
+        """
+        Args:
+            picam2 (Picamera2): 設定・start()済みのPicamera2インスタンス。
+            heading_fn (callable): 方位 [deg] を返す関数 (bno.get_headingなど)。Noneなら方位を付けない。
+            buffers (int): 保持するフレーム数 (2でダブル、3でトリプルバッファ)。
+            streams (tuple): 取得するストリーム名 ("main", "lores")。同じリクエストから取るので同時刻の画像になる。
+                             検出はloresだけで行うなら ("lores",) にするとmainのコピーが無くなる。
+            heading_hz (float): 方位をサンプリングする周期 [Hz]。
+            heading_history_s (float): 補間用に保持する方位の履歴の長さ [s]。
+        """
+        self.picam2 = picam2
+        self.heading_fn = heading_fn
+        self.streams = tuple(streams)
+        self.heading_hz = heading_hz
+        self._frames = deque(maxlen=max(2, buffers))
+        self._headings = deque(maxlen=max(2, int(heading_hz * heading_history_s)))
+        self._cond = threading.Condition()
+        self._running = False
+        self._threads = []
+        self._seq = 0
+        self.dropped = 0          # 受け取り側に渡されないまま押し出されたフレーム数 (最新だけを使うなら増えて正常)
+        self.errors = 0
+        self.last_error = None
+        self._delivered_seq = 0
+        self.last = None          # capture_array() で最後に渡したFrame (方位や時刻の参照用)
+
+    # ---------------- 撮影スレッド ----------------
+
+    def start(self):
+        """撮影スレッド (と方位のサンプリングスレッド) を開始する。既に動いていれば何もしない。"""
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        self._threads = [threading.Thread(target=self._capture_loop, name="frame-source", daemon=True)]
+        if self.heading_fn is not None:
+            self._threads.append(threading.Thread(target=self._heading_loop, name="frame-source-heading", daemon=True))
+        for t in self._threads:
+            t.start()
+        print(f"✅ FrameSource: 撮影スレッドを開始しました (streams={'/'.join(self.streams)}, バッファ{self._frames.maxlen}枚)。")
+        return self
+
+    def stop(self):
+        """撮影スレッドを止める (Picamera2自体は止めない)。"""
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(timeout=2.0)
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _heading_loop(self):
+        period = 1.0 / self.heading_hz
+        next_time = time.monotonic()
+        while self._running:
+            try:
+                heading = self.heading_fn()
+                if heading is not None:
+                    self._headings.append((time.monotonic(), heading))
+            except Exception as e:
+                self.last_error = e
+            next_time += period
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_time = time.monotonic() # 遅れた分は取り戻さない
+
+    def _capture_loop(self):
+        while self._running:
+            try:
+                request = self.picam2.capture_request()
+                try:
+                    arrays = {name: request.make_array(name) for name in self.streams}
+                    metadata = request.get_metadata()
+                finally:
+                    request.release()
+            except Exception as e:
+                self.errors += 1
+                self.last_error = e
+                print(f"[WARN] FrameSource: 撮影に失敗しました ({e})。")
+                time.sleep(0.1)
+                continue
+            arrived = time.monotonic()
+            timestamp = self._exposure_time(metadata, arrived)
+            with self._cond:
+                self._seq += 1
+                if len(self._frames) == self._frames.maxlen and self._frames[0].seq > self._delivered_seq:
+                    self.dropped += 1
+                image = arrays[self.streams[0]]
+                self._frames.append(Frame(image, self._seq, timestamp, self.heading_at(timestamp), metadata, arrays))
+                self._cond.notify_all()
+
+    @staticmethod
+    def _exposure_time(metadata, arrived):
+        """
+        露光の中央の時刻を time.monotonic() 基準で求める。
+        SensorTimestamp (露光開始, ns) がmonotonicと同じ時計で妥当な値ならそれを使い、
+        そうでなければ受け取った時刻から露光時間の半分を引いた値で近似する。
+        """
+        exposure_s = metadata.get("ExposureTime", 0) / 1e6
+        sensor_ns = metadata.get("SensorTimestamp")
+        if sensor_ns:
+            start = sensor_ns / 1e9
+            if 0 <= arrived - start < 1.0:
+                return start + exposure_s / 2
+        return arrived - exposure_s / 2
+
+    def heading_at(self, t):
+        """
+        時刻t (time.monotonic()基準) での方位 [deg] を履歴から線形補間する (0/360の境目も考慮)。
+        履歴が無ければNone。履歴の範囲外なら一番近いサンプルを返す。
+        """
+        history = list(self._headings)
+        if not history:
+            return None
+        if t <= history[0][0]:
+            return history[0][1]
+        for (t0, h0), (t1, h1) in zip(history, history[1:]):
+            if t0 <= t <= t1:
+                delta = (h1 - h0 + 180) % 360 - 180
+                ratio = (t - t0) / (t1 - t0) if t1 > t0 else 0.0
+                return (h0 + delta * ratio) % 360
+        return history[-1][1]
+
+    # ---------------- 受け取り側 ----------------
+
+    def _take(self, frame):
+        self._delivered_seq = max(self._delivered_seq, frame.seq)
+        return frame
+
+    def latest(self):
+        """最新のフレームを返す (待たない)。まだ1枚も無ければNone。撮影スレッドが止まっていれば開始する。"""
+        if not self._running:
+            self.start()
+        with self._cond:
+            if not self._frames:
+                return None
+            return self._take(self._frames[-1])
+
+    def wait_for(self, after=None, newer_than=None, timeout=2.0):
+        """
+        条件を満たすフレームが来るまで待って返す。
+
+        Args:
+            after (float): 露光の中央がこの時刻 (time.monotonic()基準) より後のフレームを待つ。
+            newer_than (int): seqがこの値より大きいフレームを待つ。
+            timeout (float): 待つ最大時間 [s]。
+
+        Returns:
+            Frame: 条件を満たす最新のフレーム。タイムアウトしたらNone。
+        """
+        if not self._running:
+            self.start()
+
+        def ready():
+            if not self._frames:
+                return False
+            frame = self._frames[-1]
+            if after is not None and frame.timestamp <= after:
+                return False
+            if newer_than is not None and frame.seq <= newer_than:
+                return False
+            return True
+
+        with self._cond:
+            if not self._cond.wait_for(lambda: ready() or not self._running, timeout):
+                return None
+            if not ready():
+                return None
+            return self._take(self._frames[-1])
+
+    def capture_array(self, name="main", timeout=2.0):
+        """
+        picam2.capture_array() の置き換え。露光の中央が呼び出しより後のフレームの画像を返す
+        (移動直後に呼んでも、移動中に撮影された古いフレームは返さない)。
+        タイムアウトした場合は最新のフレームを返し、1枚も無ければNone。
+        name はPicamera2と同じくストリーム名で、streamsに含まれている必要がある。
+        """
+        if name not in self.streams:
+            raise ValueError(f"FrameSource: ストリーム '{name}' は取得していません (streams={self.streams})。")
+        called = time.monotonic()
+        frame = self.wait_for(after=called, timeout=timeout)
+        if frame is None:
+            frame = self.latest()
+            if frame is None:
+                return None
+            print("[WARN] FrameSource: 新しいフレームが届かないため、最新のフレームを返します。")
+        self.last = frame
+        return frame.arrays[name]
+
+    def stats(self):
+        """撮影の統計 (dict)。"""
+        with self._cond:
+            frames = list(self._frames)
+        fps = None
+        if len(frames) >= 2 and frames[-1].timestamp > frames[0].timestamp:
+            fps = (len(frames) - 1) / (frames[-1].timestamp - frames[0].timestamp)
+        return {
+            "frames": self._seq,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "fps": fps,
+            "age_ms": (time.monotonic() - frames[-1].timestamp) * 1000 if frames else None,
+        }
+
+    def __getattr__(self, name):
+        # camera_config など、FrameSourceに無い属性はPicamera2のものを返す
+        if name.startswith("_") or name == "picam2":
+            raise AttributeError(name)
+        return getattr(self.picam2, name)
@@ -1,13 +1,14 @@
 import math
 import time
 import serial # IM920通信用ですが、このコードでは直接使われていないためコメントアウト
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import RPi.GPIO as GPIO
 from motor import MotorDriver      # ユーザーのMotorDriverクラスを使用
 from BNO055 import BNO055
 import smbus # BME280用ですが、このコードでは直接使われていないためコメントアウト
 import struct # このコードでは直接使われていないためコメントアウト
 import following # 別のファイルに定義された方向追従制御関数 (PD制御ロジックを内包)
+from turn_controller import TurnController
 
 class RoverGPSNavigator:
     """
@@ -80,7 +81,7 @@ class RoverGPSNavigator:
         )
 
         # pigpio 初期化
-        self.pi = pigpio.pi()
+        self.pi = pigpio_manager.acquire("RoverGPSNavigator")
         if not self.pi.connected:
             print("🔴 pigpio デーモンに接続できません。'sudo pigpiod' を実行してください。")
             self.cleanup() # 失敗時はクリーンアップ
@@ -104,6 +105,7 @@ class RoverGPSNavigator:
         self.bno.setExternalCrystalUse(True)
         self.bno.setMode(BNO055.OPERATION_MODE_NDOF)
         time.sleep(1) # モード設定後の待機
+        self.turner = TurnController(self.driver, self.bno)
         print("✅ センサー類の初期化完了。")
 
     def _convert_to_decimal(self, coord, direction):
@@ -242,20 +244,8 @@ class RoverGPSNavigator:
                 # 4. 方向調整フェーズ (角度誤差が大きい場合のみ回頭)
                 # 誤差の絶対値が閾値より大きい場合に回頭
                 if abs(angle_error) > self.ANGLE_ADJUST_THRESHOLD_DEG:
-                    turn_duration = 0.15 + (min(abs(angle_error), 360 - abs(angle_error)) / 180.0) * 0.2
-                    
-                    if angle_error < 0: # ターゲットが現在より小さい場合（左に回る方が近い）
-                        print(f"[TURN] 左に回頭します (誤差: {angle_error:.1f}°, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_left(0, self.TURN_SPEED)
-                        self.driver.petit_left(self.TURN_SPEED, 0)
-                    else: # ターゲットが現在より大きい場合（右に回る方が近い）
-                        print(f"[TURN] 右に回頭します (誤差: {angle_error:.1f}°, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_right(0, self.TURN_SPEED)
-                        self.driver.petit_right(self.TURN_SPEED, 0)
-                    
-                    time.sleep(turn_duration)
-                    self.driver.motor_stop_brake() # 確実な停止
-                    time.sleep(0.5) # 回転後の安定待ち
+                    print(f"[TURN] 目標方位へ回頭します (誤差: {angle_error:.1f}°)")
+                    self.turner.turn_to_heading(bearing_to_goal, speed=self.TURN_SPEED)
                     continue # 方向調整が終わったら、次のループで再度GPSと方位を確認
 
                 # 5. 前進フェーズ (PD制御による直進維持)
@@ -1,6 +1,23 @@
 import RPi.GPIO as GPIO # GPIO.cleanup()のために残しますが、ピン設定はpigpioで行いません
 import time
+import functools
+import threading
 import pigpio # pigpioを使うように変更
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
+from drive_calibration import DriveCalibration, twist_to_wheel_rates
+
+def _drive_command(method):
+    """
+    走行コマンド用のデコレータ。緊急停止中は何もしない。
+    緊急停止の書き込みと混ざらないよう、ピンへの書き込みはロックを取ってから行う。
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._drive_lock:
+            if self._estop.is_set():
+                return None
+            return method(self, *args, **kwargs)
+    return wrapper
 
 class MotorDriver:
     """
@@ -8,15 +25,33 @@ class MotorDriver:
     全てのGPIOピン設定とPWM制御はpigpioで行います。
     """
 
+    # ハードウェアPWMを出力できるピン (BCM番号) とそのPWMチャンネル
+    HW_PWM_CHANNELS = {12: 0, 18: 0, 13: 1, 19: 1}
+    # hardware_PWMのデューティ範囲 (0-1,000,000 = 0-100%)
+    HW_PWM_RANGE = 1000000
+
     def __init__(self, PWMA, AIN1, AIN2,
                  PWMB, BIN1, BIN2, STBY,
-                 freq=1000):
+                 freq=1000, pwm_backend="software", hw_freq=20000):
+        """
+        Args:
+            freq (int): ソフトウェアPWMの周波数 (Hz)。
+            pwm_backend (str): "software" (set_PWM_dutycycle, 0-255) または
+                               "hardware" (hardware_PWM, 0-1,000,000)。
+            hw_freq (int): ハードウェアPWMの周波数 (Hz)。TB6612は100kHzまで対応。
+        """
+        if pwm_backend not in ("software", "hardware"):
+            raise ValueError(f"不明なPWMバックエンドです: {pwm_backend}")
+        if pwm_backend == "hardware":
+            if PWMA not in self.HW_PWM_CHANNELS or PWMB not in self.HW_PWM_CHANNELS:
+                raise ValueError(f"ハードウェアPWMはGPIO{tuple(self.HW_PWM_CHANNELS)}のみ使用できます (PWMA={PWMA}, PWMB={PWMB})。")
+            if self.HW_PWM_CHANNELS[PWMA] == self.HW_PWM_CHANNELS[PWMB]:
+                # 同じチャンネルのピンは同じデューティしか出せない
+                raise ValueError(f"PWMA={PWMA}とPWMB={PWMB}は同じPWMチャンネルです。別チャンネルのピンを指定してください。")
         
-        # pigpioインスタンスはメインスクリプトから受け取るべきですが、
-        # MotorDriverは低レベル制御なので、ここでは内部でpiインスタンスを作成します。
-        # (ただし、メインスクリプトで既にpigpio.pi()が呼ばれていれば、
-        # pigpioは既存のデーモンに接続するだけなので問題ありません)
-        self.pi = pigpio.pi()
+        # pigpiodへの接続はpigpio_managerでプロセス内の他のクラスと共有する。
+        # (self.pi.stop() は自分の参照を返すだけなので、他のクラスの接続は切れません)
+        self.pi = pigpio_manager.acquire("MotorDriver")
         if not self.pi.connected:
             raise IOError("pigpio daemon not connected in MotorDriver.")
 
@@ -39,59 +74,81 @@ class MotorDriver:
         self.pi.write(self.STBY_PIN, 1) # pigpioでHIGHは1
 
         # --- pigpioによるPWM初期化 ---
-        self.pwm_freq = freq # 周波数
+        self.pwm_backend = pwm_backend
+        self.pwm_freq = hw_freq if pwm_backend == "hardware" else freq # 周波数
+
+        # 最大速度をRPi.GPIOの100%に合わせるため、MAX_SPEEDを定義
+        self.MAX_SPEED = 255 # pigpioのデューティサイクル範囲の最大値
 
-        # PWMA/PWMBピンのPWM周波数を設定
-        self.pi.set_PWM_frequency(self.PWMA_PIN, self.pwm_freq)
-        self.pi.set_PWM_frequency(self.PWMB_PIN, self.pwm_freq)
+        if self.pwm_backend == "software":
+            # PWMA/PWMBピンのPWM周波数を設定
+            self.pi.set_PWM_frequency(self.PWMA_PIN, self.pwm_freq)
+            self.pi.set_PWM_frequency(self.PWMB_PIN, self.pwm_freq)
 
-        # PWMの範囲を設定 (デューティサイクルの最大値)。0-255 の範囲で指定
-        self.pi.set_PWM_range(self.PWMA_PIN, 255) # 0-255の範囲に設定 (RPi.GPIOの0-100に合わせるなら100にする)
-        self.pi.set_PWM_range(self.PWMB_PIN, 255) # 0-255の範囲に設定
+            # PWMの範囲を設定 (デューティサイクルの最大値)。0-255 の範囲で指定
+            self.pi.set_PWM_range(self.PWMA_PIN, 255) # 0-255の範囲に設定 (RPi.GPIOの0-100に合わせるなら100にする)
+            self.pi.set_PWM_range(self.PWMB_PIN, 255) # 0-255の範囲に設定
 
         # motorの起動：デューティ比0⇒停止
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, 0)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, 0)
+        self._set_speed(self.PWMA_PIN, 0)
+        self._set_speed(self.PWMB_PIN, 0)
 
-        # 最大速度をRPi.GPIOの100%に合わせるため、MAX_SPEEDを定義
-        self.MAX_SPEED = 255 # pigpioのデューティサイクル範囲の最大値
+        # set_twist()で使う左右の線形化テーブル (未キャリブレーションなら恒等変換)
+        self.calibration = DriveCalibration()
+
+        # 緊急停止: フラグが立っている間は走行コマンドを無視し、ランプ処理も次のステップで抜ける
+        self._estop = threading.Event()
+        self._drive_lock = threading.RLock()
+        # 4本の方向ピンを全てHIGH (TB6612のショートブレーキ) にするためのビットマスク
+        self._brake_mask = (1 << self.A1) | (1 << self.A2) | (1 << self.B1) | (1 << self.B2)
+        self.last_estop_latency_s = None
+
+        print(f"✅ MotorDriver: インスタンス作成完了 (pigpioベース, {self.pwm_backend} PWM {self.pwm_freq}Hz)。")
 
-        print("✅ MotorDriver: インスタンス作成完了 (pigpioベース)。")
+    # 速度 (0-100%) をPWMピンへ出力する。バックエンドの違いはここで吸収する
+    def _set_speed(self, pin, speed):
+        speed = max(0, min(100, speed))
+        if self.pwm_backend == "hardware":
+            # DMAではなくPWMペリフェラルが波形を生成するため、pigpiodのCPU負荷とジッタが小さい
+            self.pi.hardware_PWM(pin, self.pwm_freq, int(speed / 100 * self.HW_PWM_RANGE))
+        else:
+            self.pi.set_PWM_dutycycle(pin, int(speed / 100 * self.MAX_SPEED)) # 0-100%を0-MAX_SPEEDに変換
 
     # 右回頭
+    @_drive_command
     def motor_right(self, speed):
-        duty = int(speed / 100 * self.MAX_SPEED) # 0-100%を0-MAX_SPEEDに変換
         self.pi.write(self.A1, 0) # pigpio LOWは0
         self.pi.write(self.A2, 1) # pigpio HIGHは1
         self.pi.write(self.B1, 0)
         self.pi.write(self.B2, 1)
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, duty)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, duty)
+        self._set_speed(self.PWMA_PIN, speed)
+        self._set_speed(self.PWMB_PIN, speed)
 
     # 左回頭
+    @_drive_command
     def motor_left(self, speed):
-        duty = int(speed / 100 * self.MAX_SPEED)
         self.pi.write(self.A1, 1)
         self.pi.write(self.A2, 0)
         self.pi.write(self.B1, 1)
         self.pi.write(self.B2, 0)
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, duty)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, duty)
+        self._set_speed(self.PWMA_PIN, speed)
+        self._set_speed(self.PWMB_PIN, speed)
 
     # 後退
+    @_drive_command
     def motor_retreat(self, speed):
-        duty = int(speed / 100 * self.MAX_SPEED)
         self.pi.write(self.A1, 1)
         self.pi.write(self.A2, 0)
         self.pi.write(self.B1, 0)
         self.pi.write(self.B2, 1)
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, duty)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, duty)
+        self._set_speed(self.PWMA_PIN, speed)
+        self._set_speed(self.PWMB_PIN, speed)
     
     # モータのトルクでブレーキをかける (実際はピンをLOWにするだけ)
+    @_drive_command
     def motor_stop_free(self):
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, 0)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, 0)
+        self._set_speed(self.PWMA_PIN, 0)
+        self._set_speed(self.PWMB_PIN, 0)
         self.pi.write(self.A1, 0)
         self.pi.write(self.A2, 0)
         self.pi.write(self.B1, 0)
@@ -99,34 +156,110 @@ class MotorDriver:
     
     # ガチブレーキ
     def motor_stop_brake(self):
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, 0)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, 0)
-        self.pi.write(self.A1, 1)
-        self.pi.write(self.A2, 1)
-        self.pi.write(self.B1, 1)
-        self.pi.write(self.B2, 1)
+        with self._drive_lock: # ブレーキは緊急停止中でも実行する
+            self._set_speed(self.PWMA_PIN, 0)
+            self._set_speed(self.PWMB_PIN, 0)
+            self.pi.write(self.A1, 1)
+            self.pi.write(self.A2, 1)
+            self.pi.write(self.B1, 1)
+            self.pi.write(self.B2, 1)
+
+    # 緊急停止 (どのスレッドから呼んでもよい)
+    # フラグを立てたあと、set_bank_1の1コマンドで4本の方向ピンを同時にHIGHにしてショートブレーキを掛ける。
+    # TB6612はIN1=IN2=HIGHならPWMに関係なくブレーキになるので、この時点で車輪は止まり始める。
+    # その後ロックを取り、実行中の走行コマンドが終わってから念のためもう一度ブレーキとPWM 0を書く。
+    def emergency_stop(self, reason=""):
+        start = time.perf_counter()
+        self._estop.set()
+        self.pi.set_bank_1(self._brake_mask)
+        with self._drive_lock:
+            self.pi.set_bank_1(self._brake_mask)
+            self._set_speed(self.PWMA_PIN, 0)
+            self._set_speed(self.PWMB_PIN, 0)
+        self.last_estop_latency_s = time.perf_counter() - start
+        print(f"🛑 MotorDriver: 緊急停止しました ({reason or '理由なし'}, {self.last_estop_latency_s * 1000:.2f}ms)。")
+
+    # 緊急停止を解除する (ブレーキは掛かったまま。次の走行コマンドから動ける)
+    def clear_emergency_stop(self):
+        self._estop.clear()
+        print("MotorDriver: 緊急停止を解除しました。")
+
+    @property
+    def estopped(self):
+        return self._estop.is_set()
+
+    # ランプ処理の1ステップ分の待機。緊急停止が掛かっていたらTrueを返すので、呼び出し側はすぐ戻る
+    def _ramp_wait(self, seconds):
+        if self._estop.is_set():
+            return True
+        time.sleep(seconds)
+        return self._estop.is_set()
+
+    # time.sleep()の代わり。緊急停止が掛かると途中で戻りTrueを返す (スタック脱出中の待機などに使う)
+    def estop_wait(self, seconds, interval=0.01):
+        end = time.monotonic() + seconds
+        while not self._estop.is_set():
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+        return True
 
     # 前進：任意
+    @_drive_command
     def motor_forward(self, speed):
-        duty = int(speed / 100 * self.MAX_SPEED)
         self.pi.write(self.A1, 0)
         self.pi.write(self.A2, 1)
         self.pi.write(self.B1, 1)
         self.pi.write(self.B2, 0)
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, duty)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, duty)
+        self._set_speed(self.PWMA_PIN, speed)
+        self._set_speed(self.PWMB_PIN, speed)
     
+    @_drive_command
     def motor_Lforward(self, speed):
-        duty = int(speed / 100 * self.MAX_SPEED)
         self.pi.write(self.A1, 0)
         self.pi.write(self.A2, 1)
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, duty)
+        self._set_speed(self.PWMA_PIN, speed)
             
+    @_drive_command
     def motor_Rforward(self, speed):
-        duty = int(speed / 100 * self.MAX_SPEED)
         self.pi.write(self.B1, 1)
         self.pi.write(self.B2, 0)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, duty)
+        self._set_speed(self.PWMB_PIN, speed)
+
+    @_drive_command
+    def motor_Lretreat(self, speed):
+        self.pi.write(self.A1, 1)
+        self.pi.write(self.A2, 0)
+        self._set_speed(self.PWMA_PIN, speed)
+
+    @_drive_command
+    def motor_Rretreat(self, speed):
+        self.pi.write(self.B1, 0)
+        self.pi.write(self.B2, 1)
+        self._set_speed(self.PWMB_PIN, speed)
+
+    # drive_calibration.calibrate_drive() の結果を設定する
+    def set_calibration(self, calibration):
+        self.calibration = calibration
+        print(f"MotorDriver: キャリブレーションを設定しました (デッドバンド 左{calibration.deadband('left'):.0f}% / 右{calibration.deadband('right'):.0f}%)。")
+
+    # 差動二輪の速度指令
+    # v: 並進 (-1.0〜1.0, 左右共通の最大車輪速度に対する比)
+    # omega: 旋回角速度 [deg/s] (右回り正)。未キャリブレーション時はデューティ差[%]として働く
+    @_drive_command
+    def set_twist(self, v, omega):
+        left, right = twist_to_wheel_rates(self.calibration, v, omega)
+        left_duty = self.calibration.duty_for("left", left)
+        right_duty = self.calibration.duty_for("right", right)
+        if left >= 0:
+            self.motor_Lforward(left_duty)
+        else:
+            self.motor_Lretreat(left_duty)
+        if right >= 0:
+            self.motor_Rforward(right_duty)
+        else:
+            self.motor_Rretreat(right_duty)
             
     # 前進：回転数制御(異なる回転数へ変化するときに滑らかに遷移するようにする)
     def changing_forward(self, before, after):
@@ -135,21 +268,24 @@ class MotorDriver:
             delta_speed = (after - before) / 100
             speed = before + i * delta_speed
             self.motor_forward(speed)
-            time.sleep(0.02)
+            if self._ramp_wait(0.02):
+                return
 
     def changing_Lforward(self, before, after):
         for i in range(1, 100):
             delta_speed = (after - before) / 100
             speed = before + i * delta_speed
             self.motor_Lforward(speed)
-            time.sleep(0.03)
+            if self._ramp_wait(0.03):
+                return
             
     def changing_Rforward(self, before, after):
         for i in range(1, 100):
             delta_speed = (after - before) / 100
             speed = before + i * delta_speed
             self.motor_Rforward(speed)
-            time.sleep(0.03)
+            if self._ramp_wait(0.03):
+                return
             
     # 右折：回転数制御(基本は停止してから使いましょう)
     def changing_right(self, before, after):
@@ -157,7 +293,8 @@ class MotorDriver:
             delta_speed = (after - before) / 50
             speed = before + i * delta_speed
             self.motor_right(speed)
-            time.sleep(0.03)
+            if self._ramp_wait(0.03):
+                return
     
     # 左折（同様）
     def changing_left(self, before, after):
@@ -165,7 +302,8 @@ class MotorDriver:
             delta_speed = (after - before) / 50
             speed = before + i * delta_speed
             self.motor_left(speed)
-            time.sleep(0.03)
+            if self._ramp_wait(0.03):
+                return
 
     # 後退：回転数制御
     def changing_retreat(self, before, after):
@@ -173,21 +311,24 @@ class MotorDriver:
             delta_speed = (after - before) / 50
             speed = before + i * delta_speed
             self.motor_retreat(speed)
-            time.sleep(0.03)
+            if self._ramp_wait(0.03):
+                return
             
     def quick_right(self, before, after):
         for i in range(10):
             delta_speed = (after - before) / 10
             speed = before + i * delta_speed
             self.motor_right(speed)
-            time.sleep(0.02)
+            if self._ramp_wait(0.02):
+                return
 
     def quick_left(self, before, after):
         for i in range(10):
             delta_speed = (after - before) / 10
             speed = before + i * delta_speed
             self.motor_left(speed)
-            time.sleep(0.02)
+            if self._ramp_wait(0.02):
+                return
     
     def changing_moving_forward(self, Lmotor_b, Lmotor_a ,Rmotor_b, Rmotor_a):
         for i in range(1, 20):
@@ -197,40 +338,45 @@ class MotorDriver:
             speed_R = Rmotor_b + i * delta_speed_R
             self.motor_Lforward(speed_L)
             self.motor_Rforward(speed_R)
-            time.sleep(0.02)
+            if self._ramp_wait(0.02):
+                return
 
     def petit_forward(self, before, after):
         for i in range (1, 5):
             delta_speed = (after - before) / 5
             speed = before + i * delta_speed
             self.motor_forward(speed)
-            time.sleep(0.02)
+            if self._ramp_wait(0.02):
+                return
             
     def petit_left(self, before, after):
         for i in range (1, 5):
             delta_speed = (after - before) / 5
             speed = before + i * delta_speed
             self.motor_left(speed)
-            time.sleep(0.02)
+            if self._ramp_wait(0.02):
+                return
 
     def petit_right(self, before, after):
         for i in range (1, 5):
             delta_speed = (after - before) / 5
             speed = before + i * delta_speed
             self.motor_right(speed)
-            time.sleep(0.02)
+            if self._ramp_wait(0.02):
+                return
             
     def petit_petit(self, count):
         for i in range (1, count + 1): # count回実行するために +1
             self.petit_forward(0, 90)
             self.petit_forward(90, 0)
-            time.sleep(0.2)
+            if self._ramp_wait(0.2):
+                return
             
     # モータードライバのクリーンアップ (pigpioピンをクリア)
     def cleanup(self):
         # PWMを停止し、ピンを出力から入力に戻す
-        self.pi.set_PWM_dutycycle(self.PWMA_PIN, 0)
-        self.pi.set_PWM_dutycycle(self.PWMB_PIN, 0)
+        self._set_speed(self.PWMA_PIN, 0)
+        self._set_speed(self.PWMB_PIN, 0)
         self.pi.set_mode(self.A1, pigpio.INPUT)
         self.pi.set_mode(self.A2, pigpio.INPUT)
         self.pi.set_mode(self.PWMA_PIN, pigpio.INPUT)
@@ -1,9 +1,10 @@
 import RPi.GPIO as GPIO
 import time
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import board # Adafruit CircuitPython I2C (BNO055用)
 import busio # Adafruit CircuitPython I2C (BNO055用)
 import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
 import smbus # BME280用
 
 # 外部クラスのインポート (各クラスがそれぞれのファイルに存在することを前提)
@@ -19,6 +20,9 @@ from Flagseeker import FlagSeeker
 from supplies_installtion import ServoController # ServoController クラス
 from Goal_Detective_Noshiro import RedConeNavigator
 from picamera2 import Picamera2
+from frame_source import FrameSource
+import camera_setup
+import color_calibration
 
 import cv2
 import numpy as np
@@ -55,7 +59,11 @@ SERVO_PIN_ACTION = 13 # 放出と物資設置で同じサーボを使う想定
 SERVO_PWM_FREQUENCY = 50
 
 # カメラ設定
-CAMERA_RESOLUTION = (640, 480)
+CAMERA_RESOLUTION = (640, 480)   # mainストリーム (フラッグ検出・デバッグ画像)
+DETECTION_RESOLUTION = (320, 240) # loresストリーム (YUV420、赤コーン検出)
+# 赤色の閾値のキャリブレーション: 起動時に正面に置いた赤コーンをloresで撮影し、その場の照明に合わせる
+COLOR_CALIBRATION_AT_STARTUP = True
+COLOR_CALIBRATION_ROI = None # (x, y, 幅, 高さ) loresの色差平面 (縦横1/2) の座標。Noneなら正面の最大の赤い領域
 
 # --- ミッションステージのパラメータ ---
 # 放出判定ステージ (RoverReleaseDetectorのデフォルト設定を使用)
@@ -90,6 +98,7 @@ FLAG_AREA_THRESHOLD_PERCENT = 20.0 # 接近完了とみなす画面占有率（
 # 物資設置ステージ (サーボ動作のデューティサイクル例)
 SUPPLIES_INSTALL_DUTY_CYCLE = 4.0 # 物資を放出するサーボのデューティサイクル
 SUPPLIES_RETURN_DUTY_CYCLE = 7.5 # 物資設置後のサーボの初期位置デューティサイクル
+SUPPLIES_ACTION_TIMEOUT_S = 15 # 放出 → 戻す の完了を待つ上限
 
 # ゴールまでGPS誘導ステージ
 GOAL_GPS_LOCATION = [35.9185000, 139.9110000] # 最終的なゴール地点
@@ -109,6 +118,7 @@ bno_sensor_main = None
 i2c_bus_main = None # メインで管理するI2Cバス
 motor_driver = None
 picam2_instance = None
+frame_source = None
 gps_im920_comm = None
 gps_comm_thread = None
 ejection_detector = None # 放出判定用
@@ -148,7 +158,7 @@ def cleanup_all_resources():
     プログラム終了時に使用した全てのハードウェアリソースを解放します。
     """
     print("\n--- 全てのシステムをクリーンアップしています ---")
-    global pi_instance, bno_sensor_main, i2c_bus_main, motor_driver, picam2_instance, \
+    global pi_instance, bno_sensor_main, i2c_bus_main, motor_driver, picam2_instance, frame_source, \
            gps_im920_comm, gps_comm_thread, ejection_detector, landing_stability_detector, \
            gps_navigator, flag_seeker, servo_controller_action, red_cone_navigator
 
@@ -168,6 +178,8 @@ def cleanup_all_resources():
         gps_im920_comm.cleanup() # IM920の通信リソースをクリーンアップ (ワイヤレスグラウンドOFFも含む)
 
     # 共有リソースのクリーンアップ
+    if frame_source:
+        frame_source.stop()
     if picam2_instance:
         picam2_instance.close()
         print("カメラを閉じました。")
@@ -195,7 +207,7 @@ if __name__ == "__main__":
 
         # --- 共通リソースの初期化 ---
         # pigpioデーモンへの接続
-        pi_instance = pigpio.pi()
+        pi_instance = pigpio_manager.acquire("nonstuck_EE")
         if not pi_instance.connected:
             print("🔴 pigpioデーモンに接続できません。'sudo pigpiod'を実行してください。")
             sys.exit(1)
@@ -220,13 +232,12 @@ if __name__ == "__main__":
 
         # Picamera2の初期化
         picam2_instance = Picamera2()
-        config = picam2_instance.create_still_configuration(
-            main={"size": CAMERA_RESOLUTION}
-        )
-        picam2_instance.configure(config)
-        picam2_instance.start()
-        time.sleep(1)
+        camera_setup.configure_detection_camera(picam2_instance, main_size=CAMERA_RESOLUTION,
+                                                lores_size=DETECTION_RESOLUTION)
         print(f"✅ カメラ初期化完了。解像度: {CAMERA_RESOLUTION[0]}x{CAMERA_RESOLUTION[1]}")
+        # 撮影は専用スレッドで行い、各フレームに露光時刻と方位を付ける (最初に撮影を要求されたときに開始)
+        frame_source = FrameSource(picam2_instance, heading_fn=bno_sensor_main.get_heading,
+                                   streams=("main", camera_setup.DETECTION_STREAM))
 
         # --- 各機能クラスのインスタンス化 ---
         # 1. 放出判定（RoverReleaseDetector）
@@ -287,7 +298,7 @@ if __name__ == "__main__":
         flag_seeker = FlagSeeker(
             driver_instance=motor_driver,
             bno_instance=bno_sensor_main,
-            picam2_instance=picam2_instance,
+            picam2_instance=frame_source, # Picamera2の代わりに渡せる
             target_shapes=FLAG_TARGET_SHAPES,
             area_threshold_percent=FLAG_AREA_THRESHOLD_PERCENT
         )
@@ -300,11 +311,16 @@ if __name__ == "__main__":
         )
         print("✅ ServoController (アクション用) インスタンス作成。")
 
+        # 赤色の閾値をその場の照明に合わせる (RedConeNavigator が分類器を読み込む前に行う)
+        if COLOR_CALIBRATION_AT_STARTUP:
+            color_calibration.calibrate_from_camera(frame_source, "red", stream=camera_setup.DETECTION_STREAM,
+                                                    roi=COLOR_CALIBRATION_ROI)
+
         # RedConeNavigator
         red_cone_navigator = RedConeNavigator(
             driver_instance=motor_driver,
             bno_instance=bno_sensor_main,
-            picam2_instance=picam2_instance,
+            picam2_instance=frame_source, # Picamera2の代わりに渡せる
             cone_lost_max_count=RED_CONE_LOST_MAX_COUNT,
             goal_percentage_threshold=RED_CONE_GOAL_PERCENTAGE
         )
@@ -346,7 +362,7 @@ if __name__ == "__main__":
         print("\n--- フェーズ3: パラシュート回避を開始します ---")
         print("パラシュート回避のため、少し前進し、周辺を確認します...")
         motor_driver.move_forward(motor_driver.MAX_SPEED * 0.5)
-        time.sleep(5)
+        motor_driver.estop_wait(5) # 緊急停止が掛かれば途中で戻る
         motor_driver.motor_stop_brake()
         print("✅ パラシュート回避行動完了。")
 
@@ -370,11 +386,11 @@ if __name__ == "__main__":
         # === フェーズ6: 物資設置 ===
         print("\n--- フェーズ6: 物資設置アクションを実行します ---")
         print("サーボを物資設置位置に移動させます。")
-        servo_controller_action.set_duty_cycle(SUPPLIES_INSTALL_DUTY_CYCLE)
-        time.sleep(5)
-        servo_controller_action.set_duty_cycle(SUPPLIES_RETURN_DUTY_CYCLE)
-        time.sleep(1)
-        print("✅ 物資設置アクション完了。")
+        # 放出 → 保持 → 戻す、をバックグラウンドで実行し、その間にフェーズ7の準備を進める
+        supplies_done = servo_controller_action.run_sequence([
+            (servo_controller_action.duty_to_pulse_width(SUPPLIES_INSTALL_DUTY_CYCLE), 5.5),
+            (servo_controller_action.duty_to_pulse_width(SUPPLIES_RETURN_DUTY_CYCLE), 1.5),
+        ])
 
         # === フェーズ7: ゴールまでGPS誘導 ===
         gps_navigator.set_goal_location(GOAL_GPS_LOCATION)
@@ -384,6 +400,14 @@ if __name__ == "__main__":
         gps_navigator.set_move_speed(GOAL_GPS_MOVE_SPEED)
         gps_navigator.set_move_duration(GOAL_GPS_MOVE_DURATION_S)
         
+        try:
+            supplies_done.result(timeout=SUPPLIES_ACTION_TIMEOUT_S) # 走り出す前にサーボ動作の完了を待つ
+            print("✅ 物資設置アクション完了。")
+        except FutureTimeoutError:
+            print(f"⚠️ 物資設置アクションが{SUPPLIES_ACTION_TIMEOUT_S}秒以内に終わりませんでした。ゴールへの誘導を続けます。")
+        except Exception as e:
+            print(f"⚠️ 物資設置アクションでエラーが発生しました: {e}。ゴールへの誘導を続けます。")
+
         print(f"\n--- フェーズ7: 最終ゴール地点 ({GOAL_GPS_LOCATION}) までGPS誘導を開始します ---")
         gps_navigator.navigate_to_goal()
         print("🎉 最終ゴール地点へのGPS誘導が完了しました！")
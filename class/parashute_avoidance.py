@@ -1,12 +1,10 @@
 import RPi.GPIO as GPIO
 import time
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import board
 import busio
-import numpy as np
 import cv2
 from picamera2 import Picamera2
-from libcamera import Transform # TransformはPicamera2のconfigureで使用
 
 import sys
 import os
@@ -16,6 +14,12 @@ import math
 from motor import MotorDriver
 from BNO055 import BNO055 # BNO055センサーライブラリ
 import following # 別のファイルに定義された方向追従制御関数
+from turn_controller import TurnController
+import color_classifier
+from frame_analysis import FrameAnalysis
+import camera_setup
+import camera_orientation
+import debug_image_writer
 
 # --- BNO055Wrapper クラスは削除される前提 ---
 
@@ -47,10 +51,14 @@ class RoverNavigator:
     BNO055_ADDRESS = 0x28
 
     # カメラ設定
-    CAMERA_WIDTH = 640
+    CAMERA_WIDTH = 640      # mainストリーム (デバッグ画像用)
     CAMERA_HEIGHT = 480
+    DETECTION_WIDTH = 320   # loresストリーム (YUV420、赤色検出用)
+    DETECTION_HEIGHT = 240
     CAMERA_FRAMERATE = 30
-    CAMERA_ROTATION = 90
+    # 反時計回りに90度回転してから左右反転した向き。反転 (=180度回転) はISPで行い、ISPにできない転置は
+    # 検出結果の座標だけを変換する (Transform(rotation=90) はRaspberry PiのISPでは使えない)
+    CAMERA_ORIENTATION = camera_orientation.Orientation.from_cv2(cv2.ROTATE_90_COUNTERCLOCKWISE, flip=1)
 
     # 赤色検出設定
     SAVE_IMAGE_DIR = "/home/mark1/Pictures/"
@@ -58,10 +66,10 @@ class RoverNavigator:
 
     # 旋回・回避設定
     ANGLE_GPS_ADJUST_THRESHOLD_DEG = 10.0
-    ANGLE_RELATIVE_TURN_TOLERANCE_DEG = 10.0
+    ANGLE_RELATIVE_TURN_TOLERANCE_DEG = 3.0
     TURN_SPEED = 90
     TURN_RE_ALIGN_SPEED = 90
-    MAX_TURN_ATTEMPTS = 100
+    TURN_TIMEOUT_S = 6.0
     FORWARD_SPEED_DEFAULT = 100
     FORWARD_DURATION_DEFAULT = 5
 
@@ -73,7 +81,7 @@ class RoverNavigator:
         GPIO.setmode(GPIO.BCM)
         GPIO.setwarnings(False)
 
-        self.pi = pigpio.pi()
+        self.pi = pigpio_manager.acquire("RoverNavigator")
         if not self.pi.connected:
             print("🔴 pigpioデーモンに接続できません。'sudo pigpiod'で起動してください。")
             sys.exit(1)
@@ -96,14 +104,23 @@ class RoverNavigator:
         time.sleep(1) # センサー安定化のための待機
         # self.bno_wrapper は不要になるため、削除
 
+        # 回頭は全てTurnController (連続PID) で行う
+        self.turner = TurnController(self.driver, self.bno,
+                                     tolerance_deg=self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG,
+                                     timeout_s=self.TURN_TIMEOUT_S)
+
         self.picam2 = Picamera2()
-        self.picam2.configure(self.picam2.create_preview_configuration(
-            main={"size": (self.CAMERA_WIDTH, self.CAMERA_HEIGHT)},
+        camera_setup.configure_detection_camera(
+            self.picam2,
+            main_size=(self.CAMERA_WIDTH, self.CAMERA_HEIGHT),
+            lores_size=(self.DETECTION_WIDTH, self.DETECTION_HEIGHT),
+            orientation=self.CAMERA_ORIENTATION,
             controls={"FrameRate": self.CAMERA_FRAMERATE},
-            transform=Transform(rotation=self.CAMERA_ROTATION)
-        ))
-        self.picam2.start()
-        time.sleep(2)
+            still=False, settle_s=2.0
+        )
+        self.orientation = camera_orientation.residual(self.picam2, self.CAMERA_ORIENTATION)
+        # 赤色の判定はloresのY/U/V平面から直接行う (参照テーブル1回の引き当て、RGBへの変換なし)
+        self.red_classifier_yuv = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="YUV")
 
         err = self.pi.bb_serial_read_open(self.RX_PIN, self.GPS_BAUD, 8)
         if err != 0:
@@ -177,8 +194,8 @@ class RoverNavigator:
             print("警告: 画像キャプチャ失敗：フレームがNoneです。")
             return None
         frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-        cv2.imwrite(path, frame_bgr)
-        print(f"デバッグ画像を保存しました: {path}")
+        debug_image_writer.save(path, frame_bgr, event=True) # エンコードと書き込みはバックグラウンドで行う
+        print(f"デバッグ画像の保存を予約しました: {path}")
         return frame_bgr
 
     def _detect_red_in_grid(self, save_filename="akairo_grid.jpg"):
@@ -186,74 +203,51 @@ class RoverNavigator:
         save_path = os.path.join(self.SAVE_IMAGE_DIR, save_filename)
         
         try:
-            frame_rgb = self.picam2.capture_array()
-            if frame_rgb is None:
+            buffer = self.picam2.capture_array(camera_setup.DETECTION_STREAM)
+            if buffer is None:
                 print("警告: 画像キャプチャ失敗: フレームがNoneです。")
                 return 'error_in_processing'
 
-            processed_frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
-            processed_frame_bgr = cv2.flip(processed_frame_bgr, 1)
-            
-            height, width, _ = processed_frame_bgr.shape
-            cell_height = height // 2
-            cell_width = width // 3
-            cells = {
-                'top_left': (0, cell_height, 0, cell_width),
-                'top_middle': (0, cell_height, cell_width, 2 * cell_width),
-                'top_right': (0, cell_height, 2 * cell_width, width),
-                'bottom_left': (cell_height, height, 0, cell_width),
-                'bottom_middle': (cell_height, height, cell_width, 2 * cell_width),
-                'bottom_right': (cell_height, height, 2 * cell_width, width),
-            }
-            red_counts = {key: 0 for key in cells}
-            total_pixels_in_cell = {key: 0 for key in cells}
-
-            lower_red1 = np.array([0, 100, 100])
-            upper_red1 = np.array([10, 255, 255])
-            lower_red2 = np.array([160, 100, 100])
-            upper_red2 = np.array([180, 255, 255])
-
-            blurred_full_frame = cv2.GaussianBlur(processed_frame_bgr, (5, 5), 0)
-            hsv_full = cv2.cvtColor(blurred_full_frame, cv2.COLOR_BGR2HSV)
-            mask_full = cv2.bitwise_or(cv2.inRange(hsv_full, lower_red1, upper_red1),
-                                       cv2.inRange(hsv_full, lower_red2, upper_red2))
-            red_pixels_full = np.count_nonzero(mask_full)
-            total_pixels_full = height * width
-            red_percentage_full = red_pixels_full / total_pixels_full if total_pixels_full > 0 else 0.0
+            # 赤色判定はこのフレームで1回だけ行い、全体の割合もセルごとの割合も同じマスクから求める
+            # (マスクは回転せず、セルの範囲だけを表示の向きに変換する)
+            analysis = FrameAnalysis(buffer, self.red_classifier_yuv, orientation=self.orientation)
+            red_percentage_full = analysis.ratio
 
             if red_percentage_full >= 0.80:
                 print(f"画像全体の赤色ピクセル割合: {red_percentage_full:.2%} (高割合) -> high_percentage_overall")
-                cv2.imwrite(save_path, processed_frame_bgr)
+                debug_image_writer.save(save_path, analysis.oriented, event=True)
                 return 'high_percentage_overall'
 
-            debug_frame = processed_frame_bgr.copy()
-            for cell_name, (y_start, y_end, x_start, x_end) in cells.items():
-                cell_frame = processed_frame_bgr[y_start:y_end, x_start:x_end]
-                blurred_cell_frame = cv2.GaussianBlur(cell_frame, (5, 5), 0)
-                hsv_cell = cv2.cvtColor(blurred_cell_frame, cv2.COLOR_BGR2HSV)
-                mask_cell = cv2.bitwise_or(cv2.inRange(hsv_cell, lower_red1, upper_red1),
-                                             cv2.inRange(hsv_cell, lower_red2, upper_red2))
-                red_counts[cell_name] = np.count_nonzero(mask_cell)
-                total_pixels_in_cell[cell_name] = cell_frame.shape[0] * cell_frame.shape[1]
-                
-                color = (255, 0, 0)
-                thickness = 2
-                if red_counts[cell_name] / total_pixels_in_cell[cell_name] >= self.MIN_RED_PIXEL_RATIO_PER_CELL:
-                    color = (0, 0, 255)
-                    thickness = 3
-                cv2.rectangle(debug_frame, (x_start, y_start), (x_end, y_end), color, thickness)
-                cv2.putText(debug_frame, f"{cell_name}: {(red_counts[cell_name] / total_pixels_in_cell[cell_name]):.2f}", 
-                                (x_start + 5, y_start + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-
-            directory = os.path.dirname(save_path)
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            cv2.imwrite(save_path, debug_frame)
-            print(f"グリッド検出画像を保存しました: {save_path}")
-
-            bottom_left_ratio = red_counts['bottom_left'] / total_pixels_in_cell['bottom_left']
-            bottom_middle_ratio = red_counts['bottom_middle'] / total_pixels_in_cell['bottom_middle']
-            bottom_right_ratio = red_counts['bottom_right'] / total_pixels_in_cell['bottom_right']
+            # 縦2x横3のセルごとの赤色の割合
+            cell_names = [['top_left', 'top_middle', 'top_right'],
+                          ['bottom_left', 'bottom_middle', 'bottom_right']]
+            ratios = analysis.grid_ratios(2, 3)
+            cell_ratios = {}
+
+            debug_frame = analysis.oriented.copy() # デバッグ画像用にだけBGRへ変換する
+            # マスクはloresの縦横1/2なので、デバッグ画像の座標に合わせて拡大する
+            scale_y = debug_frame.shape[0] / analysis.shape[0]
+            scale_x = debug_frame.shape[1] / analysis.shape[1]
+            for names, ratio_row, cell_row in zip(cell_names, ratios, analysis.grid_cells(2, 3)):
+                for cell_name, ratio, (y_start, y_end, x_start, x_end) in zip(names, ratio_row, cell_row):
+                    cell_ratios[cell_name] = ratio
+                    y_start, y_end = int(y_start * scale_y), int(y_end * scale_y)
+                    x_start, x_end = int(x_start * scale_x), int(x_end * scale_x)
+                    color = (255, 0, 0)
+                    thickness = 2
+                    if ratio >= self.MIN_RED_PIXEL_RATIO_PER_CELL:
+                        color = (0, 0, 255)
+                        thickness = 3
+                    cv2.rectangle(debug_frame, (x_start, y_start), (x_end, y_end), color, thickness)
+                    cv2.putText(debug_frame, f"{cell_name}: {ratio:.2f}", 
+                                    (x_start + 5, y_start + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+            if debug_image_writer.save(save_path, debug_frame):
+                print(f"グリッド検出画像の保存を予約しました: {save_path}")
+
+            bottom_left_ratio = cell_ratios['bottom_left']
+            bottom_middle_ratio = cell_ratios['bottom_middle']
+            bottom_right_ratio = cell_ratios['bottom_right']
 
             detected_cells_bottom_row = []
             if bottom_left_ratio >= self.MIN_RED_PIXEL_RATIO_PER_CELL:
@@ -289,63 +283,23 @@ class RoverNavigator:
         BNO055Wrapperの機能を移設。
         """
         # BNO055ライブラリの生のeuler[0]を使用
-        heading = self.bno.euler[0]
+        heading = self.bno.get_heading()
         if heading is None:
             wait_start_time = time.time()
             max_wait_time = 0.5 # 0.5秒まで待機
             while heading is None and (time.time() - wait_start_time < max_wait_time):
                 time.sleep(0.01) # 10ミリ秒待機
-                heading = self.bno.euler[0] # 再試行
+                heading = self.bno.get_heading() # 再試行
         if heading is None:
             return 0.0 # 最終的に取得できない場合、0.0を返す
         return heading
 
-    def _turn_to_relative_angle(self, angle_offset_deg, turn_speed, angle_tolerance_deg, max_turn_attempts):
+    def _turn_to_relative_angle(self, angle_offset_deg, turn_speed):
         """
         現在のBNO055の方位から、指定された角度だけ相対的に旋回します。
         """
-        # BNO055Wrapperの代わりに直接BNO055のデータを使用
-        initial_heading = self._get_bno_heading_robust()
-        if initial_heading is None: # _get_bno_heading_robust()はNoneを返さないはずですが、念のため
-            print("警告: turn_to_relative_angle: 初期方位が取得できませんでした。旋回を中止します。")
-            return False
-        
-        target_heading = (initial_heading + angle_offset_deg + 360) % 360
-        print(f"現在のBNO方位: {initial_heading:.2f}度, 相対目標角度: {angle_offset_deg:.2f}度 -> 絶対目標方位: {target_heading:.2f}度")
-
-        loop_count = 0
-        
-        while loop_count < max_turn_attempts:
-            current_heading = self._get_bno_heading_robust() # ここもヘルパーメソッドを使用
-            # _get_bno_heading_robust()はNoneを返さないので、Noneチェックは不要
-
-            angle_error = (target_heading - current_heading + 180 + 360) % 360 - 180
-
-            if abs(angle_error) <= angle_tolerance_deg:
-                print(f"[TURN] 相対回頭完了。最終誤差: {angle_error:.2f}度 (試行回数: {loop_count})")
-                self.driver.motor_stop_brake()
-                time.sleep(0.5)
-                return True
-
-            turn_duration_on = 0.02 + (abs(angle_error) / 180.0) * 0.2
-            
-            if angle_error < 0:
-                self.driver.petit_left(0, turn_speed)
-                self.driver.petit_left(turn_speed, 0)
-            else:
-                self.driver.petit_right(0, turn_speed)
-                self.driver.petit_right(turn_speed, 0)
-            
-            time.sleep(turn_duration_on)
-            self.driver.motor_stop_brake()
-            time.sleep(0.05)
-            
-            loop_count += 1
-        
-        print(f"警告: turn_to_relative_angle: 最大試行回数({max_turn_attempts}回)内に目標角度に到達できませんでした。最終誤差: {angle_error:.2f}度 (試行回数: {loop_count})")
-        self.driver.motor_stop_brake()
-        time.sleep(0.5)
-        return False
+        print(f"相対目標角度: {angle_offset_deg:.2f}度")
+        return self.turner.turn_by(angle_offset_deg, speed=turn_speed).settled
 
     def _wait_for_bno055_calibration(self):
         """BNO055センサーの完全キャリブレーションを待機します。"""
@@ -412,35 +366,13 @@ class RoverNavigator:
                     break
 
                 print("\n=== ステップ3: 目標方位への回頭 (動的調整) ===")
-                turn_attempt_count = 0
-                while turn_attempt_count < self.MAX_TURN_ATTEMPTS:
-                    current_bno_heading = self._get_bno_heading_robust() # ここをヘルパーメソッドに置き換え
-                    # _get_bno_heading_robust()はNoneを返さないので、Noneチェックは不要
-
-                    angle_error = (target_gps_heading - current_bno_heading + 180 + 360) % 360 - 180
-                    
-                    if abs(angle_error) <= self.ANGLE_GPS_ADJUST_THRESHOLD_DEG:
-                        print(f"[TURN] 方位調整完了。最終誤差: {angle_error:.2f}度")
-                        break
-
-                    turn_duration = 0.02 + (abs(angle_error) / 180.0) * 0.2
-                    if angle_error < 0:
-                        print(f"[TURN] 左に回頭します (誤差: {angle_error:.2f}度, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_left(0, self.TURN_SPEED)
-                        self.driver.petit_left(self.TURN_SPEED, 0)
-                    else:
-                        print(f"[TURN] 右に回頭します (誤差: {angle_error:.2f}度, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_right(0, self.TURN_SPEED)
-                        self.driver.petit_right(self.TURN_SPEED, 0)
-                    
-                    time.sleep(turn_duration)
-                    self.driver.motor_stop_brake()
-                    time.sleep(0.5)
-
-                    turn_attempt_count += 1
-
-                if turn_attempt_count >= self.MAX_TURN_ATTEMPTS and abs(angle_error) > self.ANGLE_GPS_ADJUST_THRESHOLD_DEG:
-                    print(f"警告: 最大回頭試行回数に達しましたが、目標方位に到達できませんでした。最終誤差: {angle_error:.2f}度")
+                current_bno_heading = self._get_bno_heading_robust()
+                angle_error = (target_gps_heading - current_bno_heading + 180 + 360) % 360 - 180
+                if abs(angle_error) > self.ANGLE_GPS_ADJUST_THRESHOLD_DEG:
+                    print(f"[TURN] 目標方位へ回頭します (誤差: {angle_error:.2f}度)")
+                    self.turner.turn_to_heading(target_gps_heading, speed=self.TURN_SPEED)
+                else:
+                    print(f"[TURN] 方位調整不要。誤差: {angle_error:.2f}度")
                 
                 self.driver.motor_stop_brake()
                 time.sleep(0.5)
@@ -451,24 +383,24 @@ class RoverNavigator:
 
                 if red_location_result == 'left_bottom':
                     print("赤色が左下に検出されました → 右に90度回頭して回避します。")
-                    self._turn_to_relative_angle(90, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                    self._turn_to_relative_angle(90, self.TURN_SPEED)
                     print("回頭後、少し前進します。")
                     following.follow_forward(self.driver, self.bno, base_speed=self.FORWARD_SPEED_DEFAULT, duration_time=self.FORWARD_DURATION_DEFAULT) # self.bno に変更
                 elif red_location_result == 'right_bottom':
                     print("赤色が右下に検出されました → 左に90度回頭して回避します。")
-                    self._turn_to_relative_angle(-90, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                    self._turn_to_relative_angle(-90, self.TURN_SPEED)
                     print("回頭後、少し前進します。")
                     following.follow_forward(self.driver, self.bno, base_speed=self.FORWARD_SPEED_DEFAULT, duration_time=self.FORWARD_DURATION_DEFAULT) # self.bno に変更
                 elif red_location_result == 'bottom_middle':
                     print("赤色が下段中央に検出されました → 右に120度回頭して前進します。")
-                    self._turn_to_relative_angle(120, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                    self._turn_to_relative_angle(120, self.TURN_SPEED)
                     print("120度回頭後、少し前進します (1回目)。")
                     following.follow_forward(self.driver, self.bno, base_speed=self.FORWARD_SPEED_DEFAULT, duration_time=self.FORWARD_DURATION_DEFAULT) # self.bno に変更
                     self.driver.motor_stop_brake()
                     time.sleep(0.5)
 
                     print("さらに左に30度回頭し、前進します。")
-                    self._turn_to_relative_angle(-30, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                    self._turn_to_relative_angle(-30, self.TURN_SPEED)
                     print("左30度回頭後、少し前進します (2回目)。")
                     following.follow_forward(self.driver, self.bno, base_speed=self.FORWARD_SPEED_DEFAULT, duration_time=self.FORWARD_DURATION_DEFAULT) # self.bno に変更
                 elif red_location_result == 'high_percentage_overall':
@@ -491,34 +423,11 @@ class RoverNavigator:
                 avoidance_confirmed_clear = False
 
                 print("\n=== 回避後: 再度目的地の方位へ回頭 ===")
-                turn_attempt_count_realign = 0
-                while turn_attempt_count_realign < self.MAX_TURN_ATTEMPTS:
-                    current_bno_heading = self._get_bno_heading_robust() # ここをヘルパーメソッドに置き換え
-                    # _get_bno_heading_robust()はNoneを返さないので、Noneチェックは不要
-
-                    angle_error = (target_gps_heading - current_bno_heading + 180 + 360) % 360 - 180
-                    
-                    if abs(angle_error) <= self.ANGLE_GPS_ADJUST_THRESHOLD_DEG:
-                        print(f"[RE-ALIGN] GPS方向への再調整完了。最終誤差: {angle_error:.2f}度")
-                        break
-
-                    turn_duration = 0.02 + (abs(angle_error) / 180.0) * 0.2
-                    if angle_error < 0:
-                        print(f"[RE-ALIGN] 左に回頭します (誤差: {angle_error:.2f}度, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_left(0, self.TURN_RE_ALIGN_SPEED)
-                        self.driver.petit_left(self.TURN_RE_ALIGN_SPEED, 0)
-                    else:
-                        print(f"[RE-ALIGN] 右に回頭します (誤差: {angle_error:.2f}度, 時間: {turn_duration:.2f}秒)")
-                        self.driver.petit_right(0, self.TURN_RE_ALIGN_SPEED)
-                        self.driver.petit_right(self.TURN_RE_ALIGN_SPEED, 0)
-                    
-                    time.sleep(turn_duration)
-                    self.driver.motor_stop_brake()
-                    time.sleep(0.5)
-                    turn_attempt_count_realign += 1
-                    
-                if turn_attempt_count_realign >= self.MAX_TURN_ATTEMPTS and abs(angle_error) > self.ANGLE_GPS_ADJUST_THRESHOLD_DEG:
-                    print(f"警告: 回避後の目的地方位への回頭が不十分です。最終誤差: {angle_error:.2f}度")
+                current_bno_heading = self._get_bno_heading_robust()
+                angle_error = (target_gps_heading - current_bno_heading + 180 + 360) % 360 - 180
+                if abs(angle_error) > self.ANGLE_GPS_ADJUST_THRESHOLD_DEG:
+                    print(f"[RE-ALIGN] GPS方向へ再調整します (誤差: {angle_error:.2f}度)")
+                    self.turner.turn_to_heading(target_gps_heading, speed=self.TURN_RE_ALIGN_SPEED)
                 self.driver.motor_stop_brake()
                 time.sleep(0.5)
 
@@ -526,16 +435,16 @@ class RoverNavigator:
                 scan_results['front'] = self._detect_red_in_grid(save_filename=f"confirm_front_{int(time.time())}.jpg")
 
                 print("→ 左に30度回頭し、赤色を確認します...")
-                self._turn_to_relative_angle(-30, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                self._turn_to_relative_angle(-30, self.TURN_SPEED)
                 scan_results['left_30'] = self._detect_red_in_grid(save_filename=f"confirm_left_{int(time.time())}.jpg")
                 print("→ 左30度から正面に戻します...")
-                self._turn_to_relative_angle(30, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                self._turn_to_relative_angle(30, self.TURN_SPEED)
 
                 print("→ 右に30度回頭し、赤色を確認します...")
-                self._turn_to_relative_angle(30, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                self._turn_to_relative_angle(30, self.TURN_SPEED)
                 scan_results['right_30'] = self._detect_red_in_grid(save_filename=f"confirm_right_{int(time.time())}.jpg")
                 print("→ 右30度から正面に戻します...")
-                self._turn_to_relative_angle(-30, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                self._turn_to_relative_angle(-30, self.TURN_SPEED)
 
                 is_front_clear = (scan_results['front'] == 'none_detected')
                 is_left_clear = (scan_results['left_30'] == 'none_detected')
@@ -550,23 +459,23 @@ class RoverNavigator:
                     
                     if scan_results['left_30'] != 'none_detected':
                         print("左30度で検出されたため、右90度回頭して回避します。")
-                        self._turn_to_relative_angle(90, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                        self._turn_to_relative_angle(90, self.TURN_SPEED)
                     elif scan_results['right_30'] != 'none_detected':
                         print("右30度で検出されたため、左90度回頭して回避します。")
-                        self._turn_to_relative_angle(-90, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                        self._turn_to_relative_angle(-90, self.TURN_SPEED)
                     elif scan_results['front'] != 'none_detected':
                         print("正面で検出されたため、右120度回頭して回避します。")
-                        self._turn_to_relative_angle(120, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                        self._turn_to_relative_angle(120, self.TURN_SPEED)
                         self.driver.motor_stop_brake()
                         time.sleep(0.5)
 
                         print("さらに左に30度回頭し、前進します。")
-                        self._turn_to_relative_angle(-30, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                        self._turn_to_relative_angle(-30, self.TURN_SPEED)
                         print("左30度回頭後、少し前進します (2回目)。")
                         following.follow_forward(self.driver, self.bno, base_speed=self.FORWARD_SPEED_DEFAULT, duration_time=self.FORWARD_DURATION_DEFAULT) # self.bno に変更
                     else:
                         print("詳細不明な検出のため、右120度回頭して回避します。")
-                        self._turn_to_relative_angle(120, self.TURN_SPEED, self.ANGLE_RELATIVE_TURN_TOLERANCE_DEG, self.MAX_TURN_ATTEMPTS)
+                        self._turn_to_relative_angle(120, self.TURN_SPEED)
                     
                     following.follow_forward(self.driver, self.bno, base_speed=self.FORWARD_SPEED_DEFAULT, duration_time=self.FORWARD_DURATION_DEFAULT) # self.bno に変更
                     self.driver.motor_stop_brake()
@@ -593,6 +502,7 @@ class RoverNavigator:
         if self.picam2:
             self.picam2.close()
             print("Picamera2をクローズしました。")
+        debug_image_writer.flush() # 保存待ちのデバッグ画像を書き終えてから終了する
         GPIO.cleanup()
         print("=== ローバー制御システムを終了しました。 ===")
 
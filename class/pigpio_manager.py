@@ -0,0 +1,288 @@
+import os
+import time
+import threading
+import pigpio
+
+# プロセス全体で1本のpigpiod接続を共有するための管理モジュール
+# 各クラスが pigpio.pi() を呼ぶと、そのたびにpigpiodへのソケット (コマンド用+通知用) が増え、
+# 起動も遅くなる。また、あるクラスが stop() すると、同じ接続を使っている他のクラスまで動かなくなる。
+#
+# 使い方:
+#   import pigpio_manager
+#   self.pi = pigpio_manager.acquire("MotorDriver")  # pigpio.pi() の代わり
+#   self.pi.write(pin, 1)                            # 使い方はpigpio.piと同じ
+#   self.pi.stop()                                   # 自分の参照を返すだけ。最後の1つでソケットを閉じる
+
+class PigpioLease:
+    """
+    共有接続への参照 (借用証)。pigpio.pi と同じメソッドを持ち、呼び出しは共有接続へそのまま渡す。
+    stop() は共有接続を閉じず、この参照だけを返却する (何度呼んでもよい)。
+    """
+
+    def __init__(self, manager, owner):
+        self._manager = manager
+        self._owner = owner
+        self._released = False
+
+    def __getattr__(self, name):
+        if self._released:
+            if name == "connected":
+                return False
+            raise RuntimeError(f"pigpio_manager: {self._owner} は既にstop()した接続を使おうとしました。")
+        return getattr(self._manager.get_pi(), name)
+
+    def callback(self, user_gpio, edge=pigpio.RISING_EDGE, func=None):
+        """共有の通知チャンネルにコールバックを登録する。再接続後も自動で登録し直される。"""
+        return self._manager.callback(user_gpio, edge, func)
+
+    def stop(self):
+        if not self._released:
+            self._released = True
+            self._manager.release(self._owner)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+class _SharedCallback:
+    """再接続をまたいで有効なコールバック。cancel()で登録を解除する。"""
+
+    def __init__(self, manager, user_gpio, edge, func):
+        self._manager = manager
+        self.user_gpio = user_gpio
+        self.edge = edge
+        self.func = func
+        self._cb = None
+
+    def _attach(self, pi):
+        self._cb = pi.callback(self.user_gpio, self.edge, self.func)
+
+    def tally(self):
+        return self._cb.tally() if self._cb else 0
+
+    def reset_tally(self):
+        if self._cb:
+            self._cb.reset_tally()
+
+    def cancel(self):
+        self._manager._remove_callback(self)
+        if self._cb:
+            self._cb.cancel()
+            self._cb = None
+
+class PigpioManager:
+    """
+    参照カウント付きのpigpio接続マネージャー。
+    最初に使われたときに接続し (遅延接続)、参照が0になったら切断する。
+    check() で死活確認を行い、pigpiodが再起動していた場合は再接続してコールバックを登録し直す。
+    """
+
+    def __init__(self, host=None, port=None):
+        """
+        Args:
+            host (str): pigpiodのホスト (省略時は環境変数PIGPIO_ADDR、無ければlocalhost)。
+            port (int): pigpiodのポート (省略時は環境変数PIGPIO_PORT、無ければ8888)。
+        """
+        self.host = host or os.environ.get("PIGPIO_ADDR", "localhost")
+        self.port = int(port or os.environ.get("PIGPIO_PORT", 8888))
+        self._lock = threading.RLock()
+        self._pi = None
+        self._owners = {}     # 所有者名 → 参照数
+        self._callbacks = []
+        self.connect_count = 0
+        self.reconnect_count = 0
+        self.connect_time_s = None  # 直近の接続にかかった時間 [s]
+        self.sockets_at_connect = None
+
+    @property
+    def refcount(self):
+        return sum(self._owners.values())
+
+    def acquire(self, owner="unknown"):
+        """共有接続への参照を1つ増やし、PigpioLeaseを返す。接続は最初に使われるまで行わない。"""
+        with self._lock:
+            self._owners[owner] = self._owners.get(owner, 0) + 1
+        return PigpioLease(self, owner)
+
+    def release(self, owner):
+        """参照を1つ減らす。0になったら共有接続を閉じる。"""
+        with self._lock:
+            count = self._owners.get(owner, 0) - 1
+            if count > 0:
+                self._owners[owner] = count
+            else:
+                self._owners.pop(owner, None)
+            if not self._owners:
+                self._disconnect()
+
+    def get_pi(self):
+        """共有しているpigpio.piを返す。未接続なら接続する。"""
+        pi = self._pi
+        if pi is not None:
+            return pi
+        with self._lock:
+            if self._pi is None:
+                self._connect()
+            return self._pi
+
+    def _connect(self):
+        start = time.perf_counter()
+        pi = pigpio.pi(self.host, self.port)
+        self.connect_time_s = time.perf_counter() - start
+        if not pi.connected:
+            print(f"🔴 pigpio_manager: pigpiodに接続できません ({self.host}:{self.port})。`sudo pigpiod`を実行してください。")
+            self._pi = pi # connected=Falseのまま返し、呼び出し側の既存のエラー処理に任せる
+            return
+        self._pi = pi
+        self.connect_count += 1
+        for cb in self._callbacks:
+            cb._attach(pi)
+        self.sockets_at_connect = count_pigpiod_sockets(self.port)
+        print(f"✅ pigpio_manager: pigpiodに接続しました ({self.connect_time_s * 1000:.1f}ms, "
+              f"このプロセスのpigpiodソケット数: {self.sockets_at_connect})。")
+
+    def _disconnect(self):
+        pi, self._pi = self._pi, None
+        if pi is not None and pi.connected:
+            for cb in self._callbacks:
+                cb._cb = None
+            pi.stop()
+            print("pigpio_manager: 全ての所有者が解放したため、pigpiodとの接続を閉じました。")
+
+    def check(self):
+        """
+        共有接続の死活確認。応答が無ければ再接続する。
+
+        Returns:
+            bool: 確認後に接続できていればTrue。
+        """
+        with self._lock:
+            if self._pi is not None and self._pi.connected:
+                try:
+                    self._pi.get_current_tick()
+                    return True
+                except Exception as e:
+                    print(f"[WARN] pigpio_manager: pigpiodが応答しません ({e})。再接続します。")
+            if self._pi is not None:
+                try:
+                    self._pi.stop()
+                except Exception:
+                    pass
+                self._pi = None
+                self.reconnect_count += 1
+            if not self._owners:
+                return False
+            self._connect()
+            return self._pi.connected
+
+    def callback(self, user_gpio, edge=pigpio.RISING_EDGE, func=None):
+        """
+        共有接続の通知チャンネル (pigpio.piが持つ1本の通知ソケット) にコールバックを登録する。
+        funcを省略するとpigpioと同様にtally()でエッジ数を数えるだけになる。
+        """
+        with self._lock:
+            cb = _SharedCallback(self, user_gpio, edge, func)
+            self._callbacks.append(cb)
+            pi = self.get_pi()
+            if pi.connected:
+                cb._attach(pi)
+            return cb
+
+    def _remove_callback(self, cb):
+        with self._lock:
+            if cb in self._callbacks:
+                self._callbacks.remove(cb)
+
+    def stats(self):
+        """接続の統計 (dict)。"""
+        return {
+            "owners": dict(self._owners),
+            "refcount": self.refcount,
+            "connected": bool(self._pi is not None and self._pi.connected),
+            "connect_count": self.connect_count,
+            "reconnect_count": self.reconnect_count,
+            "connect_time_ms": None if self.connect_time_s is None else self.connect_time_s * 1000,
+            "sockets": count_pigpiod_sockets(self.port),
+            "callbacks": len(self._callbacks),
+        }
+
+    def reset(self):
+        """所有者もコールバックも忘れて初期状態に戻す (シミュレーションの切り替え用)。接続は閉じない。"""
+        with self._lock:
+            self._pi = None
+            self._owners = {}
+            self._callbacks = []
+
+def count_pigpiod_sockets(port=8888):
+    """
+    このプロセスが開いているpigpiod (TCPポートport) へのソケット数を /proc から数える。
+    Linux以外では-1を返す。
+    """
+    try:
+        inodes = set()
+        for fd in os.listdir("/proc/self/fd"):
+            try:
+                link = os.readlink(f"/proc/self/fd/{fd}")
+            except OSError:
+                continue
+            if link.startswith("socket:["):
+                inodes.add(link[8:-1])
+        count = 0
+        for table in ("/proc/net/tcp", "/proc/net/tcp6"):
+            try:
+                with open(table) as f:
+                    next(f)
+                    for line in f:
+                        fields = line.split()
+                        remote_port = int(fields[2].rsplit(":", 1)[1], 16)
+                        if remote_port == port and fields[9] in inodes:
+                            count += 1
+            except OSError:
+                continue
+        return count
+    except OSError:
+        return -1
+
+# プロセス全体で共有するマネージャー
+_manager = PigpioManager()
+
+def acquire(owner="unknown"):
+    """pigpio.pi() の代わりに呼ぶ。共有接続への参照 (PigpioLease) を返す。"""
+    return _manager.acquire(owner)
+
+def get_manager():
+    return _manager
+
+def check():
+    return _manager.check()
+
+def stats():
+    return _manager.stats()
+
+# ====================== 実行部 ======================
+
+if __name__ == '__main__':
+    # 従来方式 (クラスごとにpigpio.pi()) と共有方式で、起動時間とソケット数を比べる
+    owners = ["MotorDriver", "GDA", "LD", "PA", "fusing"]
+
+    start = time.perf_counter()
+    separate = [pigpio.pi() for _ in owners]
+    separate_ms = (time.perf_counter() - start) * 1000
+    separate_sockets = count_pigpiod_sockets()
+    for pi in separate:
+        pi.stop()
+
+    start = time.perf_counter()
+    leases = [acquire(owner) for owner in owners]
+    connected = all(lease.connected for lease in leases)
+    shared_ms = (time.perf_counter() - start) * 1000
+    shared_sockets = count_pigpiod_sockets()
+
+    print(f"従来方式: {len(owners)}回のpigpio.pi() に {separate_ms:.1f}ms, pigpiodソケット {separate_sockets}本")
+    print(f"共有方式: {len(owners)}所有者で {shared_ms:.1f}ms, pigpiodソケット {shared_sockets}本 (接続: {connected})")
+    print(f"死活確認: {check()}")
+    for lease in leases:
+        lease.stop()
+    print(stats())
@@ -0,0 +1,108 @@
+import time
+import statistics
+from collections import namedtuple
+
+# ループ統計: iterations=周期数, overruns=締め切りを1周期以上過ぎた回数,
+# jitter_*_ms=締め切りからの起床遅れ [ms], histogram=遅れのヒストグラム (最後のビンは上限超え)
+LoopStats = namedtuple("LoopStats", [
+    "rate_hz", "iterations", "overruns",
+    "jitter_mean_ms", "jitter_p99_ms", "jitter_max_ms", "histogram",
+])
+
+class FixedRateLoop:
+    """
+    絶対締め切り方式の固定周期ループスケジューラ。
+    「処理 → time.sleep(周期)」だと処理時間 (I2Cやpigpioの通信) の分だけ周期が伸びていくが、
+    このクラスは開始時刻 + n×周期 の締め切りまで眠るので、長時間回しても周期がずれない。
+    処理が1周期以上遅れた場合は取りこぼした締め切りを飛ばしてオーバーランとして数える。
+
+    使い方:
+        loop = FixedRateLoop(50)
+        loop.start()
+        while ...:
+            (処理)
+            dt = loop.wait()
+        print(loop.stats())
+    """
+
+    def __init__(self, rate_hz, hist_bin_ms=1.0, hist_bins=10):
+        """
+        Args:
+            rate_hz (float): ループ周波数 [Hz]。
+            hist_bin_ms (float): ジッタヒストグラムのビン幅 [ms]。
+            hist_bins (int): ヒストグラムのビン数 (最後のビンは上限超えをまとめる)。
+        """
+        if rate_hz <= 0:
+            raise ValueError(f"rate_hzは正の値を指定してください: {rate_hz}")
+        self.rate_hz = rate_hz
+        self.period = 1.0 / rate_hz
+        self.hist_bin_ms = hist_bin_ms
+        self.hist_bins = hist_bins
+        self.start()
+
+    def start(self):
+        """締め切りと統計をリセットし、現在時刻を周期の起点にする。"""
+        now = time.monotonic()
+        self._next = now + self.period
+        self._last_tick = now
+        self._jitters = []
+        self._overruns = 0
+        self._histogram = [0] * self.hist_bins
+
+    def wait(self):
+        """
+        次の締め切りまで眠る。
+
+        Returns:
+            float: 前回の wait() (または start()) からの実経過時間 [s]。微分計算のdtに使う。
+        """
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+            now = time.monotonic()
+
+        lateness = now - self._next
+        if lateness >= self.period:
+            # 取りこぼした締め切りは飛ばし、位相は保ったまま次の締め切りを決める
+            missed = int(lateness / self.period)
+            self._overruns += 1
+            self._next += missed * self.period
+            lateness -= missed * self.period
+        self._next += self.period
+
+        jitter_ms = lateness * 1000
+        self._jitters.append(jitter_ms)
+        self._histogram[min(int(jitter_ms / self.hist_bin_ms), self.hist_bins - 1)] += 1
+
+        dt = now - self._last_tick
+        self._last_tick = now
+        return dt
+
+    def stats(self):
+        """ここまでのジッタ統計を LoopStats で返す。"""
+        jitters = sorted(self._jitters)
+        if not jitters:
+            return LoopStats(self.rate_hz, 0, 0, 0.0, 0.0, 0.0, list(self._histogram))
+        p99 = jitters[max(0, int(len(jitters) * 0.99) - 1)]
+        return LoopStats(
+            self.rate_hz, len(jitters), self._overruns,
+            statistics.mean(jitters), p99, jitters[-1], list(self._histogram),
+        )
+
+def format_stats(stats, label="LOOP"):
+    """LoopStatsを1行の表示用文字列にする。"""
+    return (f"[{label}] {stats.rate_hz:.0f}Hz x {stats.iterations}周期, オーバーラン {stats.overruns}回, "
+            f"ジッタ 平均 {stats.jitter_mean_ms:.2f}ms / p99 {stats.jitter_p99_ms:.2f}ms / 最大 {stats.jitter_max_ms:.2f}ms")
+
+# ====================== 実行部 ======================
+
+if __name__ == '__main__':
+    # このマシンでのスケジューラ自体のジッタを確認する (処理なしで5秒間)
+    for hz in (10, 20, 50):
+        loop = FixedRateLoop(hz)
+        end = time.monotonic() + 5.0
+        while time.monotonic() < end:
+            loop.wait()
+        stats = loop.stats()
+        print(format_stats(stats))
+        print(f"  ヒストグラム ({loop.hist_bin_ms:.0f}ms刻み): {stats.histogram}")
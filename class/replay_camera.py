@@ -0,0 +1,210 @@
+import sys
+import types
+import importlib
+import cv2
+import numpy as np
+
+# 記録した画像をカメラの代わりに返す、Picamera2と同じ使い方のクラス
+# 検出器のクラスや関数は Picamera2() を自分で作って capture_array() で撮影するものが多いので、
+# ReplayCamera を渡す (または Picamera2 の代わりに作らせる) と、同じコードのまま記録した画像で動かせる。
+# mainストリームはconfigureした解像度に縮小し、loresストリーム (YUV420) も作る。
+# Transform の hflip/vflip はISPと同じように画像に適用し、camera_config["transform"] にも残す。
+#
+# 使い方:
+#   import replay_camera
+#   replay_camera.install_fake_modules()   # picamera2/libcamera が無いPCでもimportできるようにする
+#   camera = replay_camera.ReplayCamera()
+#   camera.configure(camera.create_still_configuration(main={"size": (320, 240)}))
+#   camera.load(frame_rgb)                 # 次に capture_array() で返す画像 (センサーの向きのRGB)
+#   frame = camera.capture_array()
+
+class ReplayTransform:
+    """libcamera.Transform の代わり (hflip/vflip/transposeの属性だけを持つ)。"""
+
+    def __init__(self, hflip=0, vflip=0, transpose=0):
+        self.hflip = bool(hflip)
+        self.vflip = bool(vflip)
+        self.transpose = bool(transpose)
+
+    def __repr__(self):
+        return f"ReplayTransform(hflip={int(self.hflip)}, vflip={int(self.vflip)}, transpose={int(self.transpose)})"
+
+class _ReplayColorSpace:
+    """libcamera.ColorSpace の代わり (名前だけを持つ)。"""
+
+    def __init__(self, name):
+        self.name = name
+
+    @classmethod
+    def Sycc(cls):
+        return cls("sYCC")
+
+    @classmethod
+    def Smpte170m(cls):
+        return cls("SMPTE170M")
+
+class ReplayCamera:
+    """
+    load() した画像を capture_array() で返すカメラ。
+    縮小・YUV420への変換は load() のときに済ませておくので、capture_array() の時間は実機のコピーと同程度になる。
+    """
+
+    def __init__(self, camera_num=0, main_size=(640, 480)):
+        self.camera_num = camera_num
+        self.camera_config = {"main": {"size": tuple(main_size), "format": "RGB888"}, "lores": None, "transform": None}
+        self.controls = {}
+        self.started = False
+        self.capture_count = 0
+        self._source = None
+        self._streams = {}
+
+    # ---------------- Picamera2と同じメソッド ----------------
+
+    def create_still_configuration(self, main=None, lores=None, transform=None, colour_space=None,
+                                   controls=None, **kwargs):
+        main = dict(main or {})
+        main.setdefault("size", (640, 480))
+        main.setdefault("format", "RGB888")
+        if lores is not None:
+            lores = dict(lores)
+            lores.setdefault("format", "YUV420")
+        return {"main": main, "lores": lores, "transform": transform, "colour_space": colour_space,
+                "controls": dict(controls or {})}
+
+    create_preview_configuration = create_still_configuration
+    create_video_configuration = create_still_configuration
+
+    def configure(self, config):
+        self.camera_config = {
+            "main": {"size": tuple(config["main"]["size"]), "format": config["main"].get("format", "RGB888")},
+            "lores": None if not config.get("lores") else {"size": tuple(config["lores"]["size"]),
+                                                          "format": config["lores"].get("format", "YUV420")},
+            "transform": config.get("transform"),
+            "colour_space": config.get("colour_space"),
+            "controls": dict(config.get("controls") or {}),
+        }
+        self.controls.update(self.camera_config["controls"])
+        self.load(self._source) # 撮影のたびにconfigureし直すコードもあるので、読み込んだ画像は新しい設定で作り直す
+
+    def start(self, *args, **kwargs):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+
+    def close(self):
+        self.started = False
+
+    def set_controls(self, controls):
+        self.controls.update(controls)
+
+    def capture_metadata(self):
+        return dict(self.controls)
+
+    def capture_array(self, name="main"):
+        self.capture_count += 1
+        frame = self._streams.get(name)
+        return None if frame is None else frame.copy()
+
+    def capture_request(self):
+        self.capture_count += 1
+        return ReplayRequest(self._streams, self.capture_metadata())
+
+    # ---------------- 再生用 ----------------
+
+    def load(self, frame_rgb):
+        """次に capture_array() で返す画像 (センサーの向き、RGB、任意の解像度) を設定する。"""
+        self._source = frame_rgb
+        if frame_rgb is None:
+            self._streams = {}
+            return
+        transform = self.camera_config.get("transform")
+        hflip = bool(getattr(transform, "hflip", False))
+        vflip = bool(getattr(transform, "vflip", False))
+        if hflip or vflip:
+            frame_rgb = cv2.flip(frame_rgb, -1 if hflip and vflip else (1 if hflip else 0))
+        main_size = self.camera_config["main"]["size"]
+        streams = {"main": _resize(frame_rgb, main_size)}
+        lores = self.camera_config.get("lores")
+        if lores:
+            streams["lores"] = rgb_to_yuv420(_resize(frame_rgb, lores["size"]))
+        self._streams = streams
+
+class _ReplayMappedArray:
+    """picamera2.MappedArray の代わり (with の中でだけ .array がバッファそのものを指す)。"""
+
+    def __init__(self, frame):
+        self.array = frame
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.array = None
+
+class ReplayRequest:
+    """
+    CompletedRequest の代わり。実機と同じく release() するまでバッファを持つ。
+    map_array() はコピーせずにバッファを見せ、make_array() はコピーを返す。
+    """
+
+    def __init__(self, streams, metadata):
+        self._streams = streams
+        self._metadata = metadata
+        self.released = False
+
+    def make_array(self, name="main"):
+        return self._buffer(name).copy()
+
+    def map_array(self, name="main"):
+        return _ReplayMappedArray(self._buffer(name))
+
+    def get_metadata(self):
+        return dict(self._metadata)
+
+    def release(self):
+        self.released = True
+
+    def _buffer(self, name):
+        if self.released:
+            raise RuntimeError("release() したリクエストのバッファは使えません。")
+        frame = self._streams.get(name)
+        if frame is None:
+            raise KeyError(f"ストリーム '{name}' がありません。")
+        return frame
+
+def _resize(frame, size):
+    if (frame.shape[1], frame.shape[0]) == tuple(size):
+        return frame
+    return cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+
+def rgb_to_yuv420(frame_rgb):
+    """RGB画像をloresと同じ YUV420 (I420, フルレンジBT.601) のバッファ (高さ x 1.5, 幅) にする。"""
+    height, width = frame_rgb.shape[:2]
+    ycrcb = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2YCrCb) # OpenCVのYCrCbはフルレンジBT.601
+    half = (width // 2, height // 2)
+    cb = cv2.resize(ycrcb[..., 2], half, interpolation=cv2.INTER_AREA)
+    cr = cv2.resize(ycrcb[..., 1], half, interpolation=cv2.INTER_AREA)
+    return np.concatenate([ycrcb[..., 0].reshape(-1), cb.reshape(-1), cr.reshape(-1)]).reshape(height * 3 // 2, width)
+
+def _fake_module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    module.__replay_camera_fake__ = True
+    return module
+
+_FAKE_FACTORIES = {
+    "picamera2": lambda: _fake_module("picamera2", Picamera2=ReplayCamera),
+    "libcamera": lambda: _fake_module("libcamera", Transform=ReplayTransform, ColorSpace=_ReplayColorSpace),
+}
+
+def install_fake_modules():
+    """
+    picamera2, libcamera がimportできない環境 (開発用PCなど) では代わりのモジュールを登録する。
+    実機 (Raspberry Pi) では本物のモジュールをそのまま使う (撮影する部分は呼び出し側で ReplayCamera に差し替える)。
+    """
+    for name, factory in _FAKE_FACTORIES.items():
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            sys.modules[name] = factory()
@@ -0,0 +1,632 @@
+import sys
+import math
+import time
+import types
+import random
+import struct
+import importlib
+
+# 差動二輪ローバーの運動学シミュレータ
+# MotorDriver/BNO055/RoverGPSNavigatorなどの実機コードをそのまま動かすため、
+#   - pigpio.pi()     → FakePi  (PWMと方向ピンの書き込みを記録し、車輪速度に変換する)
+#   - smbus.SMBus()   → FakeSMBus (BNO055のレジスタを車体の姿勢から合成する)
+#   - bb_serial_read → GPSのNMEA文 ($GNRMC/$GNGGA) を車体の位置から合成する
+#   - time.sleep/monotonic/time/perf_counter → 仮想時計 (実時間より速く進む)
+# に差し替える。
+#
+# 使い方:
+#   import rover_sim
+#   rover_sim.install_fake_modules()   # pigpioなどが無いPCでも importできるようにする
+#   from motor import MotorDriver
+#   with rover_sim.RoverSim(time_limit_s=300) as sim:
+#       driver = MotorDriver(**rover_sim.MOTOR_PINS)
+#       ...
+#   print(sim.summary())
+
+# 実機と同じモーターピン (MotorDriver の引数名)
+MOTOR_PINS = {
+    'PWMA': 12, 'AIN1': 23, 'AIN2': 18,
+    'PWMB': 19, 'BIN1': 16, 'BIN2': 26,
+    'STBY': 21
+}
+GPS_RX_PIN = 17
+BNO055_ADDRESS = 0x28
+EARTH_RADIUS_M = 6378137.0 # RoverGPSNavigatorと同じ値
+
+class SimTimeout(BaseException):
+    """
+    仮想時間が time_limit_s を超えたときに送出する例外。
+    ナビゲーションコードの `except Exception` に握りつぶされないよう BaseException を継承する。
+    """
+
+class FakePi:
+    """
+    pigpio.pi の代わりになるクラス。
+    GPIOのレベル・PWMデューティ・ソフトUARTのバッファを保持し、書き込みを記録する。
+    呼び出しごとに pigpiod とのソケット通信相当の遅延 (call_latency_s) だけ仮想時間を進める。
+    """
+
+    PI_NOT_HPWM_GPIO = -95
+    PI_BAD_USER_GPIO = -2
+    HW_PWM_PINS = (12, 13, 18, 19)
+
+    def __init__(self, sim, call_latency_s=50e-6, log_limit=100000):
+        self.sim = sim
+        self.connected = True
+        self.call_latency_s = call_latency_s
+        self.levels = {}     # ピン → 0/1
+        self.modes = {}      # ピン → INPUT(0)/OUTPUT(1)
+        self.duty = {}       # ピン → デューティ (0.0〜1.0)
+        self.pwm_range = {}  # ピン → set_PWM_rangeの値
+        self.pwm_freq = {}
+        self.servo_pulse = {}
+        self.write_count = 0
+        self.log = []        # (時刻, 操作, ピン, 値)
+        self.log_limit = log_limit
+        self._serial = {}    # RXピン → bytearray
+
+    def _record(self, op, pin, value):
+        self.write_count += 1
+        if len(self.log) < self.log_limit:
+            self.log.append((self.sim.now, op, pin, value))
+        self.sim.advance(self.call_latency_s)
+
+    # --- GPIO ---
+    def set_mode(self, pin, mode):
+        self.modes[pin] = mode
+        self._record("set_mode", pin, mode)
+        return 0
+
+    def get_mode(self, pin):
+        self.sim.advance(self.call_latency_s)
+        return self.modes.get(pin, 0)
+
+    def set_pull_up_down(self, pin, pud):
+        self._record("set_pull_up_down", pin, pud)
+        return 0
+
+    def write(self, pin, level):
+        self.levels[pin] = 1 if level else 0
+        self._record("write", pin, self.levels[pin])
+        return 0
+
+    def read(self, pin):
+        self.sim.advance(self.call_latency_s)
+        return self.levels.get(pin, 0)
+
+    def set_bank_1(self, bits):
+        """bitsで1になっているGPIO 0-31をまとめてHIGHにする (1回のコマンド)。"""
+        for pin in range(32):
+            if bits >> pin & 1:
+                self.levels[pin] = 1
+        self._record("set_bank_1", None, bits)
+        return 0
+
+    def clear_bank_1(self, bits):
+        for pin in range(32):
+            if bits >> pin & 1:
+                self.levels[pin] = 0
+        self._record("clear_bank_1", None, bits)
+        return 0
+
+    def read_bank_1(self):
+        self.sim.advance(self.call_latency_s)
+        return sum(1 << pin for pin, level in self.levels.items() if level and pin < 32)
+
+    # --- PWM ---
+    def set_PWM_frequency(self, pin, freq):
+        self.pwm_freq[pin] = freq
+        self._record("set_PWM_frequency", pin, freq)
+        return freq
+
+    def set_PWM_range(self, pin, value):
+        self.pwm_range[pin] = value
+        self._record("set_PWM_range", pin, value)
+        return value
+
+    def get_PWM_range(self, pin):
+        return self.pwm_range.get(pin, 255)
+
+    def set_PWM_dutycycle(self, pin, dutycycle):
+        self.duty[pin] = max(0.0, min(1.0, dutycycle / self.pwm_range.get(pin, 255)))
+        self._record("set_PWM_dutycycle", pin, dutycycle)
+        return 0
+
+    def get_PWM_dutycycle(self, pin):
+        return round(self.duty.get(pin, 0.0) * self.pwm_range.get(pin, 255))
+
+    def hardware_PWM(self, pin, freq, dutycycle):
+        if pin not in self.HW_PWM_PINS:
+            self.sim.advance(self.call_latency_s)
+            return self.PI_NOT_HPWM_GPIO
+        self.pwm_freq[pin] = freq
+        self.duty[pin] = max(0.0, min(1.0, dutycycle / 1000000))
+        self._record("hardware_PWM", pin, dutycycle)
+        return 0
+
+    def set_servo_pulsewidth(self, pin, pulsewidth):
+        self.servo_pulse[pin] = pulsewidth
+        self._record("set_servo_pulsewidth", pin, pulsewidth)
+        return 0
+
+    def get_servo_pulsewidth(self, pin):
+        return self.servo_pulse.get(pin, 0)
+
+    # --- ソフトウェアUART (GPS) ---
+    def bb_serial_read_open(self, pin, baud, data_bits=8):
+        if pin in self._serial:
+            return -50 # PI_GPIO_IN_USE
+        self._serial[pin] = bytearray()
+        self._record("bb_serial_read_open", pin, baud)
+        return 0
+
+    def bb_serial_read(self, pin):
+        self.sim.advance(self.call_latency_s)
+        buf = self._serial.get(pin)
+        if not buf:
+            return (0, bytearray())
+        data = bytearray(buf)
+        buf.clear()
+        return (len(data), data)
+
+    def bb_serial_read_close(self, pin):
+        self._serial.pop(pin, None)
+        self._record("bb_serial_read_close", pin, 0)
+        return 0
+
+    def _feed_serial(self, pin, data, limit=8192):
+        """受信バッファにデータを追加する。pigpioの循環バッファと同様に古いデータから捨てる。"""
+        buf = self._serial.get(pin)
+        if buf is None:
+            return
+        buf.extend(data)
+        if len(buf) > limit:
+            del buf[:len(buf) - limit]
+
+    # --- その他 ---
+    def get_current_tick(self):
+        self.sim.advance(self.call_latency_s)
+        return int(self.sim.now * 1e6) & 0xFFFFFFFF
+
+    def callback(self, user_gpio, edge=0, func=None):
+        """エッジは発生しないので、登録とcancel()だけできるコールバックを返す。"""
+        self._record("callback", user_gpio, edge)
+        return _FakeCallback()
+
+    def stop(self):
+        pass
+
+class _FakeCallback:
+    def tally(self):
+        return 0
+
+    def reset_tally(self):
+        pass
+
+    def cancel(self):
+        pass
+
+class FakeSMBus:
+    """
+    smbus.SMBus の代わりになるクラス。BNO055のアドレスへの読み出しに、車体の状態から合成したレジスタ値を返す。
+    1回の読み出しごとにI2C転送相当の遅延 (read_latency_s) だけ仮想時間を進める。
+    """
+
+    def __init__(self, sim, read_latency_s=0.4e-3):
+        self.sim = sim
+        self.read_latency_s = read_latency_s
+        self.read_count = 0
+        self.registers = {} # 書き込まれたレジスタ (動作モードなど)
+
+    def read_i2c_block_data(self, address, register, length):
+        self.read_count += 1
+        self.sim.advance(self.read_latency_s)
+        if address != BNO055_ADDRESS:
+            raise OSError(121, "Remote I/O error")
+        image = self.sim.bno055_registers()
+        return list(image[register:register + length])
+
+    def read_byte_data(self, address, register):
+        return self.read_i2c_block_data(address, register, 1)[0]
+
+    def write_i2c_block_data(self, address, register, values):
+        self.sim.advance(self.read_latency_s)
+        if address != BNO055_ADDRESS:
+            raise OSError(121, "Remote I/O error")
+        for i, v in enumerate(values):
+            self.registers[register + i] = v
+
+    def write_byte_data(self, address, register, value):
+        self.write_i2c_block_data(address, register, [value])
+
+    def close(self):
+        pass
+
+class Wheel:
+    """1輪分のモーターモデル (デッドバンド + 一次遅れ + 直流モーターの消費電力)。"""
+
+    def __init__(self, max_speed, deadband, tau, tau_brake, tau_coast):
+        self.max_speed = max_speed # デューティ100%での車輪周速 [m/s]
+        self.deadband = deadband   # 回り始めるデューティ (0.0〜1.0)
+        self.tau = tau
+        self.tau_brake = tau_brake
+        self.tau_coast = tau_coast
+        self.speed = 0.0           # 車輪周速 [m/s] (前進が正)
+
+    def step(self, mode, duty, dt):
+        """
+        Args:
+            mode (str): "forward" / "reverse" / "brake" / "coast"。
+            duty (float): PWMデューティ (0.0〜1.0)。
+        """
+        if mode in ("forward", "reverse") and duty > self.deadband:
+            target = self.max_speed * (duty - self.deadband) / (1.0 - self.deadband)
+            if mode == "reverse":
+                target = -target
+            tau = self.tau
+        else:
+            target = 0.0
+            tau = self.tau_brake if mode == "brake" else (self.tau if mode in ("forward", "reverse") else self.tau_coast)
+        self.speed += (target - self.speed) * min(1.0, dt / tau)
+
+class RoverSim:
+    """
+    差動二輪ローバーの運動学シミュレータ本体。with文の間、pigpio/smbus/timeを差し替える。
+    座標は出発点を原点とするローカル座標 (x: 東 [m], y: 北 [m])、方位は北から右回り [deg]。
+    """
+
+    def __init__(self, origin=(35.9186248, 139.9081672), start_heading=0.0,
+                 max_wheel_speed=(0.50, 0.46), deadband=(0.22, 0.26), track_m=0.20,
+                 slip=0.05, turn_efficiency=0.75, tau=0.12, tau_brake=0.04, tau_coast=0.4,
+                 battery_v=7.4, motor_r_ohm=3.0,
+                 heading_noise_deg=0.2, gyro_noise_dps=0.3, accel_noise=0.05,
+                 gps_rate_hz=1.0, gps_noise_m=1.0, gps_bias_m=1.5, gps_bias_tau_s=30.0,
+                 step_s=0.002, time_limit_s=None, seed=0, motor_pins=None, gps_rx_pin=GPS_RX_PIN):
+        """
+        Args:
+            origin (tuple): 出発点の (緯度, 経度)。
+            start_heading (float): 出発時の方位 [deg]。
+            max_wheel_speed (tuple): 左右のデューティ100%での車輪周速 [m/s] (左右差を与える)。
+            deadband (tuple): 左右の回り始めるデューティ (0.0〜1.0)。
+            track_m (float): トレッド幅 [m]。
+            slip (float): 前後方向のスリップ率 (接地速度 = 車輪周速 × (1 - slip))。
+            turn_efficiency (float): スキッドステア旋回の効率 (実際のヨーレート / 運動学上のヨーレート)。
+            tau, tau_brake, tau_coast (float): 駆動・ブレーキ・惰性時の車輪速度の時定数 [s]。
+            battery_v (float): バッテリー電圧 [V]。
+            motor_r_ohm (float): モーターの巻線抵抗 [Ω] (消費電力の計算に使う)。
+            heading_noise_deg, gyro_noise_dps, accel_noise: BNO055の出力に加えるノイズの標準偏差。
+            gps_rate_hz (float): GPSの測位周期 [Hz]。
+            gps_noise_m (float): GPSの白色ノイズの標準偏差 [m]。
+            gps_bias_m (float): GPSのゆっくり変化する誤差 (一次マルコフ過程) の標準偏差 [m]。
+            gps_bias_tau_s (float): 上の誤差の相関時間 [s]。
+            step_s (float): 物理モデルの積分刻み [s]。
+            time_limit_s (float): この仮想時間を超えるとSimTimeoutを送出する (Noneなら無制限)。
+            seed (int): 乱数シード。同じシードなら同じ結果になる。
+            motor_pins (dict): MotorDriverに渡すピン番号 (省略時はMOTOR_PINS)。
+            gps_rx_pin (int): GPSをつなぐソフトUARTのRXピン。
+        """
+        self.origin = origin
+        self.track_m = track_m
+        self.slip = slip
+        self.turn_efficiency = turn_efficiency
+        self.battery_v = battery_v
+        self.motor_r_ohm = motor_r_ohm
+        self.heading_noise_deg = heading_noise_deg
+        self.gyro_noise_dps = gyro_noise_dps
+        self.accel_noise = accel_noise
+        self.gps_period = 1.0 / gps_rate_hz
+        self.gps_noise_m = gps_noise_m
+        self.gps_bias_m = gps_bias_m
+        self.gps_bias_tau_s = gps_bias_tau_s
+        self.step_s = step_s
+        self.time_limit_s = time_limit_s
+        self.pins = dict(motor_pins or MOTOR_PINS)
+        self.gps_rx_pin = gps_rx_pin
+        self.rng = random.Random(seed)
+
+        self.wheels = [
+            Wheel(max_wheel_speed[i], deadband[i], tau, tau_brake, tau_coast) for i in range(2)
+        ]
+
+        # 車体の状態
+        self.now = 0.0
+        self.x = 0.0
+        self.y = 0.0
+        self.heading = start_heading % 360
+        self.speed = 0.0     # 接地速度 [m/s]
+        self.yaw_rate = 0.0  # [deg/s] 右回り正
+        self.accel = 0.0     # 前後加速度 [m/s^2]
+        self.lateral_accel = 0.0
+        self.energy_j = 0.0  # モーターがバッテリーから取った電力量 [J]
+        self.distance_m = 0.0
+        self.trace = []      # (時刻, x, y, 方位, 速度) を trace_period_s ごとに記録
+        self.trace_period_s = 0.1
+
+        self._next_gps = 0.0
+        self._next_trace = 0.0
+        self._gps_bias = [self.rng.gauss(0, gps_bias_m), self.rng.gauss(0, gps_bias_m)]
+        self._timed_out = False
+        self._saved = None
+        self._epoch = 0.0 # with文に入った時点の実時刻 (time.time()の起点)
+
+        self.pi = FakePi(self)
+        self.i2c = FakeSMBus(self)
+
+    # ------------------------------------------------------------------
+    # 仮想時計
+    # ------------------------------------------------------------------
+    def advance(self, seconds):
+        """仮想時間をseconds秒進め、その間の車体の動きを積分する。"""
+        end = self.now + max(0.0, seconds)
+        while self.now < end:
+            dt = min(self.step_s, end - self.now)
+            self._step(dt)
+            self.now += dt
+        if self.time_limit_s is not None and self.now >= self.time_limit_s and not self._timed_out:
+            self._timed_out = True
+            raise SimTimeout(f"仮想時間が{self.time_limit_s:.0f}秒を超えました。")
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+    def monotonic(self):
+        return self.now
+
+    def wall_time(self):
+        return self._epoch + self.now
+
+    @property
+    def timed_out(self):
+        return self._timed_out
+
+    # ------------------------------------------------------------------
+    # 物理モデル
+    # ------------------------------------------------------------------
+    def _wheel_command(self, in1, in2, pwm, forward_levels):
+        """TB6612の入力ピンの状態から (モード, デューティ) を求める。"""
+        if not self.pi.levels.get(self.pins['STBY'], 0):
+            return "coast", 0.0
+        levels = (self.pi.levels.get(in1, 0), self.pi.levels.get(in2, 0))
+        duty = self.pi.duty.get(pwm, 0.0)
+        if levels == (1, 1):
+            return "brake", duty
+        if levels == (0, 0):
+            return "coast", duty
+        return ("forward" if levels == forward_levels else "reverse"), duty
+
+    def wheel_commands(self):
+        """現在の左右の (モード, デューティ)。左はAIN1=0/AIN2=1、右はBIN1=1/BIN2=0が前進 (MotorDriverと同じ)。"""
+        p = self.pins
+        return (self._wheel_command(p['AIN1'], p['AIN2'], p['PWMA'], (0, 1)),
+                self._wheel_command(p['BIN1'], p['BIN2'], p['PWMB'], (1, 0)))
+
+    def _step(self, dt):
+        commands = self.wheel_commands()
+        for wheel, (mode, duty) in zip(self.wheels, commands):
+            wheel.step(mode, duty, dt)
+            if mode in ("forward", "reverse"):
+                # 平均電圧 duty*V から逆起電力を引いた分の電流が流れ、バッテリーからは duty*I を取る
+                # (逆起電力定数はデッドバンド = 摩擦に釣り合う電流、で車輪速度モデルと整合させる)
+                back_emf = self.battery_v * (1.0 - wheel.deadband) * abs(wheel.speed) / wheel.max_speed
+                current = max(0.0, (duty * self.battery_v - back_emf) / self.motor_r_ohm)
+                self.energy_j += self.battery_v * duty * current * dt
+
+        left, right = self.wheels[0].speed, self.wheels[1].speed
+        speed = (left + right) / 2 * (1.0 - self.slip)
+        self.yaw_rate = math.degrees((left - right) / self.track_m) * self.turn_efficiency
+        self.accel = (speed - self.speed) / dt
+        self.lateral_accel = speed * math.radians(self.yaw_rate)
+        self.speed = speed
+
+        self.heading = (self.heading + self.yaw_rate * dt) % 360
+        h = math.radians(self.heading)
+        self.x += speed * math.sin(h) * dt
+        self.y += speed * math.cos(h) * dt
+        self.distance_m += abs(speed) * dt
+
+        t = self.now + dt
+        if t >= self._next_trace:
+            self.trace.append((t, self.x, self.y, self.heading, self.speed))
+            self._next_trace += self.trace_period_s
+        if t >= self._next_gps:
+            self._emit_gps(t)
+            self._next_gps += self.gps_period
+
+    # ------------------------------------------------------------------
+    # センサー合成
+    # ------------------------------------------------------------------
+    def bno055_registers(self):
+        """BNO055のレジスタページ0 (0x00〜0x3F) を現在の姿勢から合成する。"""
+        reg = bytearray(0x40)
+        reg[0x00] = 0xA0 # チップID
+        reg[0x01], reg[0x02], reg[0x03] = 0xFB, 0x32, 0x0F
+        reg[0x04:0x06] = struct.pack('<H', 0x0311)
+        reg[0x06] = 0x15
+
+        noise = self.rng.gauss
+        heading = (self.heading + noise(0, self.heading_noise_deg)) % 360
+        yaw_rate = self.yaw_rate + noise(0, self.gyro_noise_dps)
+        ax = self.accel + noise(0, self.accel_noise)
+        ay = self.lateral_accel + noise(0, self.accel_noise)
+        g = 9.80665
+        h = math.radians(heading)
+
+        def put(addr, values, scale):
+            reg[addr:addr + 2 * len(values)] = struct.pack('<' + 'h' * len(values),
+                                                          *[int(round(v * scale)) for v in values])
+
+        put(0x08, (ax, ay, g), 100)                               # 加速度 (1LSB = 0.01 m/s^2)
+        put(0x0E, (40 * math.cos(h), -40 * math.sin(h), -30), 16) # 地磁気 [uT]
+        put(0x14, (0.0, 0.0, -yaw_rate), 16)                      # ジャイロ (Zは左回り正)
+        put(0x1A, (heading, 0.0, 0.0), 16)                        # オイラー角 (heading, roll, pitch)
+        put(0x20, (math.cos(h / 2), 0.0, 0.0, -math.sin(h / 2)), 1 << 14) # クォータニオン
+        put(0x28, (ax, ay, 0.0), 100)                             # 線形加速度
+        put(0x2E, (0.0, 0.0, g), 100)                             # 重力
+        reg[0x34] = 25    # 温度
+        reg[0x35] = 0xFF  # キャリブレーション完了 (sys/gyro/accel/mag = 3)
+        reg[0x36] = 0x0F  # セルフテスト合格
+        reg[0x39] = 0x05  # センサーフュージョン実行中
+        reg[0x3A] = 0x00
+        for addr, value in self.i2c.registers.items():
+            if addr in (0x07, 0x3B, 0x3D, 0x3E, 0x3F, 0x41, 0x42):
+                reg[addr] = value # 設定レジスタは書き込まれた値を返す
+        return reg
+
+    def local_to_latlon(self, x, y):
+        lat0, lon0 = self.origin
+        lat = lat0 + math.degrees(y / EARTH_RADIUS_M)
+        lon = lon0 + math.degrees(x / (EARTH_RADIUS_M * math.cos(math.radians(lat0))))
+        return lat, lon
+
+    def latlon_to_local(self, lat, lon):
+        lat0, lon0 = self.origin
+        y = math.radians(lat - lat0) * EARTH_RADIUS_M
+        x = math.radians(lon - lon0) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+        return x, y
+
+    def distance_to(self, latlon):
+        """真の位置から緯度経度 latlon までの距離 [m]。"""
+        gx, gy = self.latlon_to_local(*latlon)
+        return math.hypot(gx - self.x, gy - self.y)
+
+    @staticmethod
+    def _nmea(body):
+        checksum = 0
+        for c in body.encode("ascii"):
+            checksum ^= c
+        return f"${body}*{checksum:02X}\r\n"
+
+    @staticmethod
+    def _nmea_coord(value, width):
+        hemisphere = 0 if value >= 0 else 1
+        value = abs(value)
+        degrees = int(value)
+        minutes = (value - degrees) * 60
+        return f"{degrees:0{width}d}{minutes:08.5f}", hemisphere
+
+    def _emit_gps(self, t):
+        """誤差を加えた測位結果を $GNRMC と $GNGGA にしてGPSのUARTバッファに流す。"""
+        a = math.exp(-self.gps_period / self.gps_bias_tau_s)
+        s = self.gps_bias_m * math.sqrt(1 - a * a)
+        self._gps_bias = [a * b + self.rng.gauss(0, s) for b in self._gps_bias]
+        ex = self._gps_bias[0] + self.rng.gauss(0, self.gps_noise_m)
+        ey = self._gps_bias[1] + self.rng.gauss(0, self.gps_noise_m)
+        lat, lon = self.local_to_latlon(self.x + ex, self.y + ey)
+
+        lat_s, lat_h = self._nmea_coord(lat, 2)
+        lon_s, lon_h = self._nmea_coord(lon, 3)
+        ns, ew = "NS"[lat_h], "EW"[lon_h]
+        stamp = time.gmtime(self._epoch + t)
+        hhmmss = time.strftime("%H%M%S", stamp) + f".{int((t % 1) * 100):02d}"
+        ddmmyy = time.strftime("%d%m%y", stamp)
+        knots = abs(self.speed) * 1.943844
+        sentences = (
+            self._nmea(f"GNRMC,{hhmmss},A,{lat_s},{ns},{lon_s},{ew},{knots:.3f},{self.heading:.2f},{ddmmyy},,,A")
+            + self._nmea(f"GNGGA,{hhmmss},{lat_s},{ns},{lon_s},{ew},1,08,1.0,10.0,M,39.0,M,,")
+        )
+        self.pi._feed_serial(self.gps_rx_pin, sentences.encode("ascii"))
+
+    # ------------------------------------------------------------------
+    # 差し替え
+    # ------------------------------------------------------------------
+    def __enter__(self):
+        install_fake_modules()
+        pigpio = sys.modules["pigpio"]
+        smbus = sys.modules["smbus"]
+        self._epoch = time.time()
+        self._saved = (time.sleep, time.monotonic, time.time, time.perf_counter,
+                       pigpio.pi, smbus.SMBus)
+        time.sleep = self.sleep
+        time.monotonic = self.monotonic
+        time.time = self.wall_time
+        time.perf_counter = self.monotonic
+        pigpio.pi = lambda *args, **kwargs: self.pi
+        smbus.SMBus = lambda *args, **kwargs: self.i2c
+        # 前のシミュレーションのFakePiを共有接続として使い回さないようにする
+        import pigpio_manager
+        pigpio_manager.get_manager().reset()
+        return self
+
+    def __exit__(self, *exc):
+        (time.sleep, time.monotonic, time.time, time.perf_counter,
+         sys.modules["pigpio"].pi, sys.modules["smbus"].SMBus) = self._saved
+        sys.modules["pigpio_manager"].get_manager().reset()
+        return exc[0] is SimTimeout # 時間切れはシミュレーションの正常な終わり方として扱う
+
+    def summary(self):
+        """走行結果の要約 (dict)。"""
+        return {
+            "time_s": self.now,
+            "energy_j": self.energy_j,
+            "distance_m": self.distance_m,
+            "x_m": self.x,
+            "y_m": self.y,
+            "heading_deg": self.heading,
+            "pigpio_writes": self.pi.write_count,
+            "i2c_reads": self.i2c.read_count,
+            "timed_out": self._timed_out,
+        }
+
+# ----------------------------------------------------------------------
+# 実機用モジュールの代わり
+# ----------------------------------------------------------------------
+def _outside_sim(*args, **kwargs):
+    raise RuntimeError("rover_sim: ハードウェアへのアクセスはRoverSimのwith文の中で行ってください。")
+
+def _fake_module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    module.__rover_sim_fake__ = True
+    return module
+
+class _FakeGPIOPWM:
+    """RPi.GPIO.PWM の代わり (RPi.GPIOでPWMを出す古いMotorDriverを作れるようにするだけで、車輪は動かない)。"""
+
+    def __init__(self, pin, frequency):
+        self.pin = pin
+        self.frequency = frequency
+        self.duty = 0
+
+    def start(self, duty):
+        self.duty = duty
+
+    def ChangeDutyCycle(self, duty):
+        self.duty = duty
+
+    def ChangeFrequency(self, frequency):
+        self.frequency = frequency
+
+    def stop(self):
+        self.duty = 0
+
+def _make_fake_gpio():
+    noop = lambda *args, **kwargs: None
+    return _fake_module(
+        "RPi.GPIO", BCM=11, BOARD=10, OUT=0, IN=1, HIGH=1, LOW=0, PUD_UP=22, PUD_DOWN=21,
+        setmode=noop, setwarnings=noop, setup=noop, output=noop, cleanup=noop,
+        input=lambda *args, **kwargs: 0, PWM=_FakeGPIOPWM,
+    )
+
+_FAKE_FACTORIES = {
+    "pigpio": lambda: _fake_module("pigpio", pi=_outside_sim, INPUT=0, OUTPUT=1, ALT0=4,
+                                   PUD_OFF=0, PUD_DOWN=1, PUD_UP=2, LOW=0, HIGH=1,
+                                   RISING_EDGE=0, FALLING_EDGE=1, EITHER_EDGE=2, error=Exception),
+    "smbus": lambda: _fake_module("smbus", SMBus=_outside_sim),
+    "serial": lambda: _fake_module("serial", Serial=_outside_sim, SerialException=OSError),
+    "RPi.GPIO": _make_fake_gpio,
+}
+
+def install_fake_modules():
+    """
+    pigpio, smbus, serial, RPi.GPIO がimportできない環境 (開発用PCなど) では代わりのモジュールを登録する。
+    実機 (Raspberry Pi) では本物のモジュールをそのまま使い、RoverSimのwith文の間だけ pigpio.pi と smbus.SMBus を差し替える。
+    """
+    for name, factory in _FAKE_FACTORIES.items():
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            module = factory()
+            sys.modules[name] = module
+            if name == "RPi.GPIO":
+                parent = sys.modules.setdefault("RPi", _fake_module("RPi"))
+                parent.GPIO = module
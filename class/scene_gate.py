@@ -0,0 +1,150 @@
+import time
+import cv2
+import numpy as np
+import color_classifier
+
+# 前回検出したフレームからシーンが変わっていなければ、検出をやり直さずに前回の結果を返すためのモジュール
+# ブレーキで停止して落ち着くのを待つ間 (time.sleep(0.5) → 撮影) も、検出ループはほとんど同じフレームに対して
+# 毎回すべての検出をやり直していた。SceneGate は
+#   - 縮小してぼかしたカラーのサムネイル (既定 32x24) を前回検出したフレームのものと比べ、
+#     いずれかのチャンネルが pixel_threshold 以上変わった画素の割合が changed_fraction 未満で、
+#   - IMUが止まっている (ヨーレートが小さく、方位も前回の検出から変わっていない) なら
+# シーンは変わっていないとみなし、前回の検出結果をそのまま返す。
+# 平均の差ではなく「変わった画素の割合」で判定するので、小さいコーンが視野に入っただけでも検出をやり直す。
+#
+# 使い方:
+#   gate = SceneGate(motion_fn=lambda: bno.get_yaw_rate(), heading_fn=bno.get_heading)
+#   result = gate.run(frame, detect)       # detect(frame) の結果 (変わっていなければ前回の結果)
+#   print(format_gate_stats(gate.stats()))
+
+class SceneGate:
+    """
+    サムネイルの差とIMUの状態から、前回検出したフレームとの違いを判定して検出を間引くクラス。
+    """
+
+    def __init__(self, thumb_size=(32, 24), pixel_threshold=12, changed_fraction=0.01, motion_fn=None,
+                 yaw_rate_threshold_dps=3.0, heading_fn=None, heading_threshold_deg=2.0, max_age_s=3.0):
+        """
+        Args:
+            thumb_size (tuple): 比べるサムネイルの (幅, 高さ)。
+            pixel_threshold (int): 変わったとみなす画素の値の差 (0-255、いずれかのチャンネル)。センサーノイズより大きくする。
+            changed_fraction (float): 変わった画素がこの割合以上ならシーンが変わったとみなす。
+            motion_fn (callable): ヨーレート [deg/s] を返す関数 (bno.get_yaw_rate など)。Noneなら使わない。
+            yaw_rate_threshold_dps (float): これ以上のヨーレートなら回頭中とみなして必ず検出する。
+            heading_fn (callable): 方位 [deg] を返す関数 (bno.get_heading など)。Noneなら使わない。
+            heading_threshold_deg (float): 前回の検出から方位がこれ以上変わっていれば必ず検出する。
+            max_age_s (float): 前回の検出からこれ以上経っていれば、変わっていなくても検出する。
+        """
+        self.thumb_size = tuple(thumb_size)
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.motion_fn = motion_fn
+        self.yaw_rate_threshold_dps = yaw_rate_threshold_dps
+        self.heading_fn = heading_fn
+        self.heading_threshold_deg = heading_threshold_deg
+        self.max_age_s = max_age_s
+        self.last_reason = None
+        self._thumb = None
+        self._heading = None
+        self._result = None
+        self._time = None
+        self.processed = 0
+        self.skipped = 0
+        self.detect_s = 0.0      # 検出にかかった合計時間 [s]
+        self.gate_s = 0.0        # 判定 (サムネイル作成と比較) にかかった合計時間 [s]
+
+    def thumbnail(self, frame):
+        """
+        縮小してぼかしたカラーのサムネイル。赤と芝生のように明るさが同じでも色が違えば差が出るよう、色も残す。
+        loresのYUV420バッファは Y/U/V の平面をそれぞれ縮小する。
+        """
+        if frame.ndim == 2:
+            planes = color_classifier.split_yuv420(frame)
+            thumb = cv2.merge([self._shrink(plane) for plane in planes])
+        else:
+            thumb = self._shrink(frame[..., :3])
+        return cv2.GaussianBlur(thumb, (3, 3), 0)
+
+    def _shrink(self, image):
+        # 間引いてから面積平均で縮小する (全画素の面積平均の半分以下の時間で、ノイズは十分に平均される)
+        width, height = self.thumb_size
+        step = max(1, min(image.shape[0] // (4 * height), image.shape[1] // (4 * width)))
+        return cv2.resize(image[::step, ::step], self.thumb_size, interpolation=cv2.INTER_AREA)
+
+    def changed(self, frame, thumb=None):
+        """
+        前回検出したときからシーンが変わったか (理由は last_reason に残す)。
+
+        Returns:
+            bool: 検出をやり直すべきならTrue。
+        """
+        if self._thumb is None:
+            self.last_reason = "初回"
+            return True
+        if self.max_age_s is not None and time.monotonic() - self._time >= self.max_age_s:
+            self.last_reason = "時間切れ"
+            return True
+        if self.motion_fn is not None:
+            rate = self.motion_fn()
+            if rate is not None and abs(rate) >= self.yaw_rate_threshold_dps:
+                self.last_reason = "回頭中"
+                return True
+        if self.heading_fn is not None and self._heading is not None:
+            heading = self.heading_fn()
+            if heading is not None and abs((heading - self._heading + 180) % 360 - 180) >= self.heading_threshold_deg:
+                self.last_reason = "方位の変化"
+                return True
+        thumb = self.thumbnail(frame) if thumb is None else thumb
+        diff = cv2.absdiff(thumb, self._thumb).max(axis=2) # どれかのチャンネルが変わった画素
+        if np.count_nonzero(diff >= self.pixel_threshold) >= self.changed_fraction * diff.size:
+            self.last_reason = "画像の変化"
+            return True
+        self.last_reason = None
+        return False
+
+    def run(self, frame, detect):
+        """
+        シーンが変わっていれば detect(frame) を実行して結果を保持し、変わっていなければ保持した結果を返す。
+
+        Args:
+            frame (np.ndarray): 撮影したフレーム (RGB/BGR、またはloresのYUV420バッファ)。
+            detect (callable): frame を受け取って検出結果を返す関数。
+
+        Returns:
+            検出結果 (detect の戻り値)。
+        """
+        start = time.perf_counter()
+        thumb = self.thumbnail(frame)
+        changed = self.changed(frame, thumb)
+        self.gate_s += time.perf_counter() - start
+        if not changed:
+            self.skipped += 1
+            return self._result
+
+        start = time.perf_counter()
+        self._result = detect(frame)
+        self.detect_s += time.perf_counter() - start
+        self.processed += 1
+        self._thumb = thumb
+        self._time = time.monotonic()
+        self._heading = self.heading_fn() if self.heading_fn is not None else None
+        return self._result
+
+    def invalidate(self):
+        """保持した結果を捨て、次のフレームでは必ず検出する (閾値や分類器を変えたときなど)。"""
+        self._thumb = None
+        self._result = None
+
+    def stats(self):
+        """検出した回数・間引いた回数と割合・節約した時間の推定 (間引いた回数 x 検出の平均時間 - 判定の合計時間) [s]。"""
+        total = self.processed + self.skipped
+        mean_detect = self.detect_s / self.processed if self.processed else 0.0
+        return {"processed": self.processed, "skipped": self.skipped,
+                "skip_rate": self.skipped / total if total else 0.0,
+                "saved_s": self.skipped * mean_detect - self.gate_s,
+                "detect_ms": mean_detect * 1000, "gate_ms": self.gate_s / total * 1000 if total else 0.0}
+
+def format_gate_stats(stats, label="GATE"):
+    """stats() の結果を1行の文字列にする。"""
+    return (f"[{label}] 検出 {stats['processed']}回, 間引き {stats['skipped']}回 ({stats['skip_rate']:.0%}), "
+            f"節約 {stats['saved_s'] * 1000:.0f}ms (検出 {stats['detect_ms']:.2f}ms/回, 判定 {stats['gate_ms']:.3f}ms/回)")
@@ -1,88 +1,272 @@
 import time
+import threading
+from concurrent.futures import Future
 import pigpio # pigpioを使うように変更
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import RPi.GPIO as GPIO # GPIO.cleanup()のために残すが、ピン設定は行わない
+from rate_loop import FixedRateLoop
 
 class ServoController:
     """
-    pigpioライブラリのPWM機能を使用してサーボモーターを制御するクラス。
-    ピンのセットアップやPWM制御はすべてpigpioで行います。
+    pigpioの set_servo_pulsewidth (1µs分解能) でサーボモーターを制御するクラス。
+    move_to() は速度・加速度を制限した軌道をバックグラウンドスレッドで生成し、
+    完了を待てる Future をすぐに返すので、サーボが動いている間に他の処理を進められる。
     """
 
-    def __init__(self, pi_instance, servo_pin=13, pwm_frequency=50):
+    def __init__(self, pi_instance=None, servo_pin=13, pwm_frequency=50,
+                 min_pulse_us=500, max_pulse_us=2500, update_hz=50):
         """
         ServoControllerのコンストラクタです。
 
         Args:
-            pi_instance (pigpio.pi): 既に初期化されたpigpioのインスタンス。
+            pi_instance (pigpio.pi): 既に初期化されたpigpioのインスタンス。省略時はpigpio_managerの共有接続を使う。
             servo_pin (int): サーボモーターが接続されているGPIOピンの番号 (BCMモード)。
-            pwm_frequency (int): PWM信号の周波数 (Hz)。標準的なサーボは50Hzを使用します。
+            pwm_frequency (int): サーボの制御周期 (Hz)。デューティ比 [%] とパルス幅 [µs] の換算に使う。
+                                 (set_servo_pulsewidthの出力は常に50Hz)
+            min_pulse_us (int): 出力を許すパルス幅の下限 [µs] (pigpioの下限は500)。
+            max_pulse_us (int): 出力を許すパルス幅の上限 [µs] (pigpioの上限は2500)。
+            update_hz (int): 軌道の更新周期 [Hz]。サーボは1周期に1回しかパルスを読まないので50Hzで十分。
         """
-        self.pi = pi_instance # pigpioインスタンスを使用
+        self._owns_pi = pi_instance is None
+        self.pi = pi_instance if pi_instance is not None else pigpio_manager.acquire("ServoController")
         self.servo_pin = servo_pin
         self.pwm_frequency = pwm_frequency
+        self.min_pulse_us = min_pulse_us
+        self.max_pulse_us = max_pulse_us
+        self.update_hz = update_hz
 
-        # --- pigpioによるサーボPWMの初期化 ---
-        # 1. ピンを出力モードに設定
+        # 軌道生成の状態 (スレッド間で共有するので self._cond で保護する)
+        self._cond = threading.Condition()
+        self._position = None   # 現在出力しているパルス幅 [µs] (Noneは未出力)
+        self._velocity = 0.0    # [µs/s]
+        self._target = None
+        self._max_velocity = None
+        self._max_accel = None
+        self._future = None
+        self._thread = None
+        self._running = True
+
+        # ピンを出力モードにして、パルスを止めた状態 (0) から始める
         self.pi.set_mode(self.servo_pin, pigpio.OUTPUT)
-        
-        # 2. PWM周波数を設定 (通常50Hz)
-        self.pi.set_PWM_frequency(self.servo_pin, self.pwm_frequency)
-        
-        # 3. PWMの範囲を設定 (デューティサイクルの最大値)。通常 0-1,000,000 ですが、
-        #    ここではデューティサイクルをパーセンテージで受け取りやすいため、
-        #    10000 などの値を設定し、後に100%の値を10000と対応させます。
-        #    一般的なサーボのデューティサイクル(2.5%～12.5%)をそのまま使用できるよう、
-        #    RPi.GPIOのPWM_rangeが0-100なので、それに対応させます。
-        self.pi.set_PWM_range(self.servo_pin, 100) # デューティサイクルを0-100で指定できるように設定
-        
-        # 4. 初期デューティサイクルを設定 (サーボ停止位置: 通常0)
-        self.pi.set_PWM_dutycycle(self.servo_pin, 0) 
-        
-        print(f"✅ GPIO{self.servo_pin} でサーボをpigpio PWMで初期化しました (周波数: {self.pwm_frequency}Hz)。")
-
-    def set_duty_cycle(self, duty_cycle):
-        """
-        サーボモーターのデューティサイクルを設定します。
-        pigpioのデューティサイクル範囲 (0-PWM_range) に合わせて設定します。
+        self.pi.set_servo_pulsewidth(self.servo_pin, 0)
+
+        print(f"✅ GPIO{self.servo_pin} でサーボをpigpioのサーボパルスで初期化しました (パルス幅 {self.min_pulse_us}-{self.max_pulse_us}µs)。")
+
+    def duty_to_pulse_width(self, duty_cycle):
+        """デューティ比 [%] をパルス幅 [µs] に換算する (50Hzなら 7.5% → 1500µs)。"""
+        return duty_cycle / 100.0 * 1000000.0 / self.pwm_frequency
+
+    def _clamp(self, pulse_us):
+        if not self.min_pulse_us <= pulse_us <= self.max_pulse_us:
+            print(f"警告: パルス幅 {pulse_us:.0f}µs は範囲外です。{self.min_pulse_us}-{self.max_pulse_us}µsに制限します。")
+        return max(self.min_pulse_us, min(self.max_pulse_us, pulse_us))
+
+    def _write(self, pulse_us):
+        self.pi.set_servo_pulsewidth(self.servo_pin, int(round(pulse_us)))
+
+    def set_pulse_width(self, pulse_us):
+        """
+        パルス幅 [µs] を即座に出力する (待機しない)。進行中のmove_to()は打ち切られる。
+        pigpioと同様に 0 を指定するとパルスを止める。
+        """
+        if pulse_us == 0:
+            with self._cond:
+                self._supersede()
+                self._position = None
+                self._velocity = 0.0
+                self.pi.set_servo_pulsewidth(self.servo_pin, 0)
+            return
+        pulse_us = self._clamp(pulse_us)
+        with self._cond:
+            self._supersede()
+            self._position = pulse_us
+            self._velocity = 0.0
+            self._target = None
+            self._write(pulse_us)
+
+    def move_to(self, pulse_us, max_velocity_us_s=None, max_accel_us_s2=None):
+        """
+        パルス幅 pulse_us [µs] まで、速度と加速度を制限した台形軌道で動かす。
+        すぐに戻り、到達すると完了する Future を返す (future.result() で待てる)。
+        新しい move_to()/set_pulse_width() が呼ばれると、前の Future はキャンセルされる。
+
+        Args:
+            pulse_us (float): 目標パルス幅 [µs]。
+            max_velocity_us_s (float): 最大速度 [µs/s]。Noneなら即座に目標を出力する。
+            max_accel_us_s2 (float): 最大加速度 [µs/s^2]。Noneなら加速度を制限しない。
+
+        Returns:
+            concurrent.futures.Future: 完了時の結果は到達したパルス幅 [µs]。
+
+        Raises:
+            RuntimeError: stop_pwm() の後に呼ばれたとき (軌道を進めるスレッドが動かず、Futureが完了しないため)。
+        """
+        pulse_us = self._clamp(pulse_us)
+        future = Future()
+        with self._cond:
+            if not self._running:
+                raise RuntimeError(f"ServoController: GPIO{self.servo_pin} は stop_pwm() 済みのため動かせません。")
+            self._supersede()
+            if max_velocity_us_s is None or self._position is None:
+                # 速度制限なし、または現在位置が不明 (初回) なら即座に出力する
+                self._position = pulse_us
+                self._velocity = 0.0
+                self._target = None
+                self._write(pulse_us)
+                future.set_result(pulse_us)
+                return future
+            self._target = pulse_us
+            self._max_velocity = abs(max_velocity_us_s)
+            self._max_accel = None if max_accel_us_s2 is None else abs(max_accel_us_s2)
+            self._future = future
+            self._ensure_thread()
+            self._cond.notify()
+        return future
+
+    def _supersede(self):
+        """進行中の軌道のFutureをキャンセルする (self._condを保持した状態で呼ぶ)。"""
+        if self._future is not None:
+            self._future.cancel()
+            self._future = None
+        self._target = None
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._worker, name=f"servo-{self.servo_pin}", daemon=True)
+            self._thread.start()
+
+    def _worker(self):
+        """目標が設定されている間、update_hzで軌道を1ステップずつ進めて出力する。"""
+        while True:
+            with self._cond:
+                while self._running and self._target is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+            loop = FixedRateLoop(self.update_hz)
+            while True:
+                dt = loop.wait()
+                with self._cond:
+                    if not self._running or self._target is None:
+                        break
+                    if self._step(dt):
+                        break
+
+    def _step(self, dt):
+        """
+        軌道を dt 秒進める (self._condを保持した状態で呼ぶ)。
+
+        Returns:
+            bool: 目標に到達したらTrue。
+        """
+        remaining = self._target - self._position
+        direction = 1.0 if remaining > 0 else -1.0
+        # 残り距離で止まれる速度 (加速度制限が無ければ最大速度)
+        v_limit = self._max_velocity
+        if self._max_accel is not None:
+            v_limit = min(v_limit, (2 * self._max_accel * abs(remaining)) ** 0.5)
+        v_desired = direction * v_limit
+        if self._max_accel is not None:
+            dv = self._max_accel * dt
+            v_desired = max(self._velocity - dv, min(self._velocity + dv, v_desired))
+        self._velocity = v_desired
+
+        step = self._velocity * dt
+        if abs(remaining) < 0.5 or (step * remaining > 0 and abs(step) >= abs(remaining)):
+            self._position = self._target
+            self._velocity = 0.0
+            self._write(self._position)
+            future, self._future = self._future, None
+            self._target = None
+            if future is not None:
+                future.set_result(self._position)
+            return True
+        self._position += step
+        self._write(self._position)
+        return False
+
+    def run_sequence(self, steps, max_velocity_us_s=None, max_accel_us_s2=None):
+        """
+        [(パルス幅[µs], 保持時間[s]), ...] の順に動かす一連の動作をバックグラウンドで実行する。
+        物資の放出 → 待機 → 戻す、のような動作を走行準備と並行して行うために使う。
+
+        Returns:
+            concurrent.futures.Future: 全ての動作が終わると完了する。
+        """
+        done = Future()
+
+        def run():
+            try:
+                for pulse_us, hold_s in steps:
+                    self.move_to(pulse_us, max_velocity_us_s, max_accel_us_s2).result()
+                    time.sleep(hold_s)
+                done.set_result(self._position)
+            except BaseException as e:
+                done.set_exception(e)
+
+        threading.Thread(target=run, name=f"servo-seq-{self.servo_pin}", daemon=True).start()
+        return done
+
+    def wait(self, timeout=None):
+        """進行中の move_to() が終わるまで待つ。"""
+        with self._cond:
+            future = self._future
+        if future is not None:
+            future.result(timeout)
+
+    def set_duty_cycle(self, duty_cycle, settle_s=0.5):
+        """
+        サーボモーターのデューティサイクルを設定します (従来のAPI)。
+        以前はPWM_rangeを100にして int(duty_cycle) を出力していたため 7.5% が 7% になっていたが、
+        µs単位のパルス幅に換算して出力するので小数のデューティもそのまま反映される。
 
         Args:
             duty_cycle (float): 設定するデューティサイクル値 (0.0 から 100.0)。
                                 一般的にサーボは2.5 (反時計回り最大) から 12.5 (時計回り最大) の範囲。
+            settle_s (float): サーボが位置に到達するのを待つ時間 [s]。0なら待たない。
         """
         if not (0.0 <= duty_cycle <= 100.0):
             print(f"警告: 不正なデューティサイクル値 ({duty_cycle}) です。0.0から100.0の範囲で指定してください。")
             return
-        
-        # pigpioのデューティサイクルは0からPWM_range (ここでは100) なので、そのまま渡せる
-        self.pi.set_PWM_dutycycle(self.servo_pin, int(duty_cycle))
-        time.sleep(0.5) # サーボが位置に到達するのを待つ
+        self.set_pulse_width(self.duty_to_pulse_width(duty_cycle))
+        if settle_s > 0:
+            time.sleep(settle_s) # サーボが位置に到達するのを待つ
         print(f"デューティサイクルを {duty_cycle:.1f}% に設定しました。")
 
     def gradually_change_duty_cycle(self, start_duty, end_duty, steps=50, delay_per_step=0.05):
         """
         サーボのデューティサイクルを`start_duty`から`end_duty`まで徐々に変化させます。
-        pigpioのデューティサイクル範囲に合わせて設定します。
+        同じ所要時間 (steps × delay_per_step) になる速度で move_to() し、完了まで待ちます。
         """
         print(f"デューティサイクルを {start_duty:.1f}% から {end_duty:.1f}% へ徐々に変化させます。")
-        for i in range(steps + 1):
-            current_duty = start_duty + (end_duty - start_duty) * i / steps
-            self.pi.set_PWM_dutycycle(self.servo_pin, int(current_duty))
-            time.sleep(delay_per_step)
+        start_us = self.duty_to_pulse_width(start_duty)
+        end_us = self.duty_to_pulse_width(end_duty)
+        duration = max(steps * delay_per_step, 1e-3)
+        self.set_pulse_width(start_us)
+        self.move_to(end_us, max_velocity_us_s=abs(end_us - start_us) / duration).result()
         print(f"デューティサイクル変化完了。最終値: {end_duty:.1f}%")
 
     def stop_pwm(self):
         """
-        PWM信号の出力を停止し、サーボへの制御を終了します。
+        軌道生成を止め、パルスの出力を停止してサーボへの制御を終了します。
         """
+        with self._cond:
+            self._supersede()
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
         if self.pi:
-            self.pi.set_PWM_dutycycle(self.servo_pin, 0) # デューティサイクルを0に
+            self.pi.set_servo_pulsewidth(self.servo_pin, 0) # パルスを止める
             self.pi.set_mode(self.servo_pin, pigpio.INPUT) # ピンを入力モードに戻して解放
             print("PWM信号を停止し、ピンを解放しました。")
 
     def cleanup(self):
         """
         サーボ制御に関連するリソースをクリーンアップします。
-        pigpioインスタンスはメインスクリプトで一括して行われるため、ここでは呼び出しません。
+        渡されたpigpioインスタンスはメインスクリプトで一括して停止するため、ここでは停止しません。
         """
         self.stop_pwm()
+        if self._owns_pi:
+            self.pi.stop() # pigpio_managerから借りた参照を返す
         print("ServoController: クリーンアップ完了。")
@@ -0,0 +1,191 @@
+import math
+import time
+from collections import namedtuple
+from rate_loop import FixedRateLoop
+
+# 回頭結果: settled=許容誤差内で静定したか, error_deg=最終誤差[deg], elapsed_s=所要時間[s]
+TurnResult = namedtuple("TurnResult", ["settled", "error_deg", "elapsed_s"])
+
+def wrap_angle(angle):
+    """角度を -180〜180 度に正規化する。"""
+    return (angle + 180) % 360 - 180
+
+class TurnController:
+    """
+    BNO055の方位とヨーレートを使った連続PID回頭制御クラス。
+    「petit_left/rightでパルス回頭 → ブレーキ → 0.5〜1秒待機」を繰り返す方式の代わりに、
+    方位をアンラップしながら毎周期 MotorDriver.set_twist(0, omega) で旋回角速度を指令する。
+    D項は方位の差分ではなくジャイロのヨーレートを使う (微分キックとノイズが出ない)。
+    許容範囲の外で止まったままのときは、回り始めるまで指令の下限を上げていく (ブレークアウェイ)。
+    目標の近くの小さい指令は、キャリブレーションの補間ではデッドバンドの端に届かないことがあるため。
+    回り始めたら下限は時定数 breakaway_decay_s で元に戻していく (上げたままだと小さい修正まで速く回してしまい、
+    行き過ぎて振動する。すぐに戻すと、またデッドバンドで止まって下限を上げ直すことを繰り返す)。
+    MotorDriver が緊急停止 (emergency_stop) されたら、その周期で回頭を打ち切る。
+    MotorDriver にキャリブレーション (drive_calibration) が無いときは、set_twist の恒等テーブルでは
+    小さい指令がデッドバンドに埋もれるので、下限を最小デューティから始める。
+    """
+
+    def __init__(self, driver, bno, kp=2.0, ki=0.5, kd=0.15, max_omega=160.0,
+                 tolerance_deg=3.0, settle_rate_dps=5.0, settle_time_s=0.2,
+                 timeout_s=6.0, loop_hz=50, uncalibrated_min_duty=30.0, breakaway_rate=20.0,
+                 breakaway_decay_s=1.0):
+        """
+        Args:
+            driver (MotorDriver): set_twist()を持つモータードライバー。
+            bno (BNO055): get_heading()とget_yaw_rate()を持つIMU。
+            kp, ki, kd: PIDゲイン (出力は旋回角速度指令 [deg/s])。
+            max_omega (float): 旋回角速度指令の上限 [deg/s]。
+            tolerance_deg (float): 到達とみなす方位誤差 [deg]。
+            settle_rate_dps (float): 静定とみなすヨーレート [deg/s]。
+            settle_time_s (float): 上の2条件がこの時間続いたら静定とする [s]。
+            timeout_s (float): 静定しなくても打ち切る時間 [s]。
+            loop_hz (int): 制御周期 [Hz]。
+            uncalibrated_min_duty (float): 未キャリブレーション時の指令の最小デューティ [%]。
+            breakaway_rate (float): 許容範囲の外で止まっている間に、指令の下限を上げる速さ [%/s (デューティ換算)]。
+            breakaway_decay_s (float): 回り始めてから、上げた下限を元に戻していく時定数 [s]。
+        """
+        self.driver = driver
+        self.bno = bno
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.max_omega = max_omega
+        self.tolerance_deg = tolerance_deg
+        self.settle_rate_dps = settle_rate_dps
+        self.settle_time_s = settle_time_s
+        self.timeout_s = timeout_s
+        self.loop_hz = loop_hz
+        self.uncalibrated_min_duty = uncalibrated_min_duty
+        self.breakaway_rate = breakaway_rate
+        self.breakaway_decay_s = breakaway_decay_s
+
+    def _read_heading(self, deadline):
+        """方位を読む。読み取り失敗時は少し待って再試行し、deadline (time.monotonic()) を過ぎたらNone。"""
+        heading = self.bno.get_heading()
+        while heading is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+            heading = self.bno.get_heading()
+        return heading
+
+    def _speed_to_omega(self, speed):
+        """旋回速度 [%] (従来のpetit_left/rightの引数) を旋回角速度の上限に換算する。"""
+        calibration = getattr(self.driver, "calibration", None)
+        max_wheel_rate = calibration.max_wheel_rate() if calibration else 100.0
+        return 2 * speed / 100 * max_wheel_rate # その場旋回では左右の車輪速度の和がヨーレート
+
+    def _min_omega(self):
+        """未キャリブレーションなら最小デューティに相当する旋回角速度指令、キャリブレーション済みなら0。"""
+        calibration = getattr(self.driver, "calibration", None)
+        if calibration is not None and getattr(calibration, "calibrated", True):
+            return 0.0
+        return 2 * self.uncalibrated_min_duty # 恒等テーブルでは 車輪速度 = デューティ = omega / 2
+
+    def turn_to_heading(self, target_heading, speed=None, timeout_s=None):
+        """絶対方位 target_heading [deg] へ近い方向に回頭する。"""
+        timeout_s = self.timeout_s if timeout_s is None else timeout_s
+        start_time = time.monotonic()
+        start = self._read_heading(start_time + timeout_s)
+        if start is None:
+            return self._no_heading(float("nan"), start_time)
+        return self._run(start, wrap_angle(target_heading - start), speed, timeout_s, start_time)
+
+    def turn_by(self, angle_offset_deg, speed=None, timeout_s=None):
+        """現在方位から angle_offset_deg [deg] (右回り正) だけ回頭する。180度を超える指定も可。"""
+        timeout_s = self.timeout_s if timeout_s is None else timeout_s
+        start_time = time.monotonic()
+        start = self._read_heading(start_time + timeout_s)
+        if start is None:
+            return self._no_heading(wrap_angle(angle_offset_deg), start_time)
+        return self._run(start, angle_offset_deg, speed, timeout_s, start_time)
+
+    def _no_heading(self, error_deg, start_time):
+        """打ち切り時間まで方位を読めなかったときの結果 (モーターは動かしていない)。"""
+        print("[TURN] 警告: BNO055から方位を読めないため回頭しませんでした。")
+        return TurnResult(False, error_deg, time.monotonic() - start_time)
+
+    def _run(self, start_heading, offset_deg, speed, timeout_s, start_time):
+        max_omega = self.max_omega if speed is None else min(self.max_omega, self._speed_to_omega(speed))
+        has_rate = hasattr(self.bno, "get_yaw_rate")
+        base_min_omega = min(self._min_omega(), max_omega)
+        min_omega = base_min_omega # 指令の下限 (止まっている間は上げていき、回り始めたら戻していく)
+
+        # 方位はアンラップした値 (開始方位からの積算) で扱う
+        yaw = 0.0
+        prev_heading = start_heading
+        integral = 0.0
+        settled_since = None
+        settled = False
+        error = offset_deg
+        stop_reason = None
+
+        deadline = start_time + timeout_s
+        prev_time = time.monotonic()
+        loop = FixedRateLoop(self.loop_hz)
+        try:
+            while True:
+                if getattr(self.driver, "estopped", False):
+                    stop_reason = "緊急停止"
+                    break
+                now = time.monotonic()
+                dt = max(now - prev_time, 1e-3)
+                prev_time = now
+                heading = self.bno.get_heading()
+                if heading is None: # 読み取り失敗: 方位が分からない間は止めて、打ち切り時間まで読み直す
+                    self.driver.motor_stop_brake()
+                    heading = self._read_heading(deadline)
+                    if heading is None:
+                        stop_reason = "方位の読み取り失敗"
+                        break
+                step = wrap_angle(heading - prev_heading)
+                prev_heading = heading
+                yaw += step
+                rate = self.bno.get_yaw_rate() if has_rate else step / dt
+                error = offset_deg - yaw
+
+                # 静定判定
+                if abs(error) <= self.tolerance_deg and abs(rate) <= self.settle_rate_dps:
+                    if settled_since is None:
+                        settled_since = now
+                    elif now - settled_since >= self.settle_time_s:
+                        settled = True
+                        break
+                else:
+                    settled_since = None
+
+                if now >= deadline:
+                    break
+
+                if abs(error) <= self.tolerance_deg:
+                    # 許容範囲内では出力を止めてデッドバンドによるハンチングを防ぐ
+                    omega = 0.0
+                    integral = 0.0
+                else:
+                    omega = self.kp * error + self.ki * integral - self.kd * rate
+                    if abs(omega) < max_omega:
+                        integral += error * dt # 飽和中は積分しない (ワインドアップ防止)
+                    omega = max(-max_omega, min(max_omega, omega))
+                    if abs(rate) < self.settle_rate_dps: # 止まったまま: デッドバンドを越えるまで下限を上げる
+                        min_omega = min(max_omega, min_omega + 2 * self.breakaway_rate * dt)
+                    else: # 回っている: 上げた下限を元の値に向かって減らしていく
+                        min_omega = base_min_omega + (min_omega - base_min_omega) * math.exp(-dt / self.breakaway_decay_s)
+                    if abs(omega) < min_omega:
+                        omega = math.copysign(min_omega, error)
+
+                if omega == 0.0:
+                    self.driver.motor_stop_brake()
+                else:
+                    self.driver.set_twist(0, omega)
+
+                loop.wait()
+        finally:
+            self.driver.motor_stop_brake()
+
+        elapsed = time.monotonic() - start_time
+        result = TurnResult(settled, wrap_angle(error), elapsed)
+        if settled:
+            print(f"[TURN] 回頭完了。最終誤差: {result.error_deg:+.1f}度, 所要時間: {elapsed:.2f}秒")
+        elif stop_reason:
+            print(f"[TURN] 警告: {stop_reason}のため回頭を打ち切りました。最終誤差: {result.error_deg:+.1f}度")
+        else:
+            print(f"[TURN] 警告: {timeout_s:.1f}秒以内に静定しませんでした。最終誤差: {result.error_deg:+.1f}度")
+        return result
@@ -0,0 +1,665 @@
+import os
+import io
+import sys
+import ast
+import json
+import math
+import time
+import hashlib
+import argparse
+import datetime
+import platform
+import subprocess
+import tracemalloc
+import contextlib
+import importlib.util
+from collections import namedtuple
+import cv2
+import numpy as np
+import rover_sim
+import replay_camera
+rover_sim.install_fake_modules()
+replay_camera.install_fake_modules()
+import camera_orientation
+from bearing import BearingEstimator, DEFAULT_HFOV_DEG
+
+# 記録したフレームのコーパス (画像 + JSONのラベル) で、検出器の速さと正しさを比べるベンチマーク
+# Flag_Detector / Flag_Detector2・3・5 / Flag_hyper / Flagseeker / test_red / camera.get_block_number /
+# RedConeNavigator / GDA2 は、それぞれカメラを自分で作って撮影するので、ReplayCamera (replay_camera.py) に
+# 差し替えて元のコードのまま動かす。フレームごとの処理時間 (p50/p99)、メモリ (tracemallocのピーク)、
+# 適合率・再現率、方向の誤差、図形の正解率を求め、結果をJSONで保存して前回の結果と比べる。
+#
+# コーパスのディレクトリ:
+#   labels.json   {"frame_0001.png": {"target": "red_cone", "bearing_deg": -8.5, "shape": null, "distance_m": 3.0},
+#                  "frame_0002.png": {"target": "flag", "bearing_deg": 4.0, "shape": "T字", "distance_m": 2.0},
+#                  "frame_0003.png": {"target": null}, ...}
+#   frame_*.png   mainストリームをそのまま保存した画像 (センサーの向き。cv2.imwriteで保存したBGR)
+#   results/      ベンチマークの結果 (実行ごとに1ファイル)
+# target は "red_cone" / "flag" / null (何も無い)。bearing_deg は表示の向き (ローバーの正面) で右が正。
+#
+# 使い方:
+#   python vision_bench.py record /home/mark1/vision_corpus --count 50   # 実機で撮影 (ラベルは後で記入)
+#   python vision_bench.py synth /tmp/vision_corpus                      # 合成画像のコーパスを作る
+#   python vision_bench.py run /home/mark1/vision_corpus [--only RedConeNavigator.bearing ...]
+
+CLASS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(CLASS_DIR)
+LABELS_FILE = "labels.json"
+RESULTS_DIR = "results"
+TARGETS = ("red_cone", "flag")
+SHAPES = ("三角形", "長方形", "T字", "十字")
+DISTANCE_BUCKETS = ((0.0, 3.0, "<3m"), (3.0, 6.0, "3-6m"), (6.0, float("inf"), ">=6m"))
+
+# 前回の結果からこれ以上悪くなったら回帰として表示する
+REGRESSION_TIME_RATIO = 1.2    # p50が1.2倍以上 (かつ0.5ms以上) 遅くなった
+REGRESSION_TIME_MIN_MS = 0.5
+REGRESSION_SCORE_DROP = 0.02   # 適合率・再現率が0.02以上下がった
+
+# ---------------- コーパス ----------------
+
+def empty_label():
+    return {"target": None, "bearing_deg": None, "shape": None, "distance_m": None}
+
+def load_labels(directory):
+    """labels.json を読み、(ファイル名, ラベル) のリストをファイル名の順に返す。"""
+    with open(os.path.join(directory, LABELS_FILE), encoding="utf-8") as f:
+        labels = json.load(f)
+    entries = []
+    for name in sorted(labels):
+        label = empty_label()
+        label.update(labels[name] or {})
+        if label["target"] not in TARGETS + (None,):
+            raise ValueError(f"vision_bench: {name} のtarget '{label['target']}' は {TARGETS} かnullにしてください。")
+        entries.append((name, label))
+    return entries
+
+def read_frame(directory, name):
+    """コーパスの画像を capture_array() と同じRGBで読む。読めなければNone。"""
+    image = cv2.imread(os.path.join(directory, name), cv2.IMREAD_COLOR)
+    return None if image is None else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def corpus_hash(directory):
+    """ラベルの内容から作るコーパスの識別子 (同じコーパスの結果どうしだけを比べるため)。"""
+    with open(os.path.join(directory, LABELS_FILE), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+def _write_labels(directory, labels):
+    with open(os.path.join(directory, LABELS_FILE), "w", encoding="utf-8") as f:
+        json.dump(labels, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+def record(directory, count=50, interval=1.0, size=(640, 480)):
+    """
+    実機のカメラでmainストリームを撮影してコーパスに追加する。ラベルは空なので、後で labels.json に記入する。
+    (どの検出器も自分でconfigureし直すので、Transformは付けずにセンサーの向きのまま保存する)
+    """
+    from picamera2 import Picamera2
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, LABELS_FILE)
+    labels = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            labels = json.load(f)
+    picam2 = Picamera2()
+    picam2.configure(picam2.create_still_configuration(main={"size": tuple(size)}))
+    picam2.start()
+    time.sleep(2)
+    try:
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        for i in range(count):
+            name = f"frame_{stamp}_{i:04d}.png"
+            frame = picam2.capture_array()
+            cv2.imwrite(os.path.join(directory, name), cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+            labels[name] = empty_label()
+            print(f"[{i + 1}/{count}] {name}")
+            time.sleep(interval)
+    finally:
+        picam2.close()
+        _write_labels(directory, labels)
+    print(f"✅ {count}枚を保存しました。{path} の target/bearing_deg/shape/distance_m を記入してください。")
+
+# ---------------- 合成コーパス ----------------
+
+SENSOR_SIZE = (640, 480)   # mainストリーム (幅, 高さ)。ローバーの表示の向きは90度回した 480x640
+CONE_SIZE_M = (0.4, 0.7)   # 赤コーンの幅・高さ [m]
+FLAG_SIZE_M = 0.6          # フラッグ (黒い板) の一辺 [m]
+
+def _column(bearing_deg, width, hfov_deg=DEFAULT_HFOV_DEG):
+    focal = (width / 2) / math.tan(math.radians(hfov_deg) / 2)
+    return width / 2 + focal * math.tan(math.radians(bearing_deg)) - 0.5, focal
+
+def _shape_polygon(shape, cx, cy, size):
+    """白い図形の頂点 (表示の向き)。sizeは図形の外接する正方形の一辺 [px]。"""
+    s = size / 2
+    if shape == "三角形":
+        points = [(0, -s), (s * 0.87, s * 0.5), (-s * 0.87, s * 0.5)]
+    elif shape == "長方形":
+        points = [(-s, -s * 0.6), (s, -s * 0.6), (s, s * 0.6), (-s, s * 0.6)]
+    elif shape == "T字":
+        t = s / 3
+        points = [(-s, -s), (s, -s), (s, -s + 2 * t), (t, -s + 2 * t), (t, s), (-t, s), (-t, -s + 2 * t), (-s, -s + 2 * t)]
+    else: # 十字
+        t = s / 3
+        points = [(-t, -s), (t, -s), (t, -t), (s, -t), (s, t), (t, t), (t, s), (-t, s), (-t, t), (-s, t), (-s, -t), (-t, -t)]
+    return np.array([(cx + x, cy + y) for x, y in points], np.int32)
+
+def render_scene(label, rng):
+    """ラベルどおりの合成画像 (表示の向き、RGB) を作る。草地・空・照明むら・赤っぽい物・影も入れる。"""
+    width, height = SENSOR_SIZE[1], SENSOR_SIZE[0]
+    horizon = int(height * rng.uniform(0.35, 0.5))
+    frame = np.empty((height, width, 3), np.float32)
+    frame[:horizon] = (150, 180, 215)
+    frame[horizon:] = (85, 115, 55)
+    frame *= np.linspace(rng.uniform(0.75, 0.95), rng.uniform(1.0, 1.15), width, dtype=np.float32)[None, :, None]
+
+    # 紛らわしい物 (茶色・ピンク・影) をいくつか置く
+    for _ in range(rng.integers(0, 3)):
+        x, y = int(rng.uniform(0, width)), int(rng.uniform(horizon, height))
+        color = [(120, 70, 40), (220, 140, 160), (70, 75, 65)][rng.integers(0, 3)]
+        cv2.ellipse(frame, (x, y), (int(rng.uniform(10, 40)), int(rng.uniform(6, 20))), 0, 0, 360, color, -1)
+
+    target, distance = label["target"], label["distance_m"]
+    if target is not None:
+        cx, focal = _column(label["bearing_deg"], width)
+        base = horizon + focal * 0.2 / distance # 地面との接点 (カメラの高さ0.2m)
+        if target == "red_cone":
+            half_w, h = focal * CONE_SIZE_M[0] / 2 / distance, focal * CONE_SIZE_M[1] / distance
+            cone = np.array([(cx - half_w, base), (cx + half_w, base), (cx + half_w * 0.2, base - h),
+                             (cx - half_w * 0.2, base - h)], np.int32)
+            cv2.fillPoly(frame, [cone], (205 * rng.uniform(0.8, 1.1), 35, 30))
+        else:
+            side = focal * FLAG_SIZE_M / distance
+            top = base - side * 1.6 # ポールの上に付いている
+            cv2.rectangle(frame, (int(cx - side / 2), int(top)), (int(cx + side / 2), int(top + side)), (15, 15, 18), -1)
+            cv2.line(frame, (int(cx), int(top + side)), (int(cx), int(base)), (90, 90, 90), max(1, int(side / 30)))
+            cv2.fillPoly(frame, [_shape_polygon(label["shape"], cx, top + side / 2, side * 0.6)], (235, 235, 235))
+
+    frame += rng.normal(0, 6, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+def synth(directory, count=64, seed=0):
+    """
+    ラベル付きの合成コーパスを作る (赤コーン・フラッグ・何も無い画像がおよそ 3:3:2)。
+    画像は表示の向きで描いてから、ローバーのカメラ (camera_orientation.ROVER) のセンサーの向きに戻して保存する。
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(directory, exist_ok=True)
+    labels = {}
+    for i in range(count):
+        kind = ("red_cone", "red_cone", "red_cone", "flag", "flag", "flag", None, None)[i % 8]
+        label = empty_label()
+        label["target"] = kind
+        if kind == "red_cone":
+            label["bearing_deg"] = round(float(rng.uniform(-20, 20)), 2)
+            label["distance_m"] = round(float(rng.uniform(1.5, 8.0)), 2)
+        elif kind == "flag":
+            label["bearing_deg"] = round(float(rng.uniform(-18, 18)), 2)
+            label["distance_m"] = round(float(rng.uniform(1.5, 5.0)), 2)
+            label["shape"] = SHAPES[(i // 8) % len(SHAPES)]
+        display = render_scene(label, rng)
+        sensor = cv2.rotate(display, cv2.ROTATE_90_CLOCKWISE) # ROVERの逆 (表示 = センサーを反時計回りに90度)
+        name = f"synth_{i:04d}.png"
+        cv2.imwrite(os.path.join(directory, name), cv2.cvtColor(sensor, cv2.COLOR_RGB2BGR))
+        labels[name] = label
+    _write_labels(directory, labels)
+    print(f"✅ 合成コーパスを作りました: {directory} ({count}枚)")
+
+# ---------------- 検出器の登録 ----------------
+
+# setup(camera) は ReplayCamera を受け取って準備し、引数なしで呼ぶと1フレーム分の検出を行う関数を返す。
+# その関数の戻り値は {"present": 目標があるか, "bearing_deg": 方向 (表示の向きで右が正) またはNone,
+# "shapes": 見つけた図形の名前のリスト}。
+Detector = namedtuple("Detector", ["name", "target", "setup", "description"])
+DETECTORS = {}
+
+def register(name, target, description=""):
+    """検出器を登録するデコレーター。"""
+    def decorator(setup):
+        DETECTORS[name] = Detector(name, target, setup, description)
+        return setup
+    return decorator
+
+def load_module(path, alias):
+    """
+    ファイルを alias という名前のモジュールとして読み込む (ルートとclassに同じ名前の別のファイルがあるため)。
+    読み込む間だけ、そのファイルのディレクトリを import の検索パスの先頭に置く。
+    """
+    directory = os.path.dirname(path)
+    sys.path.insert(0, directory)
+    try:
+        spec = importlib.util.spec_from_file_location(alias, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+def load_definitions(path, alias, skip_names=("picam2", "Picamera2")):
+    """
+    importすると撮影を始めてしまうスクリプト (test_red.py など) から、import・関数・定数の定義だけを読み込む。
+    skip_namesを使う文と、式だけの文 (関数の呼び出しなど) は実行しない。
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+
+    def uses_skipped(node):
+        return any(isinstance(n, ast.Name) and n.id in skip_names for n in ast.walk(node))
+
+    kept = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom, ast.FunctionDef, ast.ClassDef)):
+            kept.append(node)
+        elif isinstance(node, ast.Assign) and not uses_skipped(node):
+            kept.append(node)
+    module = type(sys)(alias)
+    module.__file__ = path
+    directory = os.path.dirname(path)
+    sys.path.insert(0, directory)
+    try:
+        exec(compile(ast.Module(body=kept, type_ignores=[]), path, "exec"), module.__dict__)
+    finally:
+        sys.path.remove(directory)
+    return module
+
+def _prediction(present, bearing_deg=None, shapes=()):
+    return {"present": bool(present), "bearing_deg": None if bearing_deg is None else float(bearing_deg),
+            "shapes": sorted(set(shapes))}
+
+def _block_bearing(block, blocks, width):
+    """5分割などのブロック番号 (1〜) の中央の列の角度 [deg]。"""
+    return BearingEstimator().column_to_bearing((block - 0.5) * width / blocks - 0.5, width)
+
+def _flags_prediction(flags):
+    return _prediction(flags, shapes=[shape["name"] for flag in flags for shape in flag["shapes"]])
+
+def _root_flag_detector(filename):
+    def setup(camera):
+        module = load_module(os.path.join(ROOT_DIR, filename), "vision_bench_" + filename[:-3])
+        module.Picamera2 = lambda *args, **kwargs: camera
+        module.sleep = lambda seconds: None # カメラの安定化待ちは不要
+        detector = module.FlagDetector()
+        return lambda: _flags_prediction(detector.detect())
+    return setup
+
+for _filename in ("Flag_Detector.py", "Flag_Detector2.py", "Flag_Detector3.py", "Flag_Detector5.py", "Flag_Detector6.py"):
+    register(_filename[:-3], "flag", f"{_filename} の FlagDetector.detect() (黒いフラッグの中の白い図形)")(
+        _root_flag_detector(_filename))
+
+@register("Flag_hyper", "flag", "Flag_hyper.detect_shapes_by_region() (320x240、3領域に分けて図形を数える)")
+def _flag_hyper(camera):
+    module = load_module(os.path.join(ROOT_DIR, "Flag_hyper.py"), "vision_bench_Flag_hyper")
+    module.Picamera2 = lambda *args, **kwargs: camera
+    module.sleep = lambda seconds: None
+
+    def run():
+        regions = module.detect_shapes_by_region()
+        return _prediction(any(regions.values()), shapes=[name for counts in regions.values() for name in counts])
+    return run
+
+@register("Flagseeker", "flag", "Flagseeker が使う class/Flag_Detector2.py の FlagDetector (赤い図形、デバッグ画像なし)")
+def _flagseeker(camera):
+    module = load_module(os.path.join(CLASS_DIR, "Flag_Detector2.py"), "vision_bench_class_Flag_Detector2")
+    camera.configure(camera.create_still_configuration(main={"size": (640, 480)}))
+    detector = module.FlagDetector(camera)
+    return lambda: _flags_prediction(detector.detect(save_debug_image=False))
+
+@register("test_red", "red_cone", "test_red.get_block_number_by_density() (320x480を回転、5ブロックの赤密度)")
+def _test_red(camera):
+    module = load_definitions(os.path.join(ROOT_DIR, "test_red.py"), "vision_bench_test_red")
+    camera.configure(camera.create_still_configuration(main={"size": (320, 480)}))
+
+    def run():
+        frame = camera.capture_array()
+        block = module.get_block_number_by_density(frame)
+        width = frame.shape[0] # 反時計回りに90度回してから5分割する
+        return _prediction(block is not None, None if block is None else _block_bearing(block, 5, width))
+    return run
+
+@register("camera.get_block_number", "red_cone", "camera.get_block_number() (320x240、最大の赤い輪郭の重心のブロック)")
+def _camera_block(camera):
+    module = load_module(os.path.join(ROOT_DIR, "camera.py"), "vision_bench_camera")
+    camera.configure(camera.create_still_configuration(main={"size": (320, 240)})) # init_camera() と同じ設定
+    module.picam2 = camera
+
+    def run():
+        block = module.get_block_number()
+        width = camera.camera_config["main"]["size"][0] # 画像を回さずに5分割する
+        return _prediction(block is not None, None if block is None else _block_bearing(block, 5, width))
+    return run
+
+def _red_cone_navigator(camera):
+    module = load_module(os.path.join(CLASS_DIR, "Goal_Detective_Noshiro.py"), "vision_bench_Goal_Detective_Noshiro")
+    navigator = module.RedConeNavigator(None, None, camera)
+    navigator.scene_gate = None # 同じフレームを repeat 回呼ぶので、間引かずに毎回検出させる
+    return navigator
+
+@register("RedConeNavigator.blocks", "red_cone", "RedConeNavigator.get_red_block_by_density() (320x240、5ブロック)")
+def _navigator_blocks(camera):
+    camera.configure(camera.create_still_configuration(main={"size": (320, 240)}))
+    navigator = _red_cone_navigator(camera)
+
+    def run():
+        analysis = navigator.analyze(navigator._capture())
+        block = navigator.get_red_block_by_density(analysis)
+        return _prediction(block is not None, None if block is None else _block_bearing(block, 5, analysis.shape[1]))
+    return run
+
+@register("RedConeNavigator.bearing", "red_cone", "RedConeNavigator.get_red_bearing() (main 320x240 RGB)")
+def _navigator_bearing(camera):
+    camera.configure(camera.create_still_configuration(main={"size": (320, 240)}))
+    navigator = _red_cone_navigator(camera)
+
+    def run():
+        estimate = navigator.get_red_bearing(navigator._capture())
+        return _prediction(estimate is not None, None if estimate is None else estimate.bearing_deg)
+    return run
+
+@register("RedConeNavigator.bearing_lores", "red_cone",
+          "RedConeNavigator.get_red_bearing() (camera_setupのlores 320x240 YUV420、反転はTransform)")
+def _navigator_bearing_lores(camera):
+    import camera_setup
+    camera_setup.configure_detection_camera(camera, main_size=(640, 480), lores_size=(320, 240),
+                                            orientation=camera_orientation.ROVER, settle_s=0)
+    navigator = _red_cone_navigator(camera)
+
+    def run():
+        estimate = navigator.get_red_bearing(navigator._capture())
+        return _prediction(estimate is not None, None if estimate is None else estimate.bearing_deg)
+    return run
+
+def _navigator_scan(pyramid):
+    def setup(camera):
+        camera.configure(camera.create_still_configuration(main={"size": (640, 480)}))
+        navigator = _red_cone_navigator(camera)
+        analyze = navigator.scan if pyramid else navigator.analyze
+
+        def run():
+            estimate = navigator.get_red_bearing(analyze(navigator._capture()))
+            return _prediction(estimate is not None, None if estimate is None else estimate.bearing_deg)
+        return run
+    return setup
+
+register("RedConeNavigator.full_640", "red_cone",
+         "RedConeNavigator.analyze() → get_red_bearing() (main 640x480 RGB、フレーム全体を判定)")(_navigator_scan(False))
+register("RedConeNavigator.pyramid_640", "red_cone",
+         "RedConeNavigator.scan() → get_red_bearing() (main 640x480 RGB、80x60で候補を探してROIだけ判定)")(
+    _navigator_scan(True))
+
+@register("GDA2", "red_cone", "GDA2.GDA.get_percentage() (320x480を回転、0.2%を超えたら検出)")
+def _gda2(camera):
+    module = load_module(os.path.join(ROOT_DIR, "GDA2.py"), "vision_bench_GDA2")
+    module.Picamera2 = lambda *args, **kwargs: camera
+    with rover_sim.RoverSim(): # コンストラクタがモータードライバーとpigpioに接続するので、シミュレータの中で作る
+        gda = module.GDA(bno=None)
+    return lambda: _prediction(gda.get_percentage(camera.capture_array()) > 0.2)
+
+@register("GDA2.scan", "red_cone", "GDA2.GDA.get_percentage(scan()) (320x480、360度スキャンの2段判定、0.2%を超えたら検出)")
+def _gda2_scan(camera):
+    module = load_module(os.path.join(ROOT_DIR, "GDA2.py"), "vision_bench_GDA2")
+    module.Picamera2 = lambda *args, **kwargs: camera
+    with rover_sim.RoverSim():
+        gda = module.GDA(bno=None)
+    return lambda: _prediction(gda.get_percentage(gda.scan(camera.capture_array())) > 0.2)
+
+# ---------------- 実行と評価 ----------------
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+def evaluate(detector, predictions, labels):
+    """予測とラベルから、適合率・再現率・方向の誤差・図形の正解率を求める (予測がNoneのフレームは未検出として扱う)。"""
+    tp = fp = fn = 0
+    bearing_errors, shape_hits, shape_total = [], 0, 0
+    by_distance = {name: [0, 0] for _, _, name in DISTANCE_BUCKETS}
+    for prediction, label in zip(predictions, labels):
+        present = bool(prediction and prediction["present"])
+        is_target = label["target"] == detector.target
+        if present and is_target:
+            tp += 1
+            if prediction["bearing_deg"] is not None and label["bearing_deg"] is not None:
+                bearing_errors.append(abs(prediction["bearing_deg"] - label["bearing_deg"]))
+            if label["shape"]:
+                shape_total += 1
+                shape_hits += label["shape"] in prediction["shapes"]
+        elif present:
+            fp += 1
+        elif is_target:
+            fn += 1
+        if is_target and label["distance_m"] is not None:
+            for low, high, name in DISTANCE_BUCKETS:
+                if low <= label["distance_m"] < high:
+                    by_distance[name][0] += present
+                    by_distance[name][1] += 1
+    precision, recall = _ratio(tp, tp + fp), _ratio(tp, tp + fn)
+    f1 = None if not precision or not recall else 2 * precision * recall / (precision + recall)
+    return {
+        "tp": tp, "fp": fp, "fn": fn,
+        "precision": precision, "recall": recall, "f1": f1,
+        "bearing_mae_deg": float(np.mean(bearing_errors)) if bearing_errors else None,
+        "shape_accuracy": _ratio(shape_hits, shape_total),
+        "recall_by_distance": {name: _ratio(hit, total) for name, (hit, total) in by_distance.items() if total},
+    }
+
+def run_benchmark(directory, names=None, memory_frames=20, repeat=3):
+    """
+    コーパスの全フレームで検出器を実行し、検出器の名前 → 結果 (dict) を返す。
+    処理時間は ReplayCamera への画像の設定 (実機ではISPが行う縮小) を除いた、検出関数の呼び出しだけを測る。
+    1フレームにつき repeat 回呼んで最短の時間をそのフレームの時間とする (他のプロセスによるばらつきを除く)。
+    メモリは最初の memory_frames 枚でもう1回ずつ呼んで、tracemalloc のピーク (Pythonとnumpyの確保) を測る。
+    """
+    entries = load_labels(directory)
+    names = list(names or DETECTORS)
+    unknown = [n for n in names if n not in DETECTORS]
+    if unknown:
+        raise ValueError(f"vision_bench: 登録されていない検出器です: {unknown}。{sorted(DETECTORS)} から選んでください。")
+
+    quiet = lambda: contextlib.redirect_stdout(io.StringIO())
+    first = next((read_frame(directory, name) for name, _ in entries if read_frame(directory, name) is not None), None)
+    if first is None:
+        raise ValueError(f"vision_bench: {directory} に読める画像がありません。")
+
+    active, results = {}, {}
+    for name in names:
+        detector, camera = DETECTORS[name], replay_camera.ReplayCamera()
+        start = time.perf_counter()
+        try:
+            with quiet():
+                run = detector.setup(camera)
+                camera.load(first)
+                run() # 参照テーブルの作成など、最初の1回だけの処理を測定から外す
+        except Exception as e:
+            print(f"⚠️ {name}: 準備に失敗しました ({type(e).__name__}: {e})")
+            results[name] = {"name": name, "target": detector.target, "setup_error": f"{type(e).__name__}: {e}"}
+            continue
+        active[name] = (detector, camera, run, (time.perf_counter() - start) * 1000)
+
+    times = {name: [] for name in active}
+    memory = {name: [] for name in active}
+    predictions = {name: [] for name in active}
+    errors = {name: [0, None] for name in active}
+    labels = []
+    for index, (filename, label) in enumerate(entries):
+        frame = read_frame(directory, filename)
+        if frame is None:
+            print(f"⚠️ {filename} を読めないため飛ばします。")
+            continue
+        labels.append(label)
+        for name, (detector, camera, run, _) in active.items():
+            prediction, elapsed = None, []
+            for _ in range(max(1, repeat)):
+                camera.load(frame)
+                start = time.perf_counter()
+                try:
+                    with quiet():
+                        prediction = run()
+                except Exception as e:
+                    prediction = None
+                    error = f"{type(e).__name__}: {e}"
+                else:
+                    error = None
+                elapsed.append((time.perf_counter() - start) * 1000)
+            if error:
+                errors[name][0] += 1
+                errors[name][1] = error
+            times[name].append(min(elapsed))
+            predictions[name].append(prediction)
+            if index < memory_frames:
+                camera.load(frame)
+                tracemalloc.start()
+                try:
+                    with quiet():
+                        run()
+                except Exception:
+                    pass
+                memory[name].append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+    for name, (detector, camera, run, setup_ms) in active.items():
+        result = {
+            "name": name, "target": detector.target, "description": detector.description,
+            "frames": len(times[name]), "errors": errors[name][0], "last_error": errors[name][1],
+            "setup_ms": setup_ms,
+            "ms_p50": _percentile(times[name], 0.5), "ms_p99": _percentile(times[name], 0.99),
+            "ms_mean": float(np.mean(times[name])) if times[name] else None,
+            "mem_peak_kb": max(memory[name]) / 1024 if memory[name] else None,
+        }
+        result.update(evaluate(detector, predictions[name], labels))
+        results[name] = result
+    return results
+
+# ---------------- 結果の保存と比較 ----------------
+
+def _git_revision():
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=CLASS_DIR, capture_output=True,
+                             text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "-uno"], cwd=CLASS_DIR, capture_output=True,
+                               text=True, timeout=30).stdout.strip()
+        return (rev or "unknown") + ("+dirty" if dirty else "")
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+def save_results(directory, results, results_dir=None):
+    """結果を results/<日時>_<リビジョン>.json に保存し、保存したパスと記録 (dict) を返す。"""
+    revision = _git_revision()
+    now = datetime.datetime.now()
+    record = {
+        "created": now.isoformat(timespec="seconds"),
+        "revision": revision,
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "corpus": os.path.abspath(directory),
+        "corpus_hash": corpus_hash(directory),
+        "detectors": results,
+    }
+    results_dir = results_dir or os.path.join(directory, RESULTS_DIR)
+    os.makedirs(results_dir, exist_ok=True)
+    path = os.path.join(results_dir, f"{now.strftime('%Y%m%d_%H%M%S')}_{revision.replace('+', '_')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=1)
+    return path, record
+
+def load_previous(results_dir, record, exclude=None):
+    """同じコーパス・同じ機種で、recordより前に保存された最新の結果。無ければNone。"""
+    if not os.path.isdir(results_dir):
+        return None
+    for filename in sorted(os.listdir(results_dir), reverse=True):
+        path = os.path.join(results_dir, filename)
+        if not filename.endswith(".json") or path == exclude:
+            continue
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+        if (previous.get("corpus_hash") == record["corpus_hash"] and previous.get("machine") == record["machine"]
+                and previous.get("created", "") <= record["created"]):
+            return previous
+    return None
+
+def compare(previous, record):
+    """前回の結果から悪くなった項目を (検出器, 説明) のリストで返す。"""
+    regressions = []
+    for name, now in record["detectors"].items():
+        before = previous["detectors"].get(name)
+        if not before or "setup_error" in before:
+            continue
+        if "setup_error" in now:
+            regressions.append((name, f"準備に失敗するようになった ({now['setup_error']})"))
+            continue
+        if now["errors"] > before["errors"]:
+            regressions.append((name, f"エラー {before['errors']} → {now['errors']}回"))
+        if (before["ms_p50"] and now["ms_p50"] >= before["ms_p50"] * REGRESSION_TIME_RATIO
+                and now["ms_p50"] - before["ms_p50"] >= REGRESSION_TIME_MIN_MS):
+            regressions.append((name, f"p50 {before['ms_p50']:.2f} → {now['ms_p50']:.2f}ms"))
+        for key in ("precision", "recall"):
+            if before[key] is not None and (now[key] or 0.0) <= before[key] - REGRESSION_SCORE_DROP:
+                regressions.append((name, f"{key} {before[key]:.2f} → {(now[key] or 0.0):.2f}"))
+    return regressions
+
+def format_table(results):
+    def num(value, fmt):
+        return format(value, fmt) if value is not None else "-".rjust(int(fmt.split(".")[0]))
+
+    lines = [f"{'detector':<30} | {'target':<8} | {'p50[ms]':>7} | {'p99[ms]':>7} | {'mem[KB]':>7} | "
+             f"{'prec':>4} | {'rec':>4} | {'方向誤差[deg]':>10} | {'図形':>2} | {'err':>3}"]
+    for name, r in results.items():
+        if "setup_error" in r:
+            lines.append(f"{name:<30} | {r['target']:<8} | 準備に失敗: {r['setup_error']}")
+            continue
+        lines.append(f"{name:<30} | {r['target']:<8} | {num(r['ms_p50'], '7.2f')} | {num(r['ms_p99'], '7.2f')} | "
+                     f"{num(r['mem_peak_kb'], '7.0f')} | {num(r['precision'], '4.2f')} | {num(r['recall'], '4.2f')} | "
+                     f"{num(r['bearing_mae_deg'], '10.1f')} | {num(r['shape_accuracy'], '4.2f')} | {r['errors']:>3}")
+    return "\n".join(lines)
+
+# ====================== 実行部 ======================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="記録したフレームのコーパスで検出器を比べる")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="全ての (または --only の) 検出器を実行して結果を保存する")
+    p.add_argument("corpus")
+    p.add_argument("--only", nargs="+", choices=sorted(DETECTORS))
+    p.add_argument("--memory-frames", type=int, default=20)
+    p.add_argument("--repeat", type=int, default=3, help="1フレームあたりの呼び出し回数 (最短の時間を使う)")
+    p.add_argument("--fail-on-regression", action="store_true", help="前回より悪くなったら終了コード1で終わる")
+    p = sub.add_parser("synth", help="ラベル付きの合成コーパスを作る")
+    p.add_argument("corpus")
+    p.add_argument("--count", type=int, default=64)
+    p.add_argument("--seed", type=int, default=0)
+    p = sub.add_parser("record", help="実機のカメラで撮影してコーパスに追加する")
+    p.add_argument("corpus")
+    p.add_argument("--count", type=int, default=50)
+    p.add_argument("--interval", type=float, default=1.0)
+    p = sub.add_parser("list", help="登録されている検出器")
+    args = parser.parse_args()
+
+    if args.command == "synth":
+        synth(args.corpus, args.count, args.seed)
+    elif args.command == "record":
+        record(args.corpus, args.count, args.interval)
+    elif args.command == "list":
+        for detector in DETECTORS.values():
+            print(f"{detector.name:<30} {detector.target:<8} {detector.description}")
+    else:
+        results = run_benchmark(args.corpus, args.only, args.memory_frames, args.repeat)
+        path, record_ = save_results(args.corpus, results)
+        print(format_table(results))
+        for name, r in results.items():
+            if r.get("last_error"):
+                print(f"⚠️ {name}: {r['errors']}フレームで例外 (最後: {r['last_error']})")
+        print(f"\n結果を保存しました: {path} (リビジョン {record_['revision']})")
+        previous = load_previous(os.path.dirname(path), record_, exclude=path)
+        if previous is None:
+            print("比べる前回の結果がありません (同じコーパス・同じ機種の結果のみと比べます)。")
+        else:
+            regressions = compare(previous, record_)
+            print(f"前回 ({previous['created']}, リビジョン {previous['revision']}) との比較:")
+            for name, message in regressions:
+                print(f"  🔴 {name}: {message}")
+            if not regressions:
+                print("  ✅ 悪くなった項目はありません。")
+            if regressions and args.fail_on_regression:
+                sys.exit(1)
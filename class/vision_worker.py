@@ -0,0 +1,363 @@
+import time
+import threading
+import multiprocessing as mp
+from collections import deque, namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+
+# 画像処理を別プロセス (別コア) で行うためのモジュール
+# ミッションスクリプトでは OpenCV の処理・Pythonの前後処理・モーターやIMUの制御ループが1つのインタプリタで
+# 動いているので、50msの検出があるとその間は制御ループが止まっていた (GILとCPU1コア分の取り合い)。
+# VisionWorker は検出専用のプロセスを起動し、フレームは multiprocessing.shared_memory のリングバッファ
+# で受け渡す (画像はpickleしない。キューに流すのはスロット番号などの小さなタプルだけ)。
+# 検出結果も数値だけの小さなdictで返ってくるので、制御ループ側は latest() で待たずに最新の結果を読める。
+#
+# 使い方:
+#   worker = VisionWorker((480, 640, 3), pipelines={
+#       "red": ("red_percentage", {"channel_order": "RGB"}),
+#       "grid": ("grid_occupancy", {"rows": 2, "cols": 3}),
+#   })
+#   worker.start()
+#   worker.feed_from(frame_source)    # FrameSourceの新しいフレームを自動で送る (または worker.submit(image))
+#   result = worker.latest()          # VisionResult (values["red"]["percentage"] など)。まだ無ければNone
+#   print(worker.stats())             # キューの深さ・遅延・取りこぼし
+#   worker.stop()
+
+# 検出結果:
+#   seq: VisionWorkerが付けた通し番号, source_seq: FrameSourceのseq (submitで渡した場合)
+#   timestamp: フレームの露光時刻 (time.monotonic()基準), submitted/started/finished: 投入・処理開始・完了の時刻
+#   values: パイプライン名 → 結果のdict, error: 例外があればその文字列
+VisionResult = namedtuple("VisionResult", ["seq", "source_seq", "timestamp", "submitted", "started", "finished",
+                                           "values", "error"])
+
+# スロットの状態
+_FREE, _WRITING, _READY, _BUSY = 0, 1, 2, 3
+
+# ---------------- パイプライン (ワーカープロセスの中で1回だけ作り、フレームごとに呼ぶ) ----------------
+
+def red_percentage_pipeline(ranges=None, channel_order="RGB", orientation=None, blur_ksize=5, hfov_deg=None):
+    """赤色の割合 [%]・5列で最も密度の高い列・方向の推定。"""
+    import color_classifier
+    from camera_orientation import ROVER
+    from frame_analysis import FrameAnalysis
+    from bearing import BearingEstimator, DEFAULT_HFOV_DEG
+    classifier = color_classifier.get_classifier(ranges or color_classifier.RED_RANGES, channel_order=channel_order)
+    estimator = BearingEstimator(hfov_deg=hfov_deg or DEFAULT_HFOV_DEG)
+    orientation = orientation or ROVER
+
+    def run(frame):
+        analysis = FrameAnalysis(frame, classifier, blur_ksize=blur_ksize, orientation=orientation)
+        estimate = estimator.estimate(analysis)
+        return {
+            "percentage": analysis.percentage,
+            "best_column": analysis.best_column(5, 0.05),
+            "bearing_deg": estimate.bearing_deg if estimate else None,
+            "confidence": estimate.confidence if estimate else 0.0,
+        }
+    return run
+
+def grid_occupancy_pipeline(rows=2, cols=3, ranges=None, channel_order="RGB", orientation=None, blur_ksize=5):
+    """rows x cols のセルごとの赤色の割合 (detect_red_in_grid と同じ集計)。"""
+    import color_classifier
+    from camera_orientation import ROVER
+    from frame_analysis import FrameAnalysis
+    classifier = color_classifier.get_classifier(ranges or color_classifier.RED_RANGES, channel_order=channel_order)
+    orientation = orientation or ROVER
+
+    def run(frame):
+        analysis = FrameAnalysis(frame, classifier, blur_ksize=blur_ksize, orientation=orientation)
+        return {"ratio": analysis.ratio, "cells": analysis.grid_ratios(rows, cols)}
+    return run
+
+def flag_detection_pipeline():
+    """FlagDetector (Flag_Detector2) の検出。輪郭などの配列は返さず、位置・面積・図形名だけを返す。"""
+    from Flag_Detector2 import FlagDetector
+    detectors = {}
+
+    def run(frame):
+        size = (frame.shape[1], frame.shape[0])
+        if size not in detectors:
+            detectors[size] = FlagDetector(None, size=size)
+        flags = detectors[size].detect_frame(frame, save_debug_image=False)
+        return {"flags": [(f["location"], f["center_x"], f["center_y"], f["area"], [s["name"] for s in f["shapes"]])
+                          for f in flags]}
+    return run
+
+PIPELINES = {
+    "red_percentage": red_percentage_pipeline,
+    "grid_occupancy": grid_occupancy_pipeline,
+    "flag_detection": flag_detection_pipeline,
+}
+
+# ---------------- 共有メモリのリングバッファ ----------------
+
+class _RingView:
+    """共有メモリを [状態 (int64 x slots)][seq (int64 x slots)][フレーム x slots] として見るビュー。"""
+
+    def __init__(self, buf, shape, dtype, slots):
+        header = np.ndarray((2, slots), np.int64, buffer=buf)
+        self.states = header[0]
+        self.seqs = header[1]
+        self.frames = np.ndarray((slots,) + tuple(shape), dtype, buffer=buf, offset=header.nbytes)
+
+    @staticmethod
+    def nbytes(shape, dtype, slots):
+        return 2 * slots * 8 + slots * int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+def _worker_main(shm_name, shape, dtype, slots, lock, jobs, results, pipelines):
+    """ワーカープロセスの本体。ジョブ (スロット番号) を受け取り、全パイプラインを実行して結果を返す。"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = frame = None
+    try:
+        ring = _RingView(shm.buf, shape, dtype, slots)
+        runners = {name: PIPELINES[kind](**kwargs) for name, (kind, kwargs) in pipelines.items()}
+        results.put("ready")
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            slot, seq, source_seq, timestamp, submitted = job
+            with lock:
+                if ring.states[slot] != _READY or ring.seqs[slot] != seq:
+                    continue # 処理する前に新しいフレームで上書きされた (送信側で取りこぼしとして数えている)
+                ring.states[slot] = _BUSY
+            started = time.monotonic()
+            values, error = {}, None
+            frame = ring.frames[slot]
+            try:
+                for name, run in runners.items():
+                    values[name] = run(frame)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                with lock:
+                    ring.states[slot] = _FREE
+            results.put(VisionResult(seq, source_seq, timestamp, submitted, started, time.monotonic(), values, error))
+    finally:
+        ring = frame = None # 共有メモリを指す配列を手放してから閉じる
+        shm.close()
+
+class VisionWorker:
+    """
+    検出パイプラインを別プロセスで実行するクラス。
+    フレームは共有メモリのリングバッファ (slots枚) に書き込み、ワーカーが読み終わったスロットから再利用する。
+    空きスロットが無いときは、まだ処理が始まっていない一番古いフレームを新しいフレームで置き換える
+    (制御には最新の結果が必要なので、古いフレームを待たせるより捨てる)。
+    """
+
+    def __init__(self, shape, dtype=np.uint8, pipelines=None, slots=3, start_method="spawn", history=200):
+        """
+        Args:
+            shape (tuple): フレームの形 (main RGBなら (480, 640, 3)、lores YUV420なら (360, 320))。
+            dtype: フレームのdtype。
+            pipelines (dict): 名前 → (PIPELINESの種類, 引数のdict)。省略時は赤色の割合のみ。
+            slots (int): リングバッファのフレーム数 (2以上)。
+            start_method (str): multiprocessingの開始方式。撮影やpigpioのスレッドがあっても安全なように既定は"spawn"。
+            history (int): 遅延の統計に使う直近の結果の数。
+        """
+        if slots < 2:
+            raise ValueError(f"slotsは2以上にしてください: {slots}")
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.pipelines = dict(pipelines or {"red": ("red_percentage", {})})
+        for name, (kind, _) in self.pipelines.items():
+            if kind not in PIPELINES:
+                raise ValueError(f"VisionWorker: パイプライン '{kind}' ({name}) はありません。{sorted(PIPELINES)} から選んでください。")
+        self.slots = slots
+        self._ctx = mp.get_context(start_method)
+        self._shm = None
+        self._ring = None
+        self._process = None
+        self._collector = None
+        self._feeders = []
+        self._running = False
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._latest = None
+        self._latencies = deque(maxlen=history)
+        self._processing = deque(maxlen=history)
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0     # 処理される前に新しいフレームで置き換えたフレーム数
+        self.errors = 0
+        self.last_error = None
+
+    # ---------------- 起動・停止 ----------------
+
+    def start(self, timeout=30.0):
+        """共有メモリとワーカープロセスを用意し、パイプラインの準備 (LUTの作成など) が終わるまで待つ。"""
+        if self._running:
+            return self
+        self._shm = shared_memory.SharedMemory(create=True, size=_RingView.nbytes(self.shape, self.dtype, self.slots))
+        self._ring = _RingView(self._shm.buf, self.shape, self.dtype, self.slots)
+        self._ring.states[:] = _FREE
+        self._ring.seqs[:] = 0
+        self._lock = self._ctx.Lock()
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._process = self._ctx.Process(
+            target=_worker_main, name="vision-worker", daemon=True,
+            args=(self._shm.name, self.shape, self.dtype.str, self.slots, self._lock, self._jobs, self._results,
+                  self.pipelines))
+        self._process.start()
+        try:
+            ready = self._results.get(timeout=timeout)
+        except Exception:
+            ready = None
+        if ready != "ready":
+            self.stop()
+            raise RuntimeError("VisionWorker: ワーカープロセスの起動に失敗しました。")
+        self._running = True
+        self._collector = threading.Thread(target=self._collect_loop, name="vision-worker-results", daemon=True)
+        self._collector.start()
+        print(f"✅ VisionWorker: ワーカープロセスを起動しました (pid={self._process.pid}, "
+              f"パイプライン={'/'.join(self.pipelines)}, スロット{self.slots}枚)。")
+        return self
+
+    def stop(self, timeout=2.0):
+        """ワーカープロセスを止めて共有メモリを解放する。"""
+        self._running = False
+        for t in self._feeders:
+            t.join(timeout=timeout)
+        self._feeders = []
+        if self._process is not None:
+            if self._process.is_alive():
+                self._jobs.put(None)
+                self._process.join(timeout)
+                if self._process.is_alive():
+                    self._process.terminate()
+            self._process = None
+        if self._collector is not None:
+            self._results.put(None)
+            self._collector.join(timeout)
+            self._collector = None
+        if self._shm is not None:
+            self._ring = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        with self._cond:
+            self._cond.notify_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------------- 送信側 ----------------
+
+    def submit(self, image, timestamp=None, source_seq=None):
+        """
+        フレームをリングバッファに書き込み、ワーカーに処理を依頼する (待たない)。
+
+        Args:
+            image (np.ndarray): shape/dtypeが作成時と同じフレーム。
+            timestamp (float): 露光時刻 (time.monotonic()基準)。省略時は呼び出した時刻。
+            source_seq (int): FrameSourceのseqなど、結果と対応付けるための番号。
+
+        Returns:
+            int: このフレームのseq。
+        """
+        if not self._running:
+            raise RuntimeError("VisionWorker: start() してから submit() してください。")
+        if image.shape != self.shape or image.dtype != self.dtype:
+            raise ValueError(f"VisionWorker: フレームの形 {image.shape}/{image.dtype} が "
+                             f"作成時の {self.shape}/{self.dtype} と違います。")
+        ring = self._ring
+        with self._lock:
+            free = np.flatnonzero(ring.states == _FREE)
+            if len(free):
+                slot = int(free[0])
+            else:
+                ready = np.flatnonzero(ring.states == _READY)
+                if not len(ready):
+                    raise RuntimeError("VisionWorker: 書き込めるスロットがありません (slotsを増やしてください)。")
+                slot = int(ready[np.argmin(ring.seqs[ready])])
+                self.dropped += 1
+            ring.states[slot] = _WRITING
+        np.copyto(ring.frames[slot], image)
+        self._seq += 1
+        seq = self._seq
+        with self._lock:
+            ring.seqs[slot] = seq
+            ring.states[slot] = _READY
+        now = time.monotonic()
+        self._jobs.put((slot, seq, source_seq, now if timestamp is None else timestamp, now))
+        self.submitted += 1
+        return seq
+
+    def feed_from(self, frame_source, stream="main"):
+        """FrameSourceに新しいフレームが届くたびに submit() するスレッドを開始する。"""
+        def loop():
+            last_seq = 0
+            while self._running:
+                frame = frame_source.wait_for(newer_than=last_seq, timeout=1.0)
+                if frame is None or not self._running:
+                    continue
+                last_seq = frame.seq
+                self.submit(frame.arrays[stream], timestamp=frame.timestamp, source_seq=frame.seq)
+        t = threading.Thread(target=loop, name="vision-worker-feed", daemon=True)
+        self._feeders.append(t)
+        t.start()
+        return t
+
+    # ---------------- 受信側 ----------------
+
+    def _collect_loop(self):
+        while True:
+            result = self._results.get()
+            if result is None:
+                break
+            with self._cond:
+                self.processed += 1
+                if result.error:
+                    self.errors += 1
+                    self.last_error = result.error
+                self._latencies.append(result.finished - result.submitted)
+                self._processing.append(result.finished - result.started)
+                self._latest = result
+                self._cond.notify_all()
+
+    def latest(self, name=None):
+        """
+        最新の結果を返す (待たない)。まだ無ければNone。
+        nameを指定するとそのパイプラインの結果 (dict) だけを返す。
+        """
+        result = self._latest
+        if result is None or name is None:
+            return result
+        return result.values.get(name)
+
+    def wait_result(self, after_seq=0, timeout=1.0):
+        """seqが after_seq より大きい結果が届くまで待って返す。タイムアウトしたらNone。"""
+        with self._cond:
+            ok = self._cond.wait_for(lambda: (self._latest is not None and self._latest.seq > after_seq)
+                                     or not self._running, timeout)
+            if not ok or self._latest is None or self._latest.seq <= after_seq:
+                return None
+            return self._latest
+
+    def stats(self):
+        """キューの深さ・遅延・取りこぼしなどの統計 (dict)。遅延は投入から結果が届くまで [ms]。"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            processing = sorted(self._processing)
+        try:
+            depth = self._jobs.qsize() if self._running else 0
+        except NotImplementedError:
+            depth = None
+
+        def percentile(values, p):
+            return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else None
+
+        return {
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "queue_depth": depth,
+            "latency_p50_ms": percentile(latencies, 0.5),
+            "latency_p99_ms": percentile(latencies, 0.99),
+            "processing_p50_ms": percentile(processing, 0.5),
+        }
@@ -0,0 +1,305 @@
+import os
+import json
+import time
+import hashlib
+import cv2
+import numpy as np
+import color_classifier
+
+# 起動時にその場の照明で色の閾値を合わせ、コンパイルした分類器をファイルに残しておくモジュール
+# 赤の閾値はファイルごとにばらばらで (camera.py は [0,30,30]-[20,255,255]、GDA2 は [0,150,120]-[5,255,255]、
+# Goal_Detective_Noshiro は [0,100,100]-[10,255,255])、どれがその日の照明に合っているか分からなかった。
+# 合っていない閾値だとコーンを見落とし、長い再探索が始まる。
+# calibrate() は
+#   - 基準の領域 (roi: 赤いコーンを写した矩形) があればその画素を、
+#   - 無ければ広めの種の閾値で見つかった最大の領域 (起動時に正面に置いたコーン) の画素を
+# HSVに変換し、色相の分布 (0と179がつながった円周) と彩度・明度の下限を分位点から求める。
+# 求めた範囲は CALIBRATION_PATH (JSON) に、YUV (lores) の分類器の参照テーブルは color_tables/ に .npy で保存するので、
+# 再起動後は load_classifier() が表を作り直さずに読み込むだけで済む (RGB/BGR の分類器は表を使わない)。
+#
+# 使い方:
+#   ranges = color_calibration.calibrate(frame_rgb, "red")              # 起動時に1回 (保存もする)
+#   color_calibration.calibrate_from_camera(frame_source, "red")        # ミッションの起動時 (nonstuck2 など) はloresで1回
+#   red = color_calibration.load_classifier("red", "RGB", default=color_classifier.RED_RANGES)
+#   mask = red.classify(frame_rgb)
+# 単体で実行すると (python3 color_calibration.py --roi 280,200,80,80) カメラで撮影してキャリブレーションする。
+
+CALIBRATION_PATH = "/home/mark1/color_calibration.json"
+
+# 領域を探すための広めの赤の閾値 (暗い・色の薄い赤も拾う)
+SEED_RANGES = (
+    ((0, 60, 40), (15, 255, 255)),
+    ((160, 60, 40), (180, 255, 255)),
+)
+
+MIN_PIXELS = 200         # これより少ない画素からは範囲を求めない
+HUE_MIN_FRACTION = 0.002 # 色相のヒストグラムでこれ未満の割合しかない値はノイズとみなす
+
+def to_hsv(frame, channel_order="RGB"):
+    """
+    フレームをHSV (OpenCVの H 0-179, S/V 0-255) にする。
+    loresのYUV420バッファは色差平面と同じ縦横1/2の画像になる。
+    """
+    if frame.ndim == 2: # YUV420 (I420)
+        y, u, v = color_classifier.split_yuv420(frame)
+        frame = np.stack([y[::2, ::2], u, v], axis=-1)
+        channel_order = "YUV"
+    if channel_order == "YUV":
+        return cv2.cvtColor(color_classifier.yuv_to_rgb(frame), cv2.COLOR_RGB2HSV)
+    code = cv2.COLOR_RGB2HSV if channel_order == "RGB" else cv2.COLOR_BGR2HSV
+    return cv2.cvtColor(frame[..., :3], code)
+
+def sample_roi(hsv, roi):
+    """HSV画像の矩形 roi=(x, y, 幅, 高さ) の画素を (N, 3) で返す。"""
+    x, y, w, h = roi
+    return hsv[y:y + h, x:x + w].reshape(-1, 3)
+
+def sample_scene(hsv, mask, erode=2):
+    """
+    マスクの最大の連結成分の画素を (N, 3) で返す。縁の画素は色が混ざるので erode 画素ぶん削る。
+    成分が無ければ空の配列を返す。
+    """
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    if count <= 1:
+        return np.empty((0, 3), np.uint8)
+    largest = 1 + int(np.argmax(stats[1:, cv2.CC_STAT_AREA]))
+    region = (labels == largest).astype(np.uint8)
+    if erode:
+        region = cv2.erode(region, np.ones((2 * erode + 1, 2 * erode + 1), np.uint8))
+    return hsv[region > 0]
+
+def fit_hsv_ranges(pixels, percentiles=(1, 99), hue_margin=5, sv_margin=40):
+    """
+    HSV画素の分布を覆う範囲を求める。
+
+    Args:
+        pixels (np.ndarray): (N, 3) のHSV画素。
+        percentiles (tuple): 外れ値を除く分位点 [%] (下側, 上側)。
+        hue_margin (int): 色相の範囲を両側に広げる幅。
+        sv_margin (int): 彩度・明度の下限を下げる幅 (上限は255のまま)。
+
+    Returns:
+        tuple: color_classifier と同じ ((lower, upper), ...)。赤のように0をまたぐ場合は2つの範囲になる。
+    """
+    hue = pixels[:, 0].astype(np.int64)
+    # 色相は円周なので、サンプルがほとんど無い最も長い区間で切って一直線に並べる
+    hist = np.bincount(hue, minlength=180)[:180]
+    empty = np.concatenate([hist, hist]) < max(1, len(hue) * HUE_MIN_FRACTION)
+    best_start, best_len, start = 0, 0, None
+    for i, e in enumerate(empty):
+        if e and start is None:
+            start = i
+        elif not e and start is not None:
+            if i - start > best_len:
+                best_start, best_len = start, i - start
+            start = None
+    if start is not None and len(empty) - start > best_len:
+        best_start, best_len = start, len(empty) - start
+    offset = (best_start + min(best_len, 180) // 2) % 180
+    shifted = (hue - offset) % 180
+    low = int(np.floor(np.percentile(shifted, percentiles[0]))) - hue_margin
+    high = int(np.ceil(np.percentile(shifted, percentiles[1]))) + hue_margin
+    low, high = max(low, 0), min(high, 179)
+    s_low = max(0, int(np.percentile(pixels[:, 1], percentiles[0])) - sv_margin)
+    v_low = max(0, int(np.percentile(pixels[:, 2], percentiles[0])) - sv_margin)
+
+    h_low, h_high = (low + offset) % 180, (high + offset) % 180
+    if h_low <= h_high:
+        return (((h_low, s_low, v_low), (h_high, 255, 255)),)
+    return (((0, s_low, v_low), (h_high, 255, 255)), ((h_low, s_low, v_low), (180, 255, 255)))
+
+def calibrate(frame, name="red", channel_order="RGB", roi=None, seed_ranges=SEED_RANGES,
+              path=CALIBRATION_PATH, bits=5, compile_for=("RGB", "YUV")):
+    """
+    フレームから name の色の範囲を求めて保存し、compile_for のチャンネル順の分類器を作り直す
+    (参照テーブルを使うYUVは表も作って保存する)。
+
+    Args:
+        frame (np.ndarray): 撮影した画像 (channel_order の順)、またはloresのYUV420バッファ。
+        name (str): 色の名前 (保存のキー)。
+        channel_order (str): frame のチャンネル順 ("RGB", "BGR", "YUV")。
+        roi (tuple): 基準の領域 (x, y, 幅, 高さ)。YUV420バッファでは縦横1/2の座標。Noneなら種の閾値で探す。
+        seed_ranges (tuple): roi が無いときに領域を探す閾値。
+        path (str): 保存先のJSON。
+        bits (int): 参照テーブルの量子化ビット数。
+        compile_for (tuple): 分類器を作っておくチャンネル順 (検出器が使う順)。
+
+    Returns:
+        tuple: 求めた範囲。画素が足りなければNone (保存済みの範囲はそのまま)。
+    """
+    hsv = to_hsv(frame, channel_order)
+    if roi is not None:
+        pixels = sample_roi(hsv, roi)
+    else:
+        seed_order = "YUV" if frame.ndim == 2 else channel_order
+        seed_mask = color_classifier.get_classifier(seed_ranges, channel_order=seed_order).classify(frame)
+        pixels = sample_scene(hsv, seed_mask)
+    if len(pixels) < MIN_PIXELS:
+        print(f"⚠️ color_calibration: '{name}' の画素が {len(pixels)} しか無いため、キャリブレーションしません。")
+        return None
+
+    ranges = fit_hsv_ranges(pixels)
+    coverage = _coverage(ranges, pixels)
+    save_ranges(name, ranges, path, samples=len(pixels), coverage=round(coverage, 4),
+                source="roi" if roi is not None else "scene")
+    for order in compile_for:
+        _loaded.pop((name, order, bits, path), None)
+        load_classifier(name, order, path=path, bits=bits)
+    print(f"✅ color_calibration: '{name}' = {ranges} (画素 {len(pixels)}, 被覆率 {coverage:.1%})")
+    return ranges
+
+def calibrate_from_camera(camera, name="red", stream="lores", roi=None, settle_s=1.0, path=CALIBRATION_PATH):
+    """
+    ミッションの起動時に、カメラの stream を1枚撮影して calibrate() する。
+    検出器 (RedConeNavigator など) が load_classifier() で分類器を読み込む前に呼ぶこと。
+    撮影に失敗しても、画素が足りなくてもミッションは止めず、保存済みの範囲 (無ければ検出器の既定の閾値) を使う。
+
+    Args:
+        camera: capture_array(stream) を持つカメラ (Picamera2 または FrameSource)。
+        name (str): 色の名前。
+        stream (str): 撮影するストリーム。loresのYUV420バッファならRGBに変換せずにそのまま使う。
+        roi (tuple): 基準の領域 (x, y, 幅, 高さ)。YUV420バッファでは縦横1/2の座標。Noneなら正面の最大の領域。
+        settle_s (float): 撮影の前に自動露出・ホワイトバランスが落ち着くのを待つ時間 [s]。
+        path (str): 保存先のJSON。
+
+    Returns:
+        tuple: 求めた範囲。キャリブレーションしなかったときはNone。
+    """
+    time.sleep(settle_s)
+    try:
+        frame = camera.capture_array(stream)
+    except Exception as e:
+        print(f"⚠️ color_calibration: 撮影に失敗したため、'{name}' をキャリブレーションしません ({e})。")
+        return None
+    return calibrate(frame, name, channel_order="YUV" if frame.ndim == 2 else "RGB", roi=roi, path=path)
+
+def _coverage(ranges, pixels):
+    """範囲に入るサンプル画素の割合。"""
+    inside = np.zeros(len(pixels), bool)
+    for lower, upper in ranges:
+        inside |= np.all((pixels >= lower) & (pixels <= upper), axis=1)
+    return float(inside.mean())
+
+# ---------------- 保存と読み込み ----------------
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_ranges(name, ranges, path=CALIBRATION_PATH, **info):
+    """範囲をJSONに保存する (他の色の記録は残す。書き込み途中で電源が落ちても壊れないよう置き換えで書く)。"""
+    data = _read(path)
+    data[name] = {"hsv_ranges": [list(map(list, r)) for r in color_classifier._normalize_ranges(ranges)],
+                  "created": time.strftime("%Y-%m-%d %H:%M:%S"), **info}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+def load_ranges(name, path=CALIBRATION_PATH):
+    """保存した範囲を返す。無ければNone。"""
+    entry = _read(path).get(name)
+    if entry is None:
+        return None
+    return color_classifier._normalize_ranges(entry["hsv_ranges"])
+
+def table_path(name, ranges, channel_order, bits, path=CALIBRATION_PATH):
+    """参照テーブルの保存先 (範囲が変わればファイル名も変わるので、古い表を読むことは無い)。"""
+    key = repr((color_classifier._normalize_ranges(ranges), channel_order, bits)).encode()
+    digest = hashlib.sha1(key).hexdigest()[:10]
+    return os.path.join(os.path.dirname(path) or ".", "color_tables", f"{name}_{channel_order}_{bits}_{digest}.npy")
+
+def _save_table(classifier, file_path):
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.basename(file_path).rsplit("_", 1)[0] + "_"
+    for old in os.listdir(directory): # 同じ色・チャンネル順の古い表は消す
+        if old.startswith(prefix) and old.endswith(".npy"):
+            os.remove(os.path.join(directory, old))
+    tmp = file_path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, classifier.table)
+    os.replace(tmp, file_path)
+
+# 読み込んだ分類器 (毎フレーム呼んでもファイルを読むのは最初の1回だけ)
+_loaded = {}
+
+def load_classifier(name, channel_order="RGB", default=None, path=CALIBRATION_PATH, bits=5):
+    """
+    キャリブレーションした name の色の分類器を返す。参照テーブルを使うチャンネル順 (YUV) では、
+    保存した表があれば作り直さずに読み込む。
+
+    Args:
+        name (str): 色の名前。
+        channel_order (str): 検出に使うフレームのチャンネル順。
+        default (tuple): キャリブレーションの記録が無いときに使う範囲。Noneなら FileNotFoundError。
+        path (str): キャリブレーションのJSON。
+        bits (int): 量子化ビット数。
+
+    Returns:
+        color_classifier.ColorClassifier: 分類器。
+    """
+    key = (name, channel_order, bits, path)
+    classifier = _loaded.get(key)
+    if classifier is not None:
+        return classifier
+    ranges = load_ranges(name, path)
+    if ranges is None:
+        if default is None:
+            raise FileNotFoundError(f"'{name}' のキャリブレーションが {path} にありません。")
+        print(f"⚠️ color_calibration: '{name}' のキャリブレーションが無いため、既定の閾値を使います。")
+        classifier = color_classifier.get_classifier(default, channel_order=channel_order, bits=bits)
+    elif not color_classifier.uses_table(channel_order):
+        classifier = color_classifier.get_classifier(ranges, channel_order=channel_order, bits=bits)
+    else:
+        file_path = table_path(name, ranges, channel_order, bits, path)
+        table = None
+        try:
+            table = np.load(file_path)
+        except (OSError, ValueError):
+            pass
+        try:
+            classifier = color_classifier.get_classifier(ranges, channel_order=channel_order, bits=bits, table=table)
+        except ValueError: # 壊れた表は作り直す
+            table = None
+            classifier = color_classifier.get_classifier(ranges, channel_order=channel_order, bits=bits)
+        if table is None:
+            try:
+                _save_table(classifier, file_path)
+            except OSError as e:
+                print(f"⚠️ color_calibration: 参照テーブルを保存できませんでした ({e})。")
+    _loaded[key] = classifier
+    return classifier
+
+def has_calibration(name, path=CALIBRATION_PATH):
+    """name の色のキャリブレーションが保存されているか。"""
+    return load_ranges(name, path) is not None
+
+# ====================== 実行部 ======================
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="カメラで撮影して色の閾値をキャリブレーションする")
+    parser.add_argument("--name", default="red")
+    parser.add_argument("--roi", help="基準の領域 x,y,幅,高さ (省略時は正面の最大の赤い領域)")
+    parser.add_argument("--image", help="カメラの代わりに使う画像 (BGR)")
+    parser.add_argument("--path", default=CALIBRATION_PATH)
+    args = parser.parse_args()
+    roi = tuple(int(v) for v in args.roi.split(",")) if args.roi else None
+
+    if args.image:
+        calibrate(cv2.imread(args.image), args.name, channel_order="BGR", roi=roi, path=args.path)
+    else:
+        from picamera2 import Picamera2
+        picam2 = Picamera2()
+        picam2.configure(picam2.create_still_configuration(main={"size": (640, 480)}))
+        picam2.start()
+        time.sleep(2) # 自動露出・ホワイトバランスが落ち着くまで待つ
+        try:
+            calibrate(picam2.capture_array(), args.name, channel_order="RGB", roi=roi, path=args.path)
+        finally:
+            picam2.close()
@@ -0,0 +1,246 @@
+import time
+import cv2
+import numpy as np
+
+# HSV閾値による色検出を、1つの分類器 (閾値の範囲の和集合) の classify() 1回で行うモジュール
+# 従来は フレームごとに RGB→BGR→HSV の変換、inRange 2回、bitwise_or を、ファイルごとに少しずつ違う書き方で行っていた。
+#   - RGB/BGR のフレームは RGB2BGR を省いて cv2.cvtColor で直接HSVにし、範囲ごとに inRange する。
+#     cvtColor のHSV変換はSIMDで実装されていて、参照テーブル (LUT) を画素ごとに引くより速い
+#     (np.take はインデックスを intp に変換する一時配列が必要で、640x480 では従来の処理より遅かった)。
+#     結果は inRange と完全に一致する。
+#   - loresのYUV420 (Y/U/V平面) は、各チャンネルを bits ビットに量子化した全組み合わせ (bits=5 なら 32^3 = 32768色)
+#     について最初に1回だけ HSV 判定した参照テーブルを引く (RGB画像を作らずに縦横1/2のマスクが得られる)。
+#
+# 使い方:
+#   red = color_classifier.get_classifier(RED_RANGES, channel_order="RGB")
+#   mask = red.classify(frame_rgb)     # 0/255 の uint8 マスク (inRange と同じ形式)
+#   percentage = red.percentage(frame_rgb)
+#
+# Picamera2のlores (YUV420) ストリームは channel_order="YUV" の分類器で、RGBに変換せずにY/U/V平面から直接判定できる
+#   red_yuv = color_classifier.get_classifier(RED_RANGES, channel_order="YUV")
+#   mask = red_yuv.classify(picam2.capture_array("lores"))   # 縦横1/2 (色差平面と同じ解像度) のマスク
+
+# よく使う閾値 (OpenCVのHSV: H 0-179, S/V 0-255)
+RED_RANGES = (
+    ((0, 100, 100), (10, 255, 255)),
+    ((160, 100, 100), (180, 255, 255)),
+)
+BLACK_RANGES = (
+    ((0, 0, 0), (180, 255, 50)),
+)
+
+def uses_table(channel_order):
+    """そのチャンネル順の分類器が参照テーブルを使うか (RGB/BGR は cvtColor + inRange なので使わない)。"""
+    return channel_order == "YUV"
+
+class ColorClassifier:
+    """
+    任意個のHSV範囲 (lower, upper) の和集合の色分類器。
+    RGB/BGR は HSV変換 + inRange、YUV は量子化した参照テーブルで判定する。
+    参照テーブルの量子化の代表値は各区間の中央なので、YUVでは閾値の境界付近の色だけ inRange と判定が食い違うことがある。
+    """
+
+    def __init__(self, hsv_ranges, channel_order="RGB", bits=5, table=None):
+        """
+        Args:
+            hsv_ranges (list): [(lower, upper), ...]。lower/upperは (H, S, V) でcv2.inRangeと同じ意味。
+            channel_order (str): 入力フレームのチャンネル順 ("RGB"、"BGR" または "YUV")。
+                                 Picamera2のcapture_array()はRGBなので、RGB2BGRの変換も不要になる。
+                                 "YUV"はY, Cb, Crの順 (フルレンジのBT.601、libcameraのsYCC)。YUV420のバッファも受け付ける。
+            bits (int): 参照テーブルの1チャンネルあたりの量子化ビット数 (1-8)。5なら表は32KBでCPUのL1キャッシュに収まる。
+                        8なら inRange と完全に一致するが、表が16MBになり引き当てが遅くなる。
+            table (np.ndarray): 同じ範囲・チャンネル順・bitsで作成済みの表 (color_calibration のキャッシュ)。
+                                指定すると表を作り直さない。
+            RGB/BGR の分類器は表を使わないので、表は table を参照したときに初めて作る。
+        """
+        if channel_order not in ("RGB", "BGR", "YUV"):
+            raise ValueError(f"channel_order は 'RGB'、'BGR'、'YUV' のいずれかを指定してください: {channel_order}")
+        if not 1 <= bits <= 8:
+            raise ValueError(f"bits は 1-8 の範囲で指定してください: {bits}")
+        self.hsv_ranges = _normalize_ranges(hsv_ranges)
+        self.channel_order = channel_order
+        self.bits = bits
+
+        if table is not None and (table.shape != (1 << (3 * bits),) or table.dtype != np.uint8):
+            raise ValueError(f"表の形が bits={bits} と一致しません: {table.shape} {table.dtype}")
+        self._table = table
+        self.build_time_s = 0.0
+        if table is None and uses_table(channel_order):
+            self.table # YUV は最初のフレームで待たないよう、ここで作っておく
+
+        # HSV変換 + inRange 用 (RGB/BGR)
+        self._hsv_code = cv2.COLOR_BGR2HSV if channel_order == "BGR" else cv2.COLOR_RGB2HSV
+        self._bounds = [(np.array(lower), np.array(upper)) for lower, upper in self.hsv_ranges]
+
+        # 各チャンネルの値 → 表のインデックスへの寄与 (量子化とビットシフトを済ませたもの)
+        shift = 8 - bits
+        index_dtype = np.uint16 if 3 * bits <= 16 else np.uint32
+        levels = (np.arange(256) >> shift).astype(index_dtype)
+        self._channel_luts = (levels << (2 * bits), levels << bits, levels)
+        self._index_dtype = index_dtype
+
+    @property
+    def table(self):
+        """参照テーブル (長さ 2^(3*bits) の uint8)。最初に参照したときに作る。"""
+        if self._table is None:
+            start = time.perf_counter()
+            self._table = self._build_table()
+            self.build_time_s = time.perf_counter() - start
+        return self._table
+
+    def _build_table(self):
+        """量子化した全色をHSVに変換し、いずれかの範囲に入る色を255とした表を作る。"""
+        n = 1 << self.bits
+        shift = 8 - self.bits
+        centers = (np.arange(n) << shift) + ((1 << shift) >> 1) # 各量子化区間の中央の値
+        c0, c1, c2 = np.meshgrid(centers, centers, centers, indexing="ij")
+        cube = np.stack([c0, c1, c2], axis=-1).astype(np.uint8).reshape(-1, 1, 3)
+        if self.channel_order == "YUV":
+            hsv = cv2.cvtColor(yuv_to_rgb(cube), cv2.COLOR_RGB2HSV)
+        else:
+            code = cv2.COLOR_RGB2HSV if self.channel_order == "RGB" else cv2.COLOR_BGR2HSV
+            hsv = cv2.cvtColor(cube, code)
+        table = np.zeros(hsv.shape[:2], dtype=np.uint8)
+        for lower, upper in self.hsv_ranges:
+            table |= cv2.inRange(hsv, np.array(lower), np.array(upper))
+        return table.reshape(-1)
+
+    def classify(self, frame, out=None, buffers=None):
+        """
+        フレームを分類し、範囲内の画素を255、それ以外を0としたマスクを返す。
+
+        Args:
+            frame (np.ndarray): HxWx3 (または4チャンネル、4つ目は無視) のuint8画像。
+                                channel_order="YUV"なら、YUV420 (I420) の (H*3/2)xW のバッファも渡せる。
+            out (np.ndarray): 結果を書き込むuint8配列 (省略時は新しく確保する)。
+            buffers (capture_pipeline.BufferPool): 指定すると、マスクと作業配列 (HSV画像、表の引き当て用の配列) を
+                                                   このプールから取り出して使い回す (フレームごとの確保が無くなる)。
+
+        Returns:
+            np.ndarray: HxWのuint8マスク (cv2.inRangeと同じ形式)。YUV420のバッファなら (H/2)x(W/2)。
+        """
+        if frame.ndim == 2:
+            if self.channel_order != "YUV":
+                raise ValueError("2次元のバッファ (YUV420) は channel_order='YUV' の分類器でのみ判定できます。")
+            return self.classify_yuv420(frame, out=out, buffers=buffers)
+        if self.channel_order == "YUV":
+            return self._lookup(frame[..., 0], frame[..., 1], frame[..., 2], out, buffers)
+        return self._in_range(frame, out, buffers)
+
+    def _in_range(self, frame, out=None, buffers=None):
+        """RGB/BGR のフレームを cvtColor でHSVにし、範囲ごとの inRange の和集合をとる。"""
+        if frame.shape[2] != 3:
+            frame = frame[..., :3]
+        shape = frame.shape[:2]
+        if buffers is None:
+            hsv = cv2.cvtColor(frame, self._hsv_code)
+            scratch = None
+        else:
+            hsv = cv2.cvtColor(frame, self._hsv_code, dst=buffers.get("classify_hsv", shape + (3,), np.uint8))
+            scratch = buffers.get("classify_range", shape, np.uint8) if len(self._bounds) > 1 else None
+            if out is None:
+                out = buffers.get("mask", shape, np.uint8)
+        (lower, upper), rest = self._bounds[0], self._bounds[1:]
+        mask = cv2.inRange(hsv, lower, upper, dst=out)
+        for lower, upper in rest:
+            mask = cv2.bitwise_or(mask, cv2.inRange(hsv, lower, upper, dst=scratch), dst=mask)
+        return mask
+
+    def classify_yuv420(self, buffer, size=None, out=None, buffers=None, roi=None):
+        """
+        YUV420 (I420) のバッファを、RGBに変換せずにY/U/V平面から直接判定する。
+        色差平面が縦横1/2なので、輝度も1画素おきに間引いて (H/2)x(W/2) のマスクを返す。
+
+        Args:
+            buffer (np.ndarray): picam2.capture_array("lores") の (H*3/2)xストライド のuint8配列。
+            size (tuple): 画像の (幅, 高さ)。省略時はバッファの形から求める (ストライド=幅とみなす)。
+            out (np.ndarray): 結果を書き込む (H/2)x(W/2) のuint8配列。
+            buffers (capture_pipeline.BufferPool): 作業配列を使い回すプール (classify() と同じ)。
+            roi (tuple): マスクの座標 ((H/2)x(W/2)) での (y0, y1, x0, x1)。指定するとこの範囲だけを判定し、
+                         (y1-y0)x(x1-x0) のマスクを返す。
+        """
+        y, u, v = split_yuv420(buffer, size)
+        y = y[::2, ::2]
+        if roi is not None:
+            y0, y1, x0, x1 = roi
+            y, u, v = y[y0:y1, x0:x1], u[y0:y1, x0:x1], v[y0:y1, x0:x1]
+        return self._lookup(y, u, v, out, buffers)
+
+    def _lookup(self, c0, c1, c2, out=None, buffers=None):
+        lut0, lut1, lut2 = self._channel_luts
+        if buffers is None:
+            index = np.take(lut0, c0)
+            index |= np.take(lut1, c1)
+            index |= np.take(lut2, c2)
+            return np.take(self.table, index, out=out)
+        # np.take はインデックスを intp に変換した一時配列を作るので、プールを使う場合は量子化をシフトで計算し、
+        # 最後にプールの intp 配列へ変換してから引く (どの段も out= に書き込むので画像サイズの確保が無い)
+        bits, shift = self.bits, 8 - self.bits
+        index = buffers.get("classify_index", c0.shape, self._index_dtype)
+        scratch = buffers.get("classify_scratch", c0.shape, self._index_dtype)
+        positions = buffers.get("classify_intp", c0.shape, np.intp)
+        if out is None:
+            out = buffers.get("mask", c0.shape, np.uint8)
+        np.right_shift(c0, shift, out=index, casting="unsafe")
+        np.left_shift(index, 2 * bits, out=index)
+        np.right_shift(c1, shift, out=scratch, casting="unsafe")
+        np.left_shift(scratch, bits, out=scratch)
+        np.bitwise_or(index, scratch, out=index)
+        np.right_shift(c2, shift, out=scratch, casting="unsafe")
+        np.bitwise_or(index, scratch, out=index)
+        np.copyto(positions, index)
+        return np.take(self.table, positions, out=out, mode="clip")
+
+    def ratio(self, frame):
+        """範囲内の画素の割合 (0.0-1.0)。"""
+        mask = self.classify(frame)
+        return np.count_nonzero(mask) / mask.size
+
+    def percentage(self, frame):
+        """範囲内の画素の割合 [%]。"""
+        return self.ratio(frame) * 100
+
+def yuv_to_rgb(yuv):
+    """
+    フルレンジBT.601 (JPEG/sYCC) の Y, Cb, Cr を RGB に変換する (Picamera2のYUV420と同じ定義)。
+    cv2.COLOR_YUV2RGB はアナログYUVの係数なのでカメラの色差とは一致しない。
+    """
+    y = yuv[..., 0].astype(np.float32)
+    cb = yuv[..., 1].astype(np.float32) - 128
+    cr = yuv[..., 2].astype(np.float32) - 128
+    rgb = np.stack([y + 1.402 * cr, y - 0.344136 * cb - 0.714136 * cr, y + 1.772 * cb], axis=-1)
+    return np.clip(np.rint(rgb), 0, 255).astype(np.uint8)
+
+def split_yuv420(buffer, size=None):
+    """
+    YUV420 (I420) のバッファを Y (HxW), U (H/2 x W/2), V (H/2 x W/2) の平面に分ける (コピーしない)。
+    Picamera2は1行をストライド (幅以上) で持ち、色差平面は ストライド/2 で2行ずつ詰めて並べている。
+    """
+    rows, stride = buffer.shape
+    width, height = size if size is not None else (stride, rows * 2 // 3)
+    y = buffer[:height, :width]
+    chroma = buffer[height:].reshape(-1)
+    plane = (height // 2) * (stride // 2)
+    u = chroma[:plane].reshape(height // 2, stride // 2)[:, :width // 2]
+    v = chroma[plane:2 * plane].reshape(height // 2, stride // 2)[:, :width // 2]
+    return y, u, v
+
+def _normalize_ranges(hsv_ranges):
+    """np.arrayやリストで渡された範囲を、比較・辞書のキーに使えるintのタプルにそろえる。"""
+    return tuple((tuple(int(v) for v in lower), tuple(int(v) for v in upper)) for lower, upper in hsv_ranges)
+
+# 同じ閾値の分類器は表を作り直さずに使い回す
+_classifiers = {}
+
+def get_classifier(hsv_ranges, channel_order="RGB", bits=5, table=None):
+    """
+    hsv_ranges に対応するColorClassifierを返す。同じ引数での2回目以降はキャッシュを返す。
+    関数の中で毎回呼んでも表の作成は最初の1回だけになる。
+    table を渡すと (ファイルに保存しておいた表など)、最初の1回も表を作らずにそれを使う。
+    """
+    key = (_normalize_ranges(hsv_ranges), channel_order, bits)
+    classifier = _classifiers.get(key)
+    if classifier is None:
+        classifier = ColorClassifier(hsv_ranges, channel_order, bits, table)
+        _classifiers[key] = classifier
+    return classifier
@@ -1,7 +1,7 @@
 import RPi.GPIO as GPIO
 import time
 import struct
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 
 def circuit(t_melt = 5):
     """
@@ -39,15 +39,19 @@ def circuit(t_melt = 5):
 
     #2024の先輩コード
     meltPin = 25
-    pi = pigpio.pi()
-    pi.write(meltPin, 0)
-    time.sleep(1)
-    pi.write(meltPin, 1)
-    time.sleep(t_melt)
-    pi.write(meltPin, 0)
+    # 毎回pigpio.pi()で接続・切断せず、共有接続を借りる (stop()は自分の参照を返すだけ)
+    pi = pigpio_manager.acquire("fusing")
+    try:
+        pi.write(meltPin, 0)
+        time.sleep(1)
+        pi.write(meltPin, 1)
+        time.sleep(t_melt)
+    finally:
+        try:
+            pi.write(meltPin, 0) # 例外時もニクロム線を必ずオフにする
+        finally:
+            pi.stop() # 書き込みやsleepで例外が出ても、共有接続の参照は必ず返す
     time.sleep(1)
-
-    pi.stop()
     
 if __name__ == '__main__':
     # 許容誤差を調整したい場合は、ここで値を設定できます
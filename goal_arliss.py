@@ -1,6 +1,6 @@
 import RPi.GPIO as GPIO
 import time
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import board
 import busio
 import numpy as np
@@ -385,7 +385,7 @@ if __name__ == "__main__":
         PWMB=19, BIN1=16, BIN2=26,
         STBY=21
     )
-    pi_instance = pigpio.pi()
+    pi_instance = pigpio_manager.acquire("goal_arliss")
     if not pi_instance.connected:
         print("pigpioデーモンに接続できません。終了します。")
         exit()
@@ -0,0 +1,94 @@
+import cv2
+import numpy as np
+
+# マスクの任意の矩形内の画素数を O(1) で求めるためのモジュール (積分画像 / summed-area table)
+# 以前は列ごと・セルごとに mask[y0:y1, x0:x1] を切り出して np.count_nonzero を呼んでいたので、
+# 分割を細かくしたり問い合わせを増やしたりするほど、マスクを何度も読み直していた。
+# MaskStats はマスク1枚につき cv2.integral で積分画像を1回だけ作り、以降の矩形の問い合わせは
+# 表の4点を引くだけで答える。任意の分割・スライディングウィンドウ・ROIの問い合わせがほぼ無料になる。
+#
+# 使い方:
+#   stats = MaskStats(mask)
+#   stats.count(y0, y1, x0, x1)          # [y0, y1) x [x0, x1) 内の検出画素数
+#   stats.grid_counts([0, 240, 480], [0, 213, 426, 640])   # 境界で区切ったセルごとの画素数 (まとめて計算)
+#   stats.window_counts(60, 80, 20, 20)  # 60x80の窓を20画素ずつずらしたときの画素数
+
+class MaskStats:
+    """
+    0/value のマスクの積分画像を持ち、矩形内の検出画素数・割合を返すクラス。
+    座標はすべてマスクの (行, 列) で、範囲は半開区間 [start, end)。
+    """
+
+    def __init__(self, mask, value=255, buffers=None):
+        """
+        Args:
+            mask (np.ndarray): 2次元のuint8マスク (検出画素が value、それ以外が0)。
+            value (int): 検出画素の値。積分値をこの値で割って画素数にする。
+            buffers (capture_pipeline.BufferPool): 指定すると、積分画像をこのプールの配列に書き込む。
+        """
+        self.shape = mask.shape[:2]
+        self.value = value
+        # (h+1, w+1) のint32。640x480x255でも 2^31 に収まる
+        table = None
+        if buffers is not None:
+            table = buffers.get("integral", (self.shape[0] + 1, self.shape[1] + 1), np.int32)
+        self.table = cv2.integral(mask, table, sdepth=cv2.CV_32S)
+
+    @property
+    def total(self):
+        """マスク全体の検出画素数。"""
+        return int(self.table[-1, -1]) // self.value
+
+    def count(self, y0, y1, x0, x1):
+        """矩形 [y0, y1) x [x0, x1) 内の検出画素数。"""
+        t = self.table
+        return int(t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0]) // self.value
+
+    def ratio(self, y0, y1, x0, x1):
+        """矩形 [y0, y1) x [x0, x1) 内の検出画素の割合 (0.0-1.0)。空の矩形なら0.0。"""
+        area = (y1 - y0) * (x1 - x0)
+        return self.count(y0, y1, x0, x1) / area if area > 0 else 0.0
+
+    def grid_counts(self, row_bounds, col_bounds):
+        """
+        行の境界 row_bounds と列の境界 col_bounds で区切ったセルごとの検出画素数。
+
+        Args:
+            row_bounds (list): 増加する行の境界 (例: [0, 240, 480])。
+            col_bounds (list): 増加する列の境界。
+
+        Returns:
+            np.ndarray: (len(row_bounds)-1, len(col_bounds)-1) の画素数。
+        """
+        t = self.table[np.ix_(row_bounds, col_bounds)]
+        return (t[1:, 1:] - t[:-1, 1:] - t[1:, :-1] + t[:-1, :-1]) // self.value
+
+    def grid_ratios(self, row_bounds, col_bounds):
+        """grid_countsの各セルを面積で割った割合 (0.0-1.0)。"""
+        areas = np.outer(np.diff(row_bounds), np.diff(col_bounds))
+        return self.grid_counts(row_bounds, col_bounds) / np.maximum(areas, 1)
+
+    def window_counts(self, win_h, win_w, step_y=1, step_x=1):
+        """
+        win_h x win_w の窓を (step_y, step_x) ずつずらしたときの各位置の検出画素数。
+
+        Returns:
+            np.ndarray: [i, j] が左上 (i*step_y, j*step_x) の窓の画素数。
+        """
+        height, width = self.shape
+        ys = np.arange(0, height - win_h + 1, step_y)
+        xs = np.arange(0, width - win_w + 1, step_x)
+        t = self.table
+        return (t[np.ix_(ys + win_h, xs + win_w)] - t[np.ix_(ys, xs + win_w)]
+                - t[np.ix_(ys + win_h, xs)] + t[np.ix_(ys, xs)]) // self.value
+
+    def densest_window(self, win_h, win_w, step_y=1, step_x=1):
+        """
+        検出画素が最も多い窓の (y0, y1, x0, x1) と割合を返す。窓が入らなければ (None, 0.0)。
+        """
+        counts = self.window_counts(win_h, win_w, step_y, step_x)
+        if counts.size == 0:
+            return None, 0.0
+        i, j = np.unravel_index(np.argmax(counts), counts.shape)
+        y0, x0 = int(i) * step_y, int(j) * step_x
+        return (y0, y0 + win_h, x0, x0 + win_w), int(counts[i, j]) / (win_h * win_w)
@@ -8,7 +8,7 @@ import RPi.GPIO as GPIO
 import math
 import numpy as np
 import cv2
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 from picamera2 import Picamera2
 from libcamera import Transform # TransformはPicamera2のバージョンによっては不要かもしれません
 
@@ -1335,7 +1335,7 @@ def main_sequence():
         )
         print("[メイン] モータードライバー初期化完了。")
 
-        pi_instance = pigpio.pi()
+        pi_instance = pigpio_manager.acquire("no_stuck_E_to_E")
         if not pi_instance.connected:
             raise ConnectionRefusedError("pigpioデーモンに接続できません。sudo pigpiod を実行してください。")
         print("[メイン] pigpio接続完了。")
@@ -1497,13 +1497,10 @@ def main_sequence():
             except Exception as e:
                 print(f"Picamera2クリーンアップエラー: {e}")
 
-        # pigpioのクリーンアップ (pigpioデーモンへの接続を閉じる)
-        # EmGpsDatalink内でpi.stop()を呼んでいる場合、ここで再度呼ぶとエラーになる可能性があります。
-        # 共有リソースの管理には注意が必要です。
-        # EmGpsDatalinkのcleanup_on_error/cleanup内でpi.stop()を呼び出しているため、ここでは呼び出しません。
-        # もし他の場所でpigpioインスタンスを直接扱っているなら、適切にclose()してください。
-        # if pi_instance and pi_instance.connected:
-        #     pi_instance.stop() # これはEmGpsDatalinkのcleanupで呼ばれているべき
+        # pigpioのクリーンアップ: pigpio_managerから借りた参照を返す
+        # (EmGpsDatalinkも自分の参照を借りて返すので、ここで返しても他の処理の接続は切れない。最後の1つで切断される)
+        if pi_instance:
+            pi_instance.stop()
 
         # GPIO全体のクリーンアップ（サーボやモーターのGPIO設定をリセット）
         # 物資設置で`GPIO.cleanup(SERVO_PIN)`をしているため、全体を`GPIO.cleanup()`する前に
@@ -2,20 +2,21 @@
 
 import RPi.GPIO as GPIO
 import time
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import board
 import busio
-import numpy as np
 import cv2
 from picamera2 import Picamera2
-from libcamera import Transform # Transformは使用しないのでコメントアウトまたは削除
 import sys
-import os
 import math
 
 # カスタムモジュールのインポート
 from motor import MotorDriver
 from BNO055 import BNO055
+import color_classifier
+from frame_analysis import FrameAnalysis
+import camera_orientation
+import debug_image_writer
 import following
 
 # --- BNO055用のラッパークラス (変更なし) ---
@@ -39,6 +40,8 @@ class BNO055Wrapper:
 destination_lat = 35.9248066
 destination_lon = 139.9112360
 RX_PIN = 17
+# カメラの向き: 1. 反時計回りに90度回転 (カメラが物理的に時計回りに90度傾いている場合) 2. 左右反転 (水平フリップ)
+CAMERA_ORIENTATION = camera_orientation.Orientation.from_cv2(cv2.ROTATE_90_COUNTERCLOCKWISE, flip=1)
 
 # --- 関数定義 (省略 - 変更なし) ---
 def convert_to_decimal(coord, direction):
@@ -103,15 +106,15 @@ def save_image_for_debug(picam2_instance, path="/home/mark1/Pictures/paravo_imag
         print("画像キャプチャ失敗：フレームがNoneです。")
         return None
     frame_bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-    cv2.imwrite(path, frame_bgr)
-    print(f"画像保存成功: {path}")
+    debug_image_writer.save(path, frame_bgr, event=True) # エンコードと書き込みはバックグラウンドで行う
+    print(f"画像保存を予約しました: {path}")
     return frame
 
 # --- 新しいカメラ撮影・赤色検出関数 ---
 def detect_red_in_grid(picam2_instance, save_path="/home/mark1/Pictures/akairo_grid.jpg", min_red_pixel_ratio_per_cell=0.05):
     """
     カメラ画像を縦2x横3のグリッドに分割し、各セルでの赤色検出を行い、その位置情報を返します。
-    ここではソフトウェア的に回転・反転を行います。
+    反転はカメラのTransformで、90度回転はセルの範囲の変換で扱います (画像は回転しません)。
     """
     try:
         frame_rgb = picam2_instance.capture_array() # Picamera2はデフォルトでRGB形式のNumPy配列を返す
@@ -121,68 +124,41 @@ def detect_red_in_grid(picam2_instance, save_path="/home/mark1/Pictures/akairo_g
 
         frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)
         
-        # ★★★ ここで画像を回転・反転させる ★★★
-        # 1. 反時計回りに90度回転 (カメラが物理的に時計回りに90度傾いている場合)
-        processed_frame_bgr = cv2.rotate(frame_bgr, cv2.ROTATE_90_COUNTERCLOCKWISE)
-        
-        # 2. 左右反転 (水平フリップ)
-        # 以前のコードでこの処理を試しており、ご要望に合わせて再度追加しました。
-        # もし不要であればこの行をコメントアウトしてください。
-        processed_frame_bgr = cv2.flip(processed_frame_bgr, 1) # 1は水平フリップ (左右反転)
-        
-        # もし、回転後＆左右反転後にさらに上下が反転している場合は、次の行を有効にしてみてください
-        # processed_frame_bgr = cv2.flip(processed_frame_bgr, 0) # 0は垂直フリップ (上下反転)
-
-        height, width, _ = processed_frame_bgr.shape # 処理後のフレームのサイズを使う
-        cell_height = height // 2 ; cell_width = width // 3
-        cells = {
-            'top_left': (0, cell_height, 0, cell_width), 'top_middle': (0, cell_height, cell_width, 2 * cell_width),
-            'top_right': (0, cell_height, 2 * cell_width, width),
-            'bottom_left': (cell_height, height, 0, cell_width), 'bottom_middle': (cell_height, height, cell_width, 2 * cell_width),
-            'bottom_right': (cell_height, height, 2 * cell_width, width),
-        }
-        red_counts = {key: 0 for key in cells} ; total_pixels_in_cell = {key: 0 for key in cells}
-
-        lower_red1 = np.array([0, 100, 100]) ; upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([160, 100, 100]) ; upper_red2 = np.array([180, 255, 255])
-
-        blurred_full_frame = cv2.GaussianBlur(processed_frame_bgr, (5, 5), 0)
-        hsv_full = cv2.cvtColor(blurred_full_frame, cv2.COLOR_BGR2HSV)
-        mask_full = cv2.bitwise_or(cv2.inRange(hsv_full, lower_red1, upper_red1),
-                                   cv2.inRange(hsv_full, lower_red2, upper_red2))
-        red_pixels_full = np.count_nonzero(mask_full) ; total_pixels_full = height * width
-        red_percentage_full = red_pixels_full / total_pixels_full if total_pixels_full > 0 else 0.0
+        # 向きは CAMERA_ORIENTATION (反時計回りに90度回転 + 左右反転)。不要であれば変更してください。
+        # ぼかし・赤色判定はこのフレームで1回だけ行い、全体の割合もセルごとの割合も同じマスクから求める
+        red = color_classifier.get_classifier(color_classifier.RED_RANGES, channel_order="BGR")
+        # 反転はカメラのTransformで処理済み。残りの回転は画像を回さず、セルの範囲を変換して扱う
+        orientation = camera_orientation.residual(picam2_instance, CAMERA_ORIENTATION)
+        analysis = FrameAnalysis(frame_bgr, red, blur_ksize=5, orientation=orientation)
+        processed_frame_bgr = analysis.oriented
+        red_percentage_full = analysis.ratio
 
         if red_percentage_full >= 0.80:
             print(f"画像全体の赤色ピクセル割合: {red_percentage_full:.2%} (高割合) -> high_percentage_overall")
-            cv2.imwrite(save_path, processed_frame_bgr)
+            debug_image_writer.save(save_path, processed_frame_bgr, event=True)
             return 'high_percentage_overall'
 
+        # 縦2x横3のセルごとの赤色の割合
+        cell_names = [['top_left', 'top_middle', 'top_right'], ['bottom_left', 'bottom_middle', 'bottom_right']]
+        cell_ratios = {}
+
         debug_frame = processed_frame_bgr.copy()
-        for cell_name, (y_start, y_end, x_start, x_end) in cells.items():
-            cell_frame = processed_frame_bgr[y_start:y_end, x_start:x_end]
-            blurred_cell_frame = cv2.GaussianBlur(cell_frame, (5, 5), 0)
-            hsv_cell = cv2.cvtColor(blurred_cell_frame, cv2.COLOR_BGR2HSV)
-            mask_cell = cv2.bitwise_or(cv2.inRange(hsv_cell, lower_red1, upper_red1),
-                                       cv2.inRange(hsv_cell, lower_red2, upper_red2))
-            red_counts[cell_name] = np.count_nonzero(mask_cell)
-            total_pixels_in_cell[cell_name] = cell_frame.shape[0] * cell_frame.shape[1]
-            
-            color = (255, 0, 0) ; thickness = 2
-            if red_counts[cell_name] / total_pixels_in_cell[cell_name] >= min_red_pixel_ratio_per_cell:
-                color = (0, 0, 255) ; thickness = 3
-            cv2.rectangle(debug_frame, (x_start, y_start), (x_end, y_end), color, thickness)
-            cv2.putText(debug_frame, f"{cell_name}: {(red_counts[cell_name] / total_pixels_in_cell[cell_name]):.2f}", 
-                        (x_start + 5, y_start + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-
-        directory = os.path.dirname(save_path)
-        if not os.path.exists(directory): os.makedirs(directory)
-        cv2.imwrite(save_path, debug_frame)
-        print(f"グリッド検出画像を保存しました: {save_path}")
-
-        bottom_left_ratio = red_counts['bottom_left'] / total_pixels_in_cell['bottom_left']
-        bottom_middle_ratio = red_counts['bottom_middle'] / total_pixels_in_cell['bottom_middle']
-        bottom_right_ratio = red_counts['bottom_right'] / total_pixels_in_cell['bottom_right']
+        for names, ratio_row, cell_row in zip(cell_names, analysis.grid_ratios(2, 3), analysis.grid_cells(2, 3)):
+            for cell_name, ratio, (y_start, y_end, x_start, x_end) in zip(names, ratio_row, cell_row):
+                cell_ratios[cell_name] = ratio
+                color = (255, 0, 0) ; thickness = 2
+                if ratio >= min_red_pixel_ratio_per_cell:
+                    color = (0, 0, 255) ; thickness = 3
+                cv2.rectangle(debug_frame, (x_start, y_start), (x_end, y_end), color, thickness)
+                cv2.putText(debug_frame, f"{cell_name}: {ratio:.2f}", 
+                            (x_start + 5, y_start + 20), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+        if debug_image_writer.save(save_path, debug_frame):
+            print(f"グリッド検出画像の保存を予約しました: {save_path}")
+
+        bottom_left_ratio = cell_ratios['bottom_left']
+        bottom_middle_ratio = cell_ratios['bottom_middle']
+        bottom_right_ratio = cell_ratios['bottom_right']
 
         detected_cells = []
         if bottom_left_ratio >= min_red_pixel_ratio_per_cell: detected_cells.append('bottom_left')
@@ -276,7 +252,7 @@ if __name__ == "__main__":
         PWMB=19, BIN1=16, BIN2=26,
         STBY=21
     )
-    pi_instance = pigpio.pi()
+    pi_instance = pigpio_manager.acquire("parakai")
     if not pi_instance.connected:
         print("pigpioデーモンに接続できません。終了します。")
         exit()
@@ -295,7 +271,7 @@ if __name__ == "__main__":
     picam2_instance.configure(picam2_instance.create_preview_configuration(
         main={"size": (640, 480)},
         controls={"FrameRate": 30},
-        transform=Transform(rotation=90) # ここでカメラ画像を90度回転させる
+        transform=camera_orientation.hardware_transform(CAMERA_ORIENTATION) # 反転だけISPで行う (90度回転はISP非対応)
     ))
     picam2_instance.start()
     time.sleep(2)
@@ -547,5 +523,6 @@ if __name__ == "__main__":
             pi_instance.stop()
         if 'picam2_instance' in locals():
             picam2_instance.close()
+        debug_image_writer.flush() # 保存待ちのデバッグ画像を書き終えてから終了する
         GPIO.cleanup()
         print("=== 処理を終了しました。 ===")
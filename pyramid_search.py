@@ -0,0 +1,160 @@
+import time
+import cv2
+import numpy as np
+import color_classifier
+from frame_analysis import FrameAnalysis
+
+# 360度の探索で、縮小画像で赤色の有無を先に調べ、候補がある範囲だけを元の解像度で判定するモジュール
+# 探索中の撮影の大半は何も映っていない方向なのに、RedConeNavigator.search_for_cone や GDA2 の
+# rotate_search_red_ball2 は毎回フレーム全体をぼかして色判定していた。PyramidSearch は
+#   1. フレームを 80x60 程度に縮小し (面積平均なので小さいコーンは色が薄まる)、閾値を緩めた分類器で判定する。
+#   2. 候補の画素が min_pixels 未満なら「赤色なし」として、元の解像度では何もしない。
+#   3. 候補があれば、候補を囲む矩形に余白を付けた範囲 (ROI) だけを元の解像度で判定する (FrameAnalysis の roi)。
+# loresの160x120のマスクのように、縮小画像より min_reduction 倍以上大きくないフレームは縮小の手間の方が
+# 大きいので、そのまま全体を判定する。
+# 結果は通常の FrameAnalysis なので、割合・列の密度・方向の推定はそのまま使える。
+# ROIの外は検出なしになるので、緩めた閾値でも候補にならなかった色の薄い画素だけは数えられない。
+#
+# 使い方:
+#   search = PyramidSearch(red_classifier, red_classifier_yuv, orientation=orientation)
+#   analysis = search.analyze(frame)     # frame は RGB または loresのYUV420バッファ
+#   analysis.percentage, analysis.roi    # 候補が無ければ roi は (0, 0, 0, 0)
+#   print(format_pyramid_stats(search.stats()))
+
+EMPTY_ROI = (0, 0, 0, 0)
+
+def loosen(hsv_ranges, hue_margin=5, sv_margin=40):
+    """
+    HSV範囲を緩める (色相を ±hue_margin 広げ、彩度・明度の下限を sv_margin 下げる)。
+    縮小で背景と混ざって色が薄くなった小さい物も、候補として拾えるようにする。
+    """
+    loose = []
+    for lower, upper in color_classifier._normalize_ranges(hsv_ranges):
+        loose.append(((max(0, lower[0] - hue_margin), max(0, lower[1] - sv_margin), max(0, lower[2] - sv_margin)),
+                      (min(180, upper[0] + hue_margin), upper[1], upper[2])))
+    return loose
+
+class PyramidSearch:
+    """
+    縮小画像 (粗) → 候補の範囲だけ元の解像度 (細) の2段で色を探すクラス。
+    """
+
+    def __init__(self, classifier, classifier_yuv=None, coarse_size=(80, 60), min_pixels=1, margin=2,
+                 hue_margin=5, sv_margin=40, blur_ksize=5, orientation=None, min_reduction=8):
+        """
+        Args:
+            classifier (color_classifier.ColorClassifier): 元の解像度で使う分類器 (RGB/BGR)。
+            classifier_yuv (color_classifier.ColorClassifier): loresのYUV420バッファに使う分類器。Noneなら使わない。
+            coarse_size (tuple): 縮小画像の (幅, 高さ) (センサーの向き)。
+            min_pixels (int): 縮小画像の候補の画素がこれ以上あれば、元の解像度で判定する。
+            margin (int): 候補を囲む矩形に付ける余白 (縮小画像の画素数)。
+            hue_margin (int): 縮小画像の判定で色相の範囲を広げる幅 (loosen)。
+            sv_margin (int): 縮小画像の判定で彩度・明度の下限を下げる幅 (loosen)。
+            blur_ksize (int): 元の解像度での判定の前にかけるGaussianBlurのカーネルサイズ (RGBのみ)。
+            orientation (camera_orientation.Orientation): FrameAnalysis に渡すセンサーの向きから表示の向きへの変換。
+            min_reduction (float): マスクの画素数が縮小画像の画素数のこの倍数未満なら、2段にせず全体を判定する。
+        """
+        self.classifier = classifier
+        self.classifier_yuv = classifier_yuv
+        self.coarse_size = tuple(coarse_size)
+        self.min_pixels = min_pixels
+        self.margin = margin
+        self.blur_ksize = blur_ksize
+        self.orientation = orientation
+        self.min_reduction = min_reduction
+        self._loose = {}
+        for base in (classifier, classifier_yuv):
+            if base is not None:
+                self._loose[base.channel_order] = color_classifier.get_classifier(
+                    loosen(base.hsv_ranges, hue_margin, sv_margin), base.channel_order, base.bits)
+        self.frames = 0
+        self.escalated = 0
+        self.direct = 0          # 小さいフレームなので2段にせず全体を判定した回数
+        self.coarse_s = 0.0      # 縮小画像の判定にかかった合計時間 [s]
+        self.fine_s = 0.0        # 元の解像度での判定にかかった合計時間 [s]
+        self.roi_fraction = 0.0  # 元の解像度で判定した面積の割合の合計
+        self.last_coarse_pixels = 0
+
+    def coarse_image(self, frame):
+        """縮小画像 (RGB/BGRならそのチャンネル順、YUV420なら Y/U/V を重ねた3チャンネル)。"""
+        if frame.ndim == 2:
+            return cv2.merge([self._shrink(plane) for plane in color_classifier.split_yuv420(frame)])
+        return self._shrink(frame[..., :3])
+
+    def _shrink(self, image):
+        # scene_gate と同じく、間引いてから面積平均で縮小する
+        width, height = self.coarse_size
+        step = max(1, min(image.shape[0] // (4 * height), image.shape[1] // (4 * width)))
+        return cv2.resize(image[::step, ::step], self.coarse_size, interpolation=cv2.INTER_AREA)
+
+    def candidate_roi(self, frame):
+        """
+        縮小画像で候補を探し、候補を囲む矩形をマスクの座標 (YUV420なら縦横1/2) で返す。
+
+        Returns:
+            tuple: (y0, y1, x0, x1)。候補が min_pixels 未満なら None。
+        """
+        is_yuv420 = frame.ndim == 2
+        loose = self._loose["YUV" if is_yuv420 else self.classifier.channel_order]
+        coarse = loose.classify(self.coarse_image(frame))
+        self.last_coarse_pixels = int(np.count_nonzero(coarse))
+        if self.last_coarse_pixels < self.min_pixels:
+            return None
+        x, y, w, h = cv2.boundingRect(coarse)
+        height, width = color_classifier.split_yuv420(frame)[1].shape if is_yuv420 else frame.shape[:2]
+        sx, sy = width / self.coarse_size[0], height / self.coarse_size[1]
+        return (max(0, int((y - self.margin) * sy)), min(height, int(np.ceil((y + h + self.margin) * sy))),
+                max(0, int((x - self.margin) * sx)), min(width, int(np.ceil((x + w + self.margin) * sx))))
+
+    def analyze(self, frame):
+        """
+        フレームを2段で判定した FrameAnalysis を返す (マスクは計算済み)。
+
+        Args:
+            frame (np.ndarray): 撮影したフレーム (RGB/BGR、またはloresのYUV420バッファ)。
+
+        Returns:
+            FrameAnalysis: 候補の範囲だけを判定した解析結果。候補が無ければ roi は EMPTY_ROI で、検出画素は0。
+                           小さいフレーム (min_reduction) では roi を指定せずに全体を判定したもの。
+        """
+        if frame.ndim == 2 and self.classifier_yuv is None:
+            raise ValueError("YUV420のバッファを判定するには classifier_yuv を指定してください。")
+        start = time.perf_counter()
+        mask_shape = color_classifier.split_yuv420(frame)[1].shape if frame.ndim == 2 else frame.shape[:2]
+        direct = mask_shape[0] * mask_shape[1] < self.min_reduction * self.coarse_size[0] * self.coarse_size[1]
+        roi = None if direct else self.candidate_roi(frame)
+        middle = time.perf_counter()
+        if direct:
+            self.direct += 1
+        roi_arg = None if direct else (roi or EMPTY_ROI)
+        if frame.ndim == 2:
+            analysis = FrameAnalysis(frame, self.classifier_yuv, orientation=self.orientation, roi=roi_arg)
+        else:
+            analysis = FrameAnalysis(frame, self.classifier, blur_ksize=self.blur_ksize, orientation=self.orientation,
+                                     roi=roi_arg)
+        analysis.mask
+        self.coarse_s += middle - start
+        self.fine_s += time.perf_counter() - middle
+        self.frames += 1
+        if roi is not None:
+            self.escalated += 1
+            y0, y1, x0, x1 = roi
+            self.roi_fraction += (y1 - y0) * (x1 - x0) / analysis.mask.size
+        return analysis
+
+    def stats(self):
+        """
+        判定したフレーム数・全体を判定した回数・元の解像度まで進んだ割合 (2段で判定したフレームのうち)・
+        判定した面積の平均の割合・1フレームあたりの時間 [ms]。
+        """
+        frames = max(self.frames, 1)
+        return {"frames": self.frames, "direct": self.direct, "escalated": self.escalated,
+                "escalation_rate": self.escalated / max(self.frames - self.direct, 1),
+                "roi_fraction": self.roi_fraction / max(self.escalated, 1),
+                "coarse_ms": self.coarse_s / frames * 1000, "fine_ms": self.fine_s / frames * 1000}
+
+def format_pyramid_stats(stats, label="PYRAMID"):
+    """stats() の結果を1行の文字列にする。"""
+    return (f"[{label}] {stats['frames']}フレーム (全体を判定 {stats['direct']}回), 元の解像度で判定 {stats['escalated']}回 "
+            f"({stats['escalation_rate']:.0%}, 平均 {stats['roi_fraction']:.0%} の範囲), "
+            f"縮小画像 {stats['coarse_ms']:.2f}ms/回, 元の解像度 {stats['fine_ms']:.2f}ms/回")
@@ -0,0 +1,190 @@
+import math
+from collections import namedtuple
+import cv2
+import numpy as np
+
+# 輪郭の形 (三角形・長方形・T字・十字) を、モーメントなどの特徴量とテンプレートの比較で1回で判別するモジュール
+# 以前は検出器ごとに approxPolyDP の頂点数で判別していた (Flag_Detector2 は許容誤差を変えて2回、
+# Flag_Hyper は頂点数8をT字・12を十字とみなし、Flag_Detector5 は三角形ごとに垂心も計算していた)。
+# 頂点数は輪郭が小さい・角が丸い・ノイズがあると簡単に変わるので、判別が許容誤差の値に強く依存していた。
+# ShapeClassifier は輪郭1つにつき
+#   - 凸性 (solidity = 面積 / 凸包の面積)
+#   - 充填率 (extent = 面積 / 最小外接矩形の面積。回転しても変わらない)
+#   - Huモーメントの φ1 と √φ2 (大きさ・回転・平行移動で変わらない、広がりと細長さ)
+#   - 大きさ (log √面積。小さい輪郭は角が丸まるので、同じくらいの大きさで描いたテンプレートと比べるため)
+#     テンプレートより大きい (近い) 輪郭は、大きさだけで遠くならないように図形ごとのテンプレートの範囲に収めてから比べる
+# を1回だけ求め、最初に作ったテンプレート (いろいろな大きさ・回転・縦横比で描いた図形の特徴量) の
+# 最も近いものの図形名と、近さのスコア (0-1) を返す。どのテンプレートからも遠ければ「不明」にする。
+#
+# 使い方:
+#   match = shape_classifier.classify(contour)
+#   match.name, match.score      # "T字", 0.93  (遠すぎれば "不明")
+
+SHAPES = ("三角形", "長方形", "T字", "十字")
+UNKNOWN = "不明"
+
+ShapeMatch = namedtuple("ShapeMatch", ["name", "score", "distance"])
+
+# 特徴量ごとの尺度 (この差を距離1とする)。Huモーメントは小さい輪郭の角の丸まりで変わりやすいので緩めにする。
+# 大きさは形を区別するためではなく、近い大きさのテンプレートを選ぶためなので大きく取る
+FEATURE_SCALES = np.array([0.04, 0.04, 0.012, 0.04, 0.3])
+
+def shape_polygon(name, size=1.0, aspect=1.0, thickness=1 / 3, apex_deg=60.0):
+    """
+    原点を中心とした図形の頂点 (N, 2)。
+
+    Args:
+        name (str): SHAPES のいずれか。
+        size (float): 図形の外接する正方形の一辺の半分。
+        aspect (float): 長方形の縦横比 (幅 / 高さ)。
+        thickness (float): T字・十字の棒の太さの半分 (size に対する割合)。
+        apex_deg (float): 三角形の頂角 [deg] (60なら正三角形)。
+    """
+    s = size
+    if name == "三角形":
+        half = math.tan(math.radians(apex_deg) / 2) # 底辺の半分 / 高さ
+        height = 2 * s / max(1.0, 2 * half)
+        width = height * half
+        points = [(0, -height / 2), (width, height / 2), (-width, height / 2)]
+    elif name == "長方形":
+        w, h = (s, s / aspect) if aspect >= 1 else (s * aspect, s)
+        points = [(-w, -h), (w, -h), (w, h), (-w, h)]
+    elif name == "T字":
+        t = s * thickness
+        points = [(-s, -s), (s, -s), (s, -s + 2 * t), (t, -s + 2 * t), (t, s), (-t, s), (-t, -s + 2 * t),
+                  (-s, -s + 2 * t)]
+    elif name == "十字":
+        t = s * thickness
+        points = [(-t, -s), (t, -s), (t, -t), (s, -t), (s, t), (t, t), (t, s), (-t, s), (-t, t), (-s, t),
+                  (-s, -t), (-t, -t)]
+    else:
+        raise ValueError(f"図形の名前は {SHAPES} のいずれかを指定してください: {name}")
+    return np.array(points, np.float64)
+
+def features(contour, min_area=0.0):
+    """
+    輪郭の特徴量 (solidity, extent, φ1, √φ2, log √面積)。面積が min_area 以下ならNone。
+    cv2.moments・凸包・最小外接矩形をそれぞれ1回ずつ求めるだけで、approxPolyDP は使わない。
+    φ1・φ2 は正規化中心モーメントから直接求める (cv2.HuMoments の残りの5つは使わないので計算しない)。
+    """
+    m = cv2.moments(contour)
+    area = m["m00"]
+    if area <= min_area:
+        return None
+    hull_area = cv2.contourArea(cv2.convexHull(contour))
+    w, h = cv2.minAreaRect(contour)[1]
+    nu20, nu02, nu11 = m["nu20"], m["nu02"], m["nu11"]
+    return np.array([area / hull_area if hull_area > 0 else 0.0,
+                     area / (w * h) if w * h > 0 else 0.0,
+                     nu20 + nu02, math.sqrt((nu20 - nu02) ** 2 + 4 * nu11 * nu11), 0.5 * math.log(area)])
+
+def _render_contour(points, size_px, angle_deg):
+    """頂点を回転して size_px 程度の大きさで塗りつぶし、findContours で取り直した輪郭 (画素化の影響を含む)。"""
+    angle = math.radians(angle_deg)
+    rotation = np.array([[math.cos(angle), -math.sin(angle)], [math.sin(angle), math.cos(angle)]])
+    scaled = points @ rotation.T * (size_px / 2)
+    margin = 4
+    offset = -scaled.min(axis=0) + margin
+    canvas_size = np.ceil(scaled.max(axis=0) + offset + margin).astype(int)
+    canvas = np.zeros((canvas_size[1], canvas_size[0]), np.uint8)
+    cv2.fillPoly(canvas, [np.round((scaled + offset) * 16).astype(np.int32)], 255, cv2.LINE_AA, shift=4)
+    _, canvas = cv2.threshold(canvas, 127, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(canvas, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return max(contours, key=cv2.contourArea)
+
+def _variants():
+    """テンプレートにする図形の形のばらつき (名前, shape_polygon の引数)。"""
+    for apex in (40, 50, 60, 75, 90):
+        yield "三角形", {"apex_deg": apex}
+    for aspect in (1.0, 1.3, 1.67, 2.0, 2.5):
+        yield "長方形", {"aspect": aspect}
+    for thickness in (0.25, 1 / 3, 0.4):
+        yield "T字", {"thickness": thickness}
+        yield "十字", {"thickness": thickness}
+
+def build_templates(sizes_px=(16, 24, 32, 48, 80, 120, 160, 240, 320, 480, 640), angles_deg=(0, 15, 30, 45)):
+    """
+    テンプレートの (図形名の配列, 特徴量の配列 (N, 5)) を作る。
+    小さい図形の角の丸まりも含めるため、いくつかの大きさで実際に描いてから輪郭を取り直す。
+    """
+    names, rows = [], []
+    for name, kwargs in _variants():
+        points = shape_polygon(name, **kwargs)
+        for size_px in sizes_px:
+            for angle in angles_deg:
+                f = features(_render_contour(points, size_px, angle))
+                if f is not None:
+                    names.append(name)
+                    rows.append(f)
+    return np.array(names), np.array(rows)
+
+class ShapeClassifier:
+    """
+    輪郭の特徴量を、テンプレートの特徴量との (尺度で割った) ユークリッド距離で比べる最近傍の分類器。
+    """
+
+    def __init__(self, templates=None, max_distance=3.0, min_area=10):
+        """
+        Args:
+            templates (tuple): build_templates() の結果。省略時は既定のテンプレートを作る (最初の1回だけ)。
+            max_distance (float): 最も近いテンプレートまでの距離がこれより大きければ「不明」にする。
+            min_area (float): 面積がこれ以下の輪郭はノイズとして「不明」にする。
+        """
+        self.names, self.templates = templates if templates is not None else _default_templates()
+        self._scaled = self.templates / FEATURE_SCALES
+        # 図形ごとの大きさの範囲 (テンプレートと同じ並び)。図形によって同じ画素数でも面積が違うので図形ごとに持つ
+        sizes = self.templates[:, 4]
+        self._size_min = np.empty_like(sizes)
+        self._size_max = np.empty_like(sizes)
+        for name in np.unique(self.names):
+            same = self.names == name
+            self._size_min[same] = sizes[same].min()
+            self._size_max[same] = sizes[same].max()
+        self.max_distance = max_distance
+        self.min_area = min_area
+
+    def match(self, f):
+        """
+        特徴量 (features() の結果) に最も近いテンプレートの ShapeMatch。
+        大きさは図形ごとのテンプレートの範囲に収める (テンプレートより大きい・小さいだけで「不明」にしない)。
+        """
+        diff = self._scaled - f / FEATURE_SCALES
+        diff[:, 4] = self._scaled[:, 4] - np.clip(f[4], self._size_min, self._size_max) / FEATURE_SCALES[4]
+        squared = np.einsum("ij,ij->i", diff, diff)
+        best = int(np.argmin(squared))
+        distance = math.sqrt(squared[best])
+        score = math.exp(-0.5 * distance * distance)
+        if distance > self.max_distance:
+            return ShapeMatch(UNKNOWN, score, distance)
+        return ShapeMatch(str(self.names[best]), score, distance)
+
+    def classify(self, contour):
+        """
+        輪郭の形を判別する。
+
+        Args:
+            contour (np.ndarray): cv2.findContours の輪郭 (座標系は問わない)。
+
+        Returns:
+            ShapeMatch: (図形名 (SHAPES または "不明"), スコア (0-1、1が最も近い), 最も近いテンプレートまでの距離)。
+        """
+        f = features(contour, self.min_area)
+        if f is None:
+            return ShapeMatch(UNKNOWN, 0.0, float("inf"))
+        return self.match(f)
+
+_templates = None
+_classifier = None
+
+def _default_templates():
+    global _templates
+    if _templates is None:
+        _templates = build_templates()
+    return _templates
+
+def classify(contour):
+    """既定のテンプレートの ShapeClassifier (プロセスで1つだけ作る) で輪郭を判別する。"""
+    global _classifier
+    if _classifier is None:
+        _classifier = ShapeClassifier()
+    return _classifier.classify(contour)
@@ -3,7 +3,7 @@ import csv
 import math
 import time
 import serial
-import pigpio
+import pigpio_manager # pigpiodへの接続をプロセス内で共有する
 import RPi.GPIO as GPIO
 from motor import MotorDriver      # ユーザーのMotorDriverクラスを使用
 from BNO055 import BNO055
@@ -62,7 +62,7 @@ def GPS_navigate(goal_location, bno, driver=None, pi=None):
         #-------------------------------------------------------------------------#
         #---ここでpiの引き渡しがあるかどうかの確認。なければ、piを設定し直す---#
         if pi is None:
-            pi = pigpio.pi()
+            pi = pigpio_manager.acquire("stuck")
             pi_checker = 0
         else:
             pi_checker = 1